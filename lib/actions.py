@@ -112,6 +112,31 @@ class ActionReturnValueAggregate(ActionReturnValue):
 	def addReturnValue(self, returnValue):
 		self.raw.append(returnValue)
 		
+class ActionReturnValueStream(ActionReturnValue):
+	
+	#=============================
+	"""For actions that produce their output over time, e.g. by following a log.
+	
+	self.raw is expected to be an iterable. Its items are turned into strings
+	one by one as they become available, through .terminalStrings, so that
+	interfaces can show them right away instead of waiting for the action
+	to finish (which it might never do on its own)."""
+	#=============================
+	
+	@property
+	def terminalStrings(self):
+		"""Generator of user facing terminal friendly strings, one per item."""
+		for item in self.raw:
+			yield self._itemToString(item)
+	
+	@property
+	def string(self):
+		return self._listToString(list(self.terminalStrings))
+	
+	def _itemToString(self, item):
+		"""Override to customize how items are shown."""
+		return str(item)
+
 class ActionData(argparse.Namespace): pass
 
 class Action(object):
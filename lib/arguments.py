@@ -88,24 +88,21 @@ class ParserSetup(object):
 		@MODIFIER@: Only use in this class and subclasses, no from-outside calls."""
 		
 		self.setUpUpstream()
-		self.setUp()
+		if "setUp" in type(self).__dict__:
+			# Otherwise, .setUp is an inherited one setUpUpstream already ran.
+			self.setUp()
 		
 	def setUp(self):
 		"""Make calls to self.parser to configure command line parameters."""
 		pass#OVERRIDE
 	
 	def setUpUpstream(self):
-		"""Go through all base classes and call .setUp."""
-		try:
-			for Base in self.__class__.__bases__:
-				try:
-					super(Base, self).setUp()
-				except AttributeError:
-					# 'Guess someone mixed in a non-ParserSetup class as a parent.
-					pass
-		except AttributeError:
-			# It's us: Our parent class doesn't have .setUp. ;)
-			pass
+		"""Go through all base classes and call their own .setUp, most basic first.
+		Every .setUp runs once, even for classes inherited through several bases."""
+		for Class in reversed(type(self).__mro__[1:]):
+			setUp = Class.__dict__.get("setUp")
+			if not setUp is None:
+				setUp(self)
 
 class ArgumentSetup(object):
 	
@@ -0,0 +1,73 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""Comparing the chain tips of the nodes of a host.
+
+Nodes of the same coin on one host see the same network, so they should agree on the
+best block, give or take the few seconds a block takes to get around. A node that
+falls behind the others, or sits on a different block at the same height, is the
+first sign of trouble, well before anything shows in its own logs."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from collections import namedtuple, OrderedDict
+
+#=======================================================================================
+# Datatypes
+#=======================================================================================
+
+# height, hash: Of the node's best block, None if unknown. error: Why they're unknown.
+NodeTip = namedtuple("NodeTip", "id height hash error")
+
+# height, hash: The tip. ids: The nodes on it.
+TipGroup = namedtuple("TipGroup", "height hash ids")
+
+# groups: TipGroup objects, highest first, then by how many nodes are on them.
+# maxHeight: The highest tip's height, None if no node answered. lagging: (id, blocks
+# behind) of nodes behind by more than the allowed lag. forked: ids of nodes on another
+# block than most nodes at the same height. unreachable: NodeTip objects of the nodes
+# that couldn't tell.
+TipComparison = namedtuple("TipComparison", "groups maxHeight lagging forked unreachable")
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+def compareTips(tips, maxLag=2):
+
+	"""Group the NodeTip objects by tip and find the nodes that are off. Returns a TipComparison.
+
+	A node is lagging if it's more than maxLag blocks behind the highest tip, and
+	forked if, at its height, more nodes agree on another block than on its own
+	(if no block has the most nodes, all nodes at that height count as forked).
+	Nodes on another branch that are also behind the others can't be told apart
+	from lagging ones by their tips alone; they're reported as lagging, or not at
+	all if they're within maxLag."""
+
+	reachable = [tip for tip in tips if tip.error is None and not tip.height is None]
+	unreachable = [tip for tip in tips if not tip in reachable]
+	byTip = OrderedDict()
+	for tip in reachable:
+		byTip.setdefault((tip.height, tip.hash), []).append(tip.id)
+	groups = sorted([TipGroup(height, hash, ids) for (height, hash), ids in byTip.items()],\
+		key=lambda group: (-group.height, -len(group.ids)))
+	maxHeight = max([tip.height for tip in reachable]) if len(reachable) > 0 else None
+	lagging = [(tip.id, maxHeight-tip.height) for tip in reachable if maxHeight-tip.height > maxLag]
+	forked = []
+	byHeight = OrderedDict()
+	for group in groups:
+		byHeight.setdefault(group.height, []).append(group)
+	for height, groupsAtHeight in byHeight.items():
+		if len(groupsAtHeight) < 2:
+			continue
+		counts = [len(group.ids) for group in groupsAtHeight]
+		majority = groupsAtHeight[0] if counts.count(max(counts)) == 1 else None
+		for group in groupsAtHeight:
+			if not group is majority:
+				forked.extend(group.ids)
+	return TipComparison(groups=groups, maxHeight=maxHeight, lagging=lagging, forked=forked,\
+		unreachable=unreachable)
@@ -0,0 +1,184 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""Fast copying of large files and directory trees, such as block data.
+
+Where the filesystem supports it (btrfs, XFS, bcachefs, ...), files are reflinked
+using the FICLONE ioctl: The copy shares the data blocks of the original until either
+is modified, so copying gigabytes takes a moment and no extra space. Otherwise, files
+are copied in the kernel using copy_file_range, several at a time, which doesn't
+shuttle the data through userspace and lets filesystems that can (NFS, CIFS, ...) copy
+server side."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import errno
+import fcntl
+import os
+import shutil
+import threading
+import time
+
+# Local
+from lib.exceptions import Error
+
+#=======================================================================================
+# Datatypes
+#=======================================================================================
+
+# files: How many files got copied, reflinked those of them that got reflinked.
+# bytes: Their total size. duration: Seconds it took.
+CopyStats = namedtuple("CopyStats", "files reflinked bytes duration")
+
+#=======================================================================================
+# Configuration
+#=======================================================================================
+
+# From <linux/fs.h>: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+# errno values meaning the filesystem(s) can't do what we asked for.
+UNSUPPORTED_ERRNOS = set([errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS,\
+	getattr(errno, "ENOTSUP", errno.EOPNOTSUPP)])
+
+_COPY_CHUNK_SIZE = 1 << 30
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Exceptions
+#==========================================================
+
+#==========================================================
+class CopyError(Error):
+	pass
+
+#==========================================================
+# Files
+#==========================================================
+
+def reflinkFile(sourcePath, destinationPath):
+	"""Reflink sourcePath to destinationPath using FICLONE.
+	Raises OSError if that isn't possible; errno tells why."""
+	with open(sourcePath, "rb") as sourceFile, open(destinationPath, "wb") as destinationFile:
+		fcntl.ioctl(destinationFile.fileno(), FICLONE, sourceFile.fileno())
+
+def copyFileRange(sourcePath, destinationPath):
+	"""Copy sourcePath to destinationPath in the kernel using copy_file_range, or with
+	plain reads and writes where that isn't available. Returns the bytes copied."""
+	with open(sourcePath, "rb") as sourceFile, open(destinationPath, "wb") as destinationFile:
+		size = os.fstat(sourceFile.fileno()).st_size
+		copied = 0
+		if hasattr(os, "copy_file_range"):
+			try:
+				while copied < size:
+					count = os.copy_file_range(sourceFile.fileno(), destinationFile.fileno(),\
+						min(_COPY_CHUNK_SIZE, size-copied))
+					if count == 0:
+						break
+					copied += count
+				return copied
+			except OSError as error:
+				if not error.errno in UNSUPPORTED_ERRNOS or copied > 0:
+					raise
+		shutil.copyfileobj(sourceFile, destinationFile, 1 << 20)
+		return size
+
+#==========================================================
+# Trees
+#==========================================================
+
+#==========================================================
+class TreeCopier(object):
+
+	#=============================
+	"""Copies a directory tree, reflinking files if possible, copying them in parallel if not.
+
+	Takes:
+		- workers (int): How many files to copy at once when reflinking isn't
+		  possible. Reflinks are cheap enough not to need more than one.
+		- reflink (bool): Set to False to always copy.
+
+	After the first file that can't be reflinked because the filesystem doesn't
+	support it, no further reflinks are attempted. .copy() returns CopyStats.
+	Modification times are preserved, ownership and permissions are those of
+	a newly created file, as is the case with cp. Symlinks are copied as symlinks.
+	Raises CopyError if the destination exists already, to prevent mixing data."""
+	#=============================
+
+	def __init__(self, workers=4, reflink=True):
+		self.workers = max(1, int(workers))
+		self.reflink = reflink
+		self._lock = threading.Lock()
+		self._files = 0
+		self._reflinked = 0
+		self._bytes = 0
+		self._duration = 0.0
+
+	@property
+	def stats(self):
+		"""CopyStats of everything copied so far."""
+		return CopyStats(files=self._files, reflinked=self._reflinked, bytes=self._bytes,\
+			duration=self._duration)
+
+	def _copyFile(self, sourcePath, destinationPath, size):
+		reflinked = False
+		if self.reflink:
+			try:
+				reflinkFile(sourcePath, destinationPath)
+				reflinked = True
+			except OSError as error:
+				if not error.errno in UNSUPPORTED_ERRNOS:
+					raise
+				self.reflink = False
+		if not reflinked:
+			copyFileRange(sourcePath, destinationPath)
+		stat = os.stat(sourcePath)
+		os.utime(destinationPath, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+		with self._lock:
+			self._files += 1
+			self._reflinked += 1 if reflinked else 0
+			self._bytes += size
+
+	def _collect(self, sourcePath, destinationPath, files):
+		"""Create the directories and symlinks of the tree, collecting the files to copy."""
+		os.mkdir(destinationPath)
+		with os.scandir(sourcePath) as entries:
+			for entry in entries:
+				target = os.path.join(destinationPath, entry.name)
+				if entry.is_symlink():
+					os.symlink(os.readlink(entry.path), target)
+				elif entry.is_dir():
+					self._collect(entry.path, target, files)
+				elif entry.is_file():
+					files.append((entry.path, target, entry.stat().st_size))
+
+	def copy(self, sourcePath, destinationPath):
+		"""Copy the tree at sourcePath to destinationPath. Returns .stats, which add up
+		over several calls."""
+		sourcePath, destinationPath = str(sourcePath), str(destinationPath)
+		if os.path.lexists(destinationPath):
+			raise CopyError("Won't copy {source} to {destination}: The destination exists."\
+				.format(source=sourcePath, destination=destinationPath))
+		startTime = time.monotonic()
+		files = []
+		self._collect(sourcePath, destinationPath, files)
+		# Biggest first, so the last ones to finish are small.
+		files.sort(key=lambda file: file[2], reverse=True)
+		if self.reflink and len(files) > 0:
+			# Find out whether reflinks work before starting the workers.
+			self._copyFile(*files.pop(0))
+		workers = 1 if self.reflink else self.workers
+		with ThreadPoolExecutor(max_workers=workers) as executor:
+			for future in [executor.submit(self._copyFile, *file) for file in files]:
+				future.result()
+		self._duration += time.monotonic()-startTime
+		return self.stats
@@ -7,6 +7,7 @@
 # Python.
 from collections import OrderedDict
 from collections import namedtuple
+from pathlib import Path
 import json
 import inspect
 
@@ -35,13 +36,106 @@ class WalletError(ErrorWithCodes):
 	# Daemon
 	codes.DAEMON_STUCK = 101
 	codes.DAEMON_DUPLICATE = 102
+	codes.DAEMON_START_FAILED = 103
 	# Wallet IPC
 	codes.RPC_CONNECTION_FAILED = 201
+	# Fleet
+	codes.NODE_NOT_FOUND = 301
+	# Block data
+	codes.DATA_DELETION_FAILED = 401
 
 #==========================================================
 class DaemonStuckError(Error):
 	pass
 
+#==========================================================
+class ConfigValidationError(Error):
+	pass
+
+#==========================================================
+# Config Schema
+#==========================================================
+
+#==========================================================
+class ConfigField(object):
+	
+	#=============================
+	"""Declares a field of a CurrencyConfig subclass. See CurrencyConfig.
+	
+	Takes:
+		- type: What values are turned into when assigned through the schema.
+		  str, int, float, bool, list and Path are supported. Anything else is
+		  expected to be callable with the value.
+		- default: Default value, used if there's no "default<Name>" class attribute.
+		- template (string): Format string deriving the default value from other
+		  defaults, e.g. "{defaultFileBaseName}-cli". It's formatted with all class
+		  attributes starting with "default", so subclasses changing those get
+		  matching derived defaults without having to repeat them.
+		- nullable (bool): Whether None is a valid value.
+		- validator (callable): Called with the typed value. Returns None if the
+		  value is valid, a message describing the problem otherwise."""
+	#=============================
+	
+	def __init__(self, type=str, default=None, template=None, nullable=True, validator=None):
+		self.type = type
+		self.default = default
+		self.template = template
+		self.nullable = nullable
+		self.validator = validator
+		self.name = None
+		self.defaultName = None
+		self.coerce = self._makeCoercer(type)
+		self.serialize = self._makeSerializer(type)
+	
+	def bind(self, name):
+		"""Called for the class declaring the field, with the name it's declared under."""
+		self.name = name
+		self.defaultName = "default{0}{1}".format(name[0].upper(), name[1:])
+	
+	def _makeCoercer(self, Type):
+		if Type is str:
+			return lambda value: value if type(value) is str else str(value)
+		if Type is bool:
+			return lambda value: value if type(value) is bool\
+				else not str(value).strip().lower() in ["", "0", "false", "no", "off"]
+		if Type is list:
+			return lambda value: list(value) if type(value) in [list, tuple] else [value]
+		if Type is Path:
+			return lambda value: value if isinstance(value, Path) else Path(value)
+		return Type
+	
+	def _makeSerializer(self, Type):
+		if Type is Path:
+			return str
+		if Type is list:
+			return lambda value: [str(item) if isinstance(item, Path) else item for item in value]
+		return None
+	
+	def typed(self, value):
+		"""The value as the type of the field. Raises ConfigValidationError if that fails
+		or the value doesn't validate."""
+		if value is None:
+			if self.nullable:
+				return None
+			raise ConfigValidationError("Config field \"{name}\" can't be empty.".format(name=self.name))
+		try:
+			value = self.coerce(value)
+		except (TypeError, ValueError) as error:
+			raise ConfigValidationError("Invalid value for config field \"{name}\": {value!r} ({error})"\
+				.format(name=self.name, value=value, error=error))
+		if not self.validator is None:
+			problem = self.validator(value)
+			if not problem is None:
+				raise ConfigValidationError("Invalid value for config field \"{name}\": {value!r} ({problem})"\
+					.format(name=self.name, value=value, problem=problem))
+		return value
+
+def validatePort(port):
+	"""ConfigField validator for TCP/UDP ports."""
+	if port < 1 or port > 65535:
+		return "not a valid port number"
+	return None
+
 #==========================================================
 # Wallet Classes
 #==========================================================
@@ -56,64 +150,153 @@ class CurrencyConfig(object):
 	"""Represents the configuration for handling a currency.
 	Intended to be used with Actions and Wallets in plugins.
 	
-	Is expected to have class attributes starting with "default" in their
-	variable name, which are then passed as defaults to __init__ for the
-	corresponding keyword argument, which is expected to have a
-	lower-case-starting variable name minus the "default" prefix.
-	
-	Any member variable that is assigned in the end is supposed to
-	follow the naming convention as laid out for the corresonding
-	keyword argument whenever applicable.
+	Subclasses declare their fields in the "fields" class attribute, an
+	OrderedDict mapping attribute names to ConfigField objects. Fields declared
+	by parent classes are inherited. The schema is compiled once per class upon
+	its definition (see __init_subclass__), so none of the class introspection
+	happens when configs are created, serialized or loaded.
 	
-	Numbers are also expected to be strings by default, to keep
-	things consistent across various types of sources for config
-	values that might not always preserve datatypes throughout
-	whatever means they take to reach our object.
+	The default value of a field is expected to be a class attribute named like
+	the field with a "default" prefix, starting upper case after it, or else is
+	derived through the template of its ConfigField, or taken from the ConfigField.
+	Defaults are kept as strings whenever feasible, to keep things consistent
+	across various types of sources for config values that might not always
+	preserve datatypes throughout whatever means they take to reach our object.
+	The schema takes care of turning them into the type of their field.
 	
 	Example of the above described convention:
 	
 		class SomeConfig(<OurClassName>):
+			fields = OrderedDict([\\
+				("mushroom", ConfigField(str)),\\
+				("number", ConfigField(int)),\\
+				("mushroomPath", ConfigField(Path, template="/{defaultMushroom}")),\\
+			])
 			defaultMushroom = "shiitake"
 			defaultNumber = "32"
-			def __init__(self, mushroom=defaultMushroom, number=defaultNumber):
-				self.mushroom = mushroom
-				self.number = number
+			def __init__(self, mushroom=None, number=None):
+				self._setFields_(mushroom=mushroom, number=number)
 		
 	In the above example, default values can then easily be
 	overriden upon instantiation:
 		SomeConfig(mushroom="lingzhi", number="1053")
-	"""
+	whereas .number ends up as the int 1053, and .mushroomPath as Path("/shiitake").
+	
+	.toDict()/.fromDict() and .toJson()/.fromJson() convert to and from plain
+	data, .validate() checks all fields against the schema."""
 	#=============================
 	
+	fields = OrderedDict()
+	_schema_ = OrderedDict()
+	_compiledFields_ = []
+	_defaultAttributes_ = []
+	
+	def __init_subclass__(cls, **kwargs):
+		
+		"""Compile the schema of the subclass: Fields, resolved defaults and default attributes."""
+		
+		super().__init_subclass__(**kwargs)
+		schema = OrderedDict(cls._schema_) # Inherited.
+		for name, field in cls.__dict__.get("fields", {}).items():
+			field.bind(name)
+			schema[name] = field
+		cls._schema_ = schema
+		cls._resolveTemplatedDefaults_()
+		cls._compiledFields_ = [(name, field, getattr(cls, field.defaultName, field.default))\
+			for name, field in schema.items()]
+		cls._defaultAttributes_ = [AttributeTuple(name=name, value=value)\
+			for name, value in cls.getClassAttributes().items() if name.startswith("default")]
+	
+	@classmethod
+	def _resolveTemplatedDefaults_(cls):
+		
+		"""Set the default attributes of templated fields, unless they're explicitly set.
+		
+		A default that a parent class derived from its template is derived anew, as
+		the defaults it's derived from might have changed. One that was explicitly
+		assigned somewhere along the class hierarchy is left as is."""
+		
+		templated = set()
+		for name, field in cls._schema_.items():
+			if field.template is None:
+				continue
+			owner = None
+			for Class in cls.__mro__:
+				if field.defaultName in Class.__dict__:
+					owner = Class
+					break
+			if not owner is None and (owner is cls\
+				or not field.defaultName in owner.__dict__.get("_templatedDefaults_", ())):
+				continue # Explicitly set.
+			defaults = {attributeName: getattr(cls, attributeName)\
+				for attributeName in dir(cls) if attributeName.startswith("default")}
+			setattr(cls, field.defaultName, field.template.format(**defaults))
+			templated.add(field.defaultName)
+		cls._templatedDefaults_ = frozenset(templated)
+	
 	@classmethod
 	def getClassAttributes(self):
 		attributes = {}
-		for parentClass in inspect.getmro(self):
+		for parentClass in reversed(inspect.getmro(self)):
 			attributes.update(parentClass.__dict__)
-		attributes.update(self.__dict__)
 		return attributes
 	
+	def _setFields_(self, **values):
+		"""Assign all fields of the schema from values, typed, with defaults for missing or None values."""
+		for name, field, default in type(self)._compiledFields_:
+			value = values.get(name)
+			setattr(self, name, field.typed(default if value is None else value))
+	
+	def _initState_(self):
+		"""Set up whatever isn't part of the schema. Also called by .fromDict."""
+		pass#OVERRIDE
+	
+	def validate(self):
+		"""Check all fields against the schema. Raises ConfigValidationError if one is invalid."""
+		for name, field, default in type(self)._compiledFields_:
+			field.typed(getattr(self, name, None))
+	
+	def toDict(self):
+		"""OrderedDict of all fields, with values JSON can represent."""
+		data = OrderedDict()
+		for name, field, default in type(self)._compiledFields_:
+			value = getattr(self, name, None)
+			if not value is None and not field.serialize is None:
+				value = field.serialize(value)
+			data[name] = value
+		return data
+	
+	@classmethod
+	def fromDict(cls, data):
+		"""Make a config from a dict as returned by .toDict. Missing fields get their defaults."""
+		config = cls.__new__(cls)
+		config._setFields_(**data)
+		config._initState_()
+		return config
+	
+	def toJson(self):
+		return json.dumps(self.toDict())
+	
+	@classmethod
+	def fromJson(cls, string):
+		return cls.fromDict(json.loads(string))
+	
 	@property
 	def _defaults_(self):
 		
 		"""Return all attributes that are defaults (start with "default")."""
 		
-		defaults = []
-		for attributeName, attributeValue in self.__class__.getClassAttributes().items():
-			if attributeName.startswith("default"):
-				defaults.append(AttributeTuple(\
-					name=attributeName, value=attributeValue))
-		return defaults
+		return list(type(self)._defaultAttributes_)
 	
 	@property
 	def _config_(self):
 		
-		"""Return all attributes that aren't defaults or __attributes__."""
+		"""Return all attributes that aren't defaults, _private or __attributes__."""
 		
 		config = []
 		for attributeName, attributeValue in self.__dict__.items():
 			if\
-			not attributeName.startswith("__")\
+			not attributeName.startswith("_")\
 			and not attributeName.startswith("default")\
 			and not attributeName.endswith("__"):
 				config.append(AttributeTuple\
@@ -129,8 +312,23 @@ class CurrencyConfig(object):
 	
 	@property
 	def _repr_json_(self):
-		"""A json object representing the attributes of this object."""
-		return json.puts(self._repr_dict_)
+		"""The attributes of this object as an object json can encode."""
+		return OrderedDict([\
+			("Defaults", OrderedDict([(attribute.name, self._jsonable(attribute.value))\
+				for attribute in self._defaults_])),\
+			("Config", OrderedDict([(attribute.name, self._jsonable(attribute.value))\
+				for attribute in self._config_])),\
+		])
+	
+	def _jsonable(self, value):
+		"""The value in a form json can encode. Falls back to str for anything unknown."""
+		if value is None or type(value) in [str, int, float, bool]:
+			return value
+		if type(value) in [list, tuple]:
+			return [self._jsonable(item) for item in value]
+		if type(value) in [dict, OrderedDict]:
+			return OrderedDict([(str(key), self._jsonable(item)) for key, item in value.items()])
+		return str(value)
 	
 	@property
 	def _repr_str_terminal_(self):
@@ -0,0 +1,222 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""Deduplication of the finalized block files of the nodes of a host.
+
+Every node stores the same chain history in its blocks/blk*.dat and rev*.dat files.
+Once a block file is full, the daemon moves on to the next one and never writes to it
+again, so where the files of several nodes are byte-identical, they can share one inode
+(hardlink) or one set of extents (reflink). Hardlinks also make the nodes share the page
+cache for these files; reflinks only save disk space, but keep the files independent
+should a daemon ever write to one of them.
+
+Candidates are grouped by size first, so only files that could be equal get hashed.
+Hashing is streamed and done in a process pool, as it's CPU bound for files that are
+in the page cache. The highest numbered blk and rev file of every node is left alone,
+as those are still being appended to."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import os
+import re
+import time
+
+# Local
+from lib.copying import reflinkFile, UNSUPPORTED_ERRNOS
+from lib.exceptions import Error
+
+#=======================================================================================
+# Datatypes
+#=======================================================================================
+
+# nodeId: Id of the node the file belongs to. stat: Its os.stat_result at the time
+# it was found, to notice if it changed before it gets replaced.
+BlockFile = namedtuple("BlockFile", "nodeId path stat")
+
+# files: How many candidates were looked at. groups: How many sets of identical files
+# with more than one inode were found. linked: How many files were (or, on a dry run,
+# would have been) replaced by links, bytesSaved: Their total size. skipped: Files
+# that changed while we were at it. duration: Seconds it took.
+DedupStats = namedtuple("DedupStats", "files groups linked bytesSaved skipped duration")
+
+#=======================================================================================
+# Configuration
+#=======================================================================================
+
+BLOCK_FILE_PATTERN = re.compile(r"^(blk|rev)(\d+)\.dat$")
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Exceptions
+#==========================================================
+
+#==========================================================
+class DedupError(Error):
+	pass
+
+#==========================================================
+# Functions
+#==========================================================
+
+def hashFile(path):
+	"""BLAKE2b hex digest of the file at path, read in chunks."""
+	digest = hashlib.blake2b(digest_size=32)
+	with open(path, "rb") as hashedFile:
+		for chunk in iter(lambda: hashedFile.read(_HASH_CHUNK_SIZE), b""):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+def finalizedBlockFiles(nodeId, blocksDirPath):
+	"""BlockFiles of the blk and rev files in blocksDirPath, except the highest numbered
+	of each kind, which the daemon might still append to."""
+	files = {"blk": [], "rev": []}
+	try:
+		with os.scandir(blocksDirPath) as entries:
+			for entry in entries:
+				match = BLOCK_FILE_PATTERN.match(entry.name)
+				if match and entry.is_file(follow_symlinks=False):
+					files[match.group(1)].append((int(match.group(2)), entry))
+	except FileNotFoundError:
+		return []
+	blockFiles = []
+	for kind in files.values():
+		kind.sort(key=lambda numberedEntry: numberedEntry[0])
+		blockFiles.extend([BlockFile(nodeId, entry.path, entry.stat(follow_symlinks=False))\
+			for number, entry in kind[:-1]])
+	return blockFiles
+
+#==========================================================
+# Deduplication
+#==========================================================
+
+#==========================================================
+class BlockFileDeduplicator(object):
+
+	#=============================
+	"""Replaces identical finalized block files of several nodes by links to one of them.
+
+	Takes:
+		- workers (int): Size of the hashing process pool. None for one per CPU.
+		- linkMode (string): "hardlink", "reflink" or "auto", which reflinks where the
+		  filesystem supports it and hardlinks otherwise.
+		- dryRun (bool): Only find out what would be replaced.
+
+	.deduplicate(nodes) takes (id, blocksDirPath) pairs and returns DedupStats.
+	Files are only linked to others on the same filesystem. Of every set of identical
+	files, the inode most of them share already is kept, so running it again after
+	hardlinking is cheap.
+	Right before a file gets replaced, it's checked not to have changed since it was
+	hashed. Replacing is atomic (link to a temporary name, then rename over the file).
+	Daemons having the old file open keep reading it until they reopen it; its space
+	is freed once they do."""
+	#=============================
+
+	def __init__(self, workers=None, linkMode="auto", dryRun=False):
+		if not linkMode in ("hardlink", "reflink", "auto"):
+			raise DedupError("Unknown link mode: {0}".format(linkMode))
+		self.workers = None if workers is None else max(1, int(workers))
+		self.linkMode = linkMode
+		self.dryRun = dryRun
+
+	def collect(self, nodes):
+		"""BlockFiles of all nodes, grouped by device and size, leaving out sizes only
+		one inode has."""
+		bySize = OrderedDict()
+		for nodeId, blocksDirPath in nodes:
+			for blockFile in finalizedBlockFiles(nodeId, blocksDirPath):
+				bySize.setdefault((blockFile.stat.st_dev, blockFile.stat.st_size), []).append(blockFile)
+		return [blockFiles for blockFiles in bySize.values()\
+			if len(set([blockFile.stat.st_ino for blockFile in blockFiles])) > 1]
+
+	def _hash(self, candidates):
+		"""Hashes of the candidates by path, each inode hashed only once."""
+		byInode = OrderedDict()
+		for blockFile in candidates:
+			byInode.setdefault((blockFile.stat.st_dev, blockFile.stat.st_ino), blockFile.path)
+		with ProcessPoolExecutor(max_workers=self.workers) as executor:
+			hashes = dict(zip(byInode.keys(), executor.map(hashFile, byInode.values(), chunksize=4)))
+		return {blockFile.path: hashes[(blockFile.stat.st_dev, blockFile.stat.st_ino)]\
+			for blockFile in candidates}
+
+	def _unchanged(self, blockFile):
+		try:
+			stat = os.stat(blockFile.path, follow_symlinks=False)
+		except FileNotFoundError:
+			return False
+		return (stat.st_ino, stat.st_size, stat.st_mtime_ns)\
+			== (blockFile.stat.st_ino, blockFile.stat.st_size, blockFile.stat.st_mtime_ns)
+
+	def _link(self, sourcePath, destinationPath):
+		"""Atomically replace destinationPath with a link to sourcePath."""
+		temporaryPath = "{0}.dedup-{1}".format(destinationPath, os.getpid())
+		if self.linkMode in ("reflink", "auto"):
+			try:
+				reflinkFile(sourcePath, temporaryPath)
+				stat = os.stat(destinationPath)
+				os.utime(temporaryPath, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+				os.replace(temporaryPath, destinationPath)
+				return
+			except OSError as error:
+				try:
+					os.unlink(temporaryPath)
+				except FileNotFoundError:
+					pass
+				if self.linkMode == "reflink" or not error.errno in UNSUPPORTED_ERRNOS:
+					raise
+				self.linkMode = "hardlink"
+		os.link(sourcePath, temporaryPath)
+		try:
+			os.replace(temporaryPath, destinationPath)
+		except OSError:
+			os.unlink(temporaryPath)
+			raise
+
+	def deduplicate(self, nodes):
+		startTime = time.monotonic()
+		sizeGroups = self.collect(nodes)
+		candidates = [blockFile for blockFiles in sizeGroups for blockFile in blockFiles]
+		hashes = self._hash(candidates)
+		groups, linked, bytesSaved, skipped = 0, 0, 0, 0
+		for blockFiles in sizeGroups:
+			byHash = OrderedDict()
+			for blockFile in blockFiles:
+				byHash.setdefault(hashes[blockFile.path], []).append(blockFile)
+			for identical in byHash.values():
+				inodes = [blockFile.stat.st_ino for blockFile in identical]
+				if len(set(inodes)) < 2:
+					continue
+				groups += 1
+				keptInode = max(inodes, key=inodes.count)
+				kept = [blockFile for blockFile in identical if blockFile.stat.st_ino == keptInode][0]
+				if not self._unchanged(kept):
+					skipped += len(identical)
+					continue
+				freedInodes = set()
+				for blockFile in identical:
+					if blockFile.stat.st_ino == keptInode:
+						continue
+					if not self._unchanged(blockFile):
+						skipped += 1
+						continue
+					if not self.dryRun:
+						self._link(kept.path, blockFile.path)
+					linked += 1
+					# Space is only freed once no link to the replaced inode is left.
+					if blockFile.stat.st_nlink <= inodes.count(blockFile.stat.st_ino)\
+						and not blockFile.stat.st_ino in freedInodes:
+						freedInodes.add(blockFile.stat.st_ino)
+						bytesSaved += blockFile.stat.st_size
+		return DedupStats(files=len(candidates), groups=groups, linked=linked, bytesSaved=bytesSaved,\
+			skipped=skipped, duration=time.monotonic()-startTime)
@@ -6,6 +6,7 @@
 
 import os
 import shutil
+import tempfile
 
 from lib.exceptions import Error
 
@@ -92,4 +93,34 @@ class BatchPathExistenceCheck(object):
 		elif self.nonExistentPathCount > 1:
 			raise PathNotFoundError(\
 				"Error: The following paths don't exist: {batchErrorMessage}".format(\
-					batchErrorMessage=self.batchErrorMessage))
\ No newline at end of file
+					batchErrorMessage=self.batchErrorMessage))
+
+#==========================================================
+# File writing
+#==========================================================
+
+def writeFileAtomically(path, data):
+	
+	"""Replace the file at path with data (bytes or string) in one step.
+	
+	Writes to a temporary file in the same directory, syncs it to disk and renames
+	it over the file, so readers either get the old or the new contents, never
+	a partial file, even if we get killed halfway through."""
+	
+	path = str(path)
+	if isinstance(data, str):
+		data = data.encode()
+	fd, tempPath = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),\
+		prefix=".{0}.".format(os.path.basename(path)), suffix=".tmp")
+	try:
+		with os.fdopen(fd, "wb") as tempFile:
+			tempFile.write(data)
+			tempFile.flush()
+			os.fsync(tempFile.fileno())
+		os.replace(tempPath, path)
+	except BaseException:
+		try:
+			os.unlink(tempPath)
+		except FileNotFoundError:
+			pass
+		raise
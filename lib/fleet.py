@@ -0,0 +1,200 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""Discovery of all nodes of a coin set up in the masternode directory layout.
+
+The layout, as established by legacy/vivomanager.sh:
+	~/coins/<coin>/bin/                            Binaries shared by all nodes.
+	~/coins/<coin>/masternodes/<id>/               Home directory of the node.
+	~/coins/<coin>/masternodes/<id>/.<coin>core/   Its datadir, with its conf file.
+The RPC port of a node is baseRpcPort+id and its P2P port basePort+id, unless its conf
+file says otherwise.
+
+FleetLoader lists the masternodes directory once and builds the config of every node
+from the directory entry and the node's parsed conf file, without touching anything
+else on disk. The result is a Fleet, indexed by id, datadir and port."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from collections import namedtuple, OrderedDict
+import os
+
+# Local
+from lib.nodeconf import loadNodeConf
+
+#=======================================================================================
+# Datatypes
+#=======================================================================================
+
+# id: Name of the node's directory (string). rpcPort: The RPC port in effect, the same
+# as config.rpcPort. port: The P2P port in effect, None if neither the conf file nor the
+# id tell. config: The node's CurrencyConfig.
+FleetNode = namedtuple("FleetNode", "id homeDirPath dataDirPath rpcPort port config")
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Collections
+#==========================================================
+
+#==========================================================
+class Fleet(object):
+
+	#=============================
+	"""The nodes of a coin, indexed by id, datadir path and port (RPC and P2P).
+
+	Takes:
+		- nodes (list): FleetNode objects.
+
+	Iterating yields the nodes in order of their ids, numerically where the ids
+	are numbers. All lookups are dict lookups and return None if there's no
+	such node."""
+	#=============================
+
+	def __init__(self, nodes=[]):
+		self.nodes = []
+		self._byId = {}
+		self._byDataDir = {}
+		self._byPort = {}
+		for node in sorted(nodes, key=self._sortKey):
+			self.add(node)
+
+	def _sortKey(self, node):
+		return (0, int(node.id), "") if node.id.isdigit() else (1, 0, node.id)
+
+	def add(self, node):
+		self.nodes.append(node)
+		self._byId[node.id] = node
+		self._byDataDir[os.path.abspath(str(node.dataDirPath))] = node
+		for port in [node.rpcPort, node.port]:
+			if not port is None:
+				self._byPort.setdefault(port, node)
+
+	def __iter__(self):
+		return iter(self.nodes)
+
+	def __len__(self):
+		return len(self.nodes)
+
+	def __contains__(self, id):
+		return str(id) in self._byId
+
+	@property
+	def ids(self):
+		return [node.id for node in self.nodes]
+
+	def byId(self, id):
+		return self._byId.get(str(id))
+
+	def byDataDir(self, dataDirPath):
+		return self._byDataDir.get(os.path.abspath(str(dataDirPath)))
+
+	def byPort(self, port):
+		"""The node using the port, be it as its RPC or P2P port."""
+		try:
+			return self._byPort.get(int(port))
+		except ValueError:
+			return None
+
+	def resolve(self, identifier):
+		"""The node identified by identifier: Its id, or else its datadir path."""
+		node = self.byId(identifier)
+		if node is None:
+			node = self.byDataDir(identifier)
+		return node
+
+	@property
+	def _repr_str_(self):
+		return "\n".join(["{id}: {dataDir} (rpc: {rpcPort}, p2p: {port})".format(id=node.id,\
+			dataDir=node.dataDirPath, rpcPort=node.rpcPort, port=node.port) for node in self.nodes])
+
+	@property
+	def _repr_json_(self):
+		return [OrderedDict([("id", node.id), ("homeDirPath", str(node.homeDirPath)),\
+			("dataDirPath", str(node.dataDirPath)), ("rpcPort", node.rpcPort), ("port", node.port)])\
+			for node in self.nodes]
+
+#==========================================================
+# Loading
+#==========================================================
+
+#==========================================================
+class FleetLoader(object):
+
+	#=============================
+	"""Builds the Fleet of a coin from its directory.
+
+	Takes:
+		- Config: The CurrencyConfig subclass of the coin. Its defaultDataDirName
+		  and defaultConfigFileName are what's expected in each node's directory.
+		- coinDirPath (string): The directory of the coin, e.g. ~/coins/vivo.
+		- baseRpcPort, basePort (int): The ports of node 0. Node n gets base+n.
+		- masternodesDirName, binDirName (string): Names of the directories
+		  within coinDirPath holding the node directories and the binaries.
+
+	A node without a conf file gets the ports its id derives, or else the default
+	RPC port of the Config. Entries of the masternodes directory that aren't
+	directories are ignored. If the masternodes directory doesn't exist, the fleet
+	is empty. Override .makeConfig for configs whose fields aren't those of
+	BitcoinConfig."""
+	#=============================
+
+	def __init__(self, Config, coinDirPath, baseRpcPort=9400, basePort=9700,\
+		masternodesDirName="masternodes", binDirName="bin"):
+		self.Config = Config
+		self.coinDirPath = os.path.abspath(os.path.expanduser(str(coinDirPath)))
+		self.baseRpcPort = int(baseRpcPort)
+		self.basePort = int(basePort)
+		self.masternodesDirPath = os.path.join(self.coinDirPath, masternodesDirName)
+		self.binDirPath = os.path.join(self.coinDirPath, binDirName)
+
+	def load(self):
+		return Fleet([self.loadNode(id, homeDirPath) for id, homeDirPath in self.scan()])
+
+	def scan(self):
+		"""List of (id, homeDirPath) of all node directories."""
+		nodeDirs = []
+		try:
+			with os.scandir(self.masternodesDirPath) as entries:
+				for entry in entries:
+					# Uses the type from the directory listing; no stat call.
+					if entry.is_dir():
+						nodeDirs.append((entry.name, entry.path))
+		except FileNotFoundError:
+			pass
+		return nodeDirs
+
+	def dataDirPathFor(self, homeDirPath):
+		return os.path.join(homeDirPath, self.Config.defaultDataDirName)
+
+	def confPathFor(self, dataDirPath):
+		return os.path.join(dataDirPath, self.Config.defaultConfigFileName)
+
+	def loadNode(self, id, homeDirPath):
+		dataDirPath = self.dataDirPathFor(homeDirPath)
+		try:
+			nodeConf = loadNodeConf(self.confPathFor(dataDirPath), dataDirPath=dataDirPath)
+		except FileNotFoundError:
+			nodeConf = None
+		rpcPort = None if nodeConf is None else nodeConf.rpcPort
+		port = None if nodeConf is None else nodeConf.port
+		if id.isdigit():
+			if rpcPort is None:
+				rpcPort = self.baseRpcPort+int(id)
+			if port is None:
+				port = self.basePort+int(id)
+		config = self.makeConfig(homeDirPath, dataDirPath, rpcPort)
+		# Without a port of its own, the node uses the default RPC port of its config.
+		rpcPort = getattr(config, "rpcPort", rpcPort)
+		return FleetNode(id=id, homeDirPath=homeDirPath, dataDirPath=dataDirPath, rpcPort=rpcPort,\
+			port=port, config=config)
+
+	def makeConfig(self, homeDirPath, dataDirPath, rpcPort):
+		return self.Config.fromDict({"basePaths": [self.binDirPath], "dataDirBaseDirPath": homeDirPath,\
+			"dataDirPath": dataDirPath, "rpcPort": rpcPort})
@@ -0,0 +1,182 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""Incremental decoding of large JSON documents.
+
+Some RPC calls return JSON that can grow to many megabytes (the mempool, long
+transaction lists, masternode lists, fully decoded blocks). Decoding those in one go
+means holding the whole document in memory twice: Once as text and once decoded.
+JsonStreamDecoder reads the document in chunks from a stream and yields the members
+of its top level array or object (or of a container nested further down) one by one
+as soon as they're complete, so that memory use is bounded by the largest member."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import codecs
+import json
+
+# Local
+from lib.exceptions import Error
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+# What a JSON number may consist of.
+NUMBER_CHARACTERS = "0123456789+-.eE"
+
+#==========================================================
+# Exceptions
+#==========================================================
+
+#==========================================================
+class JsonStreamError(Error):
+	pass
+
+#==========================================================
+# Decoders
+#==========================================================
+
+#==========================================================
+class JsonStreamDecoder(object):
+
+	#=============================
+	"""Yields the members of a JSON array or object read from a stream as they're decoded.
+
+	Takes:
+		- stream: A binary file-like object to read the JSON document from.
+		- path (list): Keys of nested objects to descend into before yielding.
+		  Empty for the top level container. Example: ["tx"] for the transactions
+		  of a block as returned by "getblock <hash> 2".
+		- chunkSize (int): How many bytes to read at a time.
+
+	Iterating over the decoder yields the values of an array, or (key, value)
+	tuples for an object. Members of the containers along the path that aren't
+	on it are skipped. Raises JsonStreamError if the document isn't valid JSON,
+	the container at the end of the path isn't an array or object, or the path
+	doesn't exist. .itemCount tells how many members have been yielded so far."""
+	#=============================
+
+	def __init__(self, stream, path=[], chunkSize=65536):
+		self.stream = stream
+		self.path = list(path)
+		self.chunkSize = chunkSize
+		self.itemCount = 0
+		self._decoder = json.JSONDecoder()
+		self._textDecoder = codecs.getincrementaldecoder("utf-8")()
+		self._buffer = ""
+		self._position = 0
+		self._eof = False
+
+	def __iter__(self):
+		return self.items()
+
+	def items(self):
+		"""Generator yielding the members of the container at the end of the path."""
+		for item in self._members(self.path):
+			self.itemCount += 1
+			yield item
+
+	#=============================
+	# Buffer handling
+
+	def _fill(self, minimum=None):
+		"""Read up to minimum (default: chunkSize) more bytes into the buffer.
+		Drops the part of the buffer we're done with. Returns False if there was nothing
+		left to read."""
+		if self._eof:
+			return False
+		if self._position > 0:
+			self._buffer = self._buffer[self._position:]
+			self._position = 0
+		wanted = self.chunkSize if minimum is None else max(minimum, self.chunkSize)
+		gotData = False
+		while wanted > 0:
+			data = self.stream.read(wanted)
+			if not data:
+				self._eof = True
+				self._buffer += self._textDecoder.decode(b"", final=True)
+				break
+			gotData = True
+			self._buffer += self._textDecoder.decode(data)
+			wanted -= len(data)
+		return gotData
+
+	def _peek(self):
+		"""Skip whitespace and return the next character without consuming it, None at the end."""
+		while True:
+			while self._position < len(self._buffer) and self._buffer[self._position] in " \t\n\r":
+				self._position += 1
+			if self._position < len(self._buffer):
+				return self._buffer[self._position]
+			if not self._fill():
+				return None
+
+	def _expect(self, characters):
+		"""Consume the next non-whitespace character, which has to be one of characters."""
+		character = self._peek()
+		if character is None or not character in characters:
+			raise JsonStreamError("Expected {expected} in JSON stream, got {got}."\
+				.format(expected=" or ".join(["'{0}'".format(c) for c in characters]),\
+				got="the end of the stream" if character is None else "'{0}'".format(character)))
+		self._position += 1
+		return character
+
+	def _value(self):
+		"""Decode and consume the next complete JSON value."""
+		self._peek()
+		while True:
+			try:
+				value, end = self._decoder.raw_decode(self._buffer, self._position)
+				if self._eof or not self._mayContinue(value, end):
+					self._position = end
+					return value
+			except json.JSONDecodeError as error:
+				if self._eof:
+					raise JsonStreamError("Invalid JSON in stream: {error}".format(error=error))
+			# Incomplete. Read at least as much again as we've got pending, so a huge
+			# value is re-parsed a logarithmic rather than linear number of times.
+			self._fill(minimum=len(self._buffer)-self._position)
+
+	def _mayContinue(self, value, end):
+		"""Whether the value decoded up to end might continue in the next chunk.
+		Numbers decode from a prefix ("0." or "1.5e" as 0 and 1.5, "-1" from "-12"), so a
+		number is only complete once a character follows that can't be part of it."""
+		if isinstance(value, bool) or not isinstance(value, (int, float)):
+			return end >= len(self._buffer)
+		return end >= len(self._buffer) or self._buffer[end] in NUMBER_CHARACTERS
+
+	#=============================
+	# Structure
+
+	def _members(self, path):
+		opening = self._expect("[{")
+		isObject = opening == "{"
+		closing = "}" if isObject else "]"
+		first = True
+		while True:
+			if self._peek() == closing:
+				self._position += 1
+				break
+			if not first:
+				self._expect(",")
+			first = False
+			if isObject:
+				if not self._peek() == "\"":
+					raise JsonStreamError("Expected an object key in JSON stream.")
+				key = self._value()
+				self._expect(":")
+			if len(path) == 0:
+				value = self._value()
+				yield (key, value) if isObject else value
+			elif isObject and key == path[0]:
+				yield from self._members(path[1:])
+				return
+			else:
+				self._value() # Not on our path; skip.
+		if len(path) > 0:
+			raise JsonStreamError("Path not found in JSON stream: {path}".format(path=path))
@@ -0,0 +1,234 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""A sparse on-disk index from timestamps to byte offsets in a log file.
+
+To find the lines of a time range in a log of gigabytes without reading all of it,
+LogIndex keeps the timestamp of one line per indexInterval bytes of the log in an
+index file next to it. A query looks up where in the log the range starts and ends,
+then streams just the lines in between from a memory map of the log.
+
+Building the index doesn't read the log either: For every interval, the map is
+searched for the first line starting after the interval's start and only that line's
+timestamp is parsed. The index is brought up to date before every query, so it grows
+along with the log; if the log got rotated or truncated, it's rebuilt."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import bisect
+import hashlib
+import mmap
+import os
+import struct
+
+# Local
+from lib.exceptions import Error
+from lib.logs import parseLogTime
+
+#=======================================================================================
+# Configuration
+#=======================================================================================
+
+INDEX_MAGIC = b"BTLIDX01"
+
+# Magic, inode of the log, digest of its head, log offset indexed up to, entry count.
+_HEADER = struct.Struct("<8sQ16sQQ")
+# Timestamp, offset of the line.
+_ENTRY = struct.Struct("<dQ")
+
+# How much of the start of the log identifies it, to notice it got replaced.
+_HEAD_SIZE = 256
+
+# How many lines after an interval's start to look at for a timestamp.
+_MAX_LINES_PROBED = 16
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Exceptions
+#==========================================================
+
+#==========================================================
+class LogIndexError(Error):
+	pass
+
+#==========================================================
+# Indexing
+#==========================================================
+
+#==========================================================
+class LogIndex(object):
+
+	#=============================
+	"""Timestamp to offset index of a log file, for fast time range queries.
+
+	Takes:
+		- logPath (string): Path of the log file.
+		- indexPath (string): Path of the index file. Defaults to the log's path
+		  with ".index" appended.
+		- indexInterval (int): Bytes of log per index entry.
+
+	.update() brings the index up to date with the log, .lines(since, until)
+	is a generator of the lines (str) with timestamps in that range, both
+	being seconds since the epoch (UTC) or None for an open end. Lines without
+	timestamp go with the line before them. Timestamps going backwards, as
+	they do if the clock is set back, are indexed as the highest one seen, so
+	such lines are found, but only if the range includes that highest time."""
+	#=============================
+
+	def __init__(self, logPath, indexPath=None, indexInterval=1 << 16):
+		self.logPath = str(logPath)
+		self.indexPath = "{0}.index".format(self.logPath) if indexPath is None else str(indexPath)
+		self.indexInterval = indexInterval
+		self.inode = None
+		self.headDigest = None
+		self.indexedOffset = 0
+		self.times = []
+		self.offsets = []
+
+	def _readIndex(self):
+		try:
+			with open(self.indexPath, "rb") as indexFile:
+				data = indexFile.read()
+		except FileNotFoundError:
+			return False
+		if len(data) < _HEADER.size:
+			return False
+		magic, inode, headDigest, indexedOffset, entryCount = _HEADER.unpack_from(data)
+		if not magic == INDEX_MAGIC or len(data) < _HEADER.size+entryCount*_ENTRY.size:
+			return False
+		self.inode, self.headDigest, self.indexedOffset = inode, headDigest, indexedOffset
+		entries = list(_ENTRY.iter_unpack(data[_HEADER.size:_HEADER.size+entryCount*_ENTRY.size]))
+		self.times = [entry[0] for entry in entries]
+		self.offsets = [entry[1] for entry in entries]
+		return True
+
+	def _writeIndex(self, newEntryCount):
+		"""Append the last newEntryCount entries and update the header. Entries go first,
+		so an interrupted write leaves the index as it was."""
+		mode = "r+b" if newEntryCount < len(self.times) and os.path.exists(self.indexPath) else "w+b"
+		with open(self.indexPath, mode) as indexFile:
+			if mode == "w+b":
+				newEntryCount = len(self.times)
+				indexFile.write(_HEADER.pack(INDEX_MAGIC, 0, b"\0"*16, 0, 0))
+			firstNew = len(self.times)-newEntryCount
+			indexFile.seek(_HEADER.size+firstNew*_ENTRY.size)
+			indexFile.write(b"".join([_ENTRY.pack(self.times[index], self.offsets[index])\
+				for index in range(firstNew, len(self.times))]))
+			indexFile.flush()
+			indexFile.seek(0)
+			indexFile.write(_HEADER.pack(INDEX_MAGIC, self.inode, self.headDigest, self.indexedOffset,\
+				len(self.times)))
+
+	def _reset(self, stat, headDigest):
+		self.inode = stat.st_ino
+		self.headDigest = headDigest
+		self.indexedOffset = 0
+		self.times = []
+		self.offsets = []
+
+	def _timeAt(self, logMap, offset, end):
+		"""Offset and time of the first line at or after offset with a timestamp, or None."""
+		for probe in range(_MAX_LINES_PROBED):
+			if offset >= end:
+				return None
+			lineEnd = logMap.find(b"\n", offset, end)
+			if lineEnd < 0:
+				return None
+			logTime = parseLogTime(logMap[offset:min(lineEnd, offset+64)].decode(errors="replace"))
+			if not logTime is None:
+				return offset, logTime
+			offset = lineEnd+1
+		return None
+
+	def update(self):
+		"""Index what got appended to the log since the last update. Returns the log's size."""
+		if not self.times and not self.indexedOffset:
+			self._readIndex()
+		try:
+			logFile = open(self.logPath, "rb")
+		except FileNotFoundError:
+			return 0
+		with logFile:
+			stat = os.fstat(logFile.fileno())
+			headDigest = hashlib.blake2b(logFile.read(_HEAD_SIZE), digest_size=16).digest()
+			rebuild = not (stat.st_ino == self.inode and stat.st_size >= self.indexedOffset\
+				and (self.indexedOffset < _HEAD_SIZE or headDigest == self.headDigest))
+			if rebuild:
+				self._reset(stat, headDigest)
+			elif self.indexedOffset < _HEAD_SIZE:
+				self.headDigest = headDigest # The head was still growing.
+			if stat.st_size == 0:
+				return 0
+			with mmap.mmap(logFile.fileno(), 0, access=mmap.ACCESS_READ) as logMap:
+				# Only index complete lines.
+				end = logMap.rfind(b"\n")+1
+				newEntryCount = 0
+				# On from the interval after the last indexed one.
+				boundary = 0 if len(self.offsets) == 0\
+					else (self.offsets[-1]//self.indexInterval+1)*self.indexInterval
+				while boundary < end:
+					lineStart = 0 if boundary == 0 else logMap.find(b"\n", boundary-1, end)+1
+					if lineStart <= 0 and boundary > 0:
+						break
+					found = self._timeAt(logMap, lineStart, end)
+					if not found is None:
+						offset, logTime = found
+						if len(self.times) == 0 or offset > self.offsets[-1]:
+							self.times.append(logTime if len(self.times) == 0 else max(logTime, self.times[-1]))
+							self.offsets.append(offset)
+							newEntryCount += 1
+					boundary = (boundary//self.indexInterval+1)*self.indexInterval
+				self.indexedOffset = max(self.indexedOffset, end)
+		if rebuild or newEntryCount > 0:
+			try:
+				self._writeIndex(len(self.times) if rebuild else newEntryCount)
+			except OSError as error:
+				raise LogIndexError("Can't write log index {path}: {error}".format(path=self.indexPath,\
+					error=error))
+		return stat.st_size
+
+	def offsetRange(self, since=None, until=None):
+		"""The range of offsets in the log the lines from since to until are in, as far
+		as the index can tell. The end is None if it's the end of the file."""
+		start = 0
+		if not since is None:
+			# The last indexed line before since; what's before it is too early.
+			index = bisect.bisect_left(self.times, since)-1
+			start = self.offsets[index] if index >= 0 else 0
+		end = None
+		if not until is None:
+			# The first indexed line after until; what's after it is too late.
+			index = bisect.bisect_right(self.times, until)
+			end = self.offsets[index] if index < len(self.offsets) else None
+		return start, end
+
+	def lines(self, since=None, until=None):
+		size = self.update()
+		if size == 0:
+			return
+		start, end = self.offsetRange(since, until)
+		with open(self.logPath, "rb") as logFile:
+			with mmap.mmap(logFile.fileno(), 0, access=mmap.ACCESS_READ) as logMap:
+				end = len(logMap) if end is None else end
+				inRange = False
+				offset = start
+				while offset < end:
+					lineEnd = logMap.find(b"\n", offset, end)
+					if lineEnd < 0:
+						break # Still being written.
+					line = logMap[offset:lineEnd].rstrip(b"\r").decode(errors="replace")
+					offset = lineEnd+1
+					logTime = parseLogTime(line)
+					if not logTime is None:
+						if not until is None and logTime > until:
+							return
+						inRange = since is None or logTime >= since
+					if inRange:
+						yield line
@@ -0,0 +1,297 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""Reading the log files daemons write, such as debug.log.
+
+Logs can be gigabytes, so nothing here reads a log from the beginning unless asked to:
+tailLines() reads backwards from the end, in blocks, until it has enough lines, and
+LogFollower waits for appended lines using inotify (see lib.watching)."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import calendar
+import heapq
+import itertools
+import os
+import re
+import time
+
+# Local
+from lib.watching import PathWatcher
+
+#=======================================================================================
+# Configuration
+#=======================================================================================
+
+_TAIL_BLOCK_SIZE = 65536
+
+# "2018-05-01 12:00:00", or with -logtimemicros "2018-05-01T12:00:00.123456Z".
+LOG_TIME_PATTERN = re.compile(r"^(\d{4})-(\d\d)-(\d\d)[T ](\d\d):(\d\d):(\d\d)(?:\.(\d{1,6}))?")
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Functions
+#==========================================================
+
+def tailLinesFromFile(logFile, count, end=None, blockSize=_TAIL_BLOCK_SIZE):
+	"""The last count complete lines (str) before offset end of the open binary file logFile,
+	read backwards block by block. end defaults to the size of the file."""
+	if end is None:
+		end = os.fstat(logFile.fileno()).st_size
+	if count <= 0:
+		return []
+	position = end
+	data = b""
+	# One more newline than lines wanted, for the one terminating the line before them.
+	while position > 0 and data.count(b"\n") <= count:
+		readSize = min(blockSize, position)
+		position -= readSize
+		logFile.seek(position)
+		data = logFile.read(readSize)+data
+	lines = data.split(b"\n")
+	# What comes after the last newline is a line still being written.
+	lines.pop()
+	if position > 0:
+		lines.pop(0) # Possibly cut off at the front.
+	return [line.rstrip(b"\r").decode(errors="replace") for line in lines[-count:]]
+
+def parseLogTime(line):
+	"""The UTC timestamp a log line starts with, in seconds since the epoch, or None."""
+	match = LOG_TIME_PATTERN.match(line)
+	if match is None:
+		return None
+	fields = match.groups()
+	seconds = calendar.timegm([int(field) for field in fields[:6]]+[0, 0, 0])
+	if fields[6] is None:
+		return float(seconds)
+	return seconds+int(fields[6])/10**len(fields[6])
+
+def tailLines(path, count, blockSize=_TAIL_BLOCK_SIZE):
+	"""The last count complete lines of the file at path. [] if it doesn't exist."""
+	try:
+		with open(str(path), "rb") as logFile:
+			return tailLinesFromFile(logFile, count, blockSize=blockSize)
+	except FileNotFoundError:
+		return []
+
+#==========================================================
+# Classes
+#==========================================================
+
+#==========================================================
+class LogReader(object):
+
+	#=============================
+	"""Reads the lines that got appended to a log file since the last read.
+
+	Takes:
+		- path (string): Path of the log file. It doesn't have to exist yet.
+		- fromEnd (bool): If True, lines that are already in the file upon
+		  instantiation are skipped; only what's written afterwards is read.
+
+	Only complete lines are returned; a line that's still being written is
+	held back until its newline arrives. If the file shrinks (truncation),
+	or is replaced by a different file (rotation), reading starts over from
+	the beginning of the new file."""
+	#=============================
+
+	def __init__(self, path, fromEnd=False):
+		self.path = str(path)
+		self.offset = 0
+		self.inode = None
+		self._partial = b""
+		if fromEnd:
+			try:
+				stat = os.stat(self.path)
+				self.offset = stat.st_size
+				self.inode = stat.st_ino
+			except FileNotFoundError:
+				pass
+
+	def seek(self, offset, inode=None):
+		"""Read on from offset, which should be the start of a line, of the file with
+		inode; if the file at path is a different one by then, from its beginning."""
+		self.offset = offset
+		self.inode = inode
+		self._partial = b""
+
+	@property
+	def completeOffset(self):
+		"""Offset right after the last complete line read, where to resume reading later."""
+		return self.offset-len(self._partial)
+
+	def readLines(self):
+		"""List of the complete lines (str, without line ending) appended since the last call."""
+		try:
+			with open(self.path, "rb") as logFile:
+				stat = os.fstat(logFile.fileno())
+				if not self.inode is None and (not stat.st_ino == self.inode\
+					or stat.st_size < self.offset):
+					# Rotated or truncated.
+					self.offset = 0
+					self._partial = b""
+				self.inode = stat.st_ino
+				if stat.st_size == self.offset:
+					return []
+				logFile.seek(self.offset)
+				data = logFile.read()
+		except FileNotFoundError:
+			return []
+		self.offset += len(data)
+		data = self._partial+data
+		lines = data.split(b"\n")
+		self._partial = lines.pop()
+		return [line.rstrip(b"\r").decode(errors="replace") for line in lines]
+
+#==========================================================
+class LogFollower(object):
+
+	#=============================
+	"""Follows a log file like "tail -F": The last few lines, then new ones as they come.
+
+	Takes:
+		- path (string): Path of the log file. It doesn't have to exist yet.
+		- lines (int): How many of the lines already in the file to start with.
+		- pollInterval (float): How often to check the file without inotify.
+		- useInotify (bool): Set to False to force polling.
+
+	.follow(timeout) is a generator of lines (str). With a timeout, it returns once
+	no line came in for that many seconds; without, it never does. The directory of
+	the log is watched rather than the file, so rotation and truncation are noticed
+	(see LogReader), as is the file being created."""
+	#=============================
+
+	def __init__(self, path, lines=10, pollInterval=1.0, useInotify=True):
+		self.path = str(path)
+		self.lines = lines
+		self.pollInterval = pollInterval
+		self.useInotify = useInotify
+
+	def _start(self):
+		"""The last .lines lines and a LogReader reading on from right after them."""
+		reader = LogReader(self.path)
+		try:
+			with open(self.path, "rb") as logFile:
+				stat = os.fstat(logFile.fileno())
+				lines = tailLinesFromFile(logFile, self.lines, end=stat.st_size)
+				# Read on from the start of a line still being written, if any.
+				logFile.seek(max(0, stat.st_size-_TAIL_BLOCK_SIZE))
+				block = logFile.read(stat.st_size-logFile.tell())
+				reader.offset = stat.st_size-len(block)+block.rfind(b"\n")+1 if b"\n" in block\
+					else stat.st_size
+			reader.inode = stat.st_ino
+		except FileNotFoundError:
+			lines = []
+		return lines, reader
+
+	def follow(self, timeout=None):
+		lines, reader = self._start()
+		for line in lines:
+			yield line
+		with PathWatcher([os.path.dirname(os.path.abspath(self.path))], pollInterval=self.pollInterval,\
+			useInotify=self.useInotify) as watcher:
+			idleSince = time.monotonic()
+			while True:
+				lines = reader.readLines()
+				for line in lines:
+					yield line
+				if len(lines) > 0:
+					idleSince = time.monotonic()
+				elif not timeout is None and time.monotonic()-idleSince >= timeout:
+					return
+				waitTimeout = self.pollInterval if timeout is None\
+					else min(self.pollInterval, max(0, timeout-(time.monotonic()-idleSince)))
+				# Wake up at least every pollInterval: Writes through other mounts or
+				# an overflowing event queue could go unnoticed otherwise.
+				watcher.wait(waitTimeout)
+
+#==========================================================
+class MergedLogFollower(object):
+
+	#=============================
+	"""Follows the logs of several nodes at once, merging their lines in timestamp order.
+
+	Takes:
+		- paths (dict): Paths of the log files by node id.
+		- lines (int): How many of the lines already in each file to start with.
+		- pattern (string): Regular expression lines have to match to be shown.
+		  None to show all of them.
+		- delay (float): For how many seconds to hold lines back, waiting for earlier
+		  ones from other logs, before giving up on strict order.
+		- maxBuffered (int): How many lines to hold back at most.
+		- pollInterval (float), useInotify (bool): See LogFollower.
+
+	.follow(timeout) is a generator of (id, line) tuples, see LogFollower. There's one
+	inotify instance for all logs, and only the logs it reports changes for are read.
+	Lines are filtered as they're read. Lines without timestamp (continuations) go
+	with the previous line of their log."""
+	#=============================
+
+	def __init__(self, paths, lines=10, pattern=None, delay=0.5, maxBuffered=10000, pollInterval=1.0,\
+		useInotify=True):
+		self.paths = dict([(id, str(path)) for id, path in paths.items()])
+		self.lines = lines
+		self.pattern = None if pattern is None else re.compile(pattern)
+		self.delay = delay
+		self.maxBuffered = maxBuffered
+		self.pollInterval = pollInterval
+		self.useInotify = useInotify
+		self._heap = []
+		self._sequence = itertools.count()
+		self._lastTimes = {}
+
+	def _push(self, id, lines):
+		for line in lines:
+			logTime = parseLogTime(line)
+			if logTime is None:
+				logTime = self._lastTimes.get(id, 0.0)
+			self._lastTimes[id] = logTime
+			if self.pattern is None or self.pattern.search(line):
+				heapq.heappush(self._heap, (logTime, next(self._sequence), id, line))
+
+	def _pop(self, flush=False):
+		"""Lines that have been held back long enough, or for which there's no room."""
+		watermark = time.time()-self.delay
+		while len(self._heap) > 0 and (flush or self._heap[0][0] <= watermark\
+			or len(self._heap) > self.maxBuffered):
+			logTime, sequence, id, line = heapq.heappop(self._heap)
+			yield (id, line)
+
+	def follow(self, timeout=None):
+		readers = {}
+		byDirAndName = {}
+		for id, path in self.paths.items():
+			lines, readers[id] = LogFollower(path, lines=self.lines)._start()
+			self._push(id, lines)
+			byDirAndName[os.path.split(os.path.abspath(path))] = id
+		yield from self._pop()
+		dirPaths = sorted(set([dirPath for dirPath, name in byDirAndName.keys()]))
+		with PathWatcher(dirPaths, pollInterval=self.pollInterval, useInotify=self.useInotify) as watcher:
+			idleSince = time.monotonic()
+			events = []
+			while True:
+				if len(events) > 0:
+					ids = set([byDirAndName.get((event.path, event.name)) for event in events]) - set([None])
+				else:
+					ids = readers.keys() # Polling, or timed out: Read them all.
+				heapSize = len(self._heap)
+				for id in ids:
+					self._push(id, readers[id].readLines())
+				if len(self._heap) > heapSize:
+					idleSince = time.monotonic()
+				elif len(self._heap) == 0 and not timeout is None and time.monotonic()-idleSince >= timeout:
+					return
+				yield from self._pop()
+				waitTimeout = self.pollInterval if len(self._heap) == 0 else min(self.pollInterval, self.delay)
+				if not timeout is None:
+					waitTimeout = min(waitTimeout, max(0, timeout-(time.monotonic()-idleSince)))
+				events = watcher.wait(waitTimeout)
+				if not timeout is None and len(events) == 0 and time.monotonic()-idleSince >= timeout:
+					yield from self._pop(flush=True)
@@ -105,10 +105,16 @@ class SingleCurrencyManager(object):
 		action = Action(handle=self.args.action, data=data)
 		
 		# Run action.
-		self.printToTerminal(action.run().terminalString)
+		returnValue = action.run()
+		if hasattr(returnValue, "terminalStrings"):
+			# Streaming action: Show output as it comes in.
+			for string in returnValue.terminalStrings:
+				self.printToTerminal(string, flush=True)
+		else:
+			self.printToTerminal(returnValue.terminalString)
 		
-	def printToTerminal(self, string):
+	def printToTerminal(self, string, flush=False):
 		if string.endswith("\n"):
-			print(string, end="")
+			print(string, end="", flush=flush)
 		else:
-			print(string)
\ No newline at end of file
+			print(string, flush=flush)
\ No newline at end of file
@@ -0,0 +1,306 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""A time series store for node metrics in a single SQLite file.
+
+Samples go into a raw table, keyed by small integers standing for the node and the
+metric, and the time in whole seconds, in WITHOUT ROWID tables, so a sample costs
+little more than its value. Complete minutes of raw samples get rolled up into a
+table of per minute count, minimum, maximum and mean, complete hours of those into
+an hourly one. Each table only keeps as much history as its retention allows, so the
+file stays small while the hourly table reaches back months.
+
+The database runs in WAL mode, so queries from other processes don't block writing.
+Samples are buffered and written in one transaction per batch. Queries come back as
+arrays of times and values."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from array import array
+from collections import namedtuple, OrderedDict
+import sqlite3
+import threading
+import time
+
+# Local
+from lib.exceptions import Error
+
+#=======================================================================================
+# Datatypes
+#=======================================================================================
+
+# resolution: Seconds per sample, 0 for raw samples. times: array of int seconds since
+# the epoch, the start of the interval for rollups. values: array of the values, the
+# means for rollups. minimums, maximums: arrays of the extremes per interval, the same
+# as values for raw samples.
+MetricRange = namedtuple("MetricRange", "resolution times values minimums maximums")
+
+# resolution: Seconds per row, 0 for raw samples. retention: Seconds of history kept.
+MetricTier = namedtuple("MetricTier", "table resolution retention")
+
+#=======================================================================================
+# Configuration
+#=======================================================================================
+
+SCHEMA_VERSION = 1
+
+# Finest first. Rollups of a tier are made from the one before it.
+DEFAULT_TIERS = [\
+	MetricTier("raw", 0, 6*3600),\
+	MetricTier("minutes", 60, 86400),\
+	MetricTier("hours", 3600, 90*86400)]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS names (id INTEGER PRIMARY KEY, kind INTEGER NOT NULL, name TEXT NOT NULL,
+	UNIQUE (kind, name));
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS raw (node INTEGER NOT NULL, metric INTEGER NOT NULL, time INTEGER NOT NULL,
+	value REAL, PRIMARY KEY (node, metric, time)) WITHOUT ROWID;
+"""
+
+_ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (node INTEGER NOT NULL, metric INTEGER NOT NULL, time INTEGER NOT NULL,
+	count INTEGER NOT NULL, minimum REAL, maximum REAL, mean REAL,
+	PRIMARY KEY (node, metric, time)) WITHOUT ROWID;
+"""
+
+_NODE = 0
+_METRIC = 1
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Exceptions
+#==========================================================
+
+#==========================================================
+class MetricsError(Error):
+	pass
+
+#==========================================================
+# Store
+#==========================================================
+
+#==========================================================
+class MetricsStore(object):
+
+	#=============================
+	"""Time series of node metrics in an SQLite file, rolled up and expired as they age.
+
+	Takes:
+		- path (string): The SQLite file. Created if it doesn't exist.
+		- tiers (list): MetricTier objects, finest first, the first one being the
+		  raw samples. Defaults to raw samples for 6 hours, minutes for a day and
+		  hours for 90 days.
+		- batchSize (int): Write buffered samples once this many have come in.
+		- maintenanceInterval (float): Seconds between rollups and expiry, which
+		  are done along with writing samples.
+
+	.add(node, metric, value, sampleTime) buffers a sample; .flush() writes the buffer.
+	.range(node, metric, since, until, resolution) returns a MetricRange; without a
+	resolution, from the finest tier still covering since. Only one sample per
+	node, metric and second is kept in the raw tier. Samples for minutes or hours
+	that were already rolled up don't make it into the rollups.
+	Use as a context manager, or call .close(), to write what's left in the buffer."""
+	#=============================
+
+	def __init__(self, path, tiers=DEFAULT_TIERS, batchSize=500, maintenanceInterval=60.0):
+		self.path = str(path)
+		self.tiers = list(tiers)
+		if len(self.tiers) == 0 or not self.tiers[0].resolution == 0:
+			raise MetricsError("The first tier of a metrics store has to be the raw one.")
+		self.batchSize = batchSize
+		self.maintenanceInterval = maintenanceInterval
+		self._buffer = []
+		self._ids = {}
+		self._lock = threading.RLock()
+		self._nextMaintenance = 0
+		try:
+			self.connection = sqlite3.connect(self.path, timeout=30, isolation_level=None,\
+				check_same_thread=False)
+			self.connection.execute("PRAGMA journal_mode=WAL")
+			self.connection.execute("PRAGMA synchronous=NORMAL")
+			self.connection.executescript(_SCHEMA+"".join([_ROLLUP_SCHEMA.format(table=tier.table)\
+				for tier in self.tiers[1:]]))
+			self.connection.execute("INSERT OR IGNORE INTO state (key, value) VALUES ('schema', ?)",\
+				(SCHEMA_VERSION,))
+		except sqlite3.Error as error:
+			raise MetricsError("Can't open the metrics store {path}: {error}".format(path=self.path, error=error))
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, type, value, traceback):
+		self.close()
+
+	def close(self):
+		with self._lock:
+			if not self.connection is None:
+				self.flush()
+				self.connection.close()
+				self.connection = None
+
+	def _id(self, kind, name, create=True):
+		"""The integer standing for a node or metric name, None if there's none and create is False."""
+		key = (kind, name)
+		if not key in self._ids:
+			row = self.connection.execute("SELECT id FROM names WHERE kind = ? AND name = ?", key).fetchone()
+			if row is None:
+				if not create:
+					return None
+				row = (self.connection.execute("INSERT INTO names (kind, name) VALUES (?, ?)", key).lastrowid,)
+			self._ids[key] = row[0]
+		return self._ids[key]
+
+	def _names(self, kind):
+		return [row[0] for row in self.connection.execute("SELECT name FROM names WHERE kind = ? ORDER BY name",\
+			(kind,))]
+
+	@property
+	def nodes(self):
+		with self._lock:
+			return self._names(_NODE)
+
+	@property
+	def metrics(self):
+		with self._lock:
+			return self._names(_METRIC)
+
+	def add(self, node, metric, value, sampleTime=None):
+		"""Buffer a sample. Values are floats; None is stored as a gap."""
+		with self._lock:
+			self._buffer.append((str(node), str(metric), int(time.time() if sampleTime is None else sampleTime),\
+				None if value is None else float(value)))
+			if len(self._buffer) >= self.batchSize:
+				self.flush()
+
+	def flush(self):
+		"""Write the buffered samples in one transaction, then roll up and expire if it's time."""
+		with self._lock:
+			self._writeBuffer()
+			if time.monotonic() >= self._nextMaintenance:
+				self.maintain()
+
+	def _writeBuffer(self):
+		if len(self._buffer) == 0:
+			return
+		try:
+			self.connection.execute("BEGIN IMMEDIATE")
+			try:
+				rows = [(self._id(_NODE, node), self._id(_METRIC, metric), sampleTime, value)\
+					for node, metric, sampleTime, value in self._buffer]
+				self.connection.executemany("INSERT OR REPLACE INTO raw (node, metric, time, value) "
+					"VALUES (?, ?, ?, ?)", rows)
+				self.connection.execute("COMMIT")
+			except BaseException:
+				self.connection.execute("ROLLBACK")
+				self._ids = {} # Ids created in the transaction are gone.
+				raise
+		except sqlite3.Error as error:
+			raise MetricsError("Can't write to the metrics store {path}: {error}".format(path=self.path,\
+				error=error))
+		self._buffer = []
+
+	def _series(self):
+		"""All (node, metric) id pairs. Going through them one by one uses the primary keys,
+		where asking the tables for the pairs they have would scan them."""
+		return self.connection.execute("SELECT nodes.id, metrics.id FROM names AS nodes, names AS metrics "
+			"WHERE nodes.kind = ? AND metrics.kind = ?", (_NODE, _METRIC)).fetchall()
+
+	def _rollUp(self, source, target, now):
+		"""Roll the complete target intervals of the source tier that weren't yet up into the target tier."""
+		resolution = target.resolution
+		end = int(now)//resolution*resolution
+		key = "rolledUp:{0}".format(target.table)
+		row = self.connection.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+		start = 0 if row is None else row[0]
+		if end <= start:
+			return
+		if source.resolution == 0:
+			aggregates = "count(value), min(value), max(value), avg(value)"
+		else:
+			aggregates = "sum(count), min(minimum), max(maximum), sum(mean*count)/sum(count)"
+		for node, metric in self._series():
+			self.connection.execute("INSERT OR REPLACE INTO {target} (node, metric, time, count, minimum, maximum, "
+				"mean) SELECT node, metric, time/{resolution}*{resolution}, {aggregates} FROM {source} "
+				"WHERE node = ? AND metric = ? AND time >= ? AND time < ? GROUP BY time/{resolution}".format(\
+				target=target.table, source=source.table, resolution=resolution, aggregates=aggregates),\
+				(node, metric, start, end))
+		self.connection.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, end))
+
+	def maintain(self, now=None):
+		"""Roll up what's complete and delete what's past retention."""
+		now = time.time() if now is None else now
+		with self._lock:
+			self._writeBuffer()
+			try:
+				self.connection.execute("BEGIN IMMEDIATE")
+				try:
+					for source, target in zip(self.tiers, self.tiers[1:]):
+						self._rollUp(source, target, now)
+					for tier in self.tiers:
+						for node, metric in self._series():
+							self.connection.execute("DELETE FROM {0} WHERE node = ? AND metric = ? AND time < ?"\
+								.format(tier.table), (node, metric, int(now-tier.retention)))
+					self.connection.execute("COMMIT")
+				except BaseException:
+					self.connection.execute("ROLLBACK")
+					raise
+			except sqlite3.Error as error:
+				raise MetricsError("Can't maintain the metrics store {path}: {error}".format(path=self.path,\
+					error=error))
+			self._nextMaintenance = time.monotonic()+self.maintenanceInterval
+
+	def tier(self, since=None, resolution=None, now=None):
+		"""The tier to answer a query for since with: The one with the specified
+		resolution, or else the finest one whose retention reaches back to since."""
+		if not resolution is None:
+			for tier in self.tiers:
+				if tier.resolution == resolution:
+					return tier
+			raise MetricsError("No tier with a resolution of {0} s. Resolutions: {1}".format(resolution,\
+				", ".join([str(tier.resolution) for tier in self.tiers])))
+		if since is None:
+			return self.tiers[-1]
+		now = time.time() if now is None else now
+		for tier in self.tiers:
+			if now-tier.retention <= since:
+				return tier
+		return self.tiers[-1]
+
+	def range(self, node, metric, since=None, until=None, resolution=None):
+		tier = self.tier(since, resolution)
+		times, values, minimums, maximums = array("q"), array("d"), array("d"), array("d")
+		with self._lock:
+			self.flush()
+			nodeId, metricId = self._id(_NODE, str(node), create=False), self._id(_METRIC, str(metric), create=False)
+			if nodeId is None or metricId is None:
+				return MetricRange(tier.resolution, times, values, minimums, maximums)
+			columns = "time, value, value, value" if tier.resolution == 0 else "time, mean, minimum, maximum"
+			cursor = self.connection.execute("SELECT {columns} FROM {table} WHERE node = ? AND metric = ? "
+				"AND time >= ? AND time <= ? AND {valueColumn} IS NOT NULL ORDER BY time".format(columns=columns,\
+				table=tier.table, valueColumn="value" if tier.resolution == 0 else "mean"),\
+				(nodeId, metricId, -(1 << 62) if since is None else int(since),\
+				(1 << 62) if until is None else int(until)))
+			for row in cursor:
+				times.append(row[0])
+				values.append(row[1])
+				minimums.append(row[2])
+				maximums.append(row[3])
+		return MetricRange(tier.resolution, times, values, minimums, maximums)
+
+	def latest(self, node, metric):
+		"""(time, value) of the latest raw sample, or None."""
+		with self._lock:
+			self.flush()
+			nodeId, metricId = self._id(_NODE, str(node), create=False), self._id(_METRIC, str(metric), create=False)
+			if nodeId is None or metricId is None:
+				return None
+			return self.connection.execute("SELECT time, value FROM raw WHERE node = ? AND metric = ? "
+				"ORDER BY time DESC LIMIT 1", (nodeId, metricId)).fetchone()
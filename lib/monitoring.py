@@ -0,0 +1,257 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""Keeping an eye on the nodes of a host from one long-running process.
+
+Instead of a cron job per node starting an interpreter and a cli every minute,
+FleetMonitor probes every node in a thread pool, on a schedule of its own for every
+node, with jitter, so the probes spread out instead of piling up. The probe results
+are compared across the fleet (a node is lagging if it's behind the highest tip of
+its siblings) and RestartPolicy decides which nodes get restarted."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import heapq
+import itertools
+import random
+import threading
+import time
+
+#=======================================================================================
+# Datatypes
+#=======================================================================================
+
+# What a probe found out about a node. time: When (time.time()). alive: Whether the
+# daemon is running and answering. warmingUp: Running, but not answering calls yet.
+# height, peers, mempool: Block count, connection count and transactions in the mempool.
+# masternodeStatus: What "masternode status" says. rss, cpuSeconds: Resident memory
+# (bytes) and CPU time used by the daemon so far. latency: Seconds the RPC calls took.
+# All of those are None if unknown. error: Why not alive, if it isn't.
+NodeHealth = namedtuple("NodeHealth", "id time alive warmingUp height peers mempool masternodeStatus "
+	"rss cpuSeconds latency error")
+
+# kind: "probe" (detail: NodeHealth), "restart" (detail: the reason), "restarted",
+# "restartSkipped" (detail: why), "restartFailed" (detail: the error) or "probeFailed"
+# (detail: the error).
+MonitorEvent = namedtuple("MonitorEvent", "kind id detail")
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Scheduling
+#==========================================================
+
+#==========================================================
+class JitteredScheduler(object):
+
+	#=============================
+	"""Keeps track of when what is due next.
+
+	Takes:
+		- interval (float): Seconds between runs of the same item.
+		- jitter (float): Every interval is made up to this share longer or shorter,
+		  at random, so items scheduled together drift apart.
+		- random (random.Random): Source of randomness.
+
+	.add(item) schedules an item, for a random point within the first interval
+	(so items added at once don't all run at once). .due(limit) pops the items due;
+	.reschedule(item) schedules it for the next interval from now. .timeout is
+	how long until the next item is due."""
+	#=============================
+
+	def __init__(self, interval, jitter=0.1, random=random):
+		self.interval = interval
+		self.jitter = jitter
+		self.random = random
+		self._heap = []
+		self._sequence = itertools.count()
+
+	def _nextInterval(self):
+		return self.interval*(1+self.jitter*(2*self.random.random()-1))
+
+	def add(self, item, delay=None):
+		if delay is None:
+			delay = self.random.random()*self.interval
+		heapq.heappush(self._heap, (time.monotonic()+delay, next(self._sequence), item))
+
+	def reschedule(self, item):
+		self.add(item, delay=self._nextInterval())
+
+	@property
+	def timeout(self):
+		if len(self._heap) == 0:
+			return None
+		return max(0, self._heap[0][0]-time.monotonic())
+
+	def due(self, limit=None):
+		"""Pop the items that are due, most overdue first, at most limit of them."""
+		now = time.monotonic()
+		items = []
+		while len(self._heap) > 0 and self._heap[0][0] <= now and (limit is None or len(items) < limit):
+			items.append(heapq.heappop(self._heap)[2])
+		return items
+
+#==========================================================
+# Policy
+#==========================================================
+
+#==========================================================
+class RestartPolicy(object):
+
+	#=============================
+	"""Decides when a node needs a restart.
+
+	Takes:
+		- unresponsiveProbes (int): Restart after this many probes in a row found
+		  the node not alive. 0 never restarts for that. Nodes warming up count as alive.
+		- maxLag (int): How many blocks a node may be behind the highest tip in the fleet.
+		- laggingFor (float): Restart a node that's been lagging by more than maxLag
+		  for this many seconds without its height changing. 0 never restarts for that.
+		- cooldown (float): Seconds after a restart before a node may be restarted again.
+
+	.decide(state, fleetHeight) returns the reason for a restart, or None."""
+	#=============================
+
+	def __init__(self, unresponsiveProbes=3, maxLag=3, laggingFor=900, cooldown=1800):
+		self.unresponsiveProbes = unresponsiveProbes
+		self.maxLag = maxLag
+		self.laggingFor = laggingFor
+		self.cooldown = cooldown
+
+	def decide(self, state, fleetHeight):
+		now = time.monotonic()
+		if not state.lastRestart is None and now-state.lastRestart < self.cooldown:
+			return None
+		if self.unresponsiveProbes > 0 and state.failedProbes >= self.unresponsiveProbes:
+			return "not alive for {0} probes in a row".format(state.failedProbes)
+		health = state.health
+		if self.laggingFor > 0 and not health is None and health.alive and not health.height is None\
+			and not fleetHeight is None and fleetHeight-health.height > self.maxLag\
+			and not state.heightSince is None and now-state.heightSince >= self.laggingFor:
+			return "stuck at height {height}, {lag} blocks behind the fleet, for {seconds:.0f} s".format(\
+				height=health.height, lag=fleetHeight-health.height, seconds=now-state.heightSince)
+		return None
+
+#==========================================================
+class NodeMonitorState(object):
+
+	#=============================
+	"""What the monitor keeps track of per node."""
+	#=============================
+
+	def __init__(self, node):
+		self.node = node
+		self.health = None
+		self.failedProbes = 0
+		self.heightSince = None
+		self.lastRestart = None
+		self.restarts = 0
+
+	def update(self, health):
+		if self.health is None or not health.height == self.health.height:
+			self.heightSince = time.monotonic()
+		self.failedProbes = 0 if health.alive or health.warmingUp else self.failedProbes+1
+		self.health = health
+
+#==========================================================
+# Monitor
+#==========================================================
+
+#==========================================================
+class FleetMonitor(object):
+
+	#=============================
+	"""Probes nodes on a jittered schedule and restarts them according to a RestartPolicy.
+
+	Takes:
+		- nodes (list): The nodes, each with an .id.
+		- probe (callable): Called with a node, returns its NodeHealth.
+		- restart (callable): Called with a node and the reason, restarts it. It may
+		  return a string saying why it didn't, e.g. as the node was stopped on purpose.
+		  Restarts run in the pool too, and a node isn't probed while it's restarted.
+		- interval (float), jitter (float): See JitteredScheduler.
+		- maxConcurrency (int): How many probes and restarts run at once.
+		- policy (RestartPolicy): None to never restart.
+
+	.run() is a generator of MonitorEvent that runs until .stop() is called.
+	.latest is the latest NodeHealth by node id, .states the NodeMonitorState."""
+	#=============================
+
+	def __init__(self, nodes, probe, restart=None, interval=60.0, jitter=0.2, maxConcurrency=8, policy=None):
+		self.states = OrderedDict([(node.id, NodeMonitorState(node)) for node in nodes])
+		self.probe = probe
+		self.restart = restart
+		self.scheduler = JitteredScheduler(interval, jitter=jitter)
+		self.maxConcurrency = max(1, int(maxConcurrency))
+		self.policy = policy
+		self._stopped = threading.Event()
+
+	def stop(self):
+		self._stopped.set()
+
+	@property
+	def latest(self):
+		return OrderedDict([(id, state.health) for id, state in self.states.items() if not state.health is None])
+
+	@property
+	def fleetHeight(self):
+		heights = [state.health.height for state in self.states.values()\
+			if not state.health is None and not state.health.height is None]
+		return max(heights) if len(heights) > 0 else None
+
+	def _restart(self, node, reason):
+		return self.restart(node, reason)
+
+	def run(self):
+		for id in self.states.keys():
+			self.scheduler.add(id)
+		running = {}
+		with ThreadPoolExecutor(max_workers=self.maxConcurrency) as executor:
+			while not self._stopped.is_set():
+				# What's due while all workers are busy stays due until one is free.
+				for id in self.scheduler.due(limit=self.maxConcurrency-len(running)):
+					running[executor.submit(self.probe, self.states[id].node)] = ("probe", id)
+				timeout = self.scheduler.timeout
+				if len(running) >= self.maxConcurrency:
+					timeout = None # Nothing more can start before something's done.
+				if len(running) == 0:
+					self._stopped.wait(1.0 if timeout is None else min(timeout, 1.0))
+					continue
+				done, notDone = wait(list(running.keys()), timeout=1.0 if timeout is None else min(timeout, 1.0),\
+					return_when=FIRST_COMPLETED)
+				for future in done:
+					kind, id = running.pop(future)
+					state = self.states[id]
+					try:
+						result = future.result()
+					except Exception as error:
+						self.scheduler.reschedule(id)
+						yield MonitorEvent("probeFailed" if kind == "probe" else "restartFailed", id, error)
+						continue
+					if kind == "restart":
+						self.scheduler.reschedule(id)
+						yield MonitorEvent("restarted", id, None) if result is None\
+							else MonitorEvent("restartSkipped", id, result)
+						continue
+					state.update(result)
+					yield MonitorEvent("probe", id, result)
+					reason = None if self.policy is None or self.restart is None\
+						else self.policy.decide(state, self.fleetHeight)
+					if reason is None:
+						self.scheduler.reschedule(id)
+						continue
+					state.lastRestart = time.monotonic()
+					state.restarts += 1
+					state.failedProbes = 0
+					running[executor.submit(self._restart, state.node, reason)] = ("restart", id)
+					yield MonitorEvent("restart", id, reason)
+			for future in running.keys():
+				future.cancel()
@@ -0,0 +1,343 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""Parsing of the conf files of bitcoin derived daemons (bitcoin.conf, dash.conf, ...).
+
+Follows the rules the daemons themselves apply: "key=value" lines, "#" starting a
+comment, network sections ([main], [test], [regtest]) and "section.key=value" lines,
+repeated keys for list options (of which single value options use the first one) and
+"includeconf" for pulling in further files, relative to the datadir.
+
+Parsed files are cached by path and modification time of the file and everything it
+includes, so asking for the conf of a node over and over only costs a few stat calls."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from collections import namedtuple, OrderedDict
+import os
+import threading
+
+# Local
+from lib.exceptions import Error
+
+#=======================================================================================
+# Datatypes
+#=======================================================================================
+
+# Where and how to reach a daemon's RPC interface. user and password are None
+# if the daemon uses cookie authentication, in which case cookieFilePath is set.
+RpcEndpoint = namedtuple("RpcEndpoint", "host port user password cookieFilePath")
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Exceptions
+#==========================================================
+
+#==========================================================
+class NodeConfError(Error):
+	pass
+
+#==========================================================
+# Conf Model
+#==========================================================
+
+#==========================================================
+class NodeConf(object):
+
+	#=============================
+	"""The parsed contents of a node's conf file, including the files it includes.
+
+	Takes:
+		- path (string): Path of the conf file.
+		- values (OrderedDict): Key -> list of values from outside any section.
+		- sections (dict): Section name -> OrderedDict like values.
+		- includedPaths (list): Paths of the files pulled in through includeconf.
+
+	Use .get/.getAll/.getBool/.getInt for arbitrary keys. Values from the section of
+	the network the node runs on take precedence over the others. The most common
+	keys are available as typed properties."""
+	#=============================
+
+	def __init__(self, path, values, sections={}, includedPaths=[]):
+		self.path = path
+		self.values = values
+		self.sections = sections
+		self.includedPaths = includedPaths
+
+	@property
+	def network(self):
+		"""The network the node runs on: main, test or regtest."""
+		if self._getBool(self.values, "regtest"):
+			return "regtest"
+		if self._getBool(self.values, "testnet"):
+			return "test"
+		return "main"
+
+	def getAll(self, key, network=None):
+		"""List of all values for the key, network section first."""
+		if network is None:
+			network = self.network
+		return self.sections.get(network, {}).get(key, []) + self.values.get(key, [])
+
+	def get(self, key, default=None, network=None):
+		"""The value in effect for the key. Like the daemon, we take the first one."""
+		values = self.getAll(key, network=network)
+		if len(values) == 0:
+			return default
+		return values[0]
+
+	def getBool(self, key, default=False, network=None):
+		value = self.get(key, network=network)
+		if value is None:
+			return default
+		return self._toBool(value)
+
+	def getInt(self, key, default=None, network=None):
+		value = self.get(key, network=network)
+		if value is None or value == "":
+			return default
+		try:
+			return int(value)
+		except ValueError:
+			raise NodeConfError("Invalid value for \"{key}\" in {path}: {value}"\
+				.format(key=key, path=self.path, value=value))
+
+	def _getBool(self, values, key):
+		"""getBool for a specific dict of values, without network sections."""
+		if len(values.get(key, [])) == 0:
+			return False
+		return self._toBool(values[key][0])
+
+	def _toBool(self, value):
+		# The daemons treat anything that isn't a number as true, as long as it's set.
+		try:
+			return not int(value) == 0
+		except ValueError:
+			return True
+
+	#=============================
+	# Typed properties for common keys.
+
+	@property
+	def rpcUser(self):
+		return self.get("rpcuser")
+
+	@property
+	def rpcPassword(self):
+		return self.get("rpcpassword")
+
+	@property
+	def rpcPort(self):
+		return self.getInt("rpcport")
+
+	@property
+	def rpcConnect(self):
+		return self.get("rpcconnect")
+
+	@property
+	def rpcBind(self):
+		return self.getAll("rpcbind")
+
+	@property
+	def rpcAllowIp(self):
+		return self.getAll("rpcallowip")
+
+	@property
+	def port(self):
+		return self.getInt("port")
+
+	@property
+	def dataDir(self):
+		return self.get("datadir")
+
+	@property
+	def pidFile(self):
+		return self.get("pid")
+
+	@property
+	def server(self):
+		return self.getBool("server")
+
+	@property
+	def listen(self):
+		return self.getBool("listen", default=True)
+
+	@property
+	def externalIp(self):
+		return self.get("externalip")
+
+	@property
+	def masternode(self):
+		return self.getBool("masternode")
+
+	@property
+	def masternodePrivKey(self):
+		return self.get("masternodeprivkey")
+
+	@property
+	def masternodeBlsPrivKey(self):
+		return self.get("masternodeblsprivkey")
+
+	def rpcEndpoint(self, defaultPort, defaultHost="127.0.0.1", dataDirPath=None):
+		"""RpcEndpoint as in effect for the node, with the specified defaults for what's unset.
+		dataDirPath is needed to find the cookie file, if no credentials are set."""
+		user = self.rpcUser
+		password = self.rpcPassword
+		cookieFilePath = None
+		if user is None or password is None:
+			user, password = None, None
+			if not dataDirPath is None:
+				cookieFilePath = os.path.join(dataDirPath, ".cookie")
+		port = self.rpcPort
+		return RpcEndpoint(host=self.rpcConnect or defaultHost,\
+			port=int(defaultPort) if port is None else port,\
+			user=user, password=password, cookieFilePath=cookieFilePath)
+
+#==========================================================
+# Parsing
+#==========================================================
+
+#==========================================================
+class NodeConfParser(object):
+
+	#=============================
+	"""Parses a conf file into a NodeConf.
+
+	Takes:
+		- path (string): Path of the conf file.
+		- dataDirPath (string): Relative includeconf paths are resolved against
+		  this. Defaults to the directory the conf file is in.
+
+	Like the daemons, only includeconf lines in the conf file itself are followed,
+	not those in included files. Raises NodeConfError for lines it can't parse and
+	FileNotFoundError if the conf file doesn't exist."""
+	#=============================
+
+	def __init__(self, path, dataDirPath=None):
+		self.path = str(path)
+		if dataDirPath is None:
+			dataDirPath = os.path.dirname(os.path.abspath(self.path))
+		self.dataDirPath = str(dataDirPath)
+
+	def parse(self):
+		values = OrderedDict()
+		sections = {}
+		includes = self._parseFile(self.path, values, sections)
+		includedPaths = []
+		for includePath in includes:
+			includePath = os.path.join(self.dataDirPath, os.path.expanduser(includePath))
+			includedPaths.append(includePath)
+			try:
+				self._parseFile(includePath, values, sections)
+			except FileNotFoundError:
+				raise NodeConfError("File included by {path} not found: {includePath}"\
+					.format(path=self.path, includePath=includePath))
+		return NodeConf(self.path, values, sections, includedPaths)
+
+	def _parseFile(self, path, values, sections):
+		"""Parse one file into values and sections. Returns the includeconf values found."""
+		includes = []
+		section = None
+		with open(path, "r", errors="replace") as confFile:
+			for lineNumber, line in enumerate(confFile, start=1):
+				line = line.partition("#")[0].strip()
+				if line == "":
+					continue
+				if line.startswith("[") and line.endswith("]"):
+					section = line[1:-1].strip()
+					continue
+				key, equalSign, value = line.partition("=")
+				key = key.strip().lstrip("-")
+				value = value.strip()
+				if not equalSign or key == "":
+					raise NodeConfError("Can't parse line {lineNumber} of {path}: {line}"\
+						.format(lineNumber=lineNumber, path=path, line=line))
+				keySection = section
+				if keySection is None and "." in key:
+					keySection, key = key.split(".", 1)
+				if key.startswith("no"):
+					# Negation: -nofoo=1 is -foo=0.
+					key = key[2:]
+					value = "0" if self._isTrue(value) else "1"
+				if key == "includeconf":
+					if keySection is None:
+						includes.append(value)
+					continue
+				target = values if keySection is None else sections.setdefault(keySection, OrderedDict())
+				target.setdefault(key, []).append(value)
+		return includes
+
+	def _isTrue(self, value):
+		try:
+			return not int(value) == 0
+		except ValueError:
+			return True
+
+#==========================================================
+# Cache
+#==========================================================
+
+#==========================================================
+class NodeConfCache(object):
+
+	#=============================
+	"""Keeps parsed NodeConf objects around for as long as their files don't change.
+
+	A cached NodeConf is used as long as the modification time and size of the conf
+	file and all files it includes are what they were when it got parsed."""
+	#=============================
+
+	def __init__(self):
+		self._entries = {}
+		self._lock = threading.Lock()
+
+	def _signature(self, paths):
+		signature = []
+		for path in paths:
+			try:
+				stat = os.stat(path)
+			except FileNotFoundError:
+				return None
+			signature.append((stat.st_mtime_ns, stat.st_size))
+		return tuple(signature)
+
+	def get(self, path, dataDirPath=None):
+		"""The NodeConf for the conf file at path, parsed if it isn't cached or has changed."""
+		key = (os.path.abspath(str(path)), None if dataDirPath is None else str(dataDirPath))
+		with self._lock:
+			entry = self._entries.get(key)
+		if not entry is None:
+			signature, nodeConf = entry
+			if self._signature([nodeConf.path]+nodeConf.includedPaths) == signature:
+				return nodeConf
+		# Stat before parsing, so that a change while parsing invalidates the entry.
+		mainSignature = self._signature([key[0]])
+		nodeConf = NodeConfParser(key[0], dataDirPath=dataDirPath).parse()
+		signature = self._signature(nodeConf.includedPaths)
+		if not mainSignature is None and not signature is None:
+			with self._lock:
+				self._entries[key] = (mainSignature+signature, nodeConf)
+		return nodeConf
+
+	def invalidate(self, path=None):
+		"""Forget the cached NodeConf of the specified conf file, or all of them."""
+		with self._lock:
+			if path is None:
+				self._entries = {}
+			else:
+				path = os.path.abspath(str(path))
+				for key in [key for key in self._entries if key[0] == path]:
+					del self._entries[key]
+
+nodeConfCache = NodeConfCache()
+
+def loadNodeConf(path, dataDirPath=None):
+	"""The NodeConf for the conf file at path, through the module wide cache."""
+	return nodeConfCache.get(path, dataDirPath=dataDirPath)
@@ -0,0 +1,205 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""Push-based notifications from running daemons to our own processes.
+
+Bitcoin derived daemons can run a shell command whenever a new block becomes their
+tip (-blocknotify). We use that hook to have every daemon send the hash of the new
+block to a Unix datagram socket owned by a manager or monitor process, which can
+then react to new blocks as they arrive instead of polling the cli."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from collections import namedtuple
+import os
+import shlex
+import socket
+import sys
+import tempfile
+import time
+
+# Local
+from lib.exceptions import Error
+
+#=======================================================================================
+# Datatypes
+#=======================================================================================
+
+BlockEvent = namedtuple("BlockEvent", "node blockHash time")
+
+#=======================================================================================
+# Configuration
+#=======================================================================================
+
+# The code run by the daemon for every new block. It's passed to a bare interpreter
+# (-S: no site module) so as to keep the per-block cost down to a fraction of a second.
+# Kept to a single line, as it ends up in the daemon's command line. If nobody is
+# listening, connect_ex fails quietly and nothing is sent: The daemon mustn't care.
+BLOCKNOTIFY_SENDER_CODE = "import socket,sys;"\
+	"s=socket.socket(socket.AF_UNIX,socket.SOCK_DGRAM);"\
+	"s.connect_ex(sys.argv[1]) or s.send(sys.argv[2].encode()+b'\\0'+sys.argv[3].encode())"
+
+# Node tags and block hashes are short; anything bigger than this isn't ours.
+BLOCKNOTIFY_MAX_DATAGRAM_SIZE = 4096
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Exceptions
+#==========================================================
+
+#==========================================================
+class BlockNotifyError(Error):
+	pass
+
+#==========================================================
+# Functions
+#==========================================================
+
+def defaultBlockNotifySocketPath():
+	"""Path of the socket to use if none was specified.
+	Lives in $XDG_RUNTIME_DIR if that is set, in the temp dir otherwise."""
+	runtimeDirPath = os.environ.get("XDG_RUNTIME_DIR", tempfile.gettempdir())
+	return os.path.join(runtimeDirPath, "blockchaintools-{uid}-blocknotify.sock"\
+		.format(uid=os.getuid()))
+
+#==========================================================
+# Notification Classes
+#==========================================================
+
+#==========================================================
+class BlockNotifyCommand(object):
+
+	#=============================
+	"""The command line a daemon runs through -blocknotify to notify us of a new block.
+
+	Takes:
+		- socketPath (string): Path of the socket the listener is bound to.
+		- node (string): Tag identifying the node the daemon belongs to. Every
+		  BlockEvent the listener yields carries it.
+		- interpreter (string): Python interpreter to send the notification with.
+		  Defaults to the one we're running on."""
+	#=============================
+
+	def __init__(self, socketPath, node, interpreter=sys.executable):
+		self.socketPath = socketPath
+		self.node = node
+		self.interpreter = interpreter
+
+	@property
+	def shellCommand(self):
+		"""The command as the daemon will pass it to the shell.
+		The daemon substitutes %s with the block hash, which is why it's left unquoted."""
+		return " ".join([shlex.quote(part) for part in\
+			[self.interpreter, "-S", "-c", BLOCKNOTIFY_SENDER_CODE, str(self.socketPath), str(self.node)]]\
+			+ ["%s"])
+
+	@property
+	def daemonArg(self):
+		"""The command line argument to pass to the daemon."""
+		return "-blocknotify={command}".format(command=self.shellCommand)
+
+#==========================================================
+class BlockNotifyListener(object):
+
+	#=============================
+	"""Owns the datagram socket the daemons' -blocknotify hooks write to.
+
+	Takes:
+		- socketPath (string): Path to bind the socket to. A stale socket file
+		  left behind by a previous listener is replaced.
+
+	Use it as a context manager, or call .open() and .close() yourself:
+
+		with BlockNotifyListener(path) as listener:
+			for event in listener.events():
+				print(event.node, event.blockHash)
+
+	The socket is only accessible to our own user."""
+	#=============================
+
+	def __init__(self, socketPath=None):
+		if socketPath is None:
+			socketPath = defaultBlockNotifySocketPath()
+		self.socketPath = str(socketPath)
+		self.socket = None
+		self.latest = {}
+
+	def __enter__(self):
+		self.open()
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+	@property
+	def isOpen(self):
+		return not self.socket is None
+
+	def fileno(self):
+		"""For use with select and selectors."""
+		return self.socket.fileno()
+
+	def open(self):
+		"""Bind the socket. Raises BlockNotifyError if that fails."""
+		if self.isOpen:
+			return
+		try:
+			if os.path.exists(self.socketPath):
+				os.unlink(self.socketPath)
+			self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+			self.socket.bind(self.socketPath)
+			os.chmod(self.socketPath, 0o600)
+		except OSError as error:
+			self.socket = None
+			raise BlockNotifyError("Couldn't bind the blocknotify socket at {path}: {error}"\
+				.format(path=self.socketPath, error=error))
+
+	def close(self):
+		if not self.isOpen:
+			return
+		self.socket.close()
+		self.socket = None
+		try:
+			os.unlink(self.socketPath)
+		except FileNotFoundError:
+			pass
+
+	def commandFor(self, node):
+		"""The BlockNotifyCommand for a daemon of the specified node to notify us with."""
+		return BlockNotifyCommand(self.socketPath, node)
+
+	def receive(self, timeout=None):
+		"""Wait for the next block event and return it as BlockEvent.
+		Returns None if timeout (in seconds) runs out first.
+		Datagrams we can't make sense of are dropped."""
+		self.socket.settimeout(timeout)
+		while True:
+			try:
+				datagram = self.socket.recv(BLOCKNOTIFY_MAX_DATAGRAM_SIZE)
+			except socket.timeout:
+				return None
+			node, separator, blockHash = datagram.partition(b"\0")
+			if not separator or not blockHash:
+				continue
+			event = BlockEvent(node=node.decode(errors="replace"),\
+				blockHash=blockHash.decode(errors="replace").strip(), time=time.time())
+			self.latest[event.node] = event
+			return event
+
+	def events(self, nodes=None, timeout=None):
+		"""Generator yielding BlockEvent objects as they arrive.
+		If nodes is specified, only events for the nodes with those tags are yielded.
+		Ends once no event arrived for timeout seconds, never if timeout is None."""
+		while True:
+			event = self.receive(timeout=timeout)
+			if event is None:
+				return
+			if nodes is None or event.node in nodes:
+				yield event
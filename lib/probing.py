@@ -0,0 +1,189 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""Cheap, tiered liveness checks for daemons.
+
+A TieredProbe runs its tiers from cheapest to most expensive and stops at the first
+one that fails, so that asking whether a daemon is there at all doesn't have to cost
+more than a couple of system calls. Every tier reports how long it took."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from collections import namedtuple
+import socket
+import time
+
+#=======================================================================================
+# Datatypes
+#=======================================================================================
+
+# tier: Name of the tier. alive: Whether it passed. latency: Seconds it took.
+# detail: Whatever else the tier found out (e.g. the PID), or why it failed.
+ProbeResult = namedtuple("ProbeResult", "tier alive latency detail")
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Probe Tiers
+#==========================================================
+
+#==========================================================
+class ProbeTier(object):
+
+	#=============================
+	"""One tier of a TieredProbe.
+
+	Takes:
+		- name (string): Name of the tier, as found in its ProbeResult.
+		- check (callable): If specified, used instead of .check. Is expected
+		  to behave like it.
+
+	Override .check to implement a tier. It's expected to return an (alive, detail)
+	tuple and may raise OSError, which counts as the tier having failed."""
+	#=============================
+
+	def __init__(self, name, check=None):
+		self.name = name
+		if not check is None:
+			self.check = check
+
+	def check(self):
+		#OVERRIDE
+		return (False, None)
+
+	def run(self):
+		"""Run the check and return a ProbeResult."""
+		startTime = time.perf_counter()
+		try:
+			alive, detail = self.check()
+		except OSError as error:
+			alive, detail = False, str(error)
+		return ProbeResult(tier=self.name, alive=alive,\
+			latency=time.perf_counter()-startTime, detail=detail)
+
+#==========================================================
+class PidFileProbeTier(ProbeTier):
+
+	#=============================
+	"""Passes if the pid file exists and the process it names is alive.
+
+	Takes:
+		- pidFilePath (string): Path of the pid file.
+		- processName (string): If specified, the process also has to have this
+		  name, so as not to be fooled by a stale pid file whose PID has been reused.
+		  Only the first 15 characters count, as that's all the kernel keeps."""
+	#=============================
+
+	def __init__(self, pidFilePath, processName=None, name="pidfile"):
+		super().__init__(name)
+		self.pidFilePath = str(pidFilePath)
+		self.processName = processName
+
+	def check(self):
+		try:
+			with open(self.pidFilePath, "r") as pidFile:
+				pid = int(pidFile.read().strip())
+		except FileNotFoundError:
+			return (False, "no pid file")
+		except ValueError:
+			return (False, "invalid pid file")
+		try:
+			with open("/proc/{0}/comm".format(pid), "r") as commFile:
+				comm = commFile.read().strip()
+		except FileNotFoundError:
+			return (False, "process {0} is gone".format(pid))
+		if not self.processName is None and not comm == self.processName[:15]:
+			return (False, "process {0} is {1}, not {2}".format(pid, comm, self.processName))
+		return (True, pid)
+
+#==========================================================
+class TcpConnectProbeTier(ProbeTier):
+
+	#=============================
+	"""Passes if something accepts TCP connections at host:port."""
+	#=============================
+
+	def __init__(self, host, port, timeout=0.5, name="tcp"):
+		super().__init__(name)
+		self.host = host
+		self.port = int(port)
+		self.timeout = timeout
+
+	def check(self):
+		with socket.create_connection((self.host, self.port), timeout=self.timeout):
+			return (True, "{0}:{1}".format(self.host, self.port))
+
+#==========================================================
+# Probes
+#==========================================================
+
+#==========================================================
+class LivenessReport(object):
+
+	#=============================
+	"""The results of a TieredProbe run.
+
+	.results is the list of ProbeResult for every tier that ran; tiers after a
+	failed one don't run. .alive is True if all of them passed."""
+	#=============================
+
+	def __init__(self, results):
+		self.results = results
+
+	def __bool__(self):
+		return self.alive
+
+	@property
+	def alive(self):
+		return len(self.results) > 0 and all([result.alive for result in self.results])
+
+	@property
+	def latency(self):
+		"""Seconds all tiers took together."""
+		return sum([result.latency for result in self.results])
+
+	def tier(self, name):
+		"""The ProbeResult of the tier with the specified name, or None if it didn't run."""
+		for result in self.results:
+			if result.tier == name:
+				return result
+		return None
+
+	@property
+	def _repr_str_(self):
+		return "\n".join(["{tier}: {state} ({latency:.3f} ms) {detail}".format(tier=result.tier,\
+			state="ok" if result.alive else "FAILED", latency=result.latency*1000,\
+			detail="" if result.detail is None else result.detail) for result in self.results])
+
+#==========================================================
+class TieredProbe(object):
+
+	#=============================
+	"""Runs ProbeTier objects in order, up to the first one that fails.
+
+	Takes:
+		- tiers (list): ProbeTier objects that always run, cheapest first.
+		- deepTiers (list): ProbeTier objects that only run if deep health
+		  is asked for."""
+	#=============================
+
+	def __init__(self, tiers, deepTiers=[]):
+		self.tiers = tiers
+		self.deepTiers = deepTiers
+
+	def run(self, deep=False):
+		"""Run the probe and return a LivenessReport."""
+		tiers = self.tiers+self.deepTiers if deep else self.tiers
+		results = []
+		for tier in tiers:
+			result = tier.run()
+			results.append(result)
+			if not result.alive:
+				break
+		return LivenessReport(results)
@@ -44,6 +44,8 @@ UnsplitArg = namedtuple("UnsplitArg", "param")
 ProcStatus = namedtuple("ProcStatus", "name data")
 # Proc status: UID & GUID
 ProcStatusPerms = namedtuple("ProcStatusPerms", "real effective savedSet filesystem")
+# Resource usage: Resident memory in bytes, CPU time (user and system) in seconds.
+ProcessResources = namedtuple("ProcessResources", "rss cpuSeconds")
 
 #=======================================================================================
 # Library
@@ -55,6 +57,25 @@ ProcStatusPerms = namedtuple("ProcStatusPerms", "real effective savedSet filesys
 
 class NoSuchProcessError(Exception): pass
 
+#=========================================================
+# Resource Usage
+#=========================================================
+
+def readProcessResources(pid):
+	"""ProcessResources of the process with the specified PID, from /proc.
+	Raises NoSuchProcessError if there's no such process."""
+	try:
+		with open("/proc/{0}/stat".format(pid), "rb") as statFile:
+			stat = statFile.read()
+		with open("/proc/{0}/statm".format(pid), "rb") as statmFile:
+			statm = statmFile.read()
+	except (FileNotFoundError, ProcessLookupError):
+		raise NoSuchProcessError("A process with the PID {0} doesn't exist (anymore?).".format(pid))
+	# The name in parentheses may contain spaces; the fields after it are utime (14) and stime (15).
+	fields = stat[stat.rindex(b")")+2:].split()
+	return ProcessResources(rss=int(statm.split()[1])*os.sysconf("SC_PAGE_SIZE"),\
+		cpuSeconds=(int(fields[11])+int(fields[12]))/os.sysconf("SC_CLK_TCK"))
+
 #=========================================================
 # Internal Processes
 #=============================
@@ -72,9 +93,6 @@ class Process(object):
 	def __init__(self, commandLine, run=True, env=None):
 		
 		self.commandLine = commandLine
-		
-		if run == True:
-			self.run()
 		self._communicated = False
 		self._stdout = None
 		self._stderr = None
@@ -84,6 +102,9 @@ class Process(object):
 			self.env.update(env)
 		else:
 			self.env = os.environ.copy()
+		
+		if run == True:
+			self.run()
 			
 	def run(self):
 		self.process = Popen(self.commandLine, env=self.env, stdout=PIPE, stderr=PIPE)
@@ -95,6 +116,21 @@ class Process(object):
 			self._communicated = True
 		return ProcessOutput(self._stdout, self._stderr)
 	
+	@property
+	def stdoutStream(self):
+		"""The stdout pipe of the process, for reading its output as it comes in.
+		Once done reading, call .waitAndGetOutput() to get the rest and reap the process."""
+		return self.process.stdout
+	
+	@property
+	def running(self):
+		return self.process.poll() is None
+	
+	def kill(self):
+		"""Kill the process if it's still running."""
+		if self.running:
+			self.process.kill()
+	
 	def waitAndGetStdout(self, timeout=None):
 		return self.waitAndGetOutput(timeout).stdout
 	
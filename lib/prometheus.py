@@ -0,0 +1,265 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""Exposing the health of the nodes to Prometheus.
+
+FleetExporter keeps the latest probe result of every node, as they come in from a
+FleetMonitor, and renders them in the Prometheus text format. A scrape only ever
+renders what's cached, so however often it comes, it never causes RPC calls to the
+daemons. The metrics are served over HTTP, or written to a file for the textfile
+collector of the node exporter, or both."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from collections import OrderedDict
+import http.server
+import math
+import threading
+
+# Local
+from lib.exceptions import Error
+from lib.filesystem import writeFileAtomically
+
+#=======================================================================================
+# Configuration
+#=======================================================================================
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+METRIC_PREFIX = "blockchaintools"
+
+# Seconds.
+DEFAULT_LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Exceptions
+#==========================================================
+
+#==========================================================
+class PrometheusError(Error):
+	pass
+
+#==========================================================
+# Functions
+#==========================================================
+
+def escapeLabelValue(value):
+	return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def formatValue(value):
+	if isinstance(value, bool):
+		return "1" if value else "0"
+	if isinstance(value, int):
+		return str(value)
+	if math.isinf(value):
+		return "+Inf" if value > 0 else "-Inf"
+	return repr(float(value))
+
+def formatLabels(labels):
+	if len(labels) == 0:
+		return ""
+	return "{{{0}}}".format(",".join(["{0}=\"{1}\"".format(name, escapeLabelValue(value))\
+		for name, value in labels.items()]))
+
+#==========================================================
+# Metrics
+#==========================================================
+
+#==========================================================
+class Histogram(object):
+
+	#=============================
+	"""Counts observations into cumulative buckets, the Prometheus way.
+
+	Takes:
+		- buckets (list): The upper bounds, ascending. +Inf is added."""
+	#=============================
+
+	def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+		self.bounds = sorted(buckets)+[float("inf")]
+		self.counts = [0]*len(self.bounds)
+		self.sum = 0.0
+		self.count = 0
+
+	def observe(self, value):
+		for index, bound in enumerate(self.bounds):
+			if value <= bound:
+				self.counts[index] += 1
+				break
+		self.sum += value
+		self.count += 1
+
+	def samples(self, name, labels):
+		"""(name, labels, value) of the bucket, sum and count samples."""
+		samples = []
+		cumulative = 0
+		for bound, count in zip(self.bounds, self.counts):
+			cumulative += count
+			bucketLabels = OrderedDict(labels)
+			bucketLabels["le"] = formatValue(bound)
+			samples.append(("{0}_bucket".format(name), bucketLabels, cumulative))
+		samples.append(("{0}_sum".format(name), labels, self.sum))
+		samples.append(("{0}_count".format(name), labels, self.count))
+		return samples
+
+#==========================================================
+class MetricFamily(object):
+
+	#=============================
+	"""The samples of one metric, with its HELP and TYPE."""
+	#=============================
+
+	def __init__(self, name, help, type="gauge"):
+		self.name = "{0}_{1}".format(METRIC_PREFIX, name)
+		self.help = help
+		self.type = type
+		self.samples = []
+
+	def add(self, labels, value):
+		"""Add a sample; values that are None are left out."""
+		if not value is None:
+			self.samples.append((self.name, labels, value))
+
+	@property
+	def text(self):
+		lines = ["# HELP {name} {help}".format(name=self.name, help=self.help),\
+			"# TYPE {name} {type}".format(name=self.name, type=self.type)]
+		lines.extend(["{name}{labels} {value}".format(name=name, labels=formatLabels(labels),\
+			value=formatValue(value)) for name, labels, value in self.samples])
+		return "\n".join(lines)
+
+#==========================================================
+# Exporter
+#==========================================================
+
+#==========================================================
+class FleetExporter(object):
+
+	#=============================
+	"""Renders the cached health of the nodes as Prometheus metrics.
+
+	Takes:
+		- labels (dict): Labels for all samples, e.g. {"coin": "vivo"}.
+		- latencyBuckets (list): Upper bounds of the RPC latency histogram buckets.
+
+	.observe(event) takes the MonitorEvent objects of a FleetMonitor: "probe"
+	events update the node's health and latency histogram, "restarted" events
+	count restarts. .text renders all of it. .serve(host, port) serves it at
+	/metrics from a thread, .writeTextfile(path) writes it to a file atomically."""
+	#=============================
+
+	def __init__(self, labels={}, latencyBuckets=DEFAULT_LATENCY_BUCKETS):
+		self.labels = OrderedDict(labels)
+		self.latencyBuckets = latencyBuckets
+		self.health = OrderedDict()
+		self.latencies = OrderedDict()
+		self.restarts = OrderedDict()
+		self.scrapes = 0
+		self._lock = threading.Lock()
+		self._server = None
+
+	def observe(self, event):
+		with self._lock:
+			if event.kind == "probe":
+				health = event.detail
+				self.health[event.id] = health
+				if not health.latency is None:
+					self.latencies.setdefault(event.id, Histogram(self.latencyBuckets)).observe(health.latency)
+			elif event.kind == "restarted":
+				self.restarts[event.id] = self.restarts.get(event.id, 0)+1
+
+	def _nodeLabels(self, id, **extra):
+		labels = OrderedDict(self.labels)
+		labels["node"] = id
+		labels.update(sorted(extra.items()))
+		return labels
+
+	@property
+	def families(self):
+		up = MetricFamily("node_up", "Whether the daemon is running and answering RPC calls.")
+		warmingUp = MetricFamily("node_warming_up", "Whether the daemon is running, but still warming up.")
+		height = MetricFamily("node_block_height", "Block count of the node.")
+		peers = MetricFamily("node_peers", "Connection count of the node.")
+		mempool = MetricFamily("node_mempool_transactions", "Transactions in the mempool of the node.")
+		masternode = MetricFamily("node_masternode_status", "Masternode status of the node, as a label.")
+		rss = MetricFamily("node_resident_memory_bytes", "Resident memory of the daemon.")
+		cpu = MetricFamily("node_cpu_seconds_total", "CPU time the daemon used, user and system.", "counter")
+		probeTime = MetricFamily("node_last_probe_timestamp_seconds", "When the node was last probed.")
+		latency = MetricFamily("node_rpc_latency_seconds", "How long the RPC calls of the probes took.",\
+			"histogram")
+		restarts = MetricFamily("node_restarts_total", "Restarts of the node by the monitor.", "counter")
+		fleetHeight = MetricFamily("fleet_block_height", "Highest block count among the nodes.")
+		with self._lock:
+			for id, health in self.health.items():
+				labels = self._nodeLabels(id)
+				up.add(labels, health.alive)
+				warmingUp.add(labels, health.warmingUp)
+				height.add(labels, health.height)
+				peers.add(labels, health.peers)
+				mempool.add(labels, health.mempool)
+				if not health.masternodeStatus is None:
+					masternode.add(self._nodeLabels(id, status=health.masternodeStatus), 1)
+				rss.add(labels, health.rss)
+				cpu.add(labels, health.cpuSeconds)
+				probeTime.add(labels, health.time)
+				restarts.add(labels, self.restarts.get(id, 0))
+			for id, histogram in self.latencies.items():
+				latency.samples.extend(histogram.samples(latency.name, self._nodeLabels(id)))
+			heights = [health.height for health in self.health.values() if not health.height is None]
+			fleetHeight.add(self.labels, max(heights) if len(heights) > 0 else None)
+		return [up, warmingUp, height, peers, mempool, masternode, rss, cpu, probeTime, latency, restarts,\
+			fleetHeight]
+
+	@property
+	def text(self):
+		return "\n".join([family.text for family in self.families])+"\n"
+
+	def writeTextfile(self, path):
+		"""Write the metrics to path for the node exporter's textfile collector, which
+		only picks up files ending in .prom. Written to a temporary file first, so the
+		collector never reads half of it."""
+		try:
+			writeFileAtomically(path, self.text)
+		except OSError as error:
+			raise PrometheusError("Can't write the metrics to {path}: {error}".format(path=path, error=error))
+
+	def serve(self, host="127.0.0.1", port=9468):
+		"""Serve the metrics at http://host:port/metrics from a thread. Returns the
+		address actually bound, which tells the port if port is 0."""
+		exporter = self
+		class Handler(http.server.BaseHTTPRequestHandler):
+			def log_message(self, *args):
+				pass
+			def do_GET(self):
+				if not self.path.split("?")[0] in ("/metrics", "/"):
+					self.send_error(404)
+					return
+				data = exporter.text.encode()
+				exporter.scrapes += 1
+				self.send_response(200)
+				self.send_header("Content-Type", CONTENT_TYPE)
+				self.send_header("Content-Length", str(len(data)))
+				self.end_headers()
+				self.wfile.write(data)
+		try:
+			self._server = http.server.ThreadingHTTPServer((host, int(port)), Handler)
+		except OSError as error:
+			raise PrometheusError("Can't listen on {host}:{port} for metrics scrapes: {error}".format(host=host,\
+				port=port, error=error))
+		self._server.daemon_threads = True
+		threading.Thread(target=self._server.serve_forever, daemon=True).start()
+		return self._server.server_address
+
+	def close(self):
+		if not self._server is None:
+			self._server.shutdown()
+			self._server.server_close()
+			self._server = None
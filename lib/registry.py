@@ -0,0 +1,344 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""A persistent index of the nodes of a coin, so they don't have to be rediscovered.
+
+Discovering a fleet (see lib.fleet) means listing the masternodes directory, and
+opening and parsing every node's conf file. The NodeRegistry does that once and keeps
+the results in a JSON file in the coin directory. It's trusted for as long as the
+masternodes directory doesn't change; resolving a single node only stats its conf file
+to make sure it's still what got indexed.
+
+In long-running mode (NodeRegistry.watch), the registry is kept current through
+inotify on the masternodes directory and the datadirs, updating just the nodes
+that changed. That's also where the last known PID of every daemon comes from."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from collections import namedtuple, OrderedDict
+import hashlib
+import json
+import os
+import time
+
+# Local
+from lib.exceptions import Error
+from lib.filesystem import writeFileAtomically
+from lib.fleet import Fleet, FleetNode
+from lib.watching import PathWatcher, IN_CLOSE_WRITE, IN_CREATE, IN_DELETE, IN_MOVED_FROM,\
+	IN_MOVED_TO, IN_DELETE_SELF, IN_ISDIR
+
+#=======================================================================================
+# Datatypes
+#=======================================================================================
+
+# kind: "added", "removed", "changed" or "pid". id: The node's id.
+RegistryChange = namedtuple("RegistryChange", "kind id")
+
+#=======================================================================================
+# Configuration
+#=======================================================================================
+
+REGISTRY_VERSION = 1
+REGISTRY_FILE_NAME = "registry.json"
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Exceptions
+#==========================================================
+
+#==========================================================
+class RegistryError(Error):
+	pass
+
+#==========================================================
+# Registry
+#==========================================================
+
+#==========================================================
+class NodeRegistry(object):
+
+	#=============================
+	"""Keeps the id, datadir, ports, conf hash and last known daemon PID of every node.
+
+	Takes:
+		- loader (FleetLoader): Used to discover nodes and build their configs.
+		- path (string): Path of the registry file. Default: registry.json in
+		  the coin directory.
+		- pidFileName (string): Name of the daemons' pid file in their datadirs.
+
+	The registry loads lazily. If the file is missing, unreadable, of another
+	version or the masternodes directory changed since it got written, the nodes
+	are rediscovered, reusing the records of nodes whose conf file didn't change,
+	and the file is rewritten. Failing to write it isn't an error; it's a cache."""
+	#=============================
+
+	def __init__(self, loader, path=None, pidFileName=None):
+		self.loader = loader
+		self.path = str(path) if not path is None\
+			else os.path.join(loader.coinDirPath, REGISTRY_FILE_NAME)
+		self.pidFileName = pidFileName if not pidFileName is None\
+			else "{0}.pid".format(loader.Config.defaultDaemonBinName)
+		self.records = None
+		self.dirSignature = None
+
+	#=============================
+	# Persistence
+
+	def _read(self):
+		try:
+			with open(self.path, "r") as registryFile:
+				data = json.load(registryFile)
+		except (OSError, ValueError):
+			return False
+		if not isinstance(data, dict) or not data.get("version") == REGISTRY_VERSION\
+			or not data.get("masternodesDirPath") == self.loader.masternodesDirPath:
+			return False
+		self.records = OrderedDict([(record["id"], record) for record in data.get("nodes", [])])
+		self.dirSignature = data.get("dirSignature")
+		return True
+
+	def save(self):
+		"""Write the registry file. Returns False if that failed."""
+		data = OrderedDict([("version", REGISTRY_VERSION),\
+			("masternodesDirPath", self.loader.masternodesDirPath),\
+			("dirSignature", self.dirSignature), ("nodes", list(self.records.values()))])
+		try:
+			writeFileAtomically(self.path, json.dumps(data, indent="\t"))
+		except OSError:
+			return False
+		return True
+
+	def load(self):
+		"""Load the registry, rediscovering the nodes if it's stale. Returns self."""
+		if self.records is None:
+			if not self._read() or not self.dirSignature == self._dirSignature():
+				self.rebuild()
+		return self
+
+	def _dirSignature(self):
+		try:
+			return os.stat(self.loader.masternodesDirPath).st_mtime_ns
+		except FileNotFoundError:
+			return None
+
+	#=============================
+	# Records
+
+	def _confSignature(self, confPath):
+		try:
+			stat = os.stat(confPath)
+		except FileNotFoundError:
+			return None
+		return [stat.st_mtime_ns, stat.st_size]
+
+	def _confHash(self, confPath):
+		try:
+			with open(confPath, "rb") as confFile:
+				return hashlib.blake2b(confFile.read(), digest_size=16).hexdigest()
+		except FileNotFoundError:
+			return None
+
+	def _makeRecord(self, id, homeDirPath, pid=None):
+		node = self.loader.loadNode(id, homeDirPath)
+		confPath = self.loader.confPathFor(node.dataDirPath)
+		return OrderedDict([("id", node.id), ("homeDirPath", str(node.homeDirPath)),\
+			("dataDirPath", str(node.dataDirPath)), ("rpcPort", node.rpcPort), ("port", node.port),\
+			("confSignature", self._confSignature(confPath)), ("confHash", self._confHash(confPath)),\
+			("pid", pid)])
+
+	def _nodeFromRecord(self, record):
+		return FleetNode(id=record["id"], homeDirPath=record["homeDirPath"],\
+			dataDirPath=record["dataDirPath"], rpcPort=record["rpcPort"], port=record["port"],\
+			config=self.loader.makeConfig(record["homeDirPath"], record["dataDirPath"], record["rpcPort"]))
+
+	def _isCurrent(self, record):
+		confPath = self.loader.confPathFor(record["dataDirPath"])
+		return self._confSignature(confPath) == record["confSignature"]
+
+	def rebuild(self):
+		"""Rediscover the nodes and save. Unchanged nodes keep their records. Returns the changes."""
+		self.dirSignature = self._dirSignature()
+		oldRecords = self.records or OrderedDict()
+		self.records = OrderedDict()
+		changes = []
+		for id, homeDirPath in self.loader.scan():
+			record = oldRecords.get(id)
+			if record is None or not record["homeDirPath"] == homeDirPath or not self._isCurrent(record):
+				record = self._makeRecord(id, homeDirPath, pid=None if record is None else record["pid"])
+				changes.append(RegistryChange("added" if not id in oldRecords else "changed", id))
+			self.records[id] = record
+		changes += [RegistryChange("removed", id) for id in oldRecords if not id in self.records]
+		self.save()
+		return changes
+
+	def updateNode(self, id):
+		"""Re-read the node with the specified id from disk. Returns the RegistryChange or None."""
+		self.load()
+		homeDirPath = os.path.join(self.loader.masternodesDirPath, id)
+		if not os.path.isdir(homeDirPath):
+			if self.records.pop(id, None) is None:
+				return None
+			return RegistryChange("removed", id)
+		record = self.records.get(id)
+		if not record is None and self._isCurrent(record):
+			return None
+		newRecord = self._makeRecord(id, homeDirPath, pid=None if record is None else record["pid"])
+		if not record is None and newRecord["confHash"] == record["confHash"]:
+			# Touched, but not changed.
+			record["confSignature"] = newRecord["confSignature"]
+			return None
+		self.records[id] = newRecord
+		return RegistryChange("added" if record is None else "changed", id)
+
+	def setPid(self, id, pid):
+		"""Record the last known PID of the node's daemon. Returns whether it changed."""
+		record = self.load().records.get(str(id))
+		if record is None or record["pid"] == pid:
+			return False
+		record["pid"] = pid
+		return True
+
+	def _readPid(self, dataDirPath):
+		try:
+			with open(os.path.join(dataDirPath, self.pidFileName), "r") as pidFile:
+				return int(pidFile.read().strip())
+		except (OSError, ValueError):
+			return None
+
+	#=============================
+	# Lookup
+
+	def __len__(self):
+		return len(self.load().records)
+
+	@property
+	def ids(self):
+		return list(self.load().records.keys())
+
+	def pid(self, id):
+		"""Last known PID of the node's daemon, None if unknown."""
+		record = self.load().records.get(str(id))
+		return None if record is None else record["pid"]
+
+	def fleet(self):
+		"""The Fleet of all nodes, straight from the registry."""
+		return Fleet([self._nodeFromRecord(record) for record in self.load().records.values()])
+
+	def resolve(self, identifier):
+		"""The FleetNode identified by identifier (id or datadir path), or None.
+		Only that node's conf file is checked for changes."""
+		self.load()
+		record = self.records.get(str(identifier))
+		if record is None:
+			dataDirPath = os.path.abspath(str(identifier))
+			for candidate in self.records.values():
+				if candidate["dataDirPath"] == dataDirPath:
+					record = candidate
+					break
+		if record is None:
+			return None
+		if not self._isCurrent(record):
+			# Saved even if only the signature changed, so it isn't hashed again next time.
+			self.updateNode(record["id"])
+			self.save()
+			record = self.records.get(record["id"])
+			if record is None:
+				return None
+		return self._nodeFromRecord(record)
+
+	#=============================
+	# Long-running mode
+
+	def watch(self, timeout=None):
+
+		"""Generator keeping the registry current, yielding a RegistryChange for every change.
+
+		Watches the masternodes directory for nodes coming and going and every
+		datadir for its conf and pid files. Saves after every batch of changes.
+		Stops once timeout seconds passed without changes, never if it's None."""
+
+		self.load()
+		changes = self.rebuild()
+		for change in changes:
+			yield change
+		for record in self.records.values():
+			self.setPid(record["id"], self._readPid(record["dataDirPath"]))
+		mask = IN_CLOSE_WRITE | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF
+		confFileName = self.loader.Config.defaultConfigFileName
+		with PathWatcher(self._watchedPaths(), mask=mask) as watcher:
+			lastChangeTime = time.monotonic()
+			while True:
+				watched = self._watchedBy(watcher)
+				events = watcher.wait(timeout=timeout)
+				if not watcher.usingInotify:
+					# Polling: Check everything.
+					changes = self.rebuild() + self._updatePids()
+				else:
+					changes = self._handleEvents(events, confFileName)
+					# Datadirs that just came into existence might have gotten their
+					# files before we were watching them.
+					for dataDirPath in self._watchedBy(watcher) - watched:
+						for id, record in list(self.records.items()):
+							if record["dataDirPath"] == dataDirPath:
+								change = self.updateNode(id)
+								if not change is None:
+									changes.append(change)
+				if len(changes) > 0:
+					lastChangeTime = time.monotonic()
+				elif not timeout is None and time.monotonic()-lastChangeTime >= timeout:
+					return
+				if len(changes) > 0:
+					self.save()
+					watcher.paths = self._watchedPaths()
+					watcher.rewatch()
+				for change in changes:
+					yield change
+
+	def _watchedBy(self, watcher):
+		return set(watcher.inotify.watches.values()) if watcher.usingInotify else set()
+
+	def _watchedPaths(self):
+		return [self.loader.masternodesDirPath]\
+			+ [record["dataDirPath"] for record in self.records.values()]
+
+	def _handleEvents(self, events, confFileName):
+		changes = []
+		dataDirIds = {record["dataDirPath"]: id for id, record in self.records.items()}
+		for event in events:
+			if event.path == self.loader.masternodesDirPath:
+				if event.mask & IN_ISDIR:
+					ids = [event.name]
+				else:
+					continue
+			elif event.path in dataDirIds:
+				id = dataDirIds[event.path]
+				if event.name == self.pidFileName:
+					if self.setPid(id, self._readPid(event.path)):
+						changes.append(RegistryChange("pid", id))
+					continue
+				if not event.name == confFileName and not event.mask & IN_DELETE_SELF:
+					continue
+				ids = [id]
+			else:
+				continue
+			for id in ids:
+				change = self.updateNode(id)
+				if not change is None:
+					changes.append(change)
+		self.dirSignature = self._dirSignature()
+		return changes
+
+	def _updatePids(self):
+		changes = []
+		for id, record in self.records.items():
+			if self.setPid(id, self._readPid(record["dataDirPath"])):
+				changes.append(RegistryChange("pid", id))
+		return changes
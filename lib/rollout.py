@@ -0,0 +1,239 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""Rolling lifecycle operations (restarts, reindexes, binary switches) across a fleet.
+
+Taking a masternode down for a restart or reindex takes it off the network until it's
+ready again. RollingOrchestrator runs such an operation on one node after the other,
+keeping at most maxUnavailable nodes down at any time, nodes that are down for other
+reasons included. A slot only frees up once the node it was used for is ready again.
+
+Progress is checkpointed to a file after every node, so a rollout that got interrupted
+picks up where it left off when it's run again."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import json
+import os
+import time
+
+# Local
+from lib.exceptions import Error
+from lib.filesystem import writeFileAtomically
+
+#=======================================================================================
+# Datatypes
+#=======================================================================================
+
+# kind: "skipped" (done in an earlier run), "started", "done", "failed", "waiting"
+# (the budget is used up by nodes that are down) or "finished". id: Node id, None for
+# events about the whole rollout. detail: Error message, duration or the like.
+RolloutEvent = namedtuple("RolloutEvent", "kind id detail")
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Exceptions
+#==========================================================
+
+#==========================================================
+class RolloutError(Error):
+	pass
+
+#==========================================================
+# Checkpoints
+#==========================================================
+
+#==========================================================
+class RolloutCheckpoint(object):
+
+	#=============================
+	"""The progress of a rollout, saved to a JSON file.
+
+	Takes:
+		- path (string): Path of the checkpoint file.
+
+	.operation is the name of the operation being rolled out, .ids the ids of all
+	nodes it's rolled out to, .done those it's done for. Every change is written
+	to disk right away, atomically. .remove() deletes the file once the rollout
+	is finished."""
+	#=============================
+
+	def __init__(self, path):
+		self.path = str(path)
+		self.operation = None
+		self.ids = []
+		self.done = []
+		self.failed = OrderedDict()
+
+	@property
+	def exists(self):
+		return os.path.exists(self.path)
+
+	def load(self):
+		"""Read the checkpoint file. Returns False if there is none."""
+		try:
+			with open(self.path, "r") as checkpointFile:
+				data = json.load(checkpointFile)
+		except FileNotFoundError:
+			return False
+		except (OSError, ValueError) as error:
+			raise RolloutError("Can't read rollout checkpoint {path}: {error}"\
+				.format(path=self.path, error=error))
+		self.operation = data["operation"]
+		self.ids = data["ids"]
+		self.done = data["done"]
+		self.failed = OrderedDict(data.get("failed", {}))
+		return True
+
+	def save(self):
+		writeFileAtomically(self.path, json.dumps(OrderedDict([("operation", self.operation),\
+			("ids", self.ids), ("done", self.done), ("failed", self.failed)]), indent="\t"))
+
+	def begin(self, operation, ids):
+		self.operation = operation
+		self.ids = list(ids)
+		self.done = []
+		self.failed = OrderedDict()
+		self.save()
+
+	def markDone(self, id):
+		self.done.append(id)
+		self.failed.pop(id, None)
+		self.save()
+
+	def markFailed(self, id, message):
+		self.failed[id] = message
+		self.save()
+
+	def remove(self):
+		try:
+			os.unlink(self.path)
+		except FileNotFoundError:
+			pass
+
+#==========================================================
+# Orchestration
+#==========================================================
+
+#==========================================================
+class RollingOrchestrator(object):
+
+	#=============================
+	"""Runs a lifecycle operation across nodes without taking too many down at once.
+
+	Takes:
+		- operationName (string): Name of the operation, as kept in the checkpoint.
+		- operation (callable): Called with a node. Takes it down, does its thing
+		  and returns once the node is ready again, raising an exception otherwise.
+		- isAvailable (callable): Called with a node, returns whether it's up.
+		- maxUnavailable (int): How many nodes may be down at once.
+		- checkpoint (RolloutCheckpoint): Where to keep track of the progress.
+		- waitTimeout (float): For how many seconds to wait for nodes that are down
+		  for other reasons to come back when they use up the budget, before giving up.
+
+	Nodes are expected to have an .id. .run(nodes) is a generator yielding a
+	RolloutEvent for everything that happens. If the checkpoint belongs to a rollout
+	of the same operation to the same nodes, nodes done already are skipped; one
+	of another operation raises RolloutError. Once a node fails, no further nodes
+	are taken down, the rollout ends and RolloutError is raised after the nodes in
+	progress are done. The checkpoint is removed once every node is done."""
+	#=============================
+
+	def __init__(self, operationName, operation, isAvailable, maxUnavailable=1, checkpoint=None,\
+		waitTimeout=600, pollInterval=5):
+		self.operationName = operationName
+		self.operation = operation
+		self.isAvailable = isAvailable
+		self.maxUnavailable = max(1, int(maxUnavailable))
+		self.checkpoint = checkpoint
+		self.waitTimeout = waitTimeout
+		self.pollInterval = pollInterval
+
+	def _resume(self, ids):
+		"""Ids of the nodes done in an earlier run of this rollout."""
+		if self.checkpoint is None:
+			return set()
+		if self.checkpoint.load():
+			if not self.checkpoint.operation == self.operationName:
+				raise RolloutError("An unfinished rollout of \"{operation}\" is checkpointed in {path}. "
+					"Finish it first or remove the checkpoint.".format(operation=self.checkpoint.operation,\
+					path=self.checkpoint.path))
+			if sorted(self.checkpoint.ids) == sorted(ids):
+				return set(self.checkpoint.done)
+		self.checkpoint.begin(self.operationName, ids)
+		return set()
+
+	def _timed(self, node):
+		startTime = time.monotonic()
+		self.operation(node)
+		return time.monotonic()-startTime
+
+	def _downElsewhere(self, nodes, busyIds):
+		"""How many nodes we're not working on are down."""
+		return len([node for node in nodes if not node.id in busyIds and not self.isAvailable(node)])
+
+	def run(self, nodes):
+		nodes = list(nodes)
+		doneIds = self._resume([node.id for node in nodes])
+		pending = []
+		for node in nodes:
+			if node.id in doneIds:
+				yield RolloutEvent("skipped", node.id, None)
+			else:
+				pending.append(node)
+		running = {}
+		failures = []
+		waitingSince = None
+		with ThreadPoolExecutor(max_workers=self.maxUnavailable) as executor:
+			while (len(pending) > 0 and len(failures) == 0) or len(running) > 0:
+				if len(pending) > 0 and len(failures) == 0 and len(running) < self.maxUnavailable:
+					busyIds = set([node.id for node in running.values()])
+					down = self._downElsewhere([node for node in nodes if not node is pending[0]], busyIds)
+					budget = self.maxUnavailable-len(running)-down
+					if budget > 0:
+						waitingSince = None
+						node = pending.pop(0)
+						running[executor.submit(self._timed, node)] = node
+						yield RolloutEvent("started", node.id, None)
+						continue
+					if len(running) == 0:
+						if waitingSince is None:
+							waitingSince = time.monotonic()
+							yield RolloutEvent("waiting", None,\
+								"{0} node(s) down for other reasons".format(down))
+						elif time.monotonic()-waitingSince > self.waitTimeout:
+							raise RolloutError("Gave up waiting for nodes that are down to come back, "
+								"so as not to take down more than {0} at once.".format(self.maxUnavailable))
+						time.sleep(self.pollInterval)
+						continue
+				done, notDone = wait(list(running.keys()), timeout=self.pollInterval,\
+					return_when=FIRST_COMPLETED)
+				for future in done:
+					node = running.pop(future)
+					try:
+						duration = future.result()
+					except Exception as error:
+						failures.append((node, error))
+						if not self.checkpoint is None:
+							self.checkpoint.markFailed(node.id, str(error).strip())
+						yield RolloutEvent("failed", node.id, str(error).strip())
+						continue
+					if not self.checkpoint is None:
+						self.checkpoint.markDone(node.id)
+					yield RolloutEvent("done", node.id, duration)
+		if len(failures) > 0:
+			raise RolloutError("Rollout of \"{operation}\" stopped, as it failed for: {ids}. "
+				"Run it again to resume.".format(operation=self.operationName,\
+				ids=", ".join([node.id for node, error in failures])))
+		if not self.checkpoint is None:
+			self.checkpoint.remove()
+		yield RolloutEvent("finished", None, None)
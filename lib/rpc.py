@@ -0,0 +1,187 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""A JSON-RPC client for talking to daemons directly, without spawning their cli.
+
+Spawning the cli for a call costs a process start; talking HTTP to the daemon costs a
+request over a connection that's kept open between calls. Several calls can be sent
+in one request as a batch, which the daemons answer in one go."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from collections import namedtuple
+import base64
+import http.client
+import itertools
+import json
+import threading
+
+# Local
+from lib.exceptions import Error
+
+#=======================================================================================
+# Datatypes
+#=======================================================================================
+
+# result: What the call returned, None if it failed with error (an RpcError).
+RpcResult = namedtuple("RpcResult", "result error")
+
+#=======================================================================================
+# Configuration
+#=======================================================================================
+
+# The daemon is warming up (loading the block index and such).
+RPC_IN_WARMUP = -28
+RPC_METHOD_NOT_FOUND = -32601
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Exceptions
+#==========================================================
+
+#==========================================================
+class RpcError(Error):
+
+	#=============================
+	"""The daemon answered the call with an error. .code is the RPC error code,
+	.rpcMessage the message as the daemon put it."""
+	#=============================
+
+	def __init__(self, message, code=None):
+		self.code = code
+		self.rpcMessage = message
+		super().__init__(message)
+
+#==========================================================
+class RpcConnectionError(Error):
+	
+	#=============================
+	"""The daemon couldn't be reached or didn't take the call. .reason is the
+	message without the decoration."""
+	#=============================
+	
+	def __init__(self, message):
+		self.reason = message
+		super().__init__(message)
+
+#==========================================================
+# Client
+#==========================================================
+
+#==========================================================
+class RpcClient(object):
+
+	#=============================
+	"""Calls the RPC methods of a daemon over HTTP.
+
+	Takes:
+		- endpoint (RpcEndpoint): Where the daemon listens, and the credentials.
+		  Cookie files are read again whenever authentication fails, as they
+		  change with every start of the daemon.
+		- timeout (float): Seconds to wait for connections and answers.
+
+	.call(method, *params) returns the result, raising RpcError if the daemon
+	answers with an error and RpcConnectionError if it can't be reached.
+	.batch(calls) takes (method, params) tuples and returns an RpcResult for each,
+	in order. Calls from several threads are serialized."""
+	#=============================
+
+	def __init__(self, endpoint, timeout=10.0):
+		self.endpoint = endpoint
+		self.timeout = timeout
+		self._connection = None
+		self._authorization = None
+		self._ids = itertools.count(1)
+		self._lock = threading.Lock()
+
+	def close(self):
+		with self._lock:
+			self._disconnect()
+
+	def _disconnect(self):
+		if not self._connection is None:
+			self._connection.close()
+			self._connection = None
+
+	def _readAuthorization(self):
+		user, password = self.endpoint.user, self.endpoint.password
+		if user is None or password is None:
+			try:
+				with open(self.endpoint.cookieFilePath, "r") as cookieFile:
+					user, separator, password = cookieFile.read().strip().partition(":")
+			except (OSError, TypeError) as error:
+				raise RpcConnectionError("No RPC credentials in the conf file and no cookie file: {error}"\
+					.format(error=error))
+		return "Basic {0}".format(base64.b64encode("{0}:{1}".format(user, password).encode()).decode())
+
+	def _post(self, payload):
+		"""Send payload, return the decoded answer. Retries once on a stale connection."""
+		body = json.dumps(payload).encode()
+		for attempt in range(2):
+			if self._authorization is None:
+				self._authorization = self._readAuthorization()
+			if self._connection is None:
+				self._connection = http.client.HTTPConnection(self.endpoint.host, self.endpoint.port,\
+					timeout=self.timeout)
+			try:
+				self._connection.request("POST", "/", body=body, headers={"Authorization": self._authorization,\
+					"Content-Type": "application/json"})
+				response = self._connection.getresponse()
+				data = response.read()
+			except (http.client.HTTPException, OSError) as error:
+				self._disconnect()
+				# A kept alive connection the daemon closed in the meantime fails on first use.
+				if attempt == 0 and isinstance(error, (http.client.RemoteDisconnected, BrokenPipeError,\
+					ConnectionResetError)):
+					continue
+				raise RpcConnectionError("Can't reach the daemon at {host}:{port}: {error}"\
+					.format(host=self.endpoint.host, port=self.endpoint.port, error=error))
+			if response.status == 401:
+				self._authorization = None
+				if attempt == 0 and self.endpoint.user is None:
+					continue # The cookie changed.
+				raise RpcConnectionError("The daemon at {host}:{port} refused the RPC credentials."\
+					.format(host=self.endpoint.host, port=self.endpoint.port))
+			if response.getheader("Connection", "").lower() == "close":
+				self._disconnect()
+			try:
+				return json.loads(data.decode())
+			except ValueError:
+				raise RpcConnectionError("Garbled answer from the daemon at {host}:{port} (HTTP {status})."\
+					.format(host=self.endpoint.host, port=self.endpoint.port, status=response.status))
+
+	def _toResult(self, answer):
+		error = answer.get("error")
+		if not error is None:
+			return RpcResult(result=None, error=RpcError(error.get("message", str(error)), error.get("code")))
+		return RpcResult(result=answer.get("result"), error=None)
+
+	def call(self, method, *params):
+		with self._lock:
+			answer = self._post({"jsonrpc": "1.0", "id": next(self._ids), "method": method, "params": list(params)})
+		result = self._toResult(answer)
+		if not result.error is None:
+			raise result.error
+		return result.result
+
+	def batch(self, calls):
+		calls = list(calls)
+		if len(calls) == 0:
+			return []
+		with self._lock:
+			ids = [next(self._ids) for call in calls]
+			answers = self._post([{"jsonrpc": "1.0", "id": id, "method": method, "params": list(params)}\
+				for id, (method, params) in zip(ids, calls)])
+		if isinstance(answers, dict):
+			# Daemons that don't do batches answer with a single error.
+			error = self._toResult(answers).error or RpcError("Batch calls aren't supported.")
+			return [RpcResult(result=None, error=error) for call in calls]
+		byId = dict([(answer.get("id"), answer) for answer in answers])
+		return [self._toResult(byId.get(id, {"error": {"message": "No answer.", "code": None}})) for id in ids]
@@ -0,0 +1,246 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""Running commands for many nodes periodically, from one process.
+
+With a crontab line per node, all of them start at the top of every minute at once.
+SpreadScheduler runs each job once per period too, but at its own offset into the
+period, so the runs are spread evenly across it, in a bounded pool of workers. A job
+whose previous run is still going is skipped rather than started twice. How long the
+runs took and how they ended is kept per job, and optionally written to a status
+file, for other processes to look at."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import heapq
+import json
+import os
+import signal
+import subprocess
+import threading
+import time
+
+# Local
+from lib.exceptions import Error
+from lib.filesystem import writeFileAtomically
+
+#=======================================================================================
+# Datatypes
+#=======================================================================================
+
+# id: Identifies the job (the node). commandLine: What to run (list). cwd: Where to run
+# it, None for the current directory.
+PeriodicJob = namedtuple("PeriodicJob", "id commandLine cwd")
+
+# start: When the run started (time.time()). duration: Seconds it took. exitCode: None
+# if it didn't get to exit. error: Why it failed, None if it didn't. output: The end of
+# what it wrote to stdout and stderr.
+JobRun = namedtuple("JobRun", "id start duration exitCode error output")
+
+# kind: "finished" or "failed" (detail: JobRun), "skipped" (detail: seconds the
+# previous run has been going), or "statusFailed" (detail: why the status file couldn't
+# be written after the run).
+JobEvent = namedtuple("JobEvent", "kind id detail")
+
+#=======================================================================================
+# Configuration
+#=======================================================================================
+
+# How much of the end of a run's output to keep.
+_OUTPUT_TAIL_SIZE = 2000
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Exceptions
+#==========================================================
+
+#==========================================================
+class SchedulingError(Error):
+	pass
+
+#==========================================================
+# Functions
+#==========================================================
+
+def runJob(job, timeout=None):
+	"""Run job once and return its JobRun. Runs that take longer than timeout seconds
+	are killed, along with their children."""
+	start = time.time()
+	startTime = time.monotonic()
+	try:
+		process = subprocess.Popen(job.commandLine, cwd=job.cwd, stdin=subprocess.DEVNULL,\
+			stdout=subprocess.PIPE, stderr=subprocess.STDOUT, start_new_session=True)
+	except OSError as error:
+		return JobRun(id=job.id, start=start, duration=time.monotonic()-startTime, exitCode=None,\
+			error="Can't run {0}: {1}".format(job.commandLine[0], error), output="")
+	error = None
+	try:
+		output, nothing = process.communicate(timeout=timeout)
+	except subprocess.TimeoutExpired:
+		try:
+			os.killpg(process.pid, signal.SIGKILL)
+		except ProcessLookupError:
+			pass
+		output, nothing = process.communicate()
+		error = "Timed out after {0:.0f} s.".format(timeout)
+	exitCode = process.returncode
+	if error is None and not exitCode == 0:
+		error = "Exited with status {0}.".format(exitCode)
+	return JobRun(id=job.id, start=start, duration=time.monotonic()-startTime,\
+		exitCode=None if exitCode < 0 else exitCode, error=error,\
+		output=output[-_OUTPUT_TAIL_SIZE:].decode(errors="replace").strip())
+
+#==========================================================
+# Statistics
+#==========================================================
+
+#==========================================================
+class JobStats(object):
+
+	#=============================
+	"""Durations and failures of the runs of one job.
+
+	.status is an OrderedDict of it, as written to the status file."""
+	#=============================
+
+	def __init__(self):
+		self.runs = 0
+		self.failures = 0
+		self.failuresInARow = 0
+		self.skipped = 0
+		self.totalDuration = 0.0
+		self.maxDuration = 0.0
+		self.lastRun = None
+		self.lastFailure = None
+
+	def record(self, run):
+		self.runs += 1
+		self.totalDuration += run.duration
+		self.maxDuration = max(self.maxDuration, run.duration)
+		self.lastRun = run
+		if run.error is None:
+			self.failuresInARow = 0
+		else:
+			self.failures += 1
+			self.failuresInARow += 1
+			self.lastFailure = run
+
+	@property
+	def averageDuration(self):
+		return None if self.runs == 0 else self.totalDuration/self.runs
+
+	def _runToDict(self, run):
+		return None if run is None else OrderedDict([("start", run.start), ("duration", run.duration),\
+			("exitCode", run.exitCode), ("error", run.error), ("output", run.output)])
+
+	@property
+	def status(self):
+		return OrderedDict([("runs", self.runs), ("failures", self.failures),\
+			("failuresInARow", self.failuresInARow), ("skipped", self.skipped),\
+			("averageDuration", self.averageDuration), ("maxDuration", self.maxDuration),\
+			("lastRun", self._runToDict(self.lastRun)), ("lastFailure", self._runToDict(self.lastFailure))])
+
+#==========================================================
+# Scheduling
+#==========================================================
+
+#==========================================================
+class SpreadScheduler(object):
+
+	#=============================
+	"""Runs every PeriodicJob once per period, spread evenly across the period.
+
+	Takes:
+		- jobs (list): The PeriodicJob objects.
+		- period (float): Seconds between runs of the same job.
+		- maxWorkers (int): How many runs may be going at once.
+		- timeout (float): Kill runs going for longer than this many seconds.
+		  None to let them run as long as they take (they're skipped meanwhile).
+		- statusPath (string): If specified, .stats is written to this JSON file
+		  after every run.
+
+	Job number i of n runs at i/n of the period into every period, counted from
+	the epoch, so with a period of 60, the first job runs at the top of the minute
+	and the others after it at even gaps, no matter when the scheduler started.
+	.run() is a generator of JobEvent that runs until .stop() is called."""
+	#=============================
+
+	def __init__(self, jobs, period=60.0, maxWorkers=4, timeout=None, statusPath=None):
+		self.jobs = OrderedDict([(job.id, job) for job in jobs])
+		self.period = float(period)
+		self.maxWorkers = max(1, int(maxWorkers))
+		self.timeout = timeout
+		self.statusPath = statusPath
+		self.stats = OrderedDict([(id, JobStats()) for id in self.jobs.keys()])
+		self._stopped = threading.Event()
+
+	def stop(self):
+		self._stopped.set()
+
+	def offset(self, index):
+		return self.period*index/max(1, len(self.jobs))
+
+	def nextRunTime(self, index, now):
+		"""The first time at or after now job number index is due."""
+		offset = self.offset(index)
+		periods = -((offset-now)//self.period) # Rounded up.
+		return periods*self.period+offset
+
+	def writeStatus(self):
+		if self.statusPath is None:
+			return
+		status = OrderedDict([("updated", time.time()), ("period", self.period),\
+			("jobs", OrderedDict([(id, stats.status) for id, stats in self.stats.items()]))])
+		try:
+			writeFileAtomically(self.statusPath, json.dumps(status, indent="\t"))
+		except OSError as error:
+			raise SchedulingError("Can't write the status file {path}: {error}".format(path=self.statusPath,\
+				error=error))
+
+	def run(self):
+		ids = list(self.jobs.keys())
+		heap = [(self.nextRunTime(index, time.time()), index) for index in range(len(ids))]
+		heapq.heapify(heap)
+		running = {}
+		runningSince = {}
+		with ThreadPoolExecutor(max_workers=self.maxWorkers) as executor:
+			while not self._stopped.is_set():
+				now = time.time()
+				while len(heap) > 0 and heap[0][0] <= now:
+					dueTime, index = heapq.heappop(heap)
+					# Runs missed while suspended aren't made up for.
+					heapq.heappush(heap, (self.nextRunTime(index, max(now, dueTime+self.period)), index))
+					id = ids[index]
+					if id in runningSince:
+						self.stats[id].skipped += 1
+						yield JobEvent("skipped", id, time.monotonic()-runningSince[id])
+						continue
+					runningSince[id] = time.monotonic()
+					running[executor.submit(runJob, self.jobs[id], self.timeout)] = id
+				timeout = 1.0 if len(heap) == 0 else min(1.0, max(0, heap[0][0]-time.time()))
+				if len(running) == 0:
+					self._stopped.wait(timeout)
+					continue
+				done, notDone = wait(list(running.keys()), timeout=timeout, return_when=FIRST_COMPLETED)
+				for future in done:
+					id = running.pop(future)
+					del runningSince[id]
+					run = future.result()
+					self.stats[id].record(run)
+					yield JobEvent("finished" if run.error is None else "failed", id, run)
+					# The runs matter more than the status file, so they go on without it.
+					try:
+						self.writeStatus()
+					except SchedulingError as error:
+						yield JobEvent("statusFailed", id, str(error))
+			for future in running.keys():
+				future.cancel()
@@ -0,0 +1,202 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""Running I/O heavy operations on many nodes at once without thrashing the disk.
+
+Starting a daemon means loading its block index and chainstate, which is mostly disk
+I/O. Starting all nodes of a host at once makes them fight over the disk, starting
+them one by one leaves it idle most of the time. StaggeredRunner runs an operation on
+many items concurrently, but only admits the next one as long as the disk isn't
+saturated, as measured by IoPressureProbe."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import os
+import time
+
+#=======================================================================================
+# Datatypes
+#=======================================================================================
+
+# item: What the operation ran on. value: What it returned, None if it raised error.
+# duration: Seconds it took. waited: Seconds it waited for admission.
+StaggeredResult = namedtuple("StaggeredResult", "item value error duration waited")
+
+#=======================================================================================
+# Configuration
+#=======================================================================================
+
+PSI_IO_PATH = "/proc/pressure/io"
+DISKSTATS_PATH = "/proc/diskstats"
+SYS_BLOCK_PATH = "/sys/block"
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Measuring
+#==========================================================
+
+#==========================================================
+class IoPressureProbe(object):
+
+	#=============================
+	"""Measures how busy the disks are, as a percentage.
+
+	Uses the kernel's pressure stall information where available (Linux 4.20+,
+	/proc/pressure/io): The share of time some task was stalled waiting on I/O.
+	Otherwise, the utilization of the busiest disk according to /proc/diskstats.
+	If neither is available, the pressure is always 0.
+
+	.sample() returns the pressure since the previous sample. The first one
+	measures over minWindow seconds, as do samples taken less than minWindow
+	seconds apart, so that back to back samples aren't meaningless."""
+	#=============================
+
+	def __init__(self, minWindow=0.25):
+		self.minWindow = minWindow
+		if self._readPsiTotal() is not None:
+			self.source = "psi"
+			self._read = self._readPsiTotal
+		elif self._readDiskTicks() is not None:
+			self.source = "diskstats"
+			self._read = self._readDiskTicks
+		else:
+			self.source = None
+			self._read = lambda: None
+		self._last = None
+
+	def _readPsiTotal(self):
+		"""Microseconds some task spent stalled on I/O, in total."""
+		try:
+			with open(PSI_IO_PATH, "r") as psiFile:
+				for line in psiFile:
+					if line.startswith("some "):
+						return {"": int(line.rpartition("total=")[2])}
+		except (OSError, ValueError):
+			return None
+		return None
+
+	def _readDiskTicks(self):
+		"""Milliseconds every disk spent doing I/O, in total, by disk name."""
+		try:
+			disks = set([name for name in os.listdir(SYS_BLOCK_PATH)\
+				if not name.startswith(("loop", "ram", "zram"))])
+			ticks = {}
+			with open(DISKSTATS_PATH, "r") as diskstatsFile:
+				for line in diskstatsFile:
+					fields = line.split()
+					if len(fields) > 12 and fields[2] in disks:
+						ticks[fields[2]] = int(fields[12])
+		except (OSError, ValueError):
+			return None
+		return ticks or None
+
+	def sample(self):
+		"""Pressure in percent since the last sample."""
+		if self.source is None:
+			return 0.0
+		if self._last is None or time.monotonic()-self._last[0] < self.minWindow:
+			if self._last is None:
+				self._last = (time.monotonic(), self._read())
+			time.sleep(max(0, self.minWindow-(time.monotonic()-self._last[0])))
+		now, counters = time.monotonic(), self._read()
+		lastTime, lastCounters = self._last
+		self._last = (now, counters)
+		if counters is None or lastCounters is None:
+			return 0.0
+		# PSI counts microseconds, diskstats milliseconds.
+		scale = 1e6 if self.source == "psi" else 1e3
+		elapsed = (now-lastTime)*scale
+		return min(100.0, max([(counters[key]-lastCounters.get(key, counters[key]))/elapsed*100\
+			for key in counters]))
+
+#==========================================================
+# Running
+#==========================================================
+
+#==========================================================
+class StaggeredRunner(object):
+
+	#=============================
+	"""Runs an operation on many items with bounded concurrency and I/O aware admission.
+
+	Takes:
+		- operation (callable): Called with an item. Expected to return only once
+		  the I/O heavy part is over, e.g. once a started daemon is ready.
+		- maxConcurrency (int): How many operations may run at once.
+		- maxIoPressure (float): Percentage of I/O pressure (see IoPressureProbe)
+		  up to which further operations are admitted. None to ignore pressure.
+		- minInterval (float): Seconds between admissions, so the pressure caused
+		  by the previous one has time to show.
+		- ioPressureProbe (IoPressureProbe): Defaults to a new one.
+
+	An operation is always admitted if none is running, so high pressure caused
+	by something else slows us down, but doesn't stall us.
+
+	.run(items) is a generator yielding a StaggeredResult for every item, as the
+	operations finish. Exceptions raised by operations end up in the results."""
+	#=============================
+
+	def __init__(self, operation, maxConcurrency=4, maxIoPressure=50.0, minInterval=1.0,\
+		ioPressureProbe=None, pollInterval=0.5):
+		self.operation = operation
+		self.maxConcurrency = max(1, int(maxConcurrency))
+		self.maxIoPressure = maxIoPressure
+		self.minInterval = minInterval
+		self.pollInterval = pollInterval
+		self.ioPressureProbe = IoPressureProbe() if ioPressureProbe is None else ioPressureProbe
+		self.lastPressure = None
+
+	def _timed(self, item, waited):
+		startTime = time.monotonic()
+		try:
+			value, error = self.operation(item), None
+		except Exception as exception:
+			value, error = None, exception
+		return StaggeredResult(item=item, value=value, error=error,\
+			duration=time.monotonic()-startTime, waited=waited)
+
+	def _admissible(self, running):
+		if running == 0:
+			return True
+		if running >= self.maxConcurrency:
+			return False
+		if self.maxIoPressure is None:
+			return True
+		self.lastPressure = self.ioPressureProbe.sample()
+		return self.lastPressure <= self.maxIoPressure
+
+	def run(self, items):
+		pending = list(items)
+		running = set()
+		lastAdmissionTime = None
+		with ThreadPoolExecutor(max_workers=self.maxConcurrency) as executor:
+			waitStartTime = time.monotonic()
+			while len(pending) > 0 or len(running) > 0:
+				if len(pending) > 0:
+					sinceLast = None if lastAdmissionTime is None else time.monotonic()-lastAdmissionTime
+					if (sinceLast is None or sinceLast >= self.minInterval or len(running) == 0)\
+						and self._admissible(len(running)):
+						now = time.monotonic()
+						running.add(executor.submit(self._timed, pending.pop(0), now-waitStartTime))
+						lastAdmissionTime = now
+						waitStartTime = now
+						continue
+					if not sinceLast is None and sinceLast < self.minInterval:
+						timeout = self.minInterval-sinceLast
+					else:
+						timeout = self.pollInterval # Under pressure or at maxConcurrency.
+				else:
+					timeout = None
+				done, notDone = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+				running = set(notDone)
+				for future in done:
+					yield future.result()
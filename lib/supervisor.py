@@ -0,0 +1,583 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""Running daemons as children of one long-running process.
+
+Started with -daemon, a daemon detaches, and whether it's still running, under which
+pid, and whether it crashed can only be found out by looking for it. Supervisor
+starts the daemons in the foreground instead, as its own children, and learns about
+their exit the moment it happens: Through a pidfd per child where the kernel has them
+(Linux 5.3+), through SIGCHLD otherwise. Daemons running already, e.g. children of a
+previous supervisor, are adopted and watched the same way, though their exit status
+can't be known. A daemon that crashes is started again,
+waiting longer after every crash in a row, so one that can't start doesn't spin.
+Other processes get the state of all daemons from a Unix socket, without looking
+for them, and can start, stop and restart them through it.
+
+The protocol of the socket: Connect, send one command line ("status", "start ID",
+"stop ID", "restart ID" or "shutdown"), get back one line of JSON, and the connection
+gets closed. Replies have "ok" set to true or false, with "error" telling why for
+the latter; "status" replies have "children", the state of every child by id."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from collections import namedtuple, OrderedDict
+import json
+import os
+import selectors
+import signal
+import socket
+import subprocess
+import threading
+import time
+
+# Local
+from lib.exceptions import Error
+
+#=======================================================================================
+# Datatypes
+#=======================================================================================
+
+# kind: "started", "adopted" (running already, but not as our child), "exited", "backoff"
+# (waiting to restart), "failed" (couldn't be started), "listening" or "shutdown". id: Child
+# id, None for events about the supervisor. detail: Pid, exit status, delay or the like.
+SupervisorEvent = namedtuple("SupervisorEvent", "kind id detail")
+
+#=======================================================================================
+# Configuration
+#=======================================================================================
+
+_REQUEST_TIMEOUT = 1.0
+_MAX_REQUEST_SIZE = 4096
+# How much of what a child wrote to stderr last is kept, for .lastError.
+_STDERR_TAIL_SIZE = 2048
+
+# What AdoptedProcess.poll() returns for an exit, as the exit status is unknown.
+ADOPTED_EXIT = "unknown"
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Exceptions
+#==========================================================
+
+#==========================================================
+class SupervisorError(Error):
+	pass
+
+#==========================================================
+class SupervisorConnectionError(SupervisorError):
+	pass
+
+#==========================================================
+# Children
+#==========================================================
+
+def _processStartTime(pid):
+	"""When the process with pid started, in clock ticks after boot, or None if there's
+	no such process or it has exited. Tells a process apart from a later one with its pid."""
+	try:
+		with open("/proc/{0}/stat".format(pid), "rb") as statFile:
+			stat = statFile.read()
+	except (FileNotFoundError, ProcessLookupError):
+		return None
+	fields = stat[stat.rindex(b")")+2:].split()
+	if fields[0] == b"Z":
+		return None
+	return int(fields[19])
+
+#==========================================================
+class AdoptedProcess(object):
+
+	#=============================
+	"""A process we didn't start, watched in place of the subprocess.Popen of a child.
+
+	Takes:
+		- pid (int): Its pid.
+
+	Its exit status can't be learned, as only the parent gets that; .poll() returns
+	ADOPTED_EXIT once it's gone. Signals are only sent as long as it's the same
+	process, not one that got its pid later."""
+	#=============================
+
+	def __init__(self, pid):
+		self.pid = pid
+		self.startTime = _processStartTime(pid)
+		self.returncode = None
+
+	def poll(self):
+		if self.returncode is None and (self.startTime is None or not _processStartTime(self.pid) == self.startTime):
+			self.returncode = ADOPTED_EXIT
+		return self.returncode
+
+	def send_signal(self, signalNumber):
+		if self.poll() is None:
+			os.kill(self.pid, signalNumber)
+
+	def kill(self):
+		self.send_signal(signal.SIGKILL)
+
+#==========================================================
+class CrashLoopBackoff(object):
+
+	#=============================
+	"""How long to wait before starting a crashed child again.
+
+	Takes:
+		- initialDelay (float): Seconds to wait after the first crash.
+		- maxDelay (float): The delay doubles with every crash in a row up to this.
+		- resetAfter (float): A child that ran at least this many seconds before it
+		  crashed is considered to have been fine; the delay starts over."""
+	#=============================
+
+	def __init__(self, initialDelay=1.0, maxDelay=300.0, resetAfter=600.0):
+		self.initialDelay = initialDelay
+		self.maxDelay = maxDelay
+		self.resetAfter = resetAfter
+
+	def delay(self, crashesInARow):
+		return min(self.maxDelay, self.initialDelay*2**max(0, crashesInARow-1))
+
+#==========================================================
+class SupervisedChild(object):
+
+	#=============================
+	"""A daemon the supervisor keeps running.
+
+	Takes:
+		- id (string): Id of the child, e.g. that of the node.
+		- commandLine (list): Command line to start it with, in the foreground.
+		- findRunning (callable): Returns the pid of the daemon if it's running
+		  already, started by someone else (e.g. a previous supervisor), None if not.
+		  Such a daemon is adopted instead of starting another one. Optional.
+
+	.state is "stopped", "running", "backoff" (waiting to be started again after
+	a crash) or "failed". .adopted tells whether the running process isn't our
+	child. .lastError has what it wrote to stderr last, if it crashed."""
+	#=============================
+
+	def __init__(self, id, commandLine, findRunning=None):
+		self.id = id
+		self.commandLine = list(commandLine)
+		self.findRunning = findRunning
+		self.state = "stopped"
+		self.wanted = True
+		self.process = None
+		self.pidfd = None
+		self.stderrTail = b""
+		self.startTime = None
+		self.nextStartTime = None
+		self.crashesInARow = 0
+		self.restarts = 0
+		self.lastExit = None
+		self.lastError = None
+		self.stopDeadline = None
+
+	@property
+	def pid(self):
+		return None if self.process is None else self.process.pid
+
+	@property
+	def adopted(self):
+		return isinstance(self.process, AdoptedProcess)
+
+	@property
+	def status(self):
+		return OrderedDict([("state", self.state), ("pid", self.pid), ("adopted", self.adopted),\
+			("wanted", self.wanted),\
+			("uptime", None if self.startTime is None or self.process is None else time.time()-self.startTime),\
+			("restarts", self.restarts), ("crashesInARow", self.crashesInARow), ("lastExit", self.lastExit),\
+			("lastError", self.lastError),\
+			("nextStartIn", None if self.nextStartTime is None else max(0, self.nextStartTime-time.monotonic()))])
+
+#==========================================================
+# Supervisor
+#==========================================================
+
+#==========================================================
+class Supervisor(object):
+
+	#=============================
+	"""Starts daemons as its children, restarts them when they crash and tells about them.
+
+	Takes:
+		- children (list): SupervisedChild objects.
+		- socketPath (string): Path of the Unix socket to serve state on. None for none.
+		- backoff (CrashLoopBackoff): Defaults to a new one.
+		- stopTimeout (float): Seconds to wait for a child to exit after SIGTERM,
+		  before killing it.
+		- usePidfd (bool): Set to False to use SIGCHLD even if pidfds are available.
+
+	.run() is a generator yielding a SupervisorEvent for everything that happens,
+	until it's shut down through the socket, .shutdown() or SIGTERM/SIGINT.
+	Then, the children are stopped with SIGTERM (which daemons take as a request
+	to shut down cleanly) and run() returns once they've all exited.
+
+	A child exiting with status 0 is taken to have been stopped on purpose, e.g.
+	through "cli stop", and isn't started again. Any other exit is a crash, as is
+	any exit of an adopted daemon, whose status we can't know. Children get sessions
+	of their own, so they outlive a supervisor that gets killed; the next one adopts
+	them (see SupervisedChild). What children write to stderr is read, the tail of
+	it kept for their status; a daemon that can't start says why there."""
+	#=============================
+
+	def __init__(self, children, socketPath=None, backoff=None, stopTimeout=180.0, usePidfd=True):
+		self.children = OrderedDict([(child.id, child) for child in children])
+		self.socketPath = None if socketPath is None else str(socketPath)
+		self.backoff = CrashLoopBackoff() if backoff is None else backoff
+		self.stopTimeout = stopTimeout
+		self.usePidfd = usePidfd and hasattr(os, "pidfd_open")
+		self.shuttingDown = False
+		self._selector = None
+		self._events = []
+		self._wakeupReader = None
+		self._wakeupWriter = None
+
+	def shutdown(self):
+		self.shuttingDown = True
+		if not self._wakeupWriter is None:
+			try:
+				self._wakeupWriter.send(b"\0")
+			except OSError:
+				pass
+
+	def _event(self, kind, id=None, detail=None):
+		self._events.append(SupervisorEvent(kind, id, detail))
+
+	#=============================
+	# Children
+
+	def _watch(self, child):
+		"""Learn about the exit of child's process through a pidfd if we can; children
+		without one are polled (see ._timeout)."""
+		child.state = "running"
+		child.startTime = time.time()
+		child.stopDeadline = None
+		if self.usePidfd:
+			try:
+				child.pidfd = os.pidfd_open(child.process.pid)
+				self._selector.register(child.pidfd, selectors.EVENT_READ, ("child", child))
+			except OSError:
+				child.pidfd = None
+
+	def _spawn(self, child):
+		child.nextStartTime = None
+		pid = None if child.findRunning is None else child.findRunning()
+		if not pid is None:
+			child.process = AdoptedProcess(pid)
+			self._watch(child)
+			self._event("adopted", child.id, pid)
+			return
+		try:
+			child.process = subprocess.Popen(child.commandLine, stdin=subprocess.DEVNULL,\
+				stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, start_new_session=True)
+		except OSError as error:
+			child.state = "failed"
+			child.lastError = str(error)
+			self._event("failed", child.id, str(error))
+			return
+		child.stderrTail = b""
+		os.set_blocking(child.process.stderr.fileno(), False)
+		self._selector.register(child.process.stderr, selectors.EVENT_READ, ("stderr", child))
+		self._watch(child)
+		self._event("started", child.id, child.process.pid)
+
+	def _readStderr(self, child, stream):
+		"""Read what's there from the stderr pipe of child, keeping the tail of it."""
+		try:
+			while True:
+				data = os.read(stream.fileno(), 65536)
+				if not data:
+					break
+				child.stderrTail = (child.stderrTail+data)[-_STDERR_TAIL_SIZE:]
+		except BlockingIOError:
+			return # Nothing more for now.
+		except OSError:
+			pass
+		self._selector.unregister(stream)
+		stream.close()
+
+	def _exitStatus(self, returnCode):
+		if returnCode == ADOPTED_EXIT:
+			return "exited (adopted, status unknown)"
+		if returnCode < 0:
+			return "killed by {0}".format(signal.Signals(-returnCode).name)
+		return "exit status {0}".format(returnCode)
+
+	def _reap(self, child):
+		"""Handle the exit of child, if it exited."""
+		if child.process is None or child.process.poll() is None:
+			return
+		returnCode = child.process.returncode
+		uptime = time.time()-child.startTime
+		child.lastExit = self._exitStatus(returnCode)
+		if not child.adopted and not child.process.stderr.closed:
+			self._readStderr(child, child.process.stderr)
+		if not returnCode == 0 and len(child.stderrTail.strip()) > 0:
+			child.lastError = child.stderrTail.decode(errors="replace").strip()
+		child.process = None
+		if not child.pidfd is None:
+			self._selector.unregister(child.pidfd)
+			os.close(child.pidfd)
+			child.pidfd = None
+		self._event("exited", child.id, child.lastExit)
+		stopRequested = not child.stopDeadline is None
+		child.stopDeadline = None
+		if stopRequested and child.wanted and not self.shuttingDown:
+			child.crashesInARow = 0
+			self._spawn(child) # Restart.
+			return
+		if self.shuttingDown or not child.wanted or returnCode == 0:
+			if not stopRequested:
+				child.wanted = False # Stopped through its own means, e.g. "cli stop".
+			child.state = "stopped"
+			child.crashesInARow = 0
+			return
+		child.crashesInARow = 1 if uptime >= self.backoff.resetAfter else child.crashesInARow+1
+		delay = self.backoff.delay(child.crashesInARow)
+		child.state = "backoff"
+		child.restarts += 1
+		child.nextStartTime = time.monotonic()+delay
+		self._event("backoff", child.id, delay)
+
+	def _terminate(self, child):
+		if child.process is None or not child.stopDeadline is None:
+			return
+		child.stopDeadline = time.monotonic()+self.stopTimeout
+		try:
+			child.process.send_signal(signal.SIGTERM)
+		except ProcessLookupError:
+			pass
+
+	def _checkStopDeadlines(self):
+		for child in self.children.values():
+			if not child.process is None and not child.stopDeadline is None\
+				and time.monotonic() > child.stopDeadline:
+				child.process.kill()
+				child.stopDeadline = time.monotonic()+self.stopTimeout
+
+	#=============================
+	# Requests
+
+	def _handleRequest(self, request):
+		words = request.split()
+		if len(words) == 0:
+			return {"ok": False, "error": "Empty request."}
+		command, arguments = words[0], words[1:]
+		if command == "status":
+			return OrderedDict([("ok", True), ("pid", os.getpid()),\
+				("children", OrderedDict([(id, child.status) for id, child in self.children.items()]))])
+		if command == "shutdown":
+			self.shutdown()
+			return {"ok": True}
+		if not command in ("start", "stop", "restart"):
+			return {"ok": False, "error": "Unknown command: {0}".format(command)}
+		if len(arguments) != 1 or not arguments[0] in self.children:
+			return {"ok": False, "error": "{command} takes the id of one of: {ids}"\
+				.format(command=command, ids=", ".join(self.children.keys()))}
+		child = self.children[arguments[0]]
+		if command == "stop":
+			child.wanted = False
+			child.nextStartTime = None
+			if child.process is None:
+				child.state = "stopped"
+			self._terminate(child)
+		elif command == "start":
+			child.wanted = True
+			child.crashesInARow = 0
+			if child.process is None:
+				self._spawn(child)
+		elif command == "restart":
+			child.wanted = True
+			child.crashesInARow = 0
+			if child.process is None:
+				self._spawn(child)
+			else:
+				self._terminate(child)
+		return OrderedDict([("ok", True), ("child", child.status)])
+
+	def _serve(self, listener):
+		try:
+			connection, address = listener.accept()
+		except BlockingIOError:
+			return
+		with connection:
+			connection.settimeout(_REQUEST_TIMEOUT)
+			try:
+				data = b""
+				while not b"\n" in data and len(data) < _MAX_REQUEST_SIZE:
+					chunk = connection.recv(_MAX_REQUEST_SIZE)
+					if not chunk:
+						break
+					data += chunk
+				reply = self._handleRequest(data.decode(errors="replace").strip())
+				connection.sendall((json.dumps(reply)+"\n").encode())
+			except OSError:
+				pass
+
+	def _listen(self):
+		if self.socketPath is None:
+			return None
+		if SupervisorClient(self.socketPath, timeout=1.0).available:
+			raise SupervisorError("Another supervisor is listening on {path} already.".format(path=self.socketPath))
+		if os.path.exists(self.socketPath):
+			os.unlink(self.socketPath) # Left behind by a supervisor that's gone.
+		listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		listener.bind(self.socketPath)
+		os.chmod(self.socketPath, 0o600)
+		listener.listen(16)
+		listener.setblocking(False)
+		return listener
+
+	#=============================
+	# Main loop
+
+	def _timeout(self):
+		deadlines = [child.nextStartTime for child in self.children.values() if not child.nextStartTime is None]
+		deadlines += [child.stopDeadline for child in self.children.values() if not child.stopDeadline is None\
+			and not child.process is None]
+		if any([not child.process is None and child.pidfd is None for child in self.children.values()]):
+			deadlines.append(time.monotonic()+1.0) # Don't rely on SIGCHLD alone; adopted ones don't send it.
+		if len(deadlines) == 0:
+			return None
+		return max(0, min(deadlines)-time.monotonic())
+
+	def run(self):
+		self._selector = selectors.DefaultSelector()
+		self._wakeupReader, self._wakeupWriter = socket.socketpair()
+		self._wakeupReader.setblocking(False)
+		self._wakeupWriter.setblocking(False)
+		self._selector.register(self._wakeupReader, selectors.EVENT_READ, ("wakeup", None))
+		# Signals can only be handled in the main thread. Elsewhere, SIGCHLD is replaced
+		# by checking on the children every second (see ._timeout), and it's up to the
+		# caller to call .shutdown().
+		handleSignals = threading.current_thread() is threading.main_thread()
+		previousHandlers = {}
+		if handleSignals:
+			previousWakeupFd = signal.set_wakeup_fd(self._wakeupWriter.fileno())
+			for signalNumber in (signal.SIGTERM, signal.SIGINT):
+				previousHandlers[signalNumber] = signal.signal(signalNumber, lambda number, frame: self.shutdown())
+			# SIGCHLD needs a handler other than the default for the wakeup fd to get it.
+			previousHandlers[signal.SIGCHLD] = signal.signal(signal.SIGCHLD, lambda number, frame: None)
+		listener = None
+		try:
+			listener = self._listen()
+			if not listener is None:
+				self._selector.register(listener, selectors.EVENT_READ, ("listener", listener))
+				self._event("listening", None, self.socketPath)
+			for child in self.children.values():
+				self._spawn(child)
+			while True:
+				yield from self._flushEvents()
+				if self.shuttingDown:
+					for child in self.children.values():
+						child.nextStartTime = None
+						self._terminate(child)
+					if all([child.process is None for child in self.children.values()]):
+						break
+				for key, mask in self._selector.select(self._timeout()):
+					kind, target = key.data
+					if kind == "child":
+						self._reap(target)
+					elif kind == "stderr":
+						self._readStderr(target, key.fileobj)
+					elif kind == "listener":
+						self._serve(target)
+					else:
+						try:
+							while self._wakeupReader.recv(4096):
+								pass
+						except BlockingIOError:
+							pass
+				for child in self.children.values():
+					if child.pidfd is None:
+						self._reap(child)
+				now = time.monotonic()
+				for child in self.children.values():
+					if not child.nextStartTime is None and now >= child.nextStartTime and not self.shuttingDown:
+						self._spawn(child)
+				self._checkStopDeadlines()
+			self._event("shutdown")
+			yield from self._flushEvents()
+		finally:
+			if handleSignals:
+				for signalNumber, handler in previousHandlers.items():
+					signal.signal(signalNumber, handler)
+				signal.set_wakeup_fd(previousWakeupFd)
+			if not listener is None:
+				listener.close()
+				try:
+					os.unlink(self.socketPath)
+				except FileNotFoundError:
+					pass
+			self._selector.close()
+			self._wakeupReader.close()
+			self._wakeupWriter.close()
+			self._wakeupWriter = None
+
+	def _flushEvents(self):
+		events, self._events = self._events, []
+		return iter(events)
+
+#==========================================================
+# Client
+#==========================================================
+
+#==========================================================
+class SupervisorClient(object):
+
+	#=============================
+	"""Talks to a Supervisor through its socket.
+
+	Takes:
+		- socketPath (string): Path of the supervisor's socket.
+		- timeout (float): Seconds to wait for a reply.
+
+	.request(command) returns the reply, raising SupervisorConnectionError if
+	there's no supervisor, SupervisorError if it says the request failed."""
+	#=============================
+
+	def __init__(self, socketPath, timeout=5.0):
+		self.socketPath = str(socketPath)
+		self.timeout = timeout
+
+	@property
+	def available(self):
+		try:
+			self.request("status")
+		except SupervisorError:
+			return False
+		return True
+
+	def request(self, command):
+		try:
+			with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+				connection.settimeout(self.timeout)
+				connection.connect(self.socketPath)
+				connection.sendall((command+"\n").encode())
+				data = b""
+				while not data.endswith(b"\n"):
+					chunk = connection.recv(65536)
+					if not chunk:
+						break
+					data += chunk
+		except OSError as error:
+			raise SupervisorConnectionError("No supervisor reachable through {path}: {error}"\
+				.format(path=self.socketPath, error=error))
+		try:
+			reply = json.loads(data.decode(), object_pairs_hook=OrderedDict)
+		except ValueError:
+			raise SupervisorConnectionError("Garbled reply from the supervisor at {path}.".format(path=self.socketPath))
+		if not reply.get("ok"):
+			raise SupervisorError(reply.get("error", "The supervisor refused: {0}".format(command)))
+		return reply
+
+	def status(self):
+		"""The status of every child by id."""
+		return self.request("status")["children"]
@@ -0,0 +1,232 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""Sync progress of a node, as told by the UpdateTip lines of its debug.log.
+
+While a node syncs or reindexes, it logs a line like this for every block:
+
+	2018-05-01 12:00:00 UpdateTip: new best=00000000000000000012... height=522000
+	version=0x20000000 log2_work=88.99 tx=310000000 date='2018-05-01 11:59:50'
+	progress=0.999998 cache=412.3MiB(3051020txo)
+
+SyncProgressTracker reads the lines appended since it last ran and keeps a compact
+time series of height, progress, transaction count and cache size, in a file next to
+the log. Rates and an ETA come from that, without asking the node anything, so it
+works even while RPC only answers "Loading block index..." (-28)."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from collections import namedtuple
+import math
+import os
+import re
+import struct
+
+# Local
+from lib.exceptions import Error
+from lib.logs import LogReader, parseLogTime
+
+#=======================================================================================
+# Datatypes
+#=======================================================================================
+
+# time: Log time in seconds since the epoch. height: Block height. progress: Estimated
+# share of the chain verified, 0 to 1. tx: Transactions in the chain up to the block.
+# cache: Size of the coins cache in MiB, None if the line doesn't tell.
+TipUpdate = namedtuple("TipUpdate", "time height progress tx cache")
+
+# height, progress, tx, cache: Those of the latest TipUpdate. blocksPerSecond and
+# txPerSecond: Rates over the window. eta: Seconds until progress reaches 1, None
+# if it can't be told. synced: Whether progress is (close enough to) 1.
+SyncEstimate = namedtuple("SyncEstimate", "time height progress tx cache blocksPerSecond txPerSecond eta synced")
+
+#=======================================================================================
+# Configuration
+#=======================================================================================
+
+UPDATE_TIP_FRAGMENT = "UpdateTip: "
+UPDATE_TIP_FIELD_PATTERN = re.compile(r"(height|tx|progress|cache)=([0-9.]+)(MiB|MB)?")
+
+PROGRESS_MAGIC = b"BTSYNC01"
+
+# Magic, inode of the log, offset read up to.
+_HEADER = struct.Struct("<8sQQ")
+# time, height, progress, tx, cache (NaN if unknown).
+_SAMPLE = struct.Struct("<dIdQf")
+
+# What counts as synced; verification progress never quite reaches 1.
+SYNCED_PROGRESS = 0.99999
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Exceptions
+#==========================================================
+
+#==========================================================
+class SyncProgressError(Error):
+	pass
+
+#==========================================================
+# Functions
+#==========================================================
+
+def parseUpdateTip(line):
+	"""TipUpdate of an UpdateTip log line, or None for other lines."""
+	position = line.find(UPDATE_TIP_FRAGMENT)
+	if position < 0:
+		return None
+	fields = {}
+	for name, value, unit in UPDATE_TIP_FIELD_PATTERN.findall(line, position):
+		fields[name] = (value, unit)
+	if not "height" in fields or not "progress" in fields:
+		return None
+	logTime = parseLogTime(line)
+	if logTime is None:
+		return None
+	cache = None
+	if "cache" in fields and fields["cache"][1]:
+		cache = float(fields["cache"][0])
+	return TipUpdate(time=logTime, height=int(fields["height"][0]), progress=float(fields["progress"][0]),\
+		tx=int(fields["tx"][0]) if "tx" in fields else 0, cache=cache)
+
+def estimate(samples, window=600):
+	"""SyncEstimate from TipUpdates in chronological order, with rates over the last window
+	seconds (or what's there of them), or None if there are no samples."""
+	if len(samples) == 0:
+		return None
+	latest = samples[-1]
+	earliest = latest
+	for sample in reversed(samples):
+		if latest.time-sample.time > window:
+			break
+		earliest = sample
+	synced = latest.progress >= SYNCED_PROGRESS
+	elapsed = latest.time-earliest.time
+	if elapsed <= 0:
+		return SyncEstimate(time=latest.time, height=latest.height, progress=latest.progress, tx=latest.tx,\
+			cache=latest.cache, blocksPerSecond=None, txPerSecond=None, eta=0.0 if synced else None, synced=synced)
+	progressPerSecond = (latest.progress-earliest.progress)/elapsed
+	if synced:
+		eta = 0.0
+	elif progressPerSecond > 0:
+		eta = (1-latest.progress)/progressPerSecond
+	else:
+		eta = None
+	return SyncEstimate(time=latest.time, height=latest.height, progress=latest.progress, tx=latest.tx,\
+		cache=latest.cache, blocksPerSecond=(latest.height-earliest.height)/elapsed,\
+		txPerSecond=(latest.tx-earliest.tx)/elapsed, eta=eta, synced=synced)
+
+#==========================================================
+# Tracking
+#==========================================================
+
+#==========================================================
+class SyncProgressTracker(object):
+
+	#=============================
+	"""Keeps a time series of the UpdateTip lines of a log in a file.
+
+	Takes:
+		- logPath (string): Path of the log file.
+		- progressPath (string): Path of the time series file. Defaults to the
+		  log's path with ".progress" appended.
+		- resolution (float): Keep at most one sample per this many seconds.
+		- maxSamples (int): Once there are more samples, the older half is dropped.
+		- maxCatchUp (int): Read at most this many bytes of log per update. If more
+		  got appended since the last one (or on the first one), what's before gets
+		  skipped, so a huge log doesn't get read through.
+
+	.update() reads what got appended to the log and returns the samples, a list
+	of TipUpdate. .estimate(window) updates, then returns the SyncEstimate."""
+	#=============================
+
+	def __init__(self, logPath, progressPath=None, resolution=10.0, maxSamples=50000, maxCatchUp=32 << 20):
+		self.logPath = str(logPath)
+		self.progressPath = "{0}.progress".format(self.logPath) if progressPath is None else str(progressPath)
+		self.resolution = resolution
+		self.maxSamples = maxSamples
+		self.maxCatchUp = maxCatchUp
+		self.samples = []
+		self._reader = LogReader(self.logPath)
+		self._savedSampleCount = 0
+		self._load()
+
+	def _load(self):
+		try:
+			with open(self.progressPath, "rb") as progressFile:
+				data = progressFile.read()
+		except FileNotFoundError:
+			return
+		if len(data) < _HEADER.size:
+			return
+		magic, inode, offset = _HEADER.unpack_from(data)
+		if not magic == PROGRESS_MAGIC:
+			return
+		sampleData = data[_HEADER.size:]
+		sampleData = sampleData[:len(sampleData)-len(sampleData)%_SAMPLE.size]
+		self.samples = [TipUpdate(time, height, progress, tx, None if math.isnan(cache) else cache)\
+			for time, height, progress, tx, cache in _SAMPLE.iter_unpack(sampleData)]
+		self._savedSampleCount = len(self.samples)
+		self._reader.seek(offset, inode)
+
+	def _save(self):
+		packed = lambda sample: _SAMPLE.pack(sample.time, sample.height, sample.progress, sample.tx,\
+			float("nan") if sample.cache is None else sample.cache)
+		try:
+			exists = os.path.exists(self.progressPath)
+			with open(self.progressPath, "r+b" if exists else "w+b") as progressFile:
+				firstNew = self._savedSampleCount if exists else 0
+				progressFile.seek(_HEADER.size+firstNew*_SAMPLE.size)
+				progressFile.write(b"".join([packed(sample) for sample in self.samples[firstNew:]]))
+				progressFile.truncate()
+				progressFile.seek(0)
+				progressFile.write(_HEADER.pack(PROGRESS_MAGIC, self._reader.inode or 0, self._reader.completeOffset))
+		except OSError as error:
+			raise SyncProgressError("Can't write sync progress to {path}: {error}"\
+				.format(path=self.progressPath, error=error))
+		self._savedSampleCount = len(self.samples)
+
+	def _add(self, tipUpdate):
+		if len(self.samples) > 0:
+			if tipUpdate.time < self.samples[-1].time:
+				return
+			if tipUpdate.time-self.samples[-1].time < self.resolution and len(self.samples) > 1\
+				and self.samples[-1].time-self.samples[-2].time < self.resolution:
+				# Replace the latest sample, so the latest state is always there.
+				self.samples[-1] = tipUpdate
+				self._savedSampleCount = min(self._savedSampleCount, len(self.samples)-1)
+				return
+		self.samples.append(tipUpdate)
+
+	def update(self):
+		try:
+			stat = os.stat(self.logPath)
+		except FileNotFoundError:
+			return self.samples
+		offset = self._reader.offset if stat.st_ino == self._reader.inode and stat.st_size >= self._reader.offset\
+			else 0
+		if stat.st_size-offset > self.maxCatchUp:
+			with open(self.logPath, "rb") as logFile:
+				logFile.seek(stat.st_size-self.maxCatchUp)
+				logFile.readline() # Probably cut off.
+				self._reader.seek(logFile.tell(), os.fstat(logFile.fileno()).st_ino)
+		for line in self._reader.readLines():
+			if UPDATE_TIP_FRAGMENT in line:
+				tipUpdate = parseUpdateTip(line)
+				if not tipUpdate is None:
+					self._add(tipUpdate)
+		if len(self.samples) > self.maxSamples:
+			self.samples = self.samples[len(self.samples)//2:]
+			self._savedSampleCount = 0
+		self._save()
+		return self.samples
+
+	def estimate(self, window=600):
+		return estimate(self.update(), window=window)
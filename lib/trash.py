@@ -0,0 +1,338 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""Deleting large directory trees without waiting for it and without hogging the disk.
+
+Deleting the block data of a node takes minutes and a lot of I/O, on a disk other
+nodes are serving from. Instead, it's renamed into a trash directory on the same
+filesystem, which is instant and atomic, and TrashPurger deletes the contents of that
+directory in the background: At idle I/O priority, throttled to a number of bytes and
+files per second, truncating big files bit by bit before unlinking them, so the
+filesystem frees their extents gradually. Progress and errors are kept in a status
+file in the trash directory."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import argparse
+from collections import namedtuple
+import ctypes
+import ctypes.util
+import fcntl
+import json
+import os
+import platform
+import stat as statModule
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+# Local
+from lib.exceptions import Error
+from lib.filesystem import writeFileAtomically
+
+#=======================================================================================
+# Datatypes
+#=======================================================================================
+
+# files, bytes: How many files got deleted so far, and their size. errors: (path, message)
+# of what couldn't be deleted. pending: Trashed trees not purged yet. done: Whether
+# the purge is over.
+PurgeProgress = namedtuple("PurgeProgress", "files bytes errors pending done")
+
+#=======================================================================================
+# Configuration
+#=======================================================================================
+
+TRASH_DIR_NAME = ".trash"
+
+# Kept in the trash directory. Names starting with a dot are never purged.
+PURGE_STATUS_FILE_NAME = ".purge.json"
+PURGE_LOCK_FILE_NAME = ".purge.lock"
+
+# From <linux/ioprio.h>.
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_SET_SYSCALLS = {"x86_64": 251, "i386": 289, "i686": 289, "aarch64": 30, "armv7l": 314,\
+	"ppc64le": 273, "riscv64": 30}
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Exceptions
+#==========================================================
+
+#==========================================================
+class TrashError(Error):
+	pass
+
+#==========================================================
+# Functions
+#==========================================================
+
+def setIdleIoPriority():
+	"""Put the calling thread into the idle I/O scheduling class (like "ionice -c3"),
+	so it only gets disk time nobody else wants. Returns whether that worked; it
+	only has an effect with I/O schedulers that honour priorities (BFQ, CFQ)."""
+	syscallNumber = IOPRIO_SET_SYSCALLS.get(platform.machine())
+	libcName = ctypes.util.find_library("c")
+	if syscallNumber is None or libcName is None:
+		return False
+	libc = ctypes.CDLL(libcName, use_errno=True)
+	# A "who" of 0 means the calling thread.
+	return libc.syscall(syscallNumber, IOPRIO_WHO_PROCESS, 0, IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT) == 0
+
+#==========================================================
+# Trash
+#==========================================================
+
+#==========================================================
+class TrashCan(object):
+	
+	#=============================
+	"""A trash directory, into which paths on the same filesystem are moved to be purged later.
+	
+	Takes:
+		- dirPath (string): Path of the trash directory. Created when needed.
+	
+	.put(path) renames path into the trash, under a unique name, and returns the new
+	path. Raises TrashError if path is on another filesystem (or is a mount point),
+	in which case it can't be trashed."""
+	#=============================
+	
+	def __init__(self, dirPath):
+		self.dirPath = str(dirPath)
+	
+	@property
+	def pending(self):
+		"""Names of the trashed trees not purged yet."""
+		try:
+			return sorted([name for name in os.listdir(self.dirPath) if not name.startswith(".")])
+		except FileNotFoundError:
+			return []
+	
+	@property
+	def status(self):
+		"""What's in the status file the last purge left, or None."""
+		try:
+			with open(os.path.join(self.dirPath, PURGE_STATUS_FILE_NAME), "r") as statusFile:
+				return json.load(statusFile)
+		except (OSError, ValueError):
+			return None
+	
+	def put(self, path):
+		path = str(path)
+		os.makedirs(self.dirPath, exist_ok=True)
+		trashedPath = os.path.join(self.dirPath, "{name}.{time}.{unique}".format(\
+			name=os.path.basename(path.rstrip(os.sep)), time=time.strftime("%Y%m%d%H%M%S"),\
+			unique=uuid.uuid4().hex[:8]))
+		try:
+			os.rename(path, trashedPath)
+		except OSError as error:
+			raise TrashError("Can't move {path} into the trash in {dirPath}: {error}"\
+				.format(path=path, dirPath=self.dirPath, error=error))
+		return trashedPath
+
+#==========================================================
+class TrashPurger(object):
+	
+	#=============================
+	"""Deletes what's in a trash directory, gently.
+	
+	Takes:
+		- dirPath (string): Path of the trash directory.
+		- maxBytesPerSecond (int): How fast to delete file contents. None for no limit.
+		- maxFilesPerSecond (int): How many files to delete per second. None for no limit.
+		- truncateStep (int): Files bigger than this are truncated by this many bytes
+		  at a time before being unlinked. Files with other hardlinks are never truncated,
+		  as that would destroy the data for the other links too.
+		- idle (bool): Whether to run at idle I/O priority.
+		- statusInterval (float): Seconds between updates of progress and status file.
+	
+	.purge() is a generator yielding PurgeProgress now and then and once it's done.
+	Errors don't stop the purge; they end up in the progress. Only one purger works on
+	a trash directory at a time; another one raises TrashError. Trees trashed while
+	one works get purged by it too. .start() purges in a thread, .detach() in a
+	process of its own that outlives ours."""
+	#=============================
+	
+	def __init__(self, dirPath, maxBytesPerSecond=64 << 20, maxFilesPerSecond=1000, truncateStep=16 << 20,\
+		idle=True, statusInterval=1.0):
+		self.trashCan = TrashCan(dirPath)
+		self.dirPath = self.trashCan.dirPath
+		self.maxBytesPerSecond = maxBytesPerSecond
+		self.maxFilesPerSecond = maxFilesPerSecond
+		self.truncateStep = truncateStep
+		self.idle = idle
+		self.statusInterval = statusInterval
+		self.files = 0
+		self.bytes = 0
+		self.errors = []
+		self._startTime = None
+		self._lastStatusTime = None
+	
+	@property
+	def progress(self):
+		return PurgeProgress(files=self.files, bytes=self.bytes, errors=list(self.errors),\
+			pending=len(self.trashCan.pending), done=False)
+	
+	def _throttle(self):
+		"""Sleep until the files and bytes deleted so far are within the limits."""
+		elapsed = time.monotonic()-self._startTime
+		behind = 0.0
+		if not self.maxBytesPerSecond is None:
+			behind = max(behind, self.bytes/self.maxBytesPerSecond-elapsed)
+		if not self.maxFilesPerSecond is None:
+			behind = max(behind, self.files/self.maxFilesPerSecond-elapsed)
+		if behind > 0:
+			time.sleep(behind)
+	
+	def _writeStatus(self, progress):
+		writeFileAtomically(os.path.join(self.dirPath, PURGE_STATUS_FILE_NAME), json.dumps({\
+			"pid": os.getpid(), "updated": time.time(), "files": progress.files, "bytes": progress.bytes,\
+			"errors": progress.errors[-20:], "pending": progress.pending, "done": progress.done}, indent="\t"))
+	
+	def _report(self, force=False):
+		"""The progress if it's time to report it, None otherwise."""
+		now = time.monotonic()
+		if not force and now-self._lastStatusTime < self.statusInterval:
+			return None
+		self._lastStatusTime = now
+		progress = self.progress
+		self._writeStatus(progress)
+		return progress
+	
+	def _deleteFile(self, path, stat):
+		size = stat.st_size if statModule.S_ISREG(stat.st_mode) else 0
+		if stat.st_nlink == 1 and size > self.truncateStep:
+			with open(path, "r+b") as bigFile:
+				while size > self.truncateStep:
+					size -= self.truncateStep
+					bigFile.truncate(size)
+					self.bytes += self.truncateStep
+					self._throttle()
+		os.unlink(path)
+		self.files += 1
+		self.bytes += size if stat.st_nlink == 1 else 0
+	
+	def _purgeTree(self, path):
+		"""Delete the tree at path, bottom up. Yields PurgeProgress now and then."""
+		try:
+			with os.scandir(path) as scan:
+				entries = list(scan)
+		except OSError as error:
+			self.errors.append((path, str(error)))
+			return
+		for entry in entries:
+			try:
+				if entry.is_dir(follow_symlinks=False):
+					yield from self._purgeTree(entry.path)
+				else:
+					self._deleteFile(entry.path, entry.stat(follow_symlinks=False))
+			except OSError as error:
+				self.errors.append((entry.path, str(error)))
+			self._throttle()
+			progress = self._report()
+			if not progress is None:
+				yield progress
+		try:
+			os.rmdir(path)
+		except OSError as error:
+			self.errors.append((path, str(error)))
+	
+	def _unattempted(self, attempted):
+		"""Names of the pending trees we haven't tried to purge yet."""
+		return [name for name in self.trashCan.pending if not name in attempted]
+	
+	def purge(self):
+		os.makedirs(self.dirPath, exist_ok=True)
+		# What couldn't be deleted stays pending, so we remember what we tried.
+		attempted = set()
+		while True:
+			with open(os.path.join(self.dirPath, PURGE_LOCK_FILE_NAME), "a") as lockFile:
+				try:
+					fcntl.flock(lockFile.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+				except BlockingIOError:
+					if self._startTime is None:
+						raise TrashError("{dirPath} is being purged already.".format(dirPath=self.dirPath))
+					break # Another purger took over; it purges what's pending now.
+				if self._startTime is None:
+					if self.idle:
+						setIdleIoPriority()
+					self._startTime = time.monotonic()
+					self._lastStatusTime = self._startTime
+				# What's trashed while we purge would find the lock taken and be left to us.
+				names = self._unattempted(attempted)
+				while len(names) > 0:
+					for name in names:
+						attempted.add(name)
+						path = os.path.join(self.dirPath, name)
+						if os.path.isdir(path) and not os.path.islink(path):
+							yield from self._purgeTree(path)
+						else:
+							try:
+								self._deleteFile(path, os.lstat(path))
+							except OSError as error:
+								self.errors.append((path, str(error)))
+					names = self._unattempted(attempted)
+				self._writeStatus(self.progress._replace(done=True))
+			# Something trashed between our last look and letting go of the lock, too.
+			if len(self._unattempted(attempted)) == 0:
+				break
+		yield self.progress._replace(done=True)
+	
+	def _exhaust(self):
+		try:
+			for progress in self.purge():
+				pass
+		except TrashError:
+			pass
+	
+	def start(self):
+		"""Purge in a daemon thread, which is returned."""
+		thread = threading.Thread(target=self._exhaust, name="TrashPurger", daemon=True)
+		thread.start()
+		return thread
+	
+	def detach(self):
+		"""Purge in a process of its own ("python -m lib.trash"), in a session of its own,
+		so it keeps going after we exit. Returns the subprocess.Popen of it.
+		A new interpreter rather than a fork, as we may have threads, whose locks a
+		forked child could never acquire."""
+		commandLine = [sys.executable, "-m", "lib.trash", self.dirPath, "--truncate-step", str(self.truncateStep)]
+		for option, value in (("--max-bytes-per-second", self.maxBytesPerSecond),\
+				("--max-files-per-second", self.maxFilesPerSecond)):
+			if not value is None:
+				commandLine += [option, str(value)]
+		if not self.idle:
+			commandLine.append("--not-idle")
+		return subprocess.Popen(commandLine, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),\
+			stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+#=======================================================================================
+# Command line
+#=======================================================================================
+
+def main(arguments):
+	"""Purge the trash directory named on the command line, as TrashPurger.detach does."""
+	parser = argparse.ArgumentParser(description="Purge a trash directory gently.")
+	parser.add_argument("dirPath", help="The trash directory.")
+	parser.add_argument("--max-bytes-per-second", dest="maxBytesPerSecond", type=int, default=None)
+	parser.add_argument("--max-files-per-second", dest="maxFilesPerSecond", type=int, default=None)
+	parser.add_argument("--truncate-step", dest="truncateStep", type=int, default=16 << 20)
+	parser.add_argument("--not-idle", dest="idle", action="store_false")
+	args = parser.parse_args(arguments)
+	os.nice(10)
+	TrashPurger(args.dirPath, maxBytesPerSecond=args.maxBytesPerSecond, maxFilesPerSecond=args.maxFilesPerSecond,\
+		truncateStep=args.truncateStep, idle=args.idle)._exhaust()
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
@@ -0,0 +1,255 @@
+#-*- coding: utf-8 -*-
+
+#=======================================================================================
+"""Watching the filesystem for changes.
+
+On Linux, this uses inotify through ctypes, so we don't have to pull in any
+third party dependencies. Where inotify isn't available (other platforms, exhausted
+watch limits and such), PathWatcher falls back to waking up in regular intervals,
+which is why callers are expected to re-check whatever state they're interested in
+whenever it wakes them up, instead of relying on the events themselves."""
+#=======================================================================================
+
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from collections import namedtuple
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+
+# Local
+from lib.exceptions import Error
+
+#=======================================================================================
+# Datatypes
+#=======================================================================================
+
+InotifyEvent = namedtuple("InotifyEvent", "watch mask cookie name path")
+
+#=======================================================================================
+# Configuration
+#=======================================================================================
+
+# From <sys/inotify.h>.
+IN_ACCESS = 0x00000001
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+# Everything that changes what's in a directory or the contents of a file in it.
+IN_CHANGES = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO\
+	| IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 65536
+
+#=======================================================================================
+# Library
+#=======================================================================================
+
+#==========================================================
+# Exceptions
+#==========================================================
+
+#==========================================================
+class InotifyUnavailableError(Error):
+	pass
+
+#==========================================================
+# Inotify
+#==========================================================
+
+#==========================================================
+class Inotify(object):
+
+	#=============================
+	"""A thin ctypes wrapper around an inotify instance.
+
+	Raises InotifyUnavailableError upon instantiation if inotify can't be used.
+
+	Add watches with .addWatch(path, mask) and get events using .read(timeout),
+	which returns a list of InotifyEvent, with .path being the watched path
+	the event is about and .name the name of the file in it, if applicable.
+	Can be used with select and selectors through .fileno()."""
+	#=============================
+
+	_libc = None
+
+	def __init__(self):
+		libc = type(self)._loadLibc()
+		self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+		if self.fd < 0:
+			raise InotifyUnavailableError("inotify_init1 failed: {error}"\
+				.format(error=os.strerror(ctypes.get_errno())))
+		self.watches = {}
+
+	@classmethod
+	def _loadLibc(cls):
+		if cls._libc is None:
+			try:
+				libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+				libc.inotify_init1.argtypes = [ctypes.c_int]
+				libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+				libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+			except (OSError, AttributeError) as error:
+				raise InotifyUnavailableError("inotify isn't available: {error}".format(error=error))
+			cls._libc = libc
+		return cls._libc
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+	def fileno(self):
+		return self.fd
+
+	def close(self):
+		if self.fd >= 0:
+			os.close(self.fd)
+			self.fd = -1
+			self.watches = {}
+
+	def addWatch(self, path, mask=IN_CHANGES):
+		"""Watch the specified path for the events in mask. Returns the watch descriptor.
+		Raises InotifyUnavailableError if the watch couldn't be added."""
+		watch = type(self)._libc.inotify_add_watch(self.fd, os.fsencode(str(path)), mask)
+		if watch < 0:
+			raise InotifyUnavailableError("Couldn't watch {path}: {error}"\
+				.format(path=path, error=os.strerror(ctypes.get_errno())))
+		self.watches[watch] = str(path)
+		return watch
+
+	def removeWatch(self, watch):
+		type(self)._libc.inotify_rm_watch(self.fd, watch)
+		self.watches.pop(watch, None)
+
+	def read(self, timeout=None):
+		"""Wait for up to timeout seconds for events and return them as a list of InotifyEvent.
+		Returns an empty list if there were none. If timeout is None, waits indefinitely."""
+		try:
+			readable = select.select([self.fd], [], [], timeout)[0]
+		except InterruptedError:
+			return []
+		if not readable:
+			return []
+		try:
+			data = os.read(self.fd, _READ_SIZE)
+		except BlockingIOError:
+			return []
+		events = []
+		offset = 0
+		while offset + _EVENT_HEADER.size <= len(data):
+			watch, mask, cookie, nameLength = _EVENT_HEADER.unpack_from(data, offset)
+			offset += _EVENT_HEADER.size
+			name = os.fsdecode(data[offset:offset+nameLength].rstrip(b"\0"))
+			offset += nameLength
+			events.append(InotifyEvent(watch=watch, mask=mask, cookie=cookie, name=name,\
+				path=self.watches.get(watch)))
+			if mask & IN_IGNORED:
+				# The watch is gone, e.g. because what it watched got deleted.
+				self.watches.pop(watch, None)
+		return events
+
+#==========================================================
+# Watchers
+#==========================================================
+
+#==========================================================
+class PathWatcher(object):
+
+	#=============================
+	"""Wakes its caller up when something changes in the specified paths.
+
+	Takes:
+		- paths (list): Directories and/or files to watch. Paths that don't
+		  exist (yet) are skipped; .rewatch() retries them.
+		- pollInterval (float): How often to wake up without inotify.
+		- mask (int): inotify event mask to watch for.
+		- useInotify (bool): Set to False to force polling.
+
+	.wait(timeout) returns once something changed, the timeout ran out or,
+	without inotify, after pollInterval seconds, whichever comes first.
+	It returns the list of InotifyEvent it got, which is empty if it was
+	woken up for any other reason."""
+	#=============================
+
+	def __init__(self, paths, pollInterval=1.0, mask=IN_CHANGES, useInotify=True):
+		self.paths = [str(path) for path in paths]
+		self.pollInterval = pollInterval
+		self.mask = mask
+		self.inotify = None
+		if useInotify:
+			try:
+				self.inotify = Inotify()
+			except InotifyUnavailableError:
+				self.inotify = None
+		self.rewatch()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+	@property
+	def usingInotify(self):
+		return not self.inotify is None
+
+	def rewatch(self):
+		"""Add watches for all paths not currently watched, e.g. because they didn't exist."""
+		if not self.usingInotify:
+			return
+		watched = set(self.inotify.watches.values())
+		for path in self.paths:
+			if path in watched or not os.path.exists(path):
+				continue
+			try:
+				self.inotify.addWatch(path, self.mask)
+			except InotifyUnavailableError as error:
+				if ctypes.get_errno() in (errno.ENOENT, errno.ENOTDIR):
+					continue # Vanished in the meantime; try again later.
+				# Out of watches or the like: Give up on inotify altogether.
+				self.inotify.close()
+				self.inotify = None
+				return
+
+	def wait(self, timeout=None):
+		"""Wait for changes. See the class docstring."""
+		if not self.usingInotify:
+			if timeout is None:
+				timeout = self.pollInterval
+			time.sleep(max(0, min(timeout, self.pollInterval)))
+			return []
+		if len(self.inotify.watches) < len(self.paths):
+			# Something we want to watch doesn't exist yet; don't wait on it forever.
+			timeout = self.pollInterval if timeout is None else min(timeout, self.pollInterval)
+		events = self.inotify.read(timeout)
+		if any([event.mask & (IN_IGNORED | IN_CREATE | IN_MOVED_TO) for event in events])\
+			or len(self.inotify.watches) < len(self.paths):
+			self.rewatch()
+		return events
+
+	def close(self):
+		if self.usingInotify:
+			self.inotify.close()
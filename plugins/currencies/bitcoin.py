@@ -5,27 +5,66 @@
 #=======================================================================================
 
 # Builtins
+from collections import namedtuple, OrderedDict
+import calendar
+import fcntl
+from concurrent.futures import Future, ThreadPoolExecutor
+import json
 import os
+import re
+import secrets
 import shutil
+import signal
+import threading
 import time
 from pathlib import Path
 
 # Local
-from lib.currencies import CurrencyConfig, Wallet, WalletError
+from lib.currencies import CurrencyConfig, ConfigField, validatePort, Wallet, WalletError
 from lib.arguments import ArgumentSetup, ParserSetup
-from lib.actions import Action, Actions, ActionReturnValue, ActionReturnValueAggregate
+from lib.consensus import compareTips, NodeTip
+from lib.copying import TreeCopier
+from lib.dedup import BlockFileDeduplicator
+from lib.actions import Action, Actions, ActionReturnValue, ActionReturnValueAggregate,\
+	ActionReturnValueStream
 from lib.filesystem import BatchPathExistenceCheck
-from lib.processing import Process, ProcessList
+from lib.fleet import FleetLoader
+from lib.registry import NodeRegistry
+from lib.rollout import RollingOrchestrator, RolloutCheckpoint
+from lib.staggering import StaggeredRunner
+from lib.supervisor import Supervisor, SupervisedChild, SupervisorClient, CrashLoopBackoff
+from lib.syncprogress import SyncProgressTracker
+from lib.trash import TrashCan, TrashPurger, TrashError, TRASH_DIR_NAME
+from lib.jsonstream import JsonStreamDecoder, JsonStreamError
+from lib.logindex import LogIndex
+from lib.logs import LogReader, LogFollower, MergedLogFollower, tailLines
+from lib.metrics import MetricsStore
+from lib.monitoring import FleetMonitor, NodeHealth, RestartPolicy
+from lib.nodeconf import loadNodeConf, RpcEndpoint
+from lib.notifications import BlockNotifyCommand, BlockNotifyListener
+from lib.probing import TieredProbe, ProbeTier, PidFileProbeTier, TcpConnectProbeTier
+from lib.prometheus import FleetExporter
+from lib.processing import Process, ProcessList, readProcessResources, NoSuchProcessError
+from lib.scheduling import SpreadScheduler, PeriodicJob, JobEvent
+from lib.rpc import RpcClient, RpcError, RpcConnectionError, RPC_IN_WARMUP
+from lib.watching import PathWatcher
 #from lib.debugging import dprint #NOTE: DEBUG
 
 # Debug
 from lib.debugging import dprint
 
 #=======================================================================================
-# Library
+# Datatypes
 #=======================================================================================
 
+# What we know about a daemon that's starting up.
+# ready: True once it answers RPC calls. message: What it's busy with, if anything.
+# progress: Percentage, if it told us. source: Where we've got all of this from.
+WarmupStatus = namedtuple("WarmupStatus", "ready message progress source")
 
+#=======================================================================================
+# Library
+#=======================================================================================
 
 #==========================================================
 # Wallet Classes
@@ -45,66 +84,114 @@ class BitcoinConfig(CurrencyConfig):
 			Name of the daemon binary.
 		dataDirName: (string)
 			Name of the datadir.
-		dataDirBaseDirPath: (string)
+		dataDirBaseDirPath: (string or Path)
 			Path to the directory the datadir is expected to reside in.
-		dataDirPath: (string)
+		dataDirPath: (string or Path)
 			The datadir path directly
+		host: (string)
+			Host the RPC interface is expected at.
+		port: (string or int)
+			Port of the RPC interface.
 	
 	Regarding paths, determine which base path contains the cli and daemon bin.
 	We also try to locate at least the default datadir directory.
 	
+	All of the above are fields of the config schema (see CurrencyConfig), which
+	types them: Paths end up as Path, rpcPort as int. Arguments left at None get
+	the class defaults.
+	
 	The intent is to use an object of this class to pass the appropriate
 	values to Wallet when instantiated. This basically moves hopefully
 	common initialization code out of the execution level module, whilst
 	still retaining the option to make changes at that level."""
 	#=============================
 	
+	#=============================
+	# Schema
+	#=============================
+	fields = OrderedDict([\
+		("basePaths", ConfigField(list, nullable=False)),\
+		("cliBinName", ConfigField(str, template="{defaultFileBaseName}-cli", nullable=False)),\
+		("daemonBinName", ConfigField(str, template="{defaultFileBaseName}d", nullable=False)),\
+		("txBinName", ConfigField(str, template="{defaultFileBaseName}-tx", nullable=False)),\
+		("qtBinName", ConfigField(str, template="{defaultFileBaseName}-qt", nullable=False)),\
+		("dataDirName", ConfigField(str, template=".{defaultFileBaseName}", nullable=False)),\
+		("dataDirBaseDirPath", ConfigField(Path, nullable=False)),\
+		("dataDirPath", ConfigField(Path)),\
+		("configFileName", ConfigField(str, template="{defaultFileBaseName}.conf", nullable=False)),\
+		("rpcHost", ConfigField(str, nullable=False)),\
+		("rpcPort", ConfigField(int, nullable=False, validator=validatePort)),\
+	])
+	
 	#=============================
 	# Defaults
 	#=============================
-	# CONVENTION: Use strings whenever feasible and typecast later.
+	# CONVENTION: Use strings whenever feasible and let the schema typecast.
 	# Rationale: If derivative or later code gets these values from
 	# somewhere else, they might end up being strings anyway.
 	# Agreeing on a basic datatype makes things easier for everyone.
+	# Defaults of templated fields (cliBinName, ..., configFileName) are derived
+	# from defaultFileBaseName, unless a class sets them explicitly.
 	defaultBasePaths = ["/usr/local/bin"]
 	defaultFileBaseName = "bitcoin"
-	defaultCliBinName = "{0}-cli".format(defaultFileBaseName)
-	defaultDaemonBinName = "{0}d".format(defaultFileBaseName)
-	defaultTxBinName = "{0}-tx".format(defaultFileBaseName)
-	defaultQtBinName = "{0}-qt".format(defaultFileBaseName)
-	defaultDataDirName = ".{0}".format(defaultFileBaseName)
 	defaultDataDirBaseDirPath = os.path.expanduser("~")
-	defaultConfigFileName = "{0}.conf".format(defaultFileBaseName)
 	defaultRpcHost = "localhost"
 	defaultRpcPort = "8332" # Example of string usage when it could have been int.
+	# Masternode directory layout (see lib.fleet): Ports of node 0.
+	defaultFleetBaseRpcPort = "9400"
+	defaultFleetBasePort = "9700"
 	#=============================
 	
-	def __init__(self, basePaths=defaultBasePaths, cliBinName=defaultCliBinName,\
-		daemonBinName=defaultDaemonBinName, dataDirName=defaultDataDirName,\
-		dataDirBaseDirPath=defaultDataDirBaseDirPath, dataDirPath=None,\
-		configFileName=defaultConfigFileName, txBinName=defaultTxBinName,\
-		qtBinName=defaultQtBinName, host=defaultRpcHost, port=defaultRpcPort):
-		
-		self.basePaths = basePaths
-		self.dataDirBaseDirPath = dataDirBaseDirPath
-		self.cliBinName = cliBinName
-		self.daemonBinName = daemonBinName
-		self.txBinName = txBinName
-		self.qtBinName = qtBinName
-		self.dataDirName = dataDirName
-		self.configFileName = configFileName
-		self.rpcHost = host
-		self.rpcPort = port
-		
-		if dataDirPath:
-			self.dataDirBaseDirPath = dataDirBaseDirPath
-			self.dataDirName = dataDirName
-			self.dataDirPath = dataDirPath
-		else:
-			dataDirPathObject = Path(self.dataDirBaseDirPath, self.dataDirName)
-			self.dataDirBaseDirPath = dataDirPathObject.parent
-			self.dataDirName = dataDirPathObject.name
-			self.dataDirPath = str(dataDirPathObject)
+	# Conf file written for new nodes, as by the legacy script.
+	nodeConfTemplate = "\n".join([\
+		"rpcuser={rpcUser}",\
+		"rpcpassword={rpcPassword}",\
+		"rpcallowip=127.0.0.1",\
+		"rpcport={rpcPort}",\
+		"listen=1",\
+		"server=1",\
+		"daemon=1",\
+		"maxconnections=24",\
+		"masternode=1",\
+		"masternodeprivkey=",\
+		"externalip=",\
+		""])
+	
+	def __init__(self, basePaths=None, cliBinName=None, daemonBinName=None, dataDirName=None,\
+		dataDirBaseDirPath=None, dataDirPath=None, configFileName=None, txBinName=None,\
+		qtBinName=None, host=None, port=None):
+		
+		self._setFields_(basePaths=basePaths, cliBinName=cliBinName, daemonBinName=daemonBinName,\
+			dataDirName=dataDirName, dataDirBaseDirPath=dataDirBaseDirPath, dataDirPath=dataDirPath,\
+			configFileName=configFileName, txBinName=txBinName, qtBinName=qtBinName,\
+			rpcHost=host, rpcPort=port)
+		self._initState_()
+	
+	@classmethod
+	def fleetLoader(cls, coinDirPath=None):
+		"""FleetLoader for the nodes of this coin, in ~/coins/<defaultFileBaseName> by default."""
+		if coinDirPath is None:
+			coinDirPath = os.path.join(os.path.expanduser("~"), "coins", cls.defaultFileBaseName)
+		return FleetLoader(cls, coinDirPath, baseRpcPort=cls.defaultFleetBaseRpcPort,\
+			basePort=cls.defaultFleetBasePort)
+	
+	@classmethod
+	def makeNodeConf(cls, rpcPort):
+		"""Contents of a conf file for a new node, with fresh RPC credentials."""
+		return cls.nodeConfTemplate.format(rpcUser=secrets.token_hex(8),\
+			rpcPassword=secrets.token_urlsafe(24), rpcPort=rpcPort)
+	
+	@classmethod
+	def nodeRegistry(cls, coinDirPath=None):
+		"""NodeRegistry of the nodes of this coin, kept in the coin directory."""
+		return NodeRegistry(cls.fleetLoader(coinDirPath))
+	
+	def _initState_(self):
+		self._resolvedPaths = {}
+		if self.dataDirPath is None:
+			self.dataDirPath = Path(self.dataDirBaseDirPath, self.dataDirName)
+			self.dataDirBaseDirPath = self.dataDirPath.parent
+			self.dataDirName = self.dataDirPath.name
 	
 	@property
 	def cliBinPath(self):
@@ -117,20 +204,75 @@ class BitcoinConfig(CurrencyConfig):
 	@property
 	def configFilePath(self):
 		return self.findFile(self.configFileName)
+	
+	@property
+	def effectiveConfigFilePath(self):
+		"""The conf file the daemon will use: The one we found, or the default one in the datadir."""
+		configFilePath = self.configFilePath
+		if configFilePath is None:
+			return os.path.join(self.dataDirPath, self.configFileName)
+		return configFilePath
+	
+	@property
+	def nodeConf(self):
+		"""The parsed conf file of the node as NodeConf, or None if there is none.
+		Parsing is cached until the file changes."""
+		try:
+			return loadNodeConf(self.effectiveConfigFilePath, dataDirPath=self.dataDirPath)
+		except FileNotFoundError:
+			return None
+	
+	@property
+	def rpcEndpoint(self):
+		"""The RpcEndpoint in effect for the node, taking the conf file into account."""
+		nodeConf = self.nodeConf
+		if nodeConf is None:
+			return RpcEndpoint(host=self.rpcHost, port=self.rpcPort, user=None, password=None,\
+				cookieFilePath=os.path.join(self.dataDirPath, ".cookie"))
+		return nodeConf.rpcEndpoint(self.rpcPort, defaultHost=self.rpcHost, dataDirPath=self.dataDirPath)
+	
+	@property
+	def debugLogPath(self):
+		return os.path.join(self.dataDirPath, "debug.log")
+	
+	@property
+	def pidFilePath(self):
+		nodeConf = self.nodeConf
+		if not nodeConf is None and not nodeConf.pidFile is None:
+			return os.path.join(self.dataDirPath, os.path.expanduser(nodeConf.pidFile))
+		return os.path.join(self.dataDirPath, "{0}.pid".format(self.daemonBinName))
+	
+	@property
+	def lockFilePath(self):
+		return os.path.join(self.dataDirPath, ".lock")
 
 	def findFile(self, fileName):
+		
 		"""Locate a file given the fileName.
-		Iterates through the basePaths to find the binary, otherwise uses shutil.which."""
+		Checks the basePaths in order for the file, otherwise uses shutil.which.
+		
+		The result is cached, for as long as the basePaths stay the same. If files
+		get moved around, call .invalidatePathCache() to have them looked up again."""
+		
+		cacheKey = (fileName, tuple(self.basePaths))
+		try:
+			return self._resolvedPaths[cacheKey]
+		except KeyError:
+			pass
 		filePath = None
 		for path in self.basePaths:
-			if os.path.exists(path):
-				for prospectiveFileName in os.listdir():
-					if prospectiveFileName == fileName:
-						filePath = os.path.join(path, fileName)
-						break
+			prospectiveFilePath = os.path.join(path, fileName)
+			if os.path.isfile(prospectiveFilePath):
+				filePath = prospectiveFilePath
+				break
 		if filePath == None:
-			return shutil.which(fileName)
+			filePath = shutil.which(fileName)
+		self._resolvedPaths[cacheKey] = filePath
 		return filePath
+	
+	def invalidatePathCache(self):
+		"""Forget where .findFile found things, e.g. after binaries have been switched."""
+		self._resolvedPaths = {}
 
 class Daemons(ProcessList):
 	"""A snapshot of all running wallet daemons associated with our currency.
@@ -154,7 +296,7 @@ class Daemons(ProcessList):
 	def byDataDirArg(self, config):
 		"""Narrow down by -datadir arg."""
 		if not hasattr(self, "_byDataDirArg"):
-			self._byDataDirArg = self.byArgvPart(["-datadir", config.dataDirPath])
+			self._byDataDirArg = self.byArgvPart(["-datadir", str(config.dataDirPath)])
 		return self._byDataDirArg
 			
 	def ours(self, config):
@@ -177,6 +319,137 @@ class Daemons(ProcessList):
 			raise WalletError("Found two daemon instances with the same -datadir option: {0}"\
 				.format(config.dataDirPath), WalletError.codes.DAEMON_DUPLICATE)
 
+#==========================================================
+class DaemonStartupMonitor(object):
+	
+	#=============================
+	"""Detects when a daemon we're starting is ready for RPC calls, or has failed to start.
+	
+	Takes:
+		- wallet (BitcoinWallet): The wallet whose daemon is being started.
+		- timeout (int): Seconds after which we give up and report failure.
+		- callback (callable): If specified, gets called with the future once it's resolved.
+		- pollInterval (float): How often to check if inotify isn't available.
+	
+	Instantiate it right before starting the daemon, so it can tell the lines the
+	new daemon writes to debug.log apart from those of previous runs. Then call
+	.start(), which returns a concurrent.futures.Future. It resolves to the
+	WarmupStatus of the ready daemon, or fails with WalletError (DAEMON_START_FAILED,
+	or DAEMON_STUCK if the timeout ran out).
+	
+	Instead of asking the cli over and over, we watch the datadir with inotify for
+	the .lock and pid file to appear and for debug.log to report that the daemon is
+	done loading, and only then confirm readiness through RPC. Without debug.log to
+	go by, RPC is checked every rpcCheckInterval seconds once the pid file exists.
+	.stage tells how far the daemon has come, for progress reporting."""
+	#=============================
+	
+	doneLoadingFragment = "init message: Done loading"
+	failureFragments = ["Error: ", "EXCEPTION: ", "Shutdown: done"]
+	rpcCheckInterval = 5
+	
+	def __init__(self, wallet, timeout=600, callback=None, pollInterval=0.5):
+		self.wallet = wallet
+		self.config = wallet.config
+		self.timeout = timeout
+		self.pollInterval = pollInterval
+		self.future = Future()
+		if not callback is None:
+			self.future.add_done_callback(callback)
+		self.logReader = LogReader(self.config.debugLogPath, fromEnd=True)
+		self.stage = "starting"
+		self.pid = None
+		# A pid file left behind by a daemon that didn't exit cleanly isn't the new one's.
+		self._stalePid = self._readPidFile()
+		self._thread = None
+	
+	def start(self):
+		"""Start monitoring in the background and return the future."""
+		self.future.set_running_or_notify_cancel()
+		self._thread = threading.Thread(target=self._run, daemon=True,\
+			name="DaemonStartupMonitor({0})".format(self.config.dataDirPath))
+		self._thread.start()
+		return self.future
+	
+	def wait(self):
+		"""Block until the daemon is ready and return its WarmupStatus, or raise WalletError."""
+		return self.future.result()
+	
+	def _run(self):
+		try:
+			self.future.set_result(self._monitor())
+		except Exception as error:
+			self.future.set_exception(error)
+	
+	def _fail(self, message):
+		raise WalletError("The daemon failed to start ({stage}): {message}\n\tdatadir: {datadir}"\
+			.format(stage=self.stage, message=message, datadir=self.config.dataDirPath),\
+			WalletError.codes.DAEMON_START_FAILED)
+	
+	def _monitor(self):
+		deadline = time.monotonic()+self.timeout
+		lastRpcCheck = 0
+		with PathWatcher([self.config.dataDirPath], pollInterval=self.pollInterval) as watcher:
+			while True:
+				doneLoading = self._checkLog()
+				self._checkFiles()
+				now = time.monotonic()
+				if doneLoading or (not self.pid is None and now-lastRpcCheck >= self.rpcCheckInterval):
+					lastRpcCheck = now
+					status = self._checkRpc()
+					if not status is None and status.ready:
+						self.stage = "ready"
+						return status
+				remaining = deadline-time.monotonic()
+				if remaining <= 0:
+					raise WalletError("The daemon didn't become ready within {timeout} seconds ({stage})."\
+						"\n\tdatadir: {datadir}".format(timeout=self.timeout, stage=self.stage,\
+						datadir=self.config.dataDirPath), WalletError.codes.DAEMON_STUCK)
+				watcher.wait(min(remaining, self.rpcCheckInterval))
+	
+	def _checkLog(self):
+		"""Go through new debug.log lines. True if the daemon's done loading."""
+		doneLoading = False
+		for line in self.logReader.readLines():
+			if self.doneLoadingFragment in line:
+				self.stage = "done loading"
+				doneLoading = True
+			elif "init message: " in line:
+				self.stage = line.partition("init message: ")[2].strip()
+			for fragment in self.failureFragments:
+				if fragment in line:
+					self._fail(line.strip())
+		return doneLoading
+	
+	def _readPidFile(self):
+		try:
+			with open(self.config.pidFilePath, "r") as pidFile:
+				return int(pidFile.read().strip())
+		except (OSError, ValueError):
+			return None
+	
+	def _checkFiles(self):
+		"""Keep track of the .lock and pid file, and of the daemon process they point us to."""
+		if self.pid is None:
+			pid = self._readPidFile()
+			if not pid is None and not pid == self._stalePid:
+				self.pid = pid
+				if self.stage == "starting":
+					self.stage = "pid file written"
+			elif self.stage == "starting" and os.path.exists(self.config.lockFilePath):
+				self.stage = "datadir locked"
+		if not self.pid is None and not os.path.exists("/proc/{0}".format(self.pid)):
+			self._fail("The daemon process ({pid}) is gone.".format(pid=self.pid))
+	
+	def _checkRpc(self):
+		"""WarmupStatus as per RPC, or None if the daemon can't be reached yet."""
+		try:
+			return self.wallet.warmupStatus()
+		except WalletError as error:
+			if error.code == WalletError.codes.RPC_CONNECTION_FAILED:
+				return None
+			raise
+
 #==========================================================
 # TODO: One day, this class will need to be redone. It's baggage from
 # an older time with hacks all over the place. It kind of worked for mnchecker,
@@ -199,6 +472,9 @@ class BitcoinWallet(Wallet):
 		"error: couldn't connect to server"\
 	]
 	
+	# What makes up the chain data that can be copied over to bootstrap another node.
+	cloneDirNames = ["blocks", "chainstate"]
+	
 	def __init__(self, config):
 		
 		self.config = config
@@ -233,19 +509,35 @@ class BitcoinWallet(Wallet):
 	@property
 	def daemonRunning(self):
 		
-		"""Returns True if the daemon is running, False if it's not."""
+		"""Returns True if the daemon is running, False if it's not.
+		
+		Only runs the cheap tiers of .probeLiveness, so it doesn't wait on a busy daemon."""
 		
-		#TODO: This is a hacky way to determine whether the daemon is running.
-		# Being reluctant to introduce third party dependencies like psutil,
-		# this will have to do for now, but even this solution will need
-		# an improvement in the robustness department eventually.
+		return self.probeLiveness().alive
+	
+	def probeLiveness(self, deep=False):
+		
+		"""Check whether the daemon is alive, cheapest check first. Returns a LivenessReport.
 		
+		Tiers:
+			- pidfile: The pid file in the datadir names a live daemon process.
+			- tcp: The RPC port accepts connections.
+			- rpc (only if deep is True): The daemon answers RPC calls and is done
+			  warming up."""
+		
+		rpcEndpoint = self.config.rpcEndpoint
+		return TieredProbe([\
+				PidFileProbeTier(self.config.pidFilePath, processName=self.config.daemonBinName),\
+				TcpConnectProbeTier(rpcEndpoint.host, rpcEndpoint.port)],\
+			deepTiers=[ProbeTier("rpc", check=self._probeRpc)]).run(deep=deep)
+	
+	def _probeRpc(self):
+		"""The deep tier of .probeLiveness."""
 		try:
-			self.runCliSafe("getblockcount")
-		except WalletError as error:
-			if error.code == type(error).codes.RPC_CONNECTION_FAILED:
-				return False
-		return True
+			status = self.warmupStatus()
+		except WalletError:
+			return (False, "RPC connection failed")
+		return (status.ready, status.message)
 		
 	def getDaemon(self):
 		"""Returns an ExternalProcess object of the daemon process.
@@ -287,54 +579,271 @@ class BitcoinWallet(Wallet):
 			return Process([self.config.cliBinPath,\
 				"-datadir={datadir}".format(datadir=self.config.dataDirPath)] + commandLine)
 
-	def runDaemon(self, commandLine):
-		"""Run the daemon. Takes a list for command line arguments to it."""
+	def daemonCommandLine(self, commandLine=[], detach=True):
+		"""The full command line to run the daemon with. Takes a list for command line arguments
+		to it. With detach set to False, the daemon stays in the foreground: -daemon=0, which
+		overrides a daemon=1 in the conf file (as the conf files we write have)."""
+		fullCommandLine = [self.config.daemonBinPath]
+		fullCommandLine.append("-daemon" if detach else "-daemon=0")
+		fullCommandLine.append("-datadir={datadir}".format(datadir=self.config.dataDirPath))
 		if not self.config.configFilePath == None:
-			return Process([self.config.daemonBinPath,\
-				"-daemon",\
-				"-datadir={datadir}".format(datadir=self.config.dataDirPath),\
-				"-conf={configFilePath}".format(configFilePath=self.config.configFilePath)] +commandLine)
-		else:
-			return Process([self.config.daemonBinPath,\
-				"-daemon",\
-				"-datadir={datadir}".format(datadir=self.config.dataDirPath)] +commandLine)
+			fullCommandLine.append("-conf={configFilePath}".format(configFilePath=self.config.configFilePath))
+		return fullCommandLine+commandLine
+	
+	def runDaemon(self, commandLine, detach=True):
+		"""Run the daemon. Takes a list for command line arguments to it.
+		See .daemonCommandLine for detach; to supervise the daemon, use Supervisor."""
+		return Process(self.daemonCommandLine(commandLine, detach=detach))
 
-	def runCliSafe(self, commandLine, _retrying=False):
+	def runCliSafe(self, commandLine, warmupTimeout=75):
+		
+		"""A version of .runCli that checks for the wallet tripping up and responds accordingly.
 		
-		"""A version of .runCli that checks for the wallet tripping up and responds accordingly."""
+		If the daemon is still warming up (RPC error -28), waits for it to become ready
+		for up to warmupTimeout seconds using .waitUntilReady and runs the command again."""
 		
 		process = self.runCli(commandLine)
 		stdoutString, stderrString = process.waitAndGetOutput()
+		self._checkRpcConnection(stderrString)
+		
+		# Catch issues caused by the wallet connecting to the daemon right after the daemon started.
+		if self._isWarmingUp(stdoutString, stderrString):
+			self.waitUntilReady(timeout=warmupTimeout)
+			process = self.runCli(commandLine)
+			stdoutString, stderrString = process.waitAndGetOutput()
+			self._checkRpcConnection(stderrString)
+		
+		return process
+	
+	def runCliStream(self, commandLine, path=[], warmupTimeout=75):
+		
+		"""Run the cli and yield the members of the JSON array or object it returns as they arrive.
+		
+		Meant for calls that return large results, which are decoded incrementally
+		instead of in one go, keeping memory use bounded by the size of one member.
+		Arrays yield their values, objects (key, value) tuples. If path is specified,
+		members of the container found by descending into those keys are yielded
+		instead (see JsonStreamDecoder).
+		
+		Like .runCliSafe, waits for a daemon that's warming up. If the cli returns
+		an error instead of JSON, WalletError is raised."""
 		
-		# Catch the wallet taking the way out because the daemon isn't running.
+		for attempt in range(2):
+			process = self.runCli(commandLine)
+			decoder = JsonStreamDecoder(process.stdoutStream, path=path)
+			try:
+				yield from decoder
+				return
+			except JsonStreamError as error:
+				if decoder.itemCount > 0:
+					raise WalletError("The output of the cli broke off:\n{error}"\
+						.format(error=error), WalletError.codes.CLI_ERROR)
+				process.kill()
+				stdoutString, stderrString = process.waitAndGetOutput()
+				self._checkRpcConnection(stderrString)
+				if attempt == 0 and self._isWarmingUp(stdoutString, stderrString):
+					self.waitUntilReady(timeout=warmupTimeout)
+					continue
+				raise WalletError("The wallet produced an error when running \"{command}\":\n {error}"\
+					.format(command=" ".join(commandLine), error=stderrString.decode() or error),\
+					WalletError.codes.CLI_ERROR)
+			finally:
+				# Also reached if the caller stops iterating early.
+				process.kill()
+				process.waitAndGetOutput()
+	
+	def iterRawMempool(self):
+		"""Generator of (txid, entry) for every transaction in the mempool."""
+		return self.runCliStream(["getrawmempool", "true"])
+	
+	def iterTransactions(self, count=10, account="*", skip=0):
+		"""Generator of the wallet's transactions as returned by listtransactions."""
+		return self.runCliStream(["listtransactions", account, str(count), str(skip)])
+	
+	def iterMasternodes(self, mode="full"):
+		"""Generator of (outpoint, info) for every masternode, for dash derived currencies."""
+		return self.runCliStream(["masternode", "list", mode])
+	
+	def iterBlockTransactions(self, blockHash):
+		"""Generator of the fully decoded transactions of the specified block."""
+		return self.runCliStream(["getblock", blockHash, "2"], path=["tx"])
+	
+	def _checkRpcConnection(self, stderrString):
+		"""Catch the wallet taking the way out because the daemon isn't running."""
 		if any([stderrString.decode().strip().startswith(fragment)\
 			for fragment in type(self).rpcFailureMessageFragments]):
-			print("[DEBUG Wallet.runCliSafe WalletError: ]", WalletError.__dict__)
 			raise WalletError(\
 				"Command line wallet can't connect to the daemon. Is the daemon running?\n{info}"\
 				.format(info="Wallet paths:\n\tcli: {cli}\n\tdaemon: {daemon}\n\tdatadir: {datadir}"\
 					.format(cli=self.config.cliBinPath, daemon=self.config.daemonBinPath, datadir=self.config.dataDirPath)),\
 				WalletError.codes.RPC_CONNECTION_FAILED)
+	
+	def _isWarmingUp(self, stdoutString, stderrString):
+		"""Whether the cli output is the daemon telling us it's still warming up."""
+		return "error code: -28" in stdoutString.decode()\
+			or "error code: -28" in stderrString.decode()
+	
+	def warmupStatus(self):
 		
-		# Catch issues caused by the wallet connecting to the daemon right after the daemon started.
-		# As this involves retrying, we have to make sure we don't get stuck retrying forever.
-		if "error code: -28" in stdoutString.decode()\
-			or "error code: -28" in stderrString.decode()\
-			and not _retrying:
-			# Rerun this method in intervals until it works, or we decide to give up.
-			for retry in range(1,16):
-				time.sleep(5)
-				retriedProcess = self.runCliSafe(commandLine, _retrying=True)
-				retriedStdoutString, retriedStderrString = retriedProcess.waitAndGetOutput()
-				if "error code: -28" in retriedStdoutString.decode()\
-					or "error code: -28" in retriedStderrString.decode():
-					continue
-				else:
-					return retriedProcess
-			raise WalletError("Daemon stuck at error -28.", WalletError.codes.DAEMON_STUCK)
+		"""Ask the daemon whether it's ready for RPC calls and return a WarmupStatus.
 		
-		return process
+		While the daemon is warming up, the message and progress are taken from the
+		RPC error it answers with. If that doesn't mention a percentage, we look for
+		one in the latest lines of debug.log.
+		
+		Raises WalletError with code RPC_CONNECTION_FAILED if the daemon can't be reached."""
+		
+		stdoutString, stderrString = self.runCli(["getblockcount"]).waitAndGetOutput()
+		self._checkRpcConnection(stderrString)
+		if not self._isWarmingUp(stdoutString, stderrString):
+			return WarmupStatus(ready=True, message=None, progress=None, source="rpc")
+		# The cli puts the RPC error message on the lines after "error message:".
+		message = (stdoutString+stderrString).decode().partition("error message:")[2].strip()
+		progress = self._parseWarmupProgress(message)
+		if progress is None:
+			logStatus = self._warmupStatusFromDebugLog()
+			if not logStatus is None:
+				return WarmupStatus(ready=False, message=message or logStatus.message,\
+					progress=logStatus.progress, source=logStatus.source)
+		return WarmupStatus(ready=False, message=message, progress=progress, source="rpc")
+	
+	def _parseWarmupProgress(self, string):
+		"""Percentage found in the specified string as float, or None."""
+		match = re.search(r"(\d+(?:\.\d+)?)\s*%", string)
+		if match is None:
+			# Verification progress is logged without a percent sign.
+			match = re.search(r"[Pp]rogress:? (\d+(?:\.\d+)?)\s*$", string)
+		if match is None:
+			return None
+		return float(match.group(1))
+	
+	def _warmupStatusFromDebugLog(self, readSize=16384):
+		"""WarmupStatus from the last few lines of debug.log, or None if there's nothing to go by."""
+		try:
+			with open(self.config.debugLogPath, "rb") as logFile:
+				logFile.seek(0, os.SEEK_END)
+				logFile.seek(max(0, logFile.tell()-readSize))
+				lines = logFile.read().decode(errors="replace").splitlines()
+		except OSError:
+			return None
+		message = None
+		progress = None
+		for line in reversed(lines):
+			if progress is None:
+				progress = self._parseWarmupProgress(line)
+			if message is None and "init message: " in line:
+				message = line.partition("init message: ")[2].strip()
+			if not message is None:
+				break
+		if message is None and progress is None:
+			return None
+		return WarmupStatus(ready=False, message=message, progress=progress, source="debug.log")
+	
+	def waitUntilReady(self, timeout=75, initialInterval=0.1, maxInterval=5, progressCallback=None):
+		
+		"""Wait for a freshly started daemon to become ready for RPC calls.
+		
+		Polls .warmupStatus with exponential backoff, starting at initialInterval
+		seconds and doubling up to maxInterval, but never past the deadline set by
+		timeout. Returns the WarmupStatus of the ready daemon the moment we learn
+		about it. If progressCallback is specified, it's called with the WarmupStatus
+		of every poll that found the daemon still warming up.
+		
+		A daemon that can't be reached yet is considered to be starting up.
+		Once the deadline has passed, WalletError is raised, with code DAEMON_STUCK if
+		the daemon was still warming up, RPC_CONNECTION_FAILED if it never answered."""
+		
+		deadline = time.monotonic()+timeout
+		interval = initialInterval
+		lastError = None
+		while True:
+			try:
+				status = self.warmupStatus()
+				lastError = None
+			except WalletError as error:
+				if not error.code == WalletError.codes.RPC_CONNECTION_FAILED:
+					raise
+				status = WarmupStatus(ready=False, message=None, progress=None, source="rpc")
+				lastError = error
+			if status.ready:
+				return status
+			if not progressCallback is None:
+				progressCallback(status)
+			remaining = deadline-time.monotonic()
+			if remaining <= 0:
+				if not lastError is None:
+					raise lastError
+				raise WalletError("Daemon stuck at error -28: {message}"\
+					.format(message=status.message), WalletError.codes.DAEMON_STUCK)
+			time.sleep(min(interval, remaining))
+			interval = min(interval*2, maxInterval)
 
+	def killDaemon(self, timeout):
+		
+		"""Terminate the daemon process named by the pid file with signals, for when it
+		doesn't answer and so can't be stopped with the cli.
+		
+		Sends SIGTERM, which the daemons handle like "stop", and SIGKILL if it hasn't
+		exited after timeout seconds. Raises WalletError with code DAEMON_STUCK if
+		even that doesn't make it go away."""
+		
+		for signalNumber, waitTimeout in ((signal.SIGTERM, timeout), (signal.SIGKILL, 10)):
+			pid = self.daemonPid
+			if pid is None:
+				break
+			try:
+				os.kill(pid, signalNumber)
+			except ProcessLookupError:
+				pass
+			if self.waitForExit(waitTimeout):
+				return
+		if not self.waitForExit(0):
+			raise WalletError("The daemon didn't exit, not even on SIGKILL.", WalletError.codes.DAEMON_STUCK)
+	
+	def waitUntilCaughtUp(self, timeout, initialInterval=1, maxInterval=30, caughtUpProgress=0.9999):
+		
+		"""Wait for a daemon that's ready for RPC calls to be done with initial block download,
+		as after a reindex or a resync. Returns getblockchaininfo's result then.
+		
+		Polls getblockchaininfo with exponential backoff like .waitUntilReady. The daemon
+		has caught up once it says it's not in initial block download anymore or, as
+		older daemons don't say, its verificationprogress reaches caughtUpProgress. Once
+		the deadline has passed, WalletError is raised with code DAEMON_STUCK, or
+		RPC_CONNECTION_FAILED if the daemon couldn't be reached at the last poll."""
+		
+		deadline = time.monotonic()+timeout
+		interval = initialInterval
+		while True:
+			lastError = None
+			try:
+				info = self.rpcClient.call("getblockchaininfo")
+				if not info.get("initialblockdownload", True)\
+						or info.get("verificationprogress", 0) >= caughtUpProgress:
+					return info
+				message = "at block {0}, verification progress {1:.4f}".format(info.get("blocks"),\
+					info.get("verificationprogress", 0))
+			except RpcError as error:
+				if not error.code == RPC_IN_WARMUP:
+					raise WalletError(error.rpcMessage, WalletError.codes.CLI_ERROR)
+				message = error.rpcMessage
+			except RpcConnectionError as error:
+				lastError = WalletError(error.reason, WalletError.codes.RPC_CONNECTION_FAILED)
+			remaining = deadline-time.monotonic()
+			if remaining <= 0:
+				if not lastError is None:
+					raise lastError
+				raise WalletError("Daemon didn't catch up: {message}".format(message=message),\
+					WalletError.codes.DAEMON_STUCK)
+			time.sleep(min(interval, remaining))
+			interval = min(interval*2, maxInterval)
+	
+	def monitorStartup(self, timeout=600, callback=None):
+		"""A DaemonStartupMonitor for this wallet, already started.
+		Call this right before starting the daemon. See DaemonStartupMonitor."""
+		monitor = DaemonStartupMonitor(self, timeout=timeout, callback=callback)
+		monitor.start()
+		return monitor
+	
 	def runDaemonSafe(self, commandLine):
 		"""A version of .runDaemon that checks for the daemon tripping up and responds accordingly."""
 		process = self.runDaemon(commandLine)
@@ -342,8 +851,19 @@ class BitcoinWallet(Wallet):
 		#TODO: Make running the daemon safer and failures more verbose with some checks & exceptions.
 		return process
 
-	def startDaemon(self, commandLine=[]):
-		"""Start the daemon. Takes a list for command line arguments."""
+	def startDaemon(self, commandLine=[], blockNotifySocketPath=None, blockNotifyNode=None):
+		
+		"""Start the daemon. Takes a list for command line arguments.
+		
+		If blockNotifySocketPath is specified, the daemon is told to notify the
+		BlockNotifyListener bound to that path of every new block through -blocknotify.
+		The events will be tagged with blockNotifyNode, which defaults to the datadir path."""
+		
+		if not blockNotifySocketPath is None:
+			if blockNotifyNode is None:
+				blockNotifyNode = str(self.config.dataDirPath)
+			commandLine = commandLine\
+				+ [BlockNotifyCommand(blockNotifySocketPath, blockNotifyNode).daemonArg]
 		return self.runDaemon(commandLine)
 
 	def stopDaemon(self, waitTimeout):
@@ -363,18 +883,112 @@ class BitcoinWallet(Wallet):
 				time.sleep(1)
 		return process
 
-	def deleteBlockchainData(self):
-		for fileName in ["blocks", "chainstate", "database", "mncache.dat", "peers.dat",\
-			"mnpayments.dat", "banlist.dat"]:
-			filePath = os.path.join(self.config.dataDirPath, fileName)
+	@property
+	def daemonPid(self):
+		"""Pid of the daemon process named by the pid file, None if there's no such process.
+		Unlike .daemonRunning, this doesn't care whether the daemon answers."""
+		alive, pid = PidFileProbeTier(self.config.pidFilePath, processName=self.config.daemonBinName).check()
+		if not alive:
+			return None
+		try:
+			with open("/proc/{0}/stat".format(pid), "r") as statFile:
+				# The state follows the parenthesized name; a zombie has exited already.
+				state = statFile.read().rpartition(")")[2].split()[0]
+		except (FileNotFoundError, IndexError):
+			return None
+		return None if state == "Z" else pid
+	
+	@property
+	def dataDirLocked(self):
+		"""Whether a daemon holds the lock on the datadir, which it does until it exits."""
+		try:
+			lockFile = open(self.config.lockFilePath, "a")
+		except OSError:
+			return False
+		with lockFile:
 			try:
-				if os.path.exists(filePath):
-					if os.path.isdir(filePath):
-						shutil.rmtree(filePath)
-					else:
-						os.remove(filePath)
+				# The daemons lock it with fcntl, which lockf uses too (flock locks are separate).
+				fcntl.lockf(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
 			except OSError:
-				pass
+				return True
+			fcntl.lockf(lockFile, fcntl.LOCK_UN)
+		return False
+	
+	def waitForExit(self, timeout, pollInterval=0.2):
+		
+		"""Wait for the daemon process to be gone and the datadir to be unlocked.
+		Returns True once they are, False if they still aren't after timeout seconds.
+		
+		The daemon stops answering RPC calls first thing when it shuts down, then
+		flushes its chainstate, so it's only safe to touch the datadir or start
+		another daemon on it after this."""
+		
+		deadline = time.monotonic()+timeout
+		while not self.daemonPid is None or self.dataDirLocked:
+			if time.monotonic() >= deadline:
+				return False
+			time.sleep(pollInterval)
+		return True
+	
+	def cloneBlockchainDataTo(self, dataDirPath, workers=4):
+		
+		"""Copy the block data (.cloneDirNames) of our datadir to the specified one.
+		
+		Reflinks the files if the filesystem supports that, copies them in parallel
+		otherwise (see TreeCopier). The daemon is expected not to be running, lest the
+		copy be inconsistent. Returns CopyStats."""
+		
+		copier = TreeCopier(workers=workers)
+		for dirName in type(self).cloneDirNames:
+			sourcePath = os.path.join(self.config.dataDirPath, dirName)
+			if os.path.isdir(sourcePath):
+				copier.copy(sourcePath, os.path.join(dataDirPath, dirName))
+		return copier.stats
+	
+	@property
+	def sentinelDirPath(self):
+		"""Where the node's copy of sentinel is installed (see the legacy "addsentinel")."""
+		return os.path.join(str(self.config.dataDirPath), "sentinel")
+	
+	def sentinelJob(self, id):
+		"""A PeriodicJob running sentinel for this node, as the legacy "sentinel" command does,
+		or None if sentinel isn't installed for it."""
+		if not os.path.isdir(self.sentinelDirPath):
+			return None
+		return PeriodicJob(id=id, commandLine=[os.path.join(self.sentinelDirPath, "venv", "bin", "python"),\
+			os.path.join("bin", "sentinel.py")], cwd=self.sentinelDirPath)
+	
+	blockchainDataNames = ["blocks", "chainstate", "database", "mncache.dat", "peers.dat",\
+		"mnpayments.dat", "banlist.dat"]
+	
+	@property
+	def trashCan(self):
+		return TrashCan(os.path.join(str(self.config.dataDirPath), TRASH_DIR_NAME))
+	
+	def deleteBlockchainData(self, purge=True):
+		"""Move the block data into the trash directory of the datadir, which is instant,
+		so the daemon can be started again right away. Unless purge is False, a detached
+		TrashPurger then deletes it in the background. Returns the trashed paths.
+		Raises WalletError if something couldn't be trashed, after trying the rest, or
+		right away if the daemon hasn't exited yet (see .waitForExit)."""
+		if not self.waitForExit(0):
+			raise WalletError("The daemon still has the datadir open; it has to exit first.",\
+				WalletError.codes.DATA_DELETION_FAILED)
+		trashCan = self.trashCan
+		trashedPaths = []
+		errors = []
+		for fileName in self.blockchainDataNames:
+			filePath = os.path.join(str(self.config.dataDirPath), fileName)
+			if os.path.lexists(filePath):
+				try:
+					trashedPaths.append(trashCan.put(filePath))
+				except TrashError as error:
+					errors.append(str(error).strip())
+		if purge and len(trashedPaths) > 0:
+			TrashPurger(trashCan.dirPath).detach()
+		if len(errors) > 0:
+			raise WalletError("\n".join(errors), WalletError.codes.DATA_DELETION_FAILED)
+		return trashedPaths
 
 	def getBlockCount(self):
 		stdout, stderr = self.runCliSafe(["getblockcount"]).waitAndGetOutput(timeout=8)
@@ -385,23 +999,191 @@ class BitcoinWallet(Wallet):
 				"The wallet produced an error when running \"getblockcount\":\n {error}"\
 					.format(error=stderr.decode()), WalletError.codes.CLI_ERROR)
 		return int(blockCount)
+	
+	@property
+	def rpcClient(self):
+		"""An RpcClient talking to the daemon directly, kept for the life of the wallet object."""
+		if not hasattr(self, "_rpcClient"):
+			self._rpcClient = RpcClient(self.config.rpcEndpoint)
+		return self._rpcClient
+	
+	def probeHealth(self, id=None):
+		
+		"""Check on the daemon and return a NodeHealth tagged with id.
+		
+		The cheap tiers of .probeLiveness come first; only if they pass, block count,
+		connection count, mempool size and masternode status are asked for over RPC,
+		in one batch. Currencies without masternodes just leave masternodeStatus at
+		None. Memory and CPU usage of the daemon are read from /proc."""
+		
+		health = OrderedDict([(field, None) for field in NodeHealth._fields])
+		health.update(id=id, time=time.time(), alive=False, warmingUp=False)
+		liveness = self.probeLiveness()
+		pidResult = liveness.tier("pidfile")
+		if not pidResult is None and pidResult.alive:
+			try:
+				resources = readProcessResources(pidResult.detail)
+				health.update(rss=resources.rss, cpuSeconds=resources.cpuSeconds)
+			except NoSuchProcessError:
+				pass
+		if not liveness.alive:
+			failed = liveness.results[-1] if len(liveness.results) > 0 else None
+			health["error"] = "{0} check failed".format(failed.tier) if failed else "not running"
+			return NodeHealth(**health)
+		startTime = time.monotonic()
+		try:
+			height, peers, mempool, masternode = self.rpcClient.batch([("getblockcount", []),\
+				("getconnectioncount", []), ("getmempoolinfo", []), ("masternode", ["status"])])
+		except RpcConnectionError as error:
+			health["error"] = error.reason
+			return NodeHealth(**health)
+		health["latency"] = time.monotonic()-startTime
+		if not height.error is None:
+			health.update(warmingUp=height.error.code == RPC_IN_WARMUP, error=height.error.rpcMessage)
+			return NodeHealth(**health)
+		health.update(alive=True, height=height.result, peers=peers.result)
+		if mempool.error is None and isinstance(mempool.result, dict):
+			health["mempool"] = mempool.result.get("size")
+		if masternode.error is None:
+			health["masternodeStatus"] = masternode.result.get("status", masternode.result.get("message"))\
+				if isinstance(masternode.result, dict) else str(masternode.result)
+		return NodeHealth(**health)
 
 #=======================================================================================
 # Actions
 #=======================================================================================
 
+#==========================================================
+# Action Base Classes
+#==========================================================
+
+#==========================================================
+class NodeAction(Action):
+	
+	#=============================
+	"""An action operating on one node.
+	
+	The node is the one picked with -i/--identifier (its id or datadir) from
+	the fleet in the coin directory, or the one of the default config if
+	none is specified."""
+	#=============================
+	
+	@property
+	def config(self):
+		identifier = getattr(self.data.args, "identifier", None)
+		if identifier is None:
+			return self.data.Config()
+		registry = self.data.Config.nodeRegistry(getattr(self.data.args, "coinDirPath", None))
+		node = registry.resolve(identifier)
+		if node is None:
+			raise WalletError("No node \"{identifier}\" found. Available nodes: {ids}"\
+				.format(identifier=identifier, ids=", ".join(registry.ids)), WalletError.codes.NODE_NOT_FOUND)
+		return node.config
+
+#==========================================================
+class FleetAction(Action):
+	
+	#=============================
+	"""An action operating on all nodes in the coin directory, or those picked with --nodes."""
+	#=============================
+	
+	@property
+	def registry(self):
+		if not hasattr(self, "_registry"):
+			self._registry = self.data.Config.nodeRegistry(getattr(self.data.args, "coinDirPath", None))
+		return self._registry
+	
+	@property
+	def supervisorSocketPath(self):
+		"""Where the supervisor of the coin directory listens (see "supervise")."""
+		return os.path.join(self.registry.loader.coinDirPath, "supervisor.sock")
+	
+	@property
+	def metricsPath(self):
+		"""Where the metrics of the nodes are kept (see "monitor" and "metrics")."""
+		return os.path.join(self.registry.loader.coinDirPath, "metrics.sqlite")
+	
+	@property
+	def nodes(self):
+		fleet = self.registry.fleet()
+		ids = getattr(self.data.args, "nodeIds", None)
+		if ids is None:
+			return list(fleet)
+		nodes = []
+		for id in [id.strip() for id in ids.split(",") if id.strip()]:
+			node = fleet.resolve(id)
+			if node is None:
+				raise WalletError("No node \"{id}\" found. Available nodes: {ids}"\
+					.format(id=id, ids=", ".join(fleet.ids)), WalletError.codes.NODE_NOT_FOUND)
+			nodes.append(node)
+		return nodes
+
+class FleetActionReturnValue(ActionReturnValueStream):
+	
+	#=============================
+	"""Shows the StaggeredResult of every node as it comes in."""
+	#=============================
+	
+	def _itemToString(self, result):
+		if not result.error is None:
+			return "{id}: FAILED after {duration:.1f} s: {error}".format(id=result.item.id,\
+				duration=result.duration, error=str(result.error).strip())
+		return "{id}: {value} ({duration:.1f} s, waited {waited:.1f} s)".format(id=result.item.id,\
+			value=result.value, duration=result.duration, waited=result.waited)
+
 #==========================================================
 #BEGIN# Action: info
 
 #=============================
-class InfoAction(Action):
+class InfoAction(NodeAction):
 	
 	#=============================
 	"""Provides various details about the setup."""
 	#=============================
 	
 	def run(self):
-		return ActionReturnValue(self.data.Config())
+		return ActionReturnValue(self.config)
+	
+#END#
+#==========================================================
+
+#==========================================================
+#BEGIN# Action: list
+
+class ListAction(Action):
+	
+	#=============================
+	"""Lists the nodes in the coin directory, with their datadirs and ports."""
+	#=============================
+	
+	def run(self):
+		return ActionReturnValue(self.data.Config.nodeRegistry(self.data.args.coinDirPath).fleet())
+	
+#END#
+#==========================================================
+
+#==========================================================
+#BEGIN# Action: registry
+
+class RegistryActionReturnValue(ActionReturnValueStream):
+	def _itemToString(self, change):
+		return "{time} {kind}: {id}".format(time=time.strftime("%Y-%m-%d %H:%M:%S"),\
+			kind=change.kind, id=change.id)
+
+class RegistryAction(Action):
+	
+	#=============================
+	"""Rediscovers the nodes in the coin directory and updates the registry.
+	
+	With --watch, keeps it current until interrupted, showing every change."""
+	#=============================
+	
+	def run(self):
+		registry = self.data.Config.nodeRegistry(self.data.args.coinDirPath)
+		if self.data.args.watch:
+			return RegistryActionReturnValue(registry.watch())
+		registry.load().rebuild()
+		return ActionReturnValue(registry.fleet())
 	
 #END#
 #==========================================================
@@ -415,14 +1197,14 @@ class CliActionReturnValue(ActionReturnValue):
 		return "{stdout}{stderr}"\
 			.format(stdout=self.raw.stdout.decode(), stderr=self.raw.stderr.decode())
 
-class CliAction(Action):
+class CliAction(NodeAction):
 	
 	#=============================
 	"""Takes command line arguments for the wallet executable and runs it with them."""
 	#=============================
 	
 	def run(self):
-		wallet = Wallet(self.data.Config())
+		wallet = Wallet(self.config)
 		return CliActionReturnValue(wallet.runCliSafe(\
 			self.data.args.args).waitAndGetOutput(timeout=180))
 #END#
@@ -434,24 +1216,31 @@ class CliAction(Action):
 
 class DaemonActionReturnValue(CliActionReturnValue): pass
 
-class StartDaemonAction(Action):
+class StartDaemonAction(NodeAction):
 	#=============================
 	"""Start the Daemon."""
 	#=============================
 	
 	def run(self):
-		wallet = Wallet(self.data.Config())
-		return DaemonActionReturnValue(wallet.startDaemon(\
-			self.data.args.args).waitAndGetOutput(timeout=180))
+		wallet = Wallet(self.config)
+		waitTimeout = getattr(self.data.args, "startWaitTimeout", None)
+		if not waitTimeout is None:
+			monitor = wallet.monitorStartup(timeout=int(waitTimeout))
+		returnValue = DaemonActionReturnValue(wallet.startDaemon(self.data.args.args,\
+			blockNotifySocketPath=getattr(self.data.args, "blockNotifySocketPath", None))\
+			.waitAndGetOutput(timeout=180))
+		if not waitTimeout is None:
+			monitor.wait()
+		return returnValue
 
-class StopDaemonAction(Action):
+class StopDaemonAction(NodeAction):
 	
 	#=============================
 	"""Stops the daemon."""
 	#=============================
 	
 	def run(self):
-		wallet = Wallet(self.data.Config())
+		wallet = Wallet(self.config)
 		return DaemonActionReturnValue(wallet.stopDaemon(\
 			self.data.args.stopDaemonTimeout)\
 			.waitAndGetOutput(timeout=self.data.args.stopDaemonTimeout))
@@ -493,58 +1282,1299 @@ class ReindexAction(Action):
 ##==========================================================
 
 #==========================================================
-# Register of all above defined actions.
-#==========================================================
-class BitcoinActions(Actions):
-	def setUp(self):
-		super().setUp()
-		self.add("cli", CliAction)
-		self.add("stop", StopDaemonAction)
-		self.add("info", InfoAction)
-		self.add("reindex", ReindexAction)
-		self.add("start", StartDaemonAction)
-		
-	def setUpUninheritable(self):
-		pass
-
-#=======================================================================================
-# Arguments
-#=======================================================================================
-
-#==========================================================
-# Argument Base Setups (for subclassing further below)
-#==========================================================
+#BEGIN# Actions: Fleet start/stop
 
-#==========================================================
-class NodeNameParserSetup(ParserSetup):
+class StartAllAction(FleetAction):
 	
 	#=============================
-	"""Many actions will be specific to some node.
-	That node is identified by its datadir."""
+	"""Starts the daemons of all nodes that aren't running, several at a time.
+	
+	The next node is only started while the disks aren't saturated (see
+	StaggeredRunner), and a node counts as being started until it's ready
+	for RPC calls, so at most --max-concurrency are warming up at once."""
 	#=============================
 	
-	def setUp(self):
-		self.parser.add_argument("-i", "--identifier", dest="identifier", default=None,\
-			help="Specify the node you'd like to operate on."
-			"To do so, use the suffix for the appropriate datadir.",\
-			metavar="DATADIR_SUFFIX")
+	def run(self):
+		runner = StaggeredRunner(self.startNode, maxConcurrency=int(self.data.args.maxConcurrency),\
+			maxIoPressure=self.data.args.maxIoPressure)
+		return FleetActionReturnValue(runner.run(self.nodes))
+	
+	def startNode(self, node):
+		wallet = Wallet(node.config)
+		if wallet.daemonRunning:
+			return "already running"
+		wallet.startDaemon(list(self.data.args.args)).waitAndGetOutput(timeout=180)
+		wallet.waitUntilReady(timeout=int(self.data.args.readyTimeout))
+		return "ready"
 
+class StopAllAction(FleetAction):
+	
+	#=============================
+	"""Stops the daemons of all nodes that are running, several at a time.
+	
+	Shutting down flushes the chainstate to disk, so this is staggered
+	like startall, and a node counts as being stopped until its daemon has
+	exited."""
+	#=============================
+	
+	def run(self):
+		runner = StaggeredRunner(self.stopNode, maxConcurrency=int(self.data.args.maxConcurrency),\
+			maxIoPressure=self.data.args.maxIoPressure)
+		return FleetActionReturnValue(runner.run(self.nodes))
+	
+	def stopNode(self, node):
+		wallet = Wallet(node.config)
+		stopTimeout = int(self.data.args.stopDaemonTimeout)
+		if wallet.daemonRunning:
+			wallet.stopDaemon(stopTimeout)
+		elif wallet.daemonPid is None:
+			return "not running"
+		# It stops answering before it has flushed and let go of its datadir, and the
+		# flush is what's staggered.
+		if not wallet.waitForExit(stopTimeout):
+			raise WalletError("Daemon didn't exit.", WalletError.codes.DAEMON_STUCK)
+		return "stopped"
+	
+#END#
 #==========================================================
-# Node-Independent arguments.
-# (no dependency on NodeNameParserSetup)
-#==========================================================
-
-# -
 
 #==========================================================
-# NodeNameParserSetup dependent arguments.
-#==========================================================
+#BEGIN# Action: rollout
 
-#==========================================================
-class CliParserSetup(NodeNameParserSetup):
+class RolloutActionReturnValue(ActionReturnValueStream):
+	def _itemToString(self, event):
+		timeString = time.strftime("%Y-%m-%d %H:%M:%S")
+		if event.id is None:
+			return "{time} {kind}{detail}".format(time=timeString, kind=event.kind,\
+				detail="" if event.detail is None else ": {0}".format(event.detail))
+		if event.kind == "done":
+			return "{time} {id}: done ({duration:.1f} s)".format(time=timeString, id=event.id,\
+				duration=event.detail)
+		return "{time} {id}: {kind}{detail}".format(time=timeString, id=event.id, kind=event.kind,\
+			detail="" if event.detail is None else ": {0}".format(event.detail))
+
+class RolloutAction(FleetAction):
 	
 	#=============================
-	"""ParserSetup for the "cli" Action."""
+	"""Runs a lifecycle operation on every node, a few at a time.
+	
+	Operations:
+		- restart: Stop the daemon and start it again.
+		- reindex: Stop the daemon and start it with -reindex.
+		- switchbin: Stop the daemon and start it with the binaries in --bin-dir.
+		- resync: Stop the daemon, trash its block data and start it again, to sync
+		  from scratch. The trash is purged in the background.
+	
+	At most --max-unavailable nodes are down at once, counting nodes that are
+	down for other reasons. A node counts as down until it's ready for RPC calls
+	again, after a reindex or resync until it has caught up with the chain.
+	Progress is checkpointed in the coin directory, so running the same rollout
+	again after an interruption or failure resumes it (see lib.rollout)."""
+	#=============================
+	
+	operations = ["restart", "reindex", "switchbin", "resync"]
+	syncingOperations = ["reindex", "resync"]
+	
+	def run(self):
+		operation = self.data.args.operation
+		if operation == "switchbin" and self.data.args.binDirPath is None:
+			raise WalletError("switchbin needs --bin-dir.", WalletError.codes.CLI_ERROR)
+		orchestrator = RollingOrchestrator(operation, self.operateOn, self.isAvailable,\
+			maxUnavailable=int(self.data.args.maxUnavailable),\
+			checkpoint=RolloutCheckpoint(os.path.join(self.registry.loader.coinDirPath, "rollout.json")))
+		return RolloutActionReturnValue(orchestrator.run(self.nodes))
+	
+	def isAvailable(self, node):
+		return Wallet(node.config).daemonRunning
+	
+	def operateOn(self, node):
+		config = node.config
+		commandLine = list(self.data.args.args)
+		if self.data.args.operation == "reindex":
+			commandLine.insert(0, "-reindex")
+		if self.data.args.operation == "switchbin":
+			config.basePaths = [self.data.args.binDirPath]
+		wallet = Wallet(config)
+		stopTimeout = int(self.data.args.stopDaemonTimeout)
+		if wallet.daemonRunning:
+			wallet.stopDaemon(stopTimeout)
+		# It stops answering before it has flushed and let go of its datadir.
+		if not wallet.waitForExit(stopTimeout):
+			raise WalletError("Daemon didn't exit.", WalletError.codes.DAEMON_STUCK)
+		if self.data.args.operation == "resync":
+			wallet.deleteBlockchainData()
+		wallet.startDaemon(commandLine).waitAndGetOutput(timeout=180)
+		wallet.waitUntilReady(timeout=int(self.data.args.readyTimeout))
+		if self.data.args.operation in self.syncingOperations:
+			wallet.waitUntilCaughtUp(timeout=int(self.data.args.syncTimeout))
+	
+#END#
+#==========================================================
+
+#==========================================================
+#BEGIN# Action: clone
+
+class CloneAction(FleetAction):
+	
+	#=============================
+	"""Sets up a new node with the block data of a synced one, so it doesn't have to sync.
+	
+	The source node's daemon is stopped for the copy, if it's running, and started
+	again afterwards. The copy only starts once the daemon process has exited, not
+	merely stopped answering. With reflinks, that's a matter of seconds (see TreeCopier).
+	The new node gets a fresh conf file, unless it has one already."""
+	#=============================
+	
+	def run(self):
+		args = self.data.args
+		loader = self.registry.loader
+		source = self.registry.resolve(args.sourceIdentifier)
+		if source is None:
+			raise WalletError("No node \"{id}\" found to clone from.".format(id=args.sourceIdentifier),\
+				WalletError.codes.NODE_NOT_FOUND)
+		targetId = args.identifier
+		if targetId is None or not targetId.isdigit():
+			raise WalletError("Specify the numeric id of the new node with -i.", WalletError.codes.CLI_ERROR)
+		homeDirPath = os.path.join(loader.masternodesDirPath, targetId)
+		dataDirPath = loader.dataDirPathFor(homeDirPath)
+		for dirName in Wallet.cloneDirNames:
+			if os.path.lexists(os.path.join(dataDirPath, dirName)):
+				raise WalletError("Node {id} has block data already: {path}".format(id=targetId,\
+					path=os.path.join(dataDirPath, dirName)), WalletError.codes.CLI_ERROR)
+		os.makedirs(dataDirPath, exist_ok=True)
+		confPath = loader.confPathFor(dataDirPath)
+		if not os.path.exists(confPath):
+			with open(confPath, "w") as confFile:
+				confFile.write(self.data.Config.makeNodeConf(loader.baseRpcPort+int(targetId)))
+		
+		sourceWallet = Wallet(source.config)
+		stopTimeout = int(args.stopDaemonTimeout)
+		wasRunning = sourceWallet.daemonRunning
+		if wasRunning:
+			sourceWallet.stopDaemon(stopTimeout)
+		# Also when it doesn't answer: It may still be flushing its chainstate.
+		if not sourceWallet.waitForExit(stopTimeout):
+			raise WalletError("The daemon of node {id} didn't exit.".format(id=source.id),\
+				WalletError.codes.DAEMON_STUCK)
+		try:
+			stats = sourceWallet.cloneBlockchainDataTo(dataDirPath, workers=int(args.workers))
+		except BaseException:
+			for dirName in Wallet.cloneDirNames:
+				shutil.rmtree(os.path.join(dataDirPath, dirName), ignore_errors=True)
+			raise
+		finally:
+			if wasRunning and sourceWallet.waitForExit(stopTimeout):
+				sourceWallet.startDaemon().waitAndGetOutput(timeout=180)
+		if not self.registry.updateNode(targetId) is None:
+			self.registry.save()
+		return ActionReturnValue({"node": targetId, "from": source.id, "datadir": dataDirPath,\
+			"files": stats.files, "reflinked": stats.reflinked,\
+			"size": "{0:.1f} MiB".format(stats.bytes/(1 << 20)),\
+			"duration": "{0:.1f} s".format(stats.duration)})
+	
+#END#
+#==========================================================
+
+#==========================================================
+#BEGIN# Action: dedup
+
+class DedupAction(FleetAction):
+	
+	#=============================
+	"""Links identical finalized block files of the nodes together (see lib.dedup)."""
+	#=============================
+	
+	def run(self):
+		args = self.data.args
+		deduplicator = BlockFileDeduplicator(workers=args.workers, linkMode=args.linkMode,\
+			dryRun=args.dryRun)
+		stats = deduplicator.deduplicate([(node.id, os.path.join(str(node.dataDirPath), "blocks"))\
+			for node in self.nodes])
+		return ActionReturnValue({"files": stats.files, "identical sets": stats.groups,\
+			"would link" if args.dryRun else "linked": stats.linked,\
+			"changed meanwhile": stats.skipped,\
+			"saved": "{0:.1f} MiB".format(stats.bytesSaved/(1 << 20)),\
+			"duration": "{0:.1f} s".format(stats.duration)})
+	
+#END#
+#==========================================================
+
+#==========================================================
+#BEGIN# Action: purge
+
+class PurgeActionReturnValue(ActionReturnValueStream):
+	def _itemToString(self, item):
+		id, progress = item
+		if isinstance(progress, str):
+			return "{id}: {message}".format(id=id, message=progress)
+		lines = ["{id}: {state}, {files} files, {size:.1f} MiB deleted, {pending} trashed tree(s) left"\
+			.format(id=id, state="done" if progress.done else "purging", files=progress.files,\
+			size=progress.bytes/(1 << 20), pending=progress.pending)]
+		if progress.done:
+			lines.extend(["{id}: ERROR: {path}: {message}".format(id=id, path=path, message=message)\
+				for path, message in progress.errors])
+		return "\n".join(lines)
+
+class PurgeAction(FleetAction):
+	
+	#=============================
+	"""Purges the trash of the nodes (see lib.trash), or, with --status, shows how the
+	background purges are getting on."""
+	#=============================
+	
+	def run(self):
+		return PurgeActionReturnValue(self.iterProgress())
+	
+	def iterProgress(self):
+		args = self.data.args
+		for node in self.nodes:
+			trashCan = Wallet(node.config).trashCan
+			if args.status:
+				status = trashCan.status
+				if status is None:
+					yield (node.id, "{0} trashed tree(s), never purged".format(len(trashCan.pending)))
+					continue
+				yield (node.id, "{state} ({pid}, {updated}), {files} files, {size:.1f} MiB deleted, "
+					"{pending} trashed tree(s) left, {errors} error(s)".format(\
+					state="done" if status["done"] else "purging", pid=status["pid"],\
+					updated=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(status["updated"])),\
+					files=status["files"], size=status["bytes"]/(1 << 20), pending=len(trashCan.pending),\
+					errors=len(status["errors"])))
+				continue
+			if len(trashCan.pending) == 0:
+				yield (node.id, "Nothing to purge.")
+				continue
+			purger = TrashPurger(trashCan.dirPath, maxBytesPerSecond=int(args.maxMegabytesPerSecond) << 20)
+			try:
+				for progress in purger.purge():
+					yield (node.id, progress)
+			except TrashError as error:
+				yield (node.id, str(error).strip())
+	
+#END#
+#==========================================================
+
+#==========================================================
+#BEGIN# Action: getlog
+
+# What parseTime understands: UTC dates and times, or times of today.
+TIME_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M"]
+TIME_OF_DAY_FORMATS = ["%H:%M:%S", "%H:%M"]
+
+def parseTime(text):
+	"""Seconds since the epoch for a UTC date and time, or a time of today."""
+	if text is None:
+		return None
+	for timeFormat in TIME_FORMATS:
+		try:
+			return calendar.timegm(time.strptime(text, timeFormat))
+		except ValueError:
+			pass
+	for timeFormat in TIME_OF_DAY_FORMATS:
+		try:
+			timeOfDay = time.strptime(text, timeFormat)
+		except ValueError:
+			continue
+		today = time.gmtime()
+		return calendar.timegm((today.tm_year, today.tm_mon, today.tm_mday,\
+			timeOfDay.tm_hour, timeOfDay.tm_min, timeOfDay.tm_sec, 0, 0, 0))
+	raise WalletError("Can't make sense of the time \"{text}\". Use YYYY-MM-DD HH:MM[:SS] or HH:MM[:SS] (UTC)."\
+		.format(text=text), WalletError.codes.CLI_ERROR)
+
+class LogActionReturnValue(ActionReturnValueStream):
+	pass
+
+class GetLogAction(NodeAction):
+	
+	#=============================
+	"""The last lines of the node's debug.log, read from the end of the file.
+	
+	With --since and/or --until, the lines of that time range instead, found
+	through a LogIndex kept next to the log (see lib.logindex)."""
+	#=============================
+	
+	def run(self):
+		args = self.data.args
+		if args.since is None and args.until is None:
+			return LogActionReturnValue(tailLines(self.config.debugLogPath, int(args.lineCount)))
+		return LogActionReturnValue(LogIndex(self.config.debugLogPath)\
+			.lines(parseTime(args.since), parseTime(args.until)))
+	
+#END#
+#==========================================================
+
+#==========================================================
+#BEGIN# Action: livelog
+
+class MergedLogActionReturnValue(ActionReturnValueStream):
+	def _itemToString(self, item):
+		id, line = item
+		return "{id}: {line}".format(id=id, line=line)
+
+class LiveLogAction(NodeAction, FleetAction):
+	
+	#=============================
+	"""Follows the node's debug.log, like "tail -F".
+	
+	With --all or --nodes, follows the logs of several nodes at once instead,
+	merged in timestamp order, each line prefixed with the id of its node
+	(see MergedLogFollower). --grep only shows lines matching a regex."""
+	#=============================
+	
+	def run(self):
+		args = self.data.args
+		lineCount = int(args.lineCount)
+		if args.allNodes or not args.nodeIds is None:
+			follower = MergedLogFollower(OrderedDict([(node.id, node.config.debugLogPath)\
+				for node in self.nodes]), lines=lineCount, pattern=args.pattern)
+			return MergedLogActionReturnValue(follower.follow())
+		lines = LogFollower(self.config.debugLogPath, lines=lineCount).follow()
+		if not args.pattern is None:
+			pattern = re.compile(args.pattern)
+			lines = (line for line in lines if pattern.search(line))
+		return LogActionReturnValue(lines)
+	
+#END#
+#==========================================================
+
+#==========================================================
+#BEGIN# Action: progress
+
+class ProgressActionReturnValue(ActionReturnValueStream):
+	
+	def _durationToString(self, seconds):
+		if seconds is None:
+			return "unknown"
+		minutes, seconds = divmod(int(seconds), 60)
+		hours, minutes = divmod(minutes, 60)
+		days, hours = divmod(hours, 24)
+		if days > 0:
+			return "{0}d {1}h".format(days, hours)
+		if hours > 0:
+			return "{0}h {1}m".format(hours, minutes)
+		return "{0}m {1}s".format(minutes, seconds)
+	
+	def _itemToString(self, item):
+		id, estimate = item
+		if estimate is None:
+			return "{id}: No UpdateTip lines in the log.".format(id=id)
+		rates = "" if estimate.blocksPerSecond is None else ", {blocks:.1f} blocks/s, {tx:.0f} tx/s"\
+			.format(blocks=estimate.blocksPerSecond, tx=estimate.txPerSecond)
+		return "{id}: height {height}, {progress:.2f}%{rates}{cache}, {state} (as of {time})".format(id=id,\
+			height=estimate.height, progress=estimate.progress*100, rates=rates,\
+			cache="" if estimate.cache is None else ", cache {0:.1f} MiB".format(estimate.cache),\
+			state="synced" if estimate.synced else "ETA {0}".format(self._durationToString(estimate.eta)),\
+			time=time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(estimate.time)))
+
+class ProgressAction(NodeAction, FleetAction):
+	
+	#=============================
+	"""How far the node is with syncing or reindexing, with blocks/s and an ETA.
+	
+	Goes by the UpdateTip lines in debug.log alone (see lib.syncprogress), so it
+	works while the node doesn't answer RPC calls yet. With --all or --nodes, shows
+	every node picked."""
+	#=============================
+	
+	def run(self):
+		args = self.data.args
+		window = int(args.window)
+		if args.allNodes or not args.nodeIds is None:
+			configs = [(node.id, node.config) for node in self.nodes]
+		else:
+			configs = [(getattr(args, "identifier", None) or "-", self.config)]
+		return ProgressActionReturnValue((id, SyncProgressTracker(config.debugLogPath).estimate(window))\
+			for id, config in configs)
+	
+#END#
+#==========================================================
+
+#==========================================================
+#BEGIN# Action: supervise
+
+class SuperviseActionReturnValue(ActionReturnValueStream):
+	def _itemToString(self, event):
+		timeString = time.strftime("%Y-%m-%d %H:%M:%S")
+		if event.kind == "backoff":
+			detail = ": starting again in {0:.0f} s".format(event.detail)
+		else:
+			detail = "" if event.detail is None else ": {0}".format(event.detail)
+		return "{time} {who}{kind}{detail}".format(time=timeString,\
+			who="" if event.id is None else "{0}: ".format(event.id), kind=event.kind, detail=detail)
+
+class SuperviseAction(FleetAction):
+	
+	#=============================
+	"""Runs the daemons of the nodes as children of this process, until it's stopped.
+	
+	The daemons run in the foreground, without -daemon. Daemons running already,
+	as after a restart of the supervisor, are adopted. Crashed daemons are started
+	again, with a delay growing with every crash in a row. The state of the daemons
+	is served on a Unix socket in the coin directory, for the "supervisor" action
+	(see lib.supervisor). SIGTERM or Ctrl+C stops the daemons, then the supervisor."""
+	#=============================
+	
+	def run(self):
+		args = self.data.args
+		children = []
+		for node in self.nodes:
+			wallet = Wallet(node.config)
+			children.append(SupervisedChild(node.id, wallet.daemonCommandLine(list(args.args), detach=False),\
+				findRunning=lambda wallet=wallet: wallet.daemonPid))
+		supervisor = Supervisor(children, socketPath=self.supervisorSocketPath,\
+			backoff=CrashLoopBackoff(maxDelay=float(args.maxBackoff)), stopTimeout=float(args.stopDaemonTimeout))
+		return SuperviseActionReturnValue(supervisor.run())
+	
+#END#
+#==========================================================
+
+#==========================================================
+#BEGIN# Action: supervisor
+
+class SupervisorActionReturnValue(ActionReturnValue):
+	
+	@property
+	def string(self):
+		if not "children" in self.raw:
+			return "ok" if not "child" in self.raw else self._childToString(self.raw["child"]["id"], self.raw["child"])
+		return "\n".join([self._childToString(id, status) for id, status in self.raw["children"].items()])
+	
+	def _childToString(self, id, status):
+		details = []
+		if not status["pid"] is None:
+			details.append("pid {0}".format(status["pid"]))
+		if not status["uptime"] is None:
+			details.append("up {0:.0f} s".format(status["uptime"]))
+		if status["restarts"] > 0:
+			details.append("{0} restart(s)".format(status["restarts"]))
+		if not status["lastExit"] is None:
+			details.append("last {0}".format(status["lastExit"]))
+		if not status["nextStartIn"] is None:
+			details.append("next start in {0:.0f} s".format(status["nextStartIn"]))
+		if status.get("adopted"):
+			details.append("adopted")
+		string = "{id}: {state}{details}".format(id=id, state=status["state"],\
+			details="" if len(details) == 0 else " ({0})".format(", ".join(details)))
+		if not status["lastError"] is None and not status["state"] == "running":
+			string += "\n\t"+status["lastError"].replace("\n", "\n\t")
+		return string
+
+class SupervisorAction(FleetAction):
+	
+	#=============================
+	"""Asks the supervisor of the coin directory (see "supervise") about its daemons,
+	or has it start, stop or restart one."""
+	#=============================
+	
+	def run(self):
+		args = self.data.args
+		command = args.command if args.identifier is None else "{0} {1}".format(args.command, args.identifier)
+		reply = SupervisorClient(self.supervisorSocketPath).request(command)
+		if "child" in reply:
+			reply["child"]["id"] = args.identifier
+		return SupervisorActionReturnValue(reply)
+	
+#END#
+#==========================================================
+
+#==========================================================
+#BEGIN# Action: monitor
+
+class MonitorActionReturnValue(ActionReturnValueStream):
+	
+	def _itemToString(self, event):
+		timeString = time.strftime("%Y-%m-%d %H:%M:%S")
+		if event.kind == "probe":
+			health = event.detail
+			if health.alive:
+				detail = "height {height}, {peers} peer(s){masternode}".format(height=health.height,\
+					peers=health.peers, masternode="" if health.masternodeStatus is None\
+						else ", masternode: {0}".format(health.masternodeStatus))
+			else:
+				detail = "{state}: {error}".format(state="warming up" if health.warmingUp else "DOWN",\
+					error=health.error)
+			return "{time} {id}: {detail}".format(time=timeString, id=event.id, detail=detail)
+		detail = "" if event.detail is None else ": {0}".format(str(event.detail).strip())
+		return "{time} {id}: {kind}{detail}".format(time=timeString, id=event.id, kind=event.kind, detail=detail)
+
+class MonitorAction(FleetAction):
+	
+	#=============================
+	"""Keeps probing the nodes and restarts those that are down or stuck, until it's stopped.
+	
+	Replaces running mnchecker from cron for every node every minute: One process
+	probes all nodes, each on its own jittered schedule, over RPC directly (see
+	lib.monitoring). A node is restarted once it failed a number of probes in a row,
+	or once it's been lagging behind the fleet's highest tip without progress for a
+	while. Nodes run by a supervisor (see "supervise") are restarted through it,
+	unless they were stopped through it. Other nodes are stopped with the cli and,
+	if they don't answer or don't exit, killed (see Wallet.killDaemon).
+	The probe results are recorded in the metrics store (see "metrics") and can be
+	exposed to Prometheus (see lib.prometheus)."""
+	#=============================
+	
+	def _restart(self, wallet, node, reason):
+		client = SupervisorClient(self.supervisorSocketPath)
+		if client.available:
+			status = client.status().get(node.id)
+			if not status is None:
+				# A restart request would make the supervisor want it running again.
+				if not status["wanted"]:
+					return "stopped through the supervisor ({0})".format(status["state"])
+				client.request("restart {0}".format(node.id))
+				return None
+		stoppedCleanly = False
+		if wallet.daemonRunning:
+			wallet.stopDaemon(self.stopTimeout)
+			stoppedCleanly = wallet.waitForExit(self.stopTimeout)
+		if not stoppedCleanly:
+			# Hung: alive, but not answering, or not stopping when asked to.
+			wallet.killDaemon(self.stopTimeout)
+		# The launcher exits once the daemon is in the background, or right away if it can't start.
+		process = wallet.startDaemon()
+		stdoutString, stderrString = process.waitAndGetOutput(timeout=180)
+		if not process.process.returncode == 0 or not stderrString.decode().strip() == "":
+			raise WalletError("The daemon didn't start: {error}".format(error=stderrString.decode().strip()\
+				or "exit code {0}".format(process.process.returncode)), WalletError.codes.DAEMON_START_FAILED)
+		return None
+	
+	def run(self):
+		args = self.data.args
+		self.stopTimeout = int(args.stopDaemonTimeout)
+		wallets = OrderedDict([(node.id, Wallet(node.config)) for node in self.nodes])
+		policy = RestartPolicy(unresponsiveProbes=int(args.restartUnresponsiveAfter), maxLag=int(args.maxLag),\
+			laggingFor=float(args.restartLaggingAfter), cooldown=float(args.restartCooldown))
+		monitor = FleetMonitor(self.nodes, probe=lambda node: wallets[node.id].probeHealth(node.id),\
+			restart=lambda node, reason: self._restart(wallets[node.id], node, reason),\
+			interval=float(args.interval), jitter=float(args.jitter), maxConcurrency=int(args.maxConcurrency),\
+			policy=None if args.noRestart else policy)
+		events = monitor.run()
+		if not args.noMetrics:
+			events = self.recordMetrics(events, MetricsStore(self.metricsPath,\
+				batchSize=len(wallets)*len(self.recordedMetrics)))
+		if not args.prometheusListen is None or not args.prometheusTextfile is None:
+			events = self.export(events)
+		return MonitorActionReturnValue(events)
+	
+	# Metric names and how to get them from a NodeHealth.
+	recordedMetrics = OrderedDict([\
+		("alive", lambda health: 1 if health.alive else 0),\
+		("height", lambda health: health.height),\
+		("peers", lambda health: health.peers),\
+		("mempool", lambda health: health.mempool),\
+		("rss", lambda health: health.rss),\
+		("cpuSeconds", lambda health: health.cpuSeconds),\
+		("latency", lambda health: health.latency)])
+	
+	def export(self, events):
+		"""Pass the events through, keeping a FleetExporter up to date with them, which
+		serves the metrics over HTTP and/or writes them to a textfile."""
+		args = self.data.args
+		exporter = FleetExporter(labels={"coin": os.path.basename(os.path.normpath(\
+			self.registry.loader.coinDirPath))})
+		if not args.prometheusListen is None:
+			host, separator, port = args.prometheusListen.rpartition(":")
+			exporter.serve(host or "127.0.0.1", port)
+		try:
+			for event in events:
+				exporter.observe(event)
+				if not args.prometheusTextfile is None and event.kind in ("probe", "restarted"):
+					exporter.writeTextfile(args.prometheusTextfile)
+				yield event
+		finally:
+			exporter.close()
+	
+	def recordMetrics(self, events, store):
+		"""Pass the events through, recording the probe results in store."""
+		with store:
+			for event in events:
+				if event.kind == "probe":
+					for metric, getValue in self.recordedMetrics.items():
+						store.add(event.id, metric, getValue(event.detail), event.detail.time)
+				yield event
+	
+#END#
+#==========================================================
+
+#==========================================================
+#BEGIN# Action: metrics
+
+class MetricsActionReturnValue(ActionReturnValueStream):
+	
+	def _itemToString(self, item):
+		if isinstance(item, str):
+			return item
+		id, metric, metricRange = item
+		if len(metricRange.times) == 0:
+			return "{id} {metric}: no samples".format(id=id, metric=metric)
+		lines = []
+		for index in range(len(metricRange.times)):
+			line = "{time} {id} {metric}: {value:g}".format(time=time.strftime("%Y-%m-%d %H:%M:%S",\
+				time.gmtime(metricRange.times[index])), id=id, metric=metric, value=metricRange.values[index])
+			if metricRange.resolution > 0:
+				line = "{line} ({minimum:g} to {maximum:g})".format(line=line, minimum=metricRange.minimums[index],\
+					maximum=metricRange.maximums[index])
+			lines.append(line)
+		return "\n".join(lines)
+
+class MetricsAction(FleetAction):
+	
+	#=============================
+	"""Shows the metrics "monitor" recorded for the nodes (see lib.metrics).
+	
+	Without a metric, lists the metrics there are. Times are UTC, as for getlog.
+	Without a resolution, the finest one reaching back to --since is used."""
+	#=============================
+	
+	def run(self):
+		return MetricsActionReturnValue(self.iterRanges())
+	
+	def iterRanges(self):
+		args = self.data.args
+		if not os.path.exists(self.metricsPath):
+			yield "No metrics recorded yet; see \"monitor\"."
+			return
+		with MetricsStore(self.metricsPath) as store:
+			if args.metric is None:
+				yield "Metrics: {0}".format(", ".join(store.metrics))
+				return
+			since = parseTime(args.since)
+			since = time.time()-3600 if since is None else since
+			resolution = None if args.resolution is None else int(args.resolution)
+			for node in self.nodes:
+				yield (node.id, args.metric, store.range(node.id, args.metric, since, parseTime(args.until),\
+					resolution))
+	
+#END#
+#==========================================================
+
+#==========================================================
+#BEGIN# Action: sentinel
+
+class SentinelActionReturnValue(ActionReturnValueStream):
+	
+	def _itemToString(self, event):
+		timeString = time.strftime("%Y-%m-%d %H:%M:%S")
+		if event.kind == "missing":
+			return "{time} {id}: No sentinel in {path}, left out.".format(time=timeString, id=event.id,\
+				path=event.detail)
+		if event.kind == "skipped":
+			return "{time} {id}: skipped, the previous run has been going for {seconds:.0f} s".format(\
+				time=timeString, id=event.id, seconds=event.detail)
+		if event.kind == "statusFailed":
+			return "{time} {id}: {error}".format(time=timeString, id=event.id, error=event.detail)
+		run = event.detail
+		line = "{time} {id}: {kind} ({duration:.1f} s)".format(time=timeString, id=event.id, kind=event.kind,\
+			duration=run.duration)
+		if run.error is None:
+			return line
+		return "{line}: {error}{output}".format(line=line, error=run.error,\
+			output="" if run.output == "" else "\n{0}".format(run.output))
+
+class SentinelStatusActionReturnValue(ActionReturnValueStream):
+	
+	def _itemToString(self, item):
+		id, status = item
+		if status is None:
+			return "{id}: not run yet".format(id=id)
+		average = "-" if status["averageDuration"] is None else "{0:.1f} s".format(status["averageDuration"])
+		line = "{id}: {runs} run(s), {failures} failed, {skipped} skipped, {average} on average, "\
+			"{max:.1f} s at most".format(id=id, runs=status["runs"], failures=status["failures"],\
+			skipped=status["skipped"], average=average, max=status["maxDuration"])
+		if status["failuresInARow"] > 0:
+			lastFailure = status["lastFailure"]
+			line = "{line}\n{id}: FAILING ({count} in a row), last at {time}: {error}".format(line=line, id=id,\
+				count=status["failuresInARow"], time=time.strftime("%Y-%m-%d %H:%M:%S",\
+				time.localtime(lastFailure["start"])), error=lastFailure["error"])
+		return line
+
+class SentinelAction(FleetAction):
+	
+	#=============================
+	"""Runs sentinel for every node once a minute, until it's stopped, or, with --status,
+	shows how the runs went.
+	
+	Replaces a crontab line per node: The runs are spread evenly across the minute
+	and run in a bounded pool (see lib.scheduling). A node's run is skipped if the
+	previous one is still going. Durations and failures are kept in a status file
+	in the coin directory."""
+	#=============================
+	
+	@property
+	def statusPath(self):
+		return os.path.join(self.registry.loader.coinDirPath, "sentinel.status.json")
+	
+	def run(self):
+		args = self.data.args
+		if args.status:
+			return SentinelStatusActionReturnValue(self.iterStatus())
+		return SentinelActionReturnValue(self.iterEvents())
+	
+	def iterStatus(self):
+		try:
+			with open(self.statusPath, "r") as statusFile:
+				jobs = json.load(statusFile)["jobs"]
+		except FileNotFoundError:
+			jobs = {}
+		for node in self.nodes:
+			yield (node.id, jobs.get(node.id))
+	
+	def iterEvents(self):
+		args = self.data.args
+		jobs = []
+		for node in self.nodes:
+			wallet = Wallet(node.config)
+			job = wallet.sentinelJob(node.id)
+			if job is None:
+				yield JobEvent("missing", node.id, wallet.sentinelDirPath)
+				continue
+			jobs.append(job)
+		if len(jobs) == 0:
+			return
+		timeout = float(args.timeout)
+		scheduler = SpreadScheduler(jobs, period=float(args.period), maxWorkers=int(args.maxWorkers),\
+			timeout=timeout if timeout > 0 else None, statusPath=self.statusPath)
+		yield from scheduler.run()
+	
+#END#
+#==========================================================
+
+#==========================================================
+#BEGIN# Action: tips
+
+class TipsActionReturnValue(ActionReturnValueStream):
+	
+	def _itemToString(self, item):
+		kind, detail = item
+		if kind == "group":
+			return "{height} {hash}: {ids}".format(height=detail.height, hash=detail.hash, ids=", ".join(detail.ids))
+		if kind == "lagging":
+			return "LAGGING {0}: {1} blocks behind".format(*detail)
+		if kind == "forked":
+			return "FORKED {0}: on another block than the other nodes at its height".format(detail)
+		if kind == "unreachable":
+			return "UNREACHABLE {id}: {error}".format(id=detail.id, error=detail.error)
+		return detail
+
+class TipsAction(FleetAction):
+	
+	#=============================
+	"""Compares the best blocks of the nodes, to spot nodes that lag behind or are forked off.
+	
+	All nodes are asked at once, each for its getblockchaininfo, so it takes one RPC
+	round trip. That has the best block's hash and height from the same moment,
+	unlike getbestblockhash and getblockcount, between which a block may come in and
+	make the node look forked. The nodes are shown grouped by tip,
+	highest first, followed by those that are off (see lib.consensus)."""
+	#=============================
+	
+	def fetchTip(self, node):
+		client = RpcClient(node.config.rpcEndpoint, timeout=float(self.data.args.timeout))
+		try:
+			info = client.call("getblockchaininfo")
+		except RpcConnectionError as error:
+			return NodeTip(id=node.id, height=None, hash=None, error=error.reason)
+		except RpcError as error:
+			return NodeTip(id=node.id, height=None, hash=None, error=error.rpcMessage)
+		finally:
+			client.close()
+		return NodeTip(id=node.id, height=info["blocks"], hash=info["bestblockhash"], error=None)
+	
+	def run(self):
+		return TipsActionReturnValue(self.iterLines())
+	
+	def iterLines(self):
+		nodes = self.nodes
+		if len(nodes) == 0:
+			return
+		with ThreadPoolExecutor(max_workers=min(32, len(nodes))) as executor:
+			tips = list(executor.map(self.fetchTip, nodes))
+		comparison = compareTips(tips, maxLag=int(self.data.args.maxLag))
+		for group in comparison.groups:
+			yield ("group", group)
+		for lagging in comparison.lagging:
+			yield ("lagging", lagging)
+		for id in comparison.forked:
+			yield ("forked", id)
+		for tip in comparison.unreachable:
+			yield ("unreachable", tip)
+		if len(comparison.lagging)+len(comparison.forked)+len(comparison.unreachable) == 0:
+			yield ("summary", "All {0} node(s) agree.".format(len(tips)))
+	
+#END#
+#==========================================================
+
+#==========================================================
+#BEGIN# Action: probe
+
+class ProbeAction(NodeAction):
+	
+	#=============================
+	"""Checks whether the daemon is alive, showing every check and how long it took."""
+	#=============================
+	
+	def run(self):
+		wallet = Wallet(self.config)
+		return ActionReturnValue(wallet.probeLiveness(deep=self.data.args.deep))
+	
+#END#
+#==========================================================
+
+#==========================================================
+#BEGIN# Action: watchblocks
+
+class WatchBlocksActionReturnValue(ActionReturnValueStream):
+	def _itemToString(self, event):
+		return "{time} {node} {blockHash}".format(time=time.strftime("%Y-%m-%d %H:%M:%S",\
+			time.localtime(event.time)), node=event.node, blockHash=event.blockHash)
+
+class WatchBlocksAction(Action):
+	
+	#=============================
+	"""Listens for -blocknotify events from daemons started with --blocknotify-socket.
+	
+	Shows every new block as it's reported, until interrupted."""
+	#=============================
+	
+	def run(self):
+		return WatchBlocksActionReturnValue(self.events())
+	
+	def events(self):
+		with BlockNotifyListener(self.data.args.blockNotifySocketPath) as listener:
+			for event in listener.events():
+				yield event
+	
+#END#
+#==========================================================
+
+#==========================================================
+# Register of all above defined actions.
+#==========================================================
+class BitcoinActions(Actions):
+	def setUp(self):
+		super().setUp()
+		self.add("cli", CliAction)
+		self.add("stop", StopDaemonAction)
+		self.add("info", InfoAction)
+		self.add("reindex", ReindexAction)
+		self.add("start", StartDaemonAction)
+		self.add("watchblocks", WatchBlocksAction)
+		self.add("probe", ProbeAction)
+		self.add("list", ListAction)
+		self.add("registry", RegistryAction)
+		self.add("startall", StartAllAction)
+		self.add("stopall", StopAllAction)
+		self.add("rollout", RolloutAction)
+		self.add("clone", CloneAction)
+		self.add("dedup", DedupAction)
+		self.add("purge", PurgeAction)
+		self.add("getlog", GetLogAction)
+		self.add("livelog", LiveLogAction)
+		self.add("progress", ProgressAction)
+		self.add("supervise", SuperviseAction)
+		self.add("supervisor", SupervisorAction)
+		self.add("monitor", MonitorAction)
+		self.add("sentinel", SentinelAction)
+		self.add("metrics", MetricsAction)
+		self.add("tips", TipsAction)
+		
+	def setUpUninheritable(self):
+		pass
+
+#=======================================================================================
+# Arguments
+#=======================================================================================
+
+#==========================================================
+# Argument Base Setups (for subclassing further below)
+#==========================================================
+
+#==========================================================
+class CoinDirParserSetup(ParserSetup):
+	
+	#=============================
+	"""For actions dealing with the nodes in the coin directory (see lib.fleet)."""
+	#=============================
+	
+	def setUp(self):
+		self.parser.add_argument("--coin-dir", dest="coinDirPath", default=None,\
+			help="Directory containing the masternodes and bin directories. "
+			"Default: ~/coins/<coin>", metavar="PATH")
+
+#==========================================================
+class NodeNameParserSetup(CoinDirParserSetup):
+	
+	#=============================
+	"""Many actions will be specific to some node.
+	That node is identified by its datadir."""
+	#=============================
+	
+	def setUp(self):
+		self.parser.add_argument("-i", "--identifier", dest="identifier", default=None,\
+			help="Specify the node you'd like to operate on."
+			"To do so, use the suffix for the appropriate datadir.",\
+			metavar="DATADIR_SUFFIX")
+
+#==========================================================
+class BlockNotifyParserSetup(ParserSetup):
+	
+	#=============================
+	"""For actions dealing with -blocknotify events."""
+	#=============================
+	
+	def setUp(self):
+		self.parser.add_argument("--blocknotify-socket", dest="blockNotifySocketPath",\
+			default=None, help="Path of the socket to send -blocknotify events to. "
+			"Default for watchblocks: A socket in $XDG_RUNTIME_DIR or the temp dir.",\
+			metavar="PATH")
+
+#==========================================================
+# Node-Independent arguments.
+# (no dependency on NodeNameParserSetup)
+#==========================================================
+
+#==========================================================
+class WatchBlocksParserSetup(BlockNotifyParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "watchblocks" Action."""
+	#=============================
+	
+	pass
+
+#==========================================================
+class ListParserSetup(CoinDirParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "list" Action."""
+	#=============================
+	
+	pass
+
+#==========================================================
+class NodesParserSetup(CoinDirParserSetup):
+	
+	#=============================
+	"""For actions operating on several nodes."""
+	#=============================
+	
+	def setUp(self):
+		self.parser.add_argument("--nodes", dest="nodeIds", default=None,\
+			help="Comma separated ids of the nodes to operate on. Default: All of them.",\
+			metavar="IDS")
+
+#==========================================================
+class FleetParserSetup(NodesParserSetup):
+	
+	#=============================
+	"""For actions operating on several nodes at once."""
+	#=============================
+	
+	def setUp(self):
+		self.parser.add_argument("--max-concurrency", dest="maxConcurrency", default=4,\
+			help="How many nodes to operate on at once. Default: 4", metavar="COUNT")
+		self.parser.add_argument("--max-io-pressure", dest="maxIoPressure", default=50.0,\
+			type=float, help="Only operate on another node while the disks are stalled less "
+			"than this percentage of the time. Default: 50", metavar="PERCENT")
+
+#==========================================================
+class StartAllParserSetup(FleetParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "startall" Action."""
+	#=============================
+	
+	def setUp(self):
+		defaultTimeout = 600
+		self.parser.add_argument("--timeout", dest="readyTimeout", default=defaultTimeout,\
+			help="For how many seconds to wait for each daemon to be ready for RPC calls. "
+			"Default: {0}".format(defaultTimeout), metavar="SECONDS")
+		self.parser.add_argument("args", nargs="*", help="Startup arguments to the daemons.")
+
+#==========================================================
+class StopAllParserSetup(FleetParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "stopall" Action."""
+	#=============================
+	
+	def setUp(self):
+		defaultTimeout = 180
+		self.parser.add_argument("--timeout", dest="stopDaemonTimeout", default=defaultTimeout,\
+			help="For how many seconds to wait for each daemon to stop. "
+			"Default: {0}".format(defaultTimeout), metavar="SECONDS")
+
+#==========================================================
+class RolloutParserSetup(NodesParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "rollout" Action."""
+	#=============================
+	
+	def setUp(self):
+		self.parser.add_argument("operation", choices=RolloutAction.operations,\
+			help="What to do with every node.")
+		self.parser.add_argument("--max-unavailable", dest="maxUnavailable", default=1,\
+			help="How many nodes may be down at once. Default: 1", metavar="COUNT")
+		self.parser.add_argument("--bin-dir", dest="binDirPath", default=None,\
+			help="For switchbin: The directory with the binaries to switch to.", metavar="PATH")
+		defaultReadyTimeout = 3600
+		self.parser.add_argument("--timeout", dest="readyTimeout", default=defaultReadyTimeout,\
+			help="For how many seconds to wait for a node to be ready again. "
+			"Default: {0}".format(defaultReadyTimeout), metavar="SECONDS")
+		defaultSyncTimeout = 172800
+		self.parser.add_argument("--sync-timeout", dest="syncTimeout", default=defaultSyncTimeout,\
+			help="For reindex and resync: For how many seconds to wait for a node to catch up "
+			"with the chain once it's ready. Default: {0}".format(defaultSyncTimeout), metavar="SECONDS")
+		defaultStopTimeout = 180
+		self.parser.add_argument("--stop-timeout", dest="stopDaemonTimeout", default=defaultStopTimeout,\
+			help="For how many seconds to wait for a daemon to stop. "
+			"Default: {0}".format(defaultStopTimeout), metavar="SECONDS")
+		self.parser.add_argument("args", nargs="*", help="Startup arguments to the daemons.")
+
+#==========================================================
+class CloneParserSetup(NodeNameParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "clone" Action. -i names the new node."""
+	#=============================
+	
+	def setUp(self):
+		self.parser.add_argument("--from", dest="sourceIdentifier", required=True,\
+			help="The synced node to copy the block data from.", metavar="ID")
+		self.parser.add_argument("--workers", dest="workers", default=4,\
+			help="How many files to copy at once if they can't be reflinked. Default: 4",\
+			metavar="COUNT")
+		defaultStopTimeout = 180
+		self.parser.add_argument("--stop-timeout", dest="stopDaemonTimeout", default=defaultStopTimeout,\
+			help="For how many seconds to wait for the source daemon to stop. "
+			"Default: {0}".format(defaultStopTimeout), metavar="SECONDS")
+
+#==========================================================
+class DedupParserSetup(NodesParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "dedup" Action."""
+	#=============================
+	
+	def setUp(self):
+		self.parser.add_argument("--link", dest="linkMode", default="auto",\
+			choices=["auto", "hardlink", "reflink"],\
+			help="Hardlinks share the page cache too, reflinks only disk space, but can't "
+			"be written to through one another. auto reflinks if the filesystem can. Default: auto")
+		self.parser.add_argument("--workers", dest="workers", default=None,\
+			help="How many processes to hash files with. Default: One per CPU.", metavar="COUNT")
+		self.parser.add_argument("--dry-run", dest="dryRun", action="store_true",\
+			help="Only report what would be linked.")
+
+#==========================================================
+class PurgeParserSetup(NodesParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "purge" Action."""
+	#=============================
+	
+	def setUp(self):
+		self.parser.add_argument("--status", dest="status", action="store_true",\
+			help="Only show how the purges in the background are getting on.")
+		self.parser.add_argument("--max-rate", dest="maxMegabytesPerSecond", default=64,\
+			help="How many MiB per second to delete at most. Default: 64", metavar="MIB")
+
+#==========================================================
+class GetLogParserSetup(NodeNameParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "getlog" Action."""
+	#=============================
+	
+	defaultLineCount = 100
+	
+	def setUp(self):
+		self.parser.add_argument("-n", "--lines", dest="lineCount", default=self.defaultLineCount,\
+			help="How many lines to show. Default: {0}".format(self.defaultLineCount), metavar="COUNT")
+		self.parser.add_argument("--since", dest="since", default=None,\
+			help="Show the lines from this time (UTC) on instead: YYYY-MM-DD HH:MM[:SS], or HH:MM[:SS] "
+			"for today.", metavar="TIME")
+		self.parser.add_argument("--until", dest="until", default=None,\
+			help="Show the lines up to this time (UTC) instead, see --since.", metavar="TIME")
+
+#==========================================================
+class LiveLogParserSetup(NodeNameParserSetup, NodesParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "livelog" Action."""
+	#=============================
+	
+	defaultLineCount = 10
+	
+	def setUp(self):
+		self.parser.add_argument("-n", "--lines", dest="lineCount", default=self.defaultLineCount,\
+			help="How many of the last lines (of every log) to show before following. "
+			"Default: {0}".format(self.defaultLineCount), metavar="COUNT")
+		self.parser.add_argument("--all", dest="allNodes", action="store_true",\
+			help="Follow the logs of all nodes at once.")
+		self.parser.add_argument("--grep", dest="pattern", default=None,\
+			help="Only show lines matching this regular expression.", metavar="REGEX")
+
+#==========================================================
+class ProgressParserSetup(NodeNameParserSetup, NodesParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "progress" Action."""
+	#=============================
+	
+	defaultWindow = 600
+	
+	def setUp(self):
+		self.parser.add_argument("--all", dest="allNodes", action="store_true",\
+			help="Show the progress of all nodes.")
+		self.parser.add_argument("--window", dest="window", default=self.defaultWindow,\
+			help="Over how many seconds of the log to measure the rates. "
+			"Default: {0}".format(self.defaultWindow), metavar="SECONDS")
+
+#==========================================================
+class SuperviseParserSetup(NodesParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "supervise" Action."""
+	#=============================
+	
+	def setUp(self):
+		defaultMaxBackoff = 300
+		self.parser.add_argument("--max-backoff", dest="maxBackoff", default=defaultMaxBackoff,\
+			help="At most how many seconds to wait before starting a crashed daemon again. "
+			"Default: {0}".format(defaultMaxBackoff), metavar="SECONDS")
+		defaultStopTimeout = 180
+		self.parser.add_argument("--stop-timeout", dest="stopDaemonTimeout", default=defaultStopTimeout,\
+			help="For how many seconds to wait for a daemon to stop before killing it. "
+			"Default: {0}".format(defaultStopTimeout), metavar="SECONDS")
+		self.parser.add_argument("args", nargs="*", help="Startup arguments to the daemons.")
+
+#==========================================================
+class MonitorParserSetup(NodesParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "monitor" Action."""
+	#=============================
+	
+	def setUp(self):
+		self.parser.add_argument("--interval", dest="interval", default=60,\
+			help="Seconds between probes of a node. Default: 60", metavar="SECONDS")
+		self.parser.add_argument("--jitter", dest="jitter", default=0.2,\
+			help="Up to which share of the interval to make it longer or shorter at random, "
+			"to spread the probes out. Default: 0.2", metavar="SHARE")
+		self.parser.add_argument("--max-concurrency", dest="maxConcurrency", default=8,\
+			help="How many nodes to probe or restart at once. Default: 8", metavar="COUNT")
+		self.parser.add_argument("--no-restart", dest="noRestart", action="store_true",\
+			help="Only report, don't restart any nodes.")
+		self.parser.add_argument("--restart-unresponsive-after", dest="restartUnresponsiveAfter", default=3,\
+			help="Restart a node after this many failed probes in a row, 0 for never. Default: 3",\
+			metavar="PROBES")
+		self.parser.add_argument("--max-lag", dest="maxLag", default=3,\
+			help="How many blocks a node may be behind the highest one of the fleet. Default: 3",\
+			metavar="BLOCKS")
+		self.parser.add_argument("--restart-lagging-after", dest="restartLaggingAfter", default=900,\
+			help="Restart a node lagging more than --max-lag blocks behind once its height "
+			"hasn't changed for this many seconds, 0 for never. Default: 900", metavar="SECONDS")
+		self.parser.add_argument("--restart-cooldown", dest="restartCooldown", default=1800,\
+			help="Don't restart a node again within this many seconds. Default: 1800",\
+			metavar="SECONDS")
+		self.parser.add_argument("--stop-timeout", dest="stopDaemonTimeout", default=180,\
+			help="For how many seconds to wait for a daemon to stop before starting it again. "
+			"Default: 180", metavar="SECONDS")
+		self.parser.add_argument("--no-metrics", dest="noMetrics", action="store_true",\
+			help="Don't record the probe results in the metrics store of the coin directory.")
+		self.parser.add_argument("--prometheus-listen", dest="prometheusListen", default=None,\
+			help="Serve the probe results as Prometheus metrics at http://[HOST:]PORT/metrics.",\
+			metavar="[HOST:]PORT")
+		self.parser.add_argument("--prometheus-textfile", dest="prometheusTextfile", default=None,\
+			help="Write the probe results as Prometheus metrics to this file, for the node exporter's "
+			"textfile collector (the name has to end in .prom).", metavar="PATH")
+
+#==========================================================
+class SentinelParserSetup(NodesParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "sentinel" Action."""
+	#=============================
+	
+	def setUp(self):
+		self.parser.add_argument("--status", dest="status", action="store_true",\
+			help="Only show how the runs of the sentinel scheduler went.")
+		self.parser.add_argument("--period", dest="period", default=60,\
+			help="Seconds between runs for a node. Default: 60", metavar="SECONDS")
+		self.parser.add_argument("--max-workers", dest="maxWorkers", default=4,\
+			help="How many runs may be going at once. Default: 4", metavar="COUNT")
+		self.parser.add_argument("--timeout", dest="timeout", default=300,\
+			help="Kill runs going for longer than this, 0 for never. Default: 300", metavar="SECONDS")
+
+#==========================================================
+class MetricsParserSetup(NodesParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "metrics" Action."""
+	#=============================
+	
+	def setUp(self):
+		self.parser.add_argument("metric", nargs="?", default=None,\
+			help="The metric to show, e.g. height. Lists them if left out.")
+		self.parser.add_argument("--since", dest="since", default=None,\
+			help="Show the samples from this time (UTC) on: YYYY-MM-DD HH:MM[:SS], or HH:MM[:SS] "
+			"for today. Default: An hour ago.", metavar="TIME")
+		self.parser.add_argument("--until", dest="until", default=None,\
+			help="Show the samples up to this time (UTC), see --since.", metavar="TIME")
+		self.parser.add_argument("--resolution", dest="resolution", default=None,\
+			help="Seconds per sample: 0 for the raw samples, 60 or 3600 for the rollups.",\
+			metavar="SECONDS")
+
+#==========================================================
+class TipsParserSetup(NodesParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "tips" Action."""
+	#=============================
+	
+	def setUp(self):
+		self.parser.add_argument("--max-lag", dest="maxLag", default=2,\
+			help="How many blocks a node may be behind the highest one before it's flagged. Default: 2",\
+			metavar="BLOCKS")
+		self.parser.add_argument("--timeout", dest="timeout", default=5,\
+			help="Seconds to wait for a node to answer. Default: 5", metavar="SECONDS")
+
+#==========================================================
+class SupervisorParserSetup(CoinDirParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "supervisor" Action."""
+	#=============================
+	
+	def setUp(self):
+		self.parser.add_argument("command", nargs="?", default="status",\
+			choices=["status", "start", "stop", "restart", "shutdown"],\
+			help="What to ask the supervisor for. Default: status")
+		self.parser.add_argument("identifier", nargs="?", default=None,\
+			help="For start, stop and restart: The id of the node.", metavar="ID")
+
+#==========================================================
+class RegistryParserSetup(CoinDirParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "registry" Action."""
+	#=============================
+	
+	def setUp(self):
+		self.parser.add_argument("--watch", dest="watch", action="store_true", default=False,\
+			help="Keep the registry current as nodes and their conf files change.")
+
+#==========================================================
+# NodeNameParserSetup dependent arguments.
+#==========================================================
+
+#==========================================================
+class CliParserSetup(NodeNameParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "cli" Action."""
 	#=============================
 	
 	@property
@@ -570,11 +2600,28 @@ class StopParserSetup(NodeNameParserSetup):
 				default=defaultTimeout)
 
 #==========================================================
-class StartDaemonParserSetup(CliParserSetup):
+class ProbeParserSetup(NodeNameParserSetup):
+	
+	#=============================
+	"""ParserSetup for the "probe" Action."""
+	#=============================
+	
+	def setUp(self):
+		self.parser.add_argument("--deep", dest="deep", action="store_true", default=False,\
+			help="Also check whether the daemon answers RPC calls.")
+
+#==========================================================
+class StartDaemonParserSetup(CliParserSetup, BlockNotifyParserSetup):
+	
 	@property
 	def help(self):
 		return "Startup arguments to the daemon."
 	
+	def setUp(self):
+		self.parser.add_argument("--wait", dest="startWaitTimeout", default=None,\
+			help="Wait for up to this many seconds for the daemon to be ready for RPC calls.",\
+			metavar="SECONDS")
+	
 #==========================================================
 class ReindexDaemonParserSetup(CliParserSetup, StopParserSetup):
 	@property
@@ -589,7 +2636,26 @@ class BitcoinArgumentSetup(ArgumentSetup):
 		StopParserSetup(self.addSubParser("stop"))
 		StartDaemonParserSetup(self.addSubParser("start"))
 		ReindexDaemonParserSetup(self.addSubParser("reindex"))
-		self.addSubParser("info")
+		WatchBlocksParserSetup(self.addSubParser("watchblocks"))
+		ProbeParserSetup(self.addSubParser("probe"))
+		ListParserSetup(self.addSubParser("list"))
+		RegistryParserSetup(self.addSubParser("registry"))
+		StartAllParserSetup(self.addSubParser("startall"))
+		StopAllParserSetup(self.addSubParser("stopall"))
+		RolloutParserSetup(self.addSubParser("rollout"))
+		CloneParserSetup(self.addSubParser("clone"))
+		DedupParserSetup(self.addSubParser("dedup"))
+		PurgeParserSetup(self.addSubParser("purge"))
+		GetLogParserSetup(self.addSubParser("getlog"))
+		LiveLogParserSetup(self.addSubParser("livelog"))
+		ProgressParserSetup(self.addSubParser("progress"))
+		SuperviseParserSetup(self.addSubParser("supervise"))
+		SupervisorParserSetup(self.addSubParser("supervisor"))
+		MonitorParserSetup(self.addSubParser("monitor"))
+		SentinelParserSetup(self.addSubParser("sentinel"))
+		MetricsParserSetup(self.addSubParser("metrics"))
+		TipsParserSetup(self.addSubParser("tips"))
+		NodeNameParserSetup(self.addSubParser("info"))
 
 #=======================================================================================
 # Exports
@@ -0,0 +1,109 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import http.server
+import json
+import socket
+import threading
+import unittest
+from types import SimpleNamespace
+
+# What's to be tested.
+from lib.consensus import compareTips, NodeTip
+from lib.nodeconf import RpcEndpoint
+from plugins.currencies.bitcoin import TipsAction
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+def tip(id, height, hash):
+	return NodeTip(id=id, height=height, hash=hash, error=None)
+
+class CompareTipsTestCase(unittest.TestCase):
+	
+	def test_agreement(self):
+		comparison = compareTips([tip("1", 100, "a"), tip("2", 100, "a"), tip("3", 99, "z")], maxLag=2)
+		self.assertEqual(comparison.maxHeight, 100)
+		self.assertEqual([(group.height, group.ids) for group in comparison.groups], [(100, ["1", "2"]), (99, ["3"])])
+		self.assertEqual((comparison.lagging, comparison.forked, comparison.unreachable), ([], [], []))
+	
+	def test_lagging(self):
+		comparison = compareTips([tip("1", 100, "a"), tip("2", 97, "b"), tip("3", 98, "c")], maxLag=2)
+		self.assertEqual(comparison.lagging, [("2", 3)])
+	
+	def test_forked(self):
+		comparison = compareTips([tip("1", 100, "a"), tip("2", 100, "a"), tip("3", 100, "b"),\
+			tip("4", 90, "c"), tip("5", 90, "d")], maxLag=20)
+		self.assertEqual(comparison.groups[0].ids, ["1", "2"])
+		# At height 90 neither block has more nodes, so both are flagged.
+		self.assertEqual(sorted(comparison.forked), ["3", "4", "5"])
+	
+	def test_unreachable(self):
+		down = NodeTip(id="2", height=None, hash=None, error="Can't reach the daemon")
+		comparison = compareTips([tip("1", 100, "a"), down])
+		self.assertEqual(comparison.unreachable, [down])
+		self.assertEqual(len(comparison.groups), 1)
+		self.assertIsNone(compareTips([down]).maxHeight)
+
+class RacingNodeHandler(http.server.BaseHTTPRequestHandler):
+	
+	#=============================
+	"""A node that got block 101 while being asked: Separate calls for the best block's
+	hash and the block count disagree, getblockchaininfo is consistent."""
+	#=============================
+	
+	protocol_version = "HTTP/1.1"
+	results = {
+		"getbestblockhash": "h100",
+		"getblockcount": 101,
+		"getblockchaininfo": {"chain": "main", "blocks": 101, "bestblockhash": "h101"}
+	}
+	
+	def log_message(self, *args):
+		pass
+	
+	def do_POST(self):
+		calls = json.loads(self.rfile.read(int(self.headers["Content-Length"])).decode())
+		answers = [{"id": call["id"], "result": self.results[call["method"]], "error": None}\
+			for call in (calls if isinstance(calls, list) else [calls])]
+		data = json.dumps(answers if isinstance(calls, list) else answers[0]).encode()
+		self.send_response(200)
+		self.send_header("Content-Length", str(len(data)))
+		self.end_headers()
+		self.wfile.write(data)
+
+class FetchTipTestCase(unittest.TestCase):
+	
+	def setUp(self):
+		self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RacingNodeHandler)
+		threading.Thread(target=self.server.serve_forever, daemon=True).start()
+		self.action = TipsAction("tips", SimpleNamespace(args=SimpleNamespace(timeout=5, maxLag=3)))
+	
+	def tearDown(self):
+		self.server.shutdown()
+		self.server.server_close()
+	
+	def node(self, id, port):
+		return SimpleNamespace(id=id, config=SimpleNamespace(rpcEndpoint=RpcEndpoint(host="127.0.0.1",\
+			port=port, user="user", password="secret", cookieFilePath=None)))
+	
+	def test_blockArriving(self):
+		racing = self.action.fetchTip(self.node("3", self.server.server_address[1]))
+		self.assertEqual((racing.height, racing.hash, racing.error), (101, "h101", None))
+		comparison = compareTips([tip("1", 101, "h101"), tip("2", 101, "h101"), racing], maxLag=3)
+		self.assertEqual(comparison.forked, [])
+	
+	def test_unreachable(self):
+		# A port nothing listens on: One that was just free.
+		with socket.socket() as closedSocket:
+			closedSocket.bind(("127.0.0.1", 0))
+			port = closedSocket.getsockname()[1]
+		unreachable = self.action.fetchTip(self.node("4", port))
+		self.assertIsNone(unreachable.height)
+		self.assertIsNotNone(unreachable.error)
+
+if __name__ == "__main__":
+	unittest.main()
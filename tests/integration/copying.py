@@ -0,0 +1,64 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import os
+import tempfile
+import unittest
+
+# What's to be tested.
+from lib.copying import TreeCopier, CopyError
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+class TreeCopierTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.sourcePath = os.path.join(self.tempDir.name, "source")
+		self.destinationPath = os.path.join(self.tempDir.name, "destination")
+		os.makedirs(os.path.join(self.sourcePath, "blocks", "index"))
+		self.files = {
+			os.path.join("blocks", "blk00000.dat"): os.urandom(300000),
+			os.path.join("blocks", "blk00001.dat"): os.urandom(1000),
+			os.path.join("blocks", "index", "000001.ldb"): b"index",
+			"empty": b""
+		}
+		for name, data in self.files.items():
+			with open(os.path.join(self.sourcePath, name), "wb") as dataFile:
+				dataFile.write(data)
+		os.utime(os.path.join(self.sourcePath, "blocks", "blk00000.dat"), (1000000000, 1000000000))
+		os.symlink("blocks", os.path.join(self.sourcePath, "link"))
+
+	def tearDown(self):
+		self.tempDir.cleanup()
+
+	def checkCopy(self, copier):
+		stats = copier.copy(self.sourcePath, self.destinationPath)
+		self.assertEqual(stats.files, len(self.files))
+		self.assertEqual(stats.bytes, sum([len(data) for data in self.files.values()]))
+		for name, data in self.files.items():
+			with open(os.path.join(self.destinationPath, name), "rb") as dataFile:
+				self.assertEqual(dataFile.read(), data)
+		self.assertEqual(os.stat(os.path.join(self.destinationPath, "blocks", "blk00000.dat")).st_mtime,\
+			1000000000)
+		self.assertEqual(os.readlink(os.path.join(self.destinationPath, "link")), "blocks")
+		return stats
+
+	def test_copy(self):
+		self.checkCopy(TreeCopier(workers=1))
+
+	def test_parallelCopy(self):
+		stats = self.checkCopy(TreeCopier(workers=3, reflink=False))
+		self.assertEqual(stats.reflinked, 0)
+
+	def test_destinationExists(self):
+		os.mkdir(self.destinationPath)
+		with self.assertRaises(CopyError):
+			TreeCopier().copy(self.sourcePath, self.destinationPath)
+
+if __name__ == "__main__":
+	unittest.main()
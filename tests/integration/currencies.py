@@ -0,0 +1,70 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import json
+import unittest
+from collections import OrderedDict
+from pathlib import Path
+
+# What's to be tested.
+from lib.currencies import CurrencyConfig, ConfigField, ConfigValidationError, validatePort
+from lib.actions import ActionReturnValue
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+class MushroomConfig(CurrencyConfig):
+	fields = OrderedDict([\
+		("mushroom", ConfigField(str, nullable=False)),\
+		("mushroomPath", ConfigField(Path, template="/{defaultMushroom}")),\
+		("port", ConfigField(int, validator=validatePort)),\
+	])
+	defaultMushroom = "shiitake"
+	defaultPort = "9400"
+	def __init__(self, mushroom=None, mushroomPath=None, port=None):
+		self._setFields_(mushroom=mushroom, mushroomPath=mushroomPath, port=port)
+
+class LingzhiConfig(MushroomConfig):
+	defaultMushroom = "lingzhi"
+
+class ExplicitConfig(LingzhiConfig):
+	defaultMushroomPath = "/explicit"
+
+class EnokiConfig(ExplicitConfig):
+	defaultMushroom = "enoki"
+
+class CurrencyConfigTestCase(unittest.TestCase):
+
+	def test_typedFields(self):
+		config = MushroomConfig(port="9401")
+		self.assertEqual(config.port, 9401)
+		self.assertEqual(config.mushroomPath, Path("/shiitake"))
+
+	def test_templatedDefaults(self):
+		self.assertEqual(LingzhiConfig().mushroomPath, Path("/lingzhi"))
+		# Explicitly set defaults are kept, in subclasses too.
+		self.assertEqual(ExplicitConfig().mushroomPath, Path("/explicit"))
+		self.assertEqual(EnokiConfig().mushroomPath, Path("/explicit"))
+
+	def test_validation(self):
+		with self.assertRaises(ConfigValidationError):
+			MushroomConfig(port="70000")
+		with self.assertRaises(ConfigValidationError):
+			MushroomConfig(port="nine")
+
+	def test_roundTrip(self):
+		config = MushroomConfig(mushroom="morel", port=9402)
+		loaded = MushroomConfig.fromJson(config.toJson())
+		self.assertEqual(loaded.toDict(), config.toDict())
+		self.assertEqual(loaded.mushroomPath, Path("/shiitake"))
+
+	def test_reprJson(self):
+		data = json.loads(ActionReturnValue(LingzhiConfig()).json)
+		self.assertEqual(data["Config"]["mushroomPath"], "/lingzhi")
+		self.assertEqual(data["Defaults"]["defaultMushroom"], "lingzhi")
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,77 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import os
+import tempfile
+import unittest
+
+# What's to be tested.
+from lib.dedup import BlockFileDeduplicator, finalizedBlockFiles
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+class BlockFileDeduplicatorTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		history = [os.urandom(20000), os.urandom(20000)]
+		self.nodes = []
+		for id in ["1", "2", "3"]:
+			blocksDirPath = os.path.join(self.tempDir.name, id, "blocks")
+			os.makedirs(blocksDirPath)
+			for number, data in enumerate(history):
+				self.write(blocksDirPath, "blk{0:05d}.dat".format(number), data)
+				self.write(blocksDirPath, "rev{0:05d}.dat".format(number), data[:1000])
+			# The files still being appended to are the same size, but differ.
+			self.write(blocksDirPath, "blk00002.dat", os.urandom(20000))
+			self.write(blocksDirPath, "rev00002.dat", os.urandom(1000))
+			self.nodes.append((id, blocksDirPath))
+		# Same size, different content.
+		self.write(self.nodes[2][1], "blk00001.dat", os.urandom(20000))
+
+	def tearDown(self):
+		self.tempDir.cleanup()
+
+	def write(self, dirPath, name, data):
+		with open(os.path.join(dirPath, name), "wb") as blockFile:
+			blockFile.write(data)
+
+	def inode(self, nodeIndex, name):
+		return os.stat(os.path.join(self.nodes[nodeIndex][1], name)).st_ino
+
+	def test_finalized(self):
+		names = sorted([os.path.basename(blockFile.path) for blockFile in finalizedBlockFiles(*self.nodes[0])])
+		self.assertEqual(names, ["blk00000.dat", "blk00001.dat", "rev00000.dat", "rev00001.dat"])
+
+	def test_hardlink(self):
+		stats = BlockFileDeduplicator(workers=2, linkMode="hardlink").deduplicate(self.nodes)
+		# blk00000 and rev00000 of nodes 2 and 3, blk00001 and rev00001 of node 2, rev00001 of node 3.
+		self.assertEqual(stats.linked, 7)
+		self.assertEqual(stats.bytesSaved, 2*20000+20000+2*1000+2*1000)
+		for name in ["blk00000.dat", "rev00000.dat", "rev00001.dat"]:
+			self.assertEqual(len(set([self.inode(index, name) for index in range(3)])), 1)
+		self.assertEqual(self.inode(0, "blk00001.dat"), self.inode(1, "blk00001.dat"))
+		self.assertNotEqual(self.inode(0, "blk00001.dat"), self.inode(2, "blk00001.dat"))
+		self.assertNotEqual(self.inode(0, "blk00002.dat"), self.inode(1, "blk00002.dat"))
+		# Nothing left to do.
+		self.assertEqual(BlockFileDeduplicator(linkMode="hardlink").deduplicate(self.nodes).linked, 0)
+
+	def test_dryRun(self):
+		inode = self.inode(1, "blk00000.dat")
+		stats = BlockFileDeduplicator(linkMode="hardlink", dryRun=True).deduplicate(self.nodes)
+		self.assertEqual(stats.linked, 7)
+		self.assertEqual(self.inode(1, "blk00000.dat"), inode)
+
+	def test_auto(self):
+		stats = BlockFileDeduplicator(linkMode="auto").deduplicate(self.nodes)
+		self.assertEqual(stats.linked, 7)
+		with open(os.path.join(self.nodes[2][1], "rev00001.dat"), "rb") as revFile:
+			with open(os.path.join(self.nodes[0][1], "rev00001.dat"), "rb") as originalFile:
+				self.assertEqual(revFile.read(), originalFile.read())
+
+if __name__ == "__main__":
+	unittest.main()
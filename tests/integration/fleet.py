@@ -0,0 +1,71 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import tempfile
+import unittest
+from pathlib import Path
+
+# Local
+from plugins.currencies.vivo import Config
+
+# What's to be tested.
+from lib.fleet import FleetLoader
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+class FleetLoaderTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.coinDirPath = Path(self.tempDir.name, "vivo")
+		for id in ["1", "2", "12", "spare"]:
+			Path(self.coinDirPath, "masternodes", id, ".vivocore").mkdir(parents=True)
+		Path(self.coinDirPath, "masternodes", "notanode").touch()
+		Path(self.coinDirPath, "masternodes", "2", ".vivocore", "vivo.conf")\
+			.write_text("rpcport=9555\nport=9800\n")
+
+	def tearDown(self):
+		self.tempDir.cleanup()
+
+	def load(self):
+		return FleetLoader(Config, self.coinDirPath, baseRpcPort=9400, basePort=9700).load()
+
+	def test_nodes(self):
+		fleet = self.load()
+		self.assertEqual(fleet.ids, ["1", "2", "12", "spare"])
+		self.assertNotIn("notanode", fleet)
+
+	def test_ports(self):
+		fleet = self.load()
+		self.assertEqual((fleet.byId(12).rpcPort, fleet.byId(12).port), (9412, 9712))
+		# The conf file takes precedence.
+		self.assertEqual((fleet.byId(2).rpcPort, fleet.byId(2).port), (9555, 9800))
+		# Neither tells: The node's RPC port is the one its config falls back to.
+		spare = fleet.byId("spare")
+		self.assertEqual(spare.rpcPort, spare.config.rpcPort)
+		self.assertIsNotNone(spare.rpcPort)
+		self.assertIsNone(spare.port)
+
+	def test_indexes(self):
+		fleet = self.load()
+		node = fleet.byId(1)
+		self.assertIs(fleet.byDataDir(node.dataDirPath), node)
+		self.assertIs(fleet.byPort(9701), node)
+		self.assertIs(fleet.resolve(str(node.dataDirPath)), node)
+		self.assertIsNone(fleet.byId(3))
+
+	def test_config(self):
+		config = self.load().byId(12).config
+		self.assertEqual(config.rpcPort, 9412)
+		self.assertEqual(config.dataDirPath, Path(self.coinDirPath, "masternodes", "12", ".vivocore"))
+		self.assertEqual(config.basePaths, [str(Path(self.coinDirPath, "bin"))])
+
+	def test_missingDir(self):
+		self.assertEqual(len(FleetLoader(Config, Path(self.tempDir.name, "dash")).load()), 0)
+
+if __name__ == "__main__":
+	unittest.main()
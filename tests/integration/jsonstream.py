@@ -0,0 +1,79 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import io
+import json
+import unittest
+
+# What's to be tested.
+from lib.jsonstream import JsonStreamDecoder, JsonStreamError
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+class JsonStreamDecoderTestCase(unittest.TestCase):
+
+	@property
+	def mempool(self):
+		return {"{0:064x}".format(i): {"size": 200+i, "fee": 0.0001*i, "depends": [], "text": "ü"*i}\
+			for i in range(0, 50)}
+
+	@property
+	def block(self):
+		return {"hash": "00ab", "height": 12, "tx": [{"txid": str(i), "vout": [i, i*2]}\
+			for i in range(0, 20)], "nextblockhash": "00cd"}
+
+	def decoder(self, document, path=[], chunkSize=7):
+		"""Decoder reading the specified document in tiny chunks, to split values up."""
+		return JsonStreamDecoder(io.BytesIO(json.dumps(document, ensure_ascii=False)\
+			.encode()), path=path, chunkSize=chunkSize)
+
+	def test_object(self):
+		self.assertEqual(dict(self.decoder(self.mempool)), self.mempool)
+
+	def test_array(self):
+		document = [1, 22, 333.5, "four", None, True, False, [5, [6]], {"7": 7}, 1234567890]
+		self.assertEqual(list(self.decoder(document)), document)
+
+	def test_numbersAcrossChunks(self):
+		# Cut anywhere, "0.0001" or "1.5e10" start with what decodes as a complete number.
+		document = [0.0001, 1.5e10, -1, -12.25, 3e-7, 0, 10, {"fee": 0.00012345, "n": -987}, 2.5E+3]
+		encoded = json.dumps(document).replace("1.5e+10", "1.5e10").replace("2500.0", "2.5E+3")
+		for chunkSize in (1, 2, 3):
+			decoder = JsonStreamDecoder(io.BytesIO(encoded.encode()), chunkSize=chunkSize)
+			self.assertEqual(list(decoder), document)
+
+	def test_truncatedNumber(self):
+		with self.assertRaises(JsonStreamError):
+			list(JsonStreamDecoder(io.BytesIO(b"[1, 1.5e"), chunkSize=2))
+
+	def test_path(self):
+		self.assertEqual(list(self.decoder(self.block, path=["tx"])), self.block["tx"])
+
+	def test_empty(self):
+		self.assertEqual(list(self.decoder([])), [])
+		self.assertEqual(list(self.decoder({})), [])
+
+	def test_itemCount(self):
+		decoder = self.decoder(self.mempool)
+		for item in decoder:
+			pass
+		self.assertEqual(decoder.itemCount, len(self.mempool))
+
+	def test_missingPath(self):
+		with self.assertRaises(JsonStreamError):
+			list(self.decoder(self.block, path=["vin"]))
+
+	def test_notJson(self):
+		with self.assertRaises(JsonStreamError):
+			list(JsonStreamDecoder(io.BytesIO(b"error code: -28\nerror message:\nLoading")))
+
+	def test_truncated(self):
+		with self.assertRaises(JsonStreamError):
+			list(JsonStreamDecoder(io.BytesIO(json.dumps(self.block["tx"]).encode()[:-20]), chunkSize=7))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,77 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import os
+import tempfile
+import time
+import unittest
+
+# What's to be tested.
+from lib.logindex import LogIndex
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+START_TIME = 1525132800 # 2018-05-01 00:00:00
+
+def logLine(second, text="UpdateTip"):
+	return "{time} {text}\n".format(time=time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(START_TIME+second)),\
+		text=text)
+
+class LogIndexTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.tempDir.name, "debug.log")
+		self.write(0, 5000)
+
+	def tearDown(self):
+		self.tempDir.cleanup()
+
+	def write(self, first, last, mode="a"):
+		with open(self.path, mode) as logFile:
+			for second in range(first, last):
+				logFile.write(logLine(second))
+				if second % 100 == 0:
+					logFile.write("  continued {0}\n".format(second))
+
+	def index(self):
+		return LogIndex(self.path, indexInterval=4096)
+
+	def test_range(self):
+		index = self.index()
+		lines = list(index.lines(START_TIME+1000, START_TIME+1002))
+		self.assertEqual(lines, [logLine(1000).rstrip(), "  continued 1000", logLine(1001).rstrip(),\
+			logLine(1002).rstrip()])
+		self.assertGreater(len(index.offsets), 10)
+		start, end = index.offsetRange(START_TIME+1000, START_TIME+1002)
+		self.assertLess(end-start, 3*4096)
+
+	def test_openEnded(self):
+		index = self.index()
+		self.assertEqual(len(list(index.lines(START_TIME+4998))), 2)
+		self.assertEqual(len(list(index.lines(until=START_TIME+1))), 3)
+
+	def test_incremental(self):
+		index = self.index()
+		index.update()
+		entryCount = len(index.offsets)
+		self.write(5000, 6000)
+		self.assertEqual(list(self.index().lines(START_TIME+5501, START_TIME+5501)), [logLine(5501).rstrip()])
+		# The index on disk got extended, not rebuilt.
+		reloaded = self.index()
+		reloaded._readIndex()
+		self.assertGreater(len(reloaded.offsets), entryCount)
+		self.assertEqual(reloaded.offsets[:entryCount], index.offsets)
+
+	def test_rotation(self):
+		self.index().update()
+		self.write(9000, 9010, mode="w")
+		self.assertEqual(list(self.index().lines(START_TIME+9005, START_TIME+9005)), [logLine(9005).rstrip()])
+		self.assertEqual(list(self.index().lines(START_TIME+1000, START_TIME+1001)), [])
+
+if __name__ == "__main__":
+	unittest.main()
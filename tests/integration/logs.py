@@ -0,0 +1,178 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+# What's to be tested.
+from lib.logs import LogFollower, LogReader, MergedLogFollower, parseLogTime, tailLines
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+class TailLinesTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.tempDir.name, "debug.log")
+		with open(self.path, "w") as logFile:
+			for number in range(1000):
+				logFile.write("line {0}\n".format(number))
+			logFile.write("partial")
+
+	def tearDown(self):
+		self.tempDir.cleanup()
+
+	def test_tail(self):
+		expected = ["line {0}".format(number) for number in range(990, 1000)]
+		self.assertEqual(tailLines(self.path, 10), expected)
+		# Lines spanning blocks.
+		self.assertEqual(tailLines(self.path, 10, blockSize=7), expected)
+
+	def test_short(self):
+		self.assertEqual(len(tailLines(self.path, 5000)), 1000)
+		self.assertEqual(tailLines(self.path, 0), [])
+		self.assertEqual(tailLines(os.path.join(self.tempDir.name, "missing.log"), 10), [])
+
+class LogReaderTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.tempDir.name, "debug.log")
+
+	def tearDown(self):
+		self.tempDir.cleanup()
+
+	def write(self, text, mode="a"):
+		with open(self.path, mode) as logFile:
+			logFile.write(text)
+
+	def test_partialLines(self):
+		reader = LogReader(self.path)
+		self.assertEqual(reader.readLines(), [])
+		self.write("first\r\nsecond ha")
+		self.assertEqual(reader.readLines(), ["first"])
+		self.assertEqual(reader.completeOffset, len("first\r\n"))
+		self.write("lf\n")
+		self.assertEqual(reader.readLines(), ["second half"])
+		self.assertEqual(reader.readLines(), [])
+
+	def test_fromEnd(self):
+		# Lines of a previous run of the daemon are skipped.
+		self.write("old\n")
+		reader = LogReader(self.path, fromEnd=True)
+		self.write("new\n")
+		self.assertEqual(reader.readLines(), ["new"])
+
+	def test_truncation(self):
+		self.write("a long line from before\n")
+		reader = LogReader(self.path, fromEnd=True)
+		self.write("short\n", "w")
+		self.assertEqual(reader.readLines(), ["short"])
+
+	def test_rotation(self):
+		self.write("old\n")
+		reader = LogReader(self.path, fromEnd=True)
+		os.rename(self.path, self.path+".1")
+		self.write("a line longer than the old file\n")
+		self.assertEqual(reader.readLines(), ["a line longer than the old file"])
+
+	def test_seek(self):
+		self.write("a\nb\nc\n")
+		reader = LogReader(self.path)
+		reader.seek(2, os.stat(self.path).st_ino)
+		self.assertEqual(reader.readLines(), ["b", "c"])
+
+class LogFollowerTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.tempDir.name, "debug.log")
+
+	def tearDown(self):
+		self.tempDir.cleanup()
+
+	def write(self, text, mode="a"):
+		with open(self.path, mode) as logFile:
+			logFile.write(text)
+
+	def writeLater(self, *writes):
+		def run():
+			for text, mode in writes:
+				time.sleep(0.1)
+				self.write(text, mode)
+		threading.Thread(target=run, daemon=True).start()
+
+	def follow(self, useInotify=True):
+		return list(LogFollower(self.path, lines=2, pollInterval=0.05, useInotify=useInotify)\
+			.follow(timeout=0.5))
+
+	def test_follow(self):
+		self.write("a\nb\nc\nhalf ")
+		self.writeLater(("line\nd\n", "a"), ("truncated\n", "w"))
+		self.assertEqual(self.follow(), ["b", "c", "half line", "d", "truncated"])
+
+	def test_poll(self):
+		self.writeLater(("created\n", "a"), ("more\n", "a"))
+		self.assertEqual(self.follow(useInotify=False), ["created", "more"])
+
+	def test_rotation(self):
+		self.write("old\n")
+		def rotate():
+			time.sleep(0.1)
+			os.rename(self.path, self.path+".1")
+			self.write("new\n")
+		threading.Thread(target=rotate, daemon=True).start()
+		self.assertEqual(self.follow(), ["old", "new"])
+
+class MergedLogFollowerTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.paths = {}
+		for id in ["1", "2"]:
+			os.mkdir(os.path.join(self.tempDir.name, id))
+			self.paths[id] = os.path.join(self.tempDir.name, id, "debug.log")
+
+	def tearDown(self):
+		self.tempDir.cleanup()
+
+	def write(self, id, *lines):
+		with open(self.paths[id], "a") as logFile:
+			for line in lines:
+				logFile.write(line+"\n")
+
+	def follow(self, **kwargs):
+		return list(MergedLogFollower(self.paths, pollInterval=0.05, delay=0.05, **kwargs).follow(timeout=0.5))
+
+	def test_parseLogTime(self):
+		self.assertEqual(parseLogTime("2018-05-01 00:00:01 UpdateTip"), 1525132801.0)
+		self.assertEqual(parseLogTime("2018-05-01T00:00:01.5Z UpdateTip"), 1525132801.5)
+		self.assertIsNone(parseLogTime("  continued"))
+
+	def test_merge(self):
+		self.write("1", "2018-05-01 00:00:01 a", "2018-05-01 00:00:03 c", "  c continued")
+		self.write("2", "2018-05-01 00:00:02 b", "2018-05-01 00:00:04 d")
+		def later():
+			time.sleep(0.1)
+			self.write("2", "2018-05-01 00:00:06 f")
+			self.write("1", "2018-05-01 00:00:05 e")
+		threading.Thread(target=later, daemon=True).start()
+		self.assertEqual(self.follow(lines=10), [("1", "2018-05-01 00:00:01 a"), ("2", "2018-05-01 00:00:02 b"),\
+			("1", "2018-05-01 00:00:03 c"), ("1", "  c continued"), ("2", "2018-05-01 00:00:04 d"),\
+			("1", "2018-05-01 00:00:05 e"), ("2", "2018-05-01 00:00:06 f")])
+
+	def test_pattern(self):
+		self.write("1", "2018-05-01 00:00:01 UpdateTip: 1", "2018-05-01 00:00:02 Other")
+		self.write("2", "2018-05-01 00:00:03 UpdateTip: 2")
+		self.assertEqual([line for id, line in self.follow(pattern="UpdateTip")],\
+			["2018-05-01 00:00:01 UpdateTip: 1", "2018-05-01 00:00:03 UpdateTip: 2"])
+
+if __name__ == "__main__":
+	unittest.main()
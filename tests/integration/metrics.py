@@ -0,0 +1,93 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+# What's to be tested.
+from lib.metrics import MetricsStore, MetricTier, MetricsError
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+TIERS = [MetricTier("raw", 0, 7200), MetricTier("minutes", 60, 86400), MetricTier("hours", 3600, 30*86400)]
+
+# A whole hour, so rollups line up.
+NOW = int(time.time())//3600*3600
+
+class MetricsStoreTestCase(unittest.TestCase):
+	
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.tempDir.name, "metrics.sqlite")
+		self.store = MetricsStore(self.path, tiers=TIERS, batchSize=1000, maintenanceInterval=1e9)
+		self.store._nextMaintenance = float("inf") # Only maintain when told to.
+	
+	def tearDown(self):
+		self.store.close()
+		self.tempDir.cleanup()
+	
+	def test_raw(self):
+		for second in range(0, 600, 10):
+			self.store.add("1", "height", 100+second//60, NOW-600+second)
+			self.store.add("2", "height", 50, NOW-600+second)
+		self.store.add("1", "peers", None, NOW-5)
+		metricRange = self.store.range("1", "height", since=NOW-600, until=NOW-301, resolution=0)
+		self.assertEqual(len(metricRange.times), 30)
+		self.assertEqual(metricRange.times[0], NOW-600)
+		self.assertEqual(metricRange.values[-1], 104)
+		self.assertEqual(list(self.store.range("1", "peers", resolution=0).times), [])
+		self.assertEqual(self.store.latest("2", "height"), (NOW-10, 50))
+		self.assertEqual(self.store.nodes, ["1", "2"])
+		self.assertEqual(self.store.metrics, ["height", "peers"])
+		self.assertEqual(len(self.store.range("3", "height", resolution=0).times), 0)
+	
+	def test_rollups(self):
+		for second in range(0, 7200, 30):
+			self.store.add("1", "peers", second%120//30, NOW-7200+second) # 0, 1, 2, 3 every two minutes.
+		self.store.maintain(now=NOW)
+		minutes = self.store.range("1", "peers", since=NOW-7200, resolution=60)
+		self.assertEqual(len(minutes.times), 120)
+		self.assertEqual(list(minutes.values[:2]), [0.5, 2.5])
+		self.assertEqual((minutes.minimums[1], minutes.maximums[1]), (2, 3))
+		hours = self.store.range("1", "peers", since=NOW-7200, resolution=3600)
+		self.assertEqual(list(hours.times), [NOW-7200, NOW-3600])
+		self.assertEqual(list(hours.values), [1.5, 1.5])
+		self.assertEqual((hours.minimums[0], hours.maximums[0]), (0, 3))
+		# Rolled up intervals aren't rolled up again.
+		self.store.maintain(now=NOW+60)
+		self.assertEqual(len(self.store.range("1", "peers", since=NOW-7200, resolution=60).times), 120)
+	
+	def test_retention(self):
+		for hour in range(48):
+			self.store.add("1", "height", hour, NOW-48*3600+hour*3600)
+		self.store.maintain(now=NOW)
+		self.assertEqual(len(self.store.range("1", "height", resolution=0).times), 2)
+		self.assertEqual(len(self.store.range("1", "height", resolution=60).times), 24)
+		self.assertEqual(len(self.store.range("1", "height", resolution=3600).times), 48)
+	
+	def test_tier(self):
+		self.assertEqual(self.store.tier(since=NOW-3600, now=NOW).resolution, 0)
+		self.assertEqual(self.store.tier(since=NOW-3*3600, now=NOW).resolution, 60)
+		self.assertEqual(self.store.tier(since=NOW-100*86400, now=NOW).resolution, 3600)
+		with self.assertRaises(MetricsError):
+			self.store.tier(resolution=5)
+	
+	def test_wal(self):
+		self.store.add("1", "height", 1, NOW)
+		self.store.flush()
+		connection = sqlite3.connect(self.path)
+		self.assertEqual(connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+		connection.close()
+		self.store.close()
+		with MetricsStore(self.path, tiers=TIERS) as store:
+			self.assertEqual(store.latest("1", "height"), (NOW, 1))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,121 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from collections import namedtuple
+import random
+import threading
+import time
+import unittest
+
+# What's to be tested.
+from lib.monitoring import FleetMonitor, JitteredScheduler, NodeHealth, NodeMonitorState, RestartPolicy
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+FakeNode = namedtuple("FakeNode", "id")
+
+def health(id, alive=True, height=100, warmingUp=False):
+	return NodeHealth(id=id, time=time.time(), alive=alive, warmingUp=warmingUp, height=height if alive else None,\
+		peers=8 if alive else None, mempool=None, masternodeStatus=None, rss=None, cpuSeconds=None, latency=None,\
+		error=None if alive else "down")
+
+class JitteredSchedulerTestCase(unittest.TestCase):
+	
+	def test_spread(self):
+		scheduler = JitteredScheduler(10.0, jitter=0.2, random=random.Random(1))
+		intervals = [scheduler._nextInterval() for count in range(1000)]
+		self.assertTrue(all([8.0 <= interval <= 12.0 for interval in intervals]))
+		self.assertGreater(max(intervals)-min(intervals), 3.0)
+	
+	def test_due(self):
+		scheduler = JitteredScheduler(10.0)
+		scheduler.add("now", delay=0)
+		scheduler.add("later", delay=60)
+		self.assertEqual(scheduler.due(), ["now"])
+		self.assertGreater(scheduler.timeout, 50)
+
+class RestartPolicyTestCase(unittest.TestCase):
+	
+	def test_unresponsive(self):
+		policy = RestartPolicy(unresponsiveProbes=2, cooldown=0)
+		state = NodeMonitorState(FakeNode("1"))
+		state.update(health("1", alive=False))
+		self.assertIsNone(policy.decide(state, None))
+		state.update(health("1", alive=False, warmingUp=True))
+		self.assertEqual(state.failedProbes, 0)
+		state.update(health("1", alive=False))
+		state.update(health("1", alive=False))
+		self.assertIsNotNone(policy.decide(state, None))
+		state.lastRestart = time.monotonic()
+		self.assertIsNone(RestartPolicy(unresponsiveProbes=2, cooldown=60).decide(state, None))
+	
+	def test_lagging(self):
+		policy = RestartPolicy(maxLag=3, laggingFor=10, cooldown=0)
+		state = NodeMonitorState(FakeNode("1"))
+		state.update(health("1", height=100))
+		self.assertIsNone(policy.decide(state, 110)) # Not stuck long enough yet.
+		state.heightSince -= 20
+		self.assertIsNone(policy.decide(state, 102)) # Within maxLag.
+		self.assertIsNotNone(policy.decide(state, 110))
+		state.update(health("1", height=101))
+		self.assertIsNone(policy.decide(state, 110)) # Making progress.
+
+class FleetMonitorTestCase(unittest.TestCase):
+	
+	def test_monitor(self):
+		nodes = [FakeNode(str(id)) for id in range(1, 6)]
+		restarted = []
+		active = []
+		overlaps = []
+		lock = threading.Lock()
+		def probe(node):
+			with lock:
+				if node.id in active:
+					overlaps.append(node.id)
+				active.append(node.id)
+			time.sleep(0.01)
+			with lock:
+				active.remove(node.id)
+			return health(node.id, alive=not node.id == "3" or len(restarted) > 0)
+		monitor = FleetMonitor(nodes, probe, restart=lambda node, reason: restarted.append(node.id),\
+			interval=0.05, jitter=0.5, maxConcurrency=3, policy=RestartPolicy(unresponsiveProbes=2, cooldown=60))
+		events = []
+		for event in monitor.run():
+			events.append(event)
+			if len([event for event in events if event.kind == "probe"]) >= 40:
+				monitor.stop()
+		self.assertEqual(restarted, ["3"])
+		self.assertEqual([event.id for event in events if event.kind == "restart"], ["3"])
+		self.assertEqual(overlaps, [])
+		self.assertEqual(set(monitor.latest.keys()), set([node.id for node in nodes]))
+		self.assertTrue(monitor.latest["3"].alive)
+		self.assertEqual(monitor.fleetHeight, 100)
+	
+	def test_restartSkipped(self):
+		# E.g. a node stopped through the supervisor: The restart callable says why it left it alone.
+		monitor = FleetMonitor([FakeNode("1")], lambda node: health(node.id, alive=False),\
+			restart=lambda node, reason: "stopped on purpose", interval=0.01, jitter=0,\
+			policy=RestartPolicy(unresponsiveProbes=1, cooldown=60))
+		events = []
+		for event in monitor.run():
+			events.append(event)
+			if event.kind == "restartSkipped":
+				monitor.stop()
+		self.assertEqual([event.kind for event in events], ["probe", "restart", "restartSkipped"])
+		self.assertEqual(events[-1].detail, "stopped on purpose")
+	
+	def test_probeFailure(self):
+		def probe(node):
+			raise RuntimeError("broken")
+		monitor = FleetMonitor([FakeNode("1")], probe, interval=0.01)
+		for event in monitor.run():
+			self.assertEqual(event.kind, "probeFailed")
+			monitor.stop()
+		self.assertEqual(monitor.latest, {})
+
+if __name__ == "__main__":
+	unittest.main()
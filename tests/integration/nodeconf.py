@@ -0,0 +1,98 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+# What's to be tested.
+from lib.nodeconf import NodeConfCache, NodeConfParser, NodeConfError
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+class NodeConfTestCase(unittest.TestCase):
+
+	conf = "\n".join([\
+		"# vivo.conf",
+		"rpcuser=user",
+		"rpcpassword=secret # trailing comment",
+		"rpcport=9401",
+		"rpcallowip=127.0.0.1",
+		"rpcallowip=10.0.0.0/8",
+		"rpcport=9999",
+		"masternode=1",
+		"masternodeprivkey=privkey",
+		"nolisten=1",
+		"includeconf=extra.conf",
+		"test.rpcport=19401",
+		"[test]",
+		"port=19701",
+		""])
+
+	extraConf = "\n".join([\
+		"port=9701",
+		"externalip=1.2.3.4",
+		""])
+
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.confPath = Path(self.tempDir.name, "vivo.conf")
+		self.confPath.write_text(self.conf)
+		Path(self.tempDir.name, "extra.conf").write_text(self.extraConf)
+
+	def tearDown(self):
+		self.tempDir.cleanup()
+
+	def parse(self):
+		return NodeConfParser(str(self.confPath)).parse()
+
+	def test_values(self):
+		nodeConf = self.parse()
+		self.assertEqual(nodeConf.rpcUser, "user")
+		self.assertEqual(nodeConf.rpcPassword, "secret")
+		self.assertTrue(nodeConf.masternode)
+		self.assertEqual(nodeConf.masternodePrivKey, "privkey")
+		self.assertFalse(nodeConf.listen)
+
+	def test_repeatedKeys(self):
+		nodeConf = self.parse()
+		self.assertEqual(nodeConf.rpcPort, 9401) # First one wins.
+		self.assertEqual(nodeConf.rpcAllowIp, ["127.0.0.1", "10.0.0.0/8"])
+
+	def test_includeconf(self):
+		nodeConf = self.parse()
+		self.assertEqual(nodeConf.port, 9701)
+		self.assertEqual(nodeConf.externalIp, "1.2.3.4")
+
+	def test_sections(self):
+		nodeConf = self.parse()
+		self.assertEqual(nodeConf.getInt("rpcport", network="test"), 19401)
+		self.assertEqual(nodeConf.getInt("port", network="test"), 19701)
+		self.assertEqual(nodeConf.network, "main")
+
+	def test_rpcEndpoint(self):
+		endpoint = self.parse().rpcEndpoint(defaultPort="8332")
+		self.assertEqual((endpoint.port, endpoint.user, endpoint.password), (9401, "user", "secret"))
+
+	def test_invalidLine(self):
+		self.confPath.write_text("rpcuser\n")
+		with self.assertRaises(NodeConfError):
+			self.parse()
+
+	def test_cache(self):
+		cache = NodeConfCache()
+		nodeConf = cache.get(self.confPath)
+		self.assertIs(cache.get(self.confPath), nodeConf)
+		# Changing an included file invalidates the cached conf.
+		extraConfPath = Path(self.tempDir.name, "extra.conf")
+		extraConfPath.write_text("port=9702\n")
+		os.utime(str(extraConfPath), ns=(0, 0))
+		self.assertEqual(cache.get(self.confPath).port, 9702)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,73 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import os
+import socket
+import subprocess
+import tempfile
+import unittest
+
+# What's to be tested.
+from lib.notifications import BlockNotifyCommand, BlockNotifyListener, BlockNotifyError
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+class BlockNotifyTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.socketPath = os.path.join(self.tempDir.name, "blocknotify.sock")
+
+	def tearDown(self):
+		self.tempDir.cleanup()
+
+	def notify(self, command, blockHash):
+		"""Run the command the way the daemons do: %s replaced, through the shell."""
+		return subprocess.run(command.shellCommand.replace("%s", blockHash), shell=True, timeout=30).returncode
+
+	def test_notify(self):
+		with BlockNotifyListener(self.socketPath) as listener:
+			self.assertEqual(self.notify(listener.commandFor("node 1"), "00ab"), 0)
+			event = listener.receive(timeout=5)
+		self.assertEqual((event.node, event.blockHash), ("node 1", "00ab"))
+		self.assertIs(listener.latest["node 1"], event)
+		self.assertFalse(os.path.exists(self.socketPath))
+
+	def test_nodeFilter(self):
+		with BlockNotifyListener(self.socketPath) as listener:
+			for node, blockHash in (("1", "aa"), ("2", "bb"), ("1", "cc")):
+				self.notify(listener.commandFor(node), blockHash)
+			events = list(listener.events(nodes=["1"], timeout=0.5))
+		self.assertEqual([event.blockHash for event in events], ["aa", "cc"])
+
+	def test_garbage(self):
+		with BlockNotifyListener(self.socketPath) as listener:
+			with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sender:
+				sender.connect(self.socketPath)
+				sender.send(b"no separator")
+				sender.send(b"1\0")
+				sender.send(b"1\0ff")
+			self.assertEqual(listener.receive(timeout=5).blockHash, "ff")
+			self.assertIsNone(listener.receive(timeout=0.1))
+
+	def test_nobodyListening(self):
+		# The daemon mustn't care whether we listen.
+		self.assertEqual(self.notify(BlockNotifyCommand(self.socketPath, "1"), "00ab"), 0)
+
+	def test_staleSocket(self):
+		with open(self.socketPath, "w"):
+			pass
+		with BlockNotifyListener(self.socketPath) as listener:
+			self.notify(listener.commandFor("1"), "00ab")
+			self.assertEqual(listener.receive(timeout=5).blockHash, "00ab")
+
+	def test_bindFailure(self):
+		with self.assertRaises(BlockNotifyError):
+			BlockNotifyListener(os.path.join(self.tempDir.name, "missing", "blocknotify.sock")).open()
+
+if __name__ == "__main__":
+	unittest.main()
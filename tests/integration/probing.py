@@ -0,0 +1,155 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+import unittest
+
+# What's to be tested.
+from lib.probing import LivenessReport, PidFileProbeTier, ProbeResult, ProbeTier, TcpConnectProbeTier, TieredProbe
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+class ProbeTierTestCase(unittest.TestCase):
+
+	def test_check(self):
+		result = ProbeTier("custom", check=lambda: (True, "fine")).run()
+		self.assertEqual((result.tier, result.alive, result.detail), ("custom", True, "fine"))
+		self.assertGreaterEqual(result.latency, 0)
+
+	def test_oserror(self):
+		def check():
+			raise ConnectionRefusedError("refused")
+		result = ProbeTier("custom", check=check).run()
+		self.assertEqual((result.alive, result.detail), (False, "refused"))
+
+	def test_default(self):
+		self.assertFalse(ProbeTier("custom").run().alive)
+
+class PidFileProbeTierTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.pidFilePath = os.path.join(self.tempDir.name, "vivod.pid")
+
+	def tearDown(self):
+		self.tempDir.cleanup()
+
+	def writePidFile(self, content):
+		with open(self.pidFilePath, "w") as pidFile:
+			pidFile.write(content)
+
+	def check(self, processName=None):
+		return PidFileProbeTier(self.pidFilePath, processName=processName).check()
+
+	def test_noPidFile(self):
+		self.assertEqual(self.check(), (False, "no pid file"))
+
+	def test_invalidPidFile(self):
+		self.writePidFile("garbage")
+		self.assertEqual(self.check(), (False, "invalid pid file"))
+
+	def test_stalePidFile(self):
+		# A pid that's certainly free: one of an exited and reaped process.
+		process = subprocess.Popen(["true"])
+		process.wait()
+		self.writePidFile("{0}\n".format(process.pid))
+		self.assertEqual(self.check(), (False, "process {0} is gone".format(process.pid)))
+
+	def test_alive(self):
+		self.writePidFile(str(os.getpid()))
+		self.assertEqual(self.check(), (True, os.getpid()))
+
+	def test_pidReused(self):
+		# The pid file names a live process, but not the daemon.
+		self.writePidFile(str(os.getpid()))
+		alive, detail = self.check(processName="vivod")
+		self.assertFalse(alive)
+		self.assertIn("not vivod", detail)
+
+	def test_longProcessName(self):
+		# The kernel only keeps the first 15 characters of the name.
+		binPath = os.path.join(self.tempDir.name, "vivod-with-a-long-name")
+		os.symlink(shutil.which("sleep"), binPath)
+		process = subprocess.Popen([binPath, "30"])
+		try:
+			self.writePidFile(str(process.pid))
+			# Popen may return before the child has exec'd.
+			deadline = time.monotonic()+10
+			while not self.check(processName="vivod-with-a-long-name")[0]:
+				self.assertLess(time.monotonic(), deadline)
+				time.sleep(0.01)
+			self.assertEqual(self.check(processName="vivod-with-a-long-name"), (True, process.pid))
+		finally:
+			process.kill()
+			process.wait()
+
+class TcpConnectProbeTierTestCase(unittest.TestCase):
+
+	def test_listening(self):
+		with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+			server.bind(("127.0.0.1", 0))
+			server.listen(1)
+			port = server.getsockname()[1]
+			result = TcpConnectProbeTier("127.0.0.1", port).run()
+		self.assertEqual((result.tier, result.alive, result.detail), ("tcp", True, "127.0.0.1:{0}".format(port)))
+
+	def test_refused(self):
+		# A port that's certainly free: one of a closed socket.
+		with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+			server.bind(("127.0.0.1", 0))
+			port = server.getsockname()[1]
+		self.assertFalse(TcpConnectProbeTier("127.0.0.1", port).run().alive)
+
+class TieredProbeTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.calls = []
+
+	def tier(self, name, alive):
+		def check():
+			self.calls.append(name)
+			return (alive, None)
+		return ProbeTier(name, check=check)
+
+	def test_alive(self):
+		report = TieredProbe([self.tier("first", True), self.tier("second", True)],\
+			deepTiers=[self.tier("deep", True)]).run()
+		self.assertTrue(report)
+		self.assertEqual(self.calls, ["first", "second"])
+		self.assertIsNone(report.tier("deep"))
+
+	def test_deep(self):
+		report = TieredProbe([self.tier("first", True)], deepTiers=[self.tier("deep", False)]).run(deep=True)
+		self.assertFalse(report)
+		self.assertEqual(self.calls, ["first", "deep"])
+		self.assertFalse(report.tier("deep").alive)
+
+	def test_stopsAtFailure(self):
+		report = TieredProbe([self.tier("first", False), self.tier("second", True)]).run()
+		self.assertFalse(report.alive)
+		self.assertEqual(self.calls, ["first"])
+		self.assertEqual([result.tier for result in report.results], ["first"])
+
+	def test_noTiers(self):
+		self.assertFalse(TieredProbe([]).run().alive)
+
+class LivenessReportTestCase(unittest.TestCase):
+
+	def test_report(self):
+		report = LivenessReport([ProbeResult("pidfile", True, 0.001, 123), ProbeResult("tcp", False, 0.002, "refused")])
+		self.assertFalse(report.alive)
+		self.assertAlmostEqual(report.latency, 0.003)
+		self.assertEqual(report.tier("pidfile").detail, 123)
+		self.assertIn("tcp: FAILED (2.000 ms) refused", report._repr_str_)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,170 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import base64
+import http.server
+import json
+import os
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+# What's to be tested.
+from lib.monitoring import MonitorEvent, NodeHealth
+from lib.prometheus import FleetExporter, Histogram, PrometheusError
+from plugins.currencies.bitcoin import BitcoinConfig, BitcoinWallet
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+class StandInDaemonHandler(http.server.BaseHTTPRequestHandler):
+	
+	#=============================
+	"""Answers the RPC calls of a probe like a synced masternode would."""
+	#=============================
+	
+	protocol_version = "HTTP/1.1"
+	results = {
+		"getblockcount": 4321,
+		"getconnectioncount": 9,
+		"getmempoolinfo": {"size": 17, "bytes": 5000},
+		"masternode": {"status": "Masternode successfully started"}
+	}
+	
+	def log_message(self, *args):
+		pass
+	
+	def do_POST(self):
+		body = self.rfile.read(int(self.headers["Content-Length"]))
+		if not self.headers.get("Authorization") == "Basic {0}".format(base64.b64encode(b"user:secret").decode()):
+			self.send_response(401)
+			self.send_header("Content-Length", "0")
+			self.end_headers()
+			return
+		data = json.dumps([{"id": call["id"], "result": self.results.get(call["method"]), "error": None}\
+			for call in json.loads(body.decode())]).encode()
+		self.send_response(200)
+		self.send_header("Content-Length", str(len(data)))
+		self.end_headers()
+		self.wfile.write(data)
+
+def health(id, alive=True, height=100, latency=0.02, masternodeStatus=None):
+	return NodeHealth(id=id, time=1700000000.5, alive=alive, warmingUp=False, height=height if alive else None,\
+		peers=8 if alive else None, mempool=3 if alive else None, masternodeStatus=masternodeStatus,\
+		rss=1 << 30, cpuSeconds=12.5, latency=latency if alive else None, error=None if alive else "down")
+
+class HistogramTestCase(unittest.TestCase):
+	
+	def test_buckets(self):
+		histogram = Histogram([0.1, 1.0])
+		for value in (0.05, 0.5, 0.5, 5.0):
+			histogram.observe(value)
+		samples = histogram.samples("latency", {"node": "1"})
+		self.assertEqual([(sample[1]["le"], sample[2]) for sample in samples[:3]],\
+			[("0.1", 1), ("1.0", 3), ("+Inf", 4)])
+		self.assertEqual(samples[-1][2], 4)
+		self.assertAlmostEqual(samples[-2][2], 6.05)
+
+class FleetExporterTestCase(unittest.TestCase):
+	
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.exporter = FleetExporter(labels={"coin": "vivo"})
+		self.exporter.observe(MonitorEvent("probe", "1", health("1", masternodeStatus="ENABLED \"ok\"")))
+		self.exporter.observe(MonitorEvent("probe", "2", health("2", height=98)))
+		self.exporter.observe(MonitorEvent("probe", "3", health("3", alive=False)))
+		self.exporter.observe(MonitorEvent("restart", "3", "not alive"))
+		self.exporter.observe(MonitorEvent("restarted", "3", None))
+	
+	def tearDown(self):
+		self.exporter.close()
+		self.tempDir.cleanup()
+	
+	def test_text(self):
+		lines = self.exporter.text.splitlines()
+		self.assertIn("blockchaintools_node_up{coin=\"vivo\",node=\"1\"} 1", lines)
+		self.assertIn("blockchaintools_node_up{coin=\"vivo\",node=\"3\"} 0", lines)
+		self.assertIn("blockchaintools_node_block_height{coin=\"vivo\",node=\"2\"} 98", lines)
+		self.assertIn("blockchaintools_fleet_block_height{coin=\"vivo\"} 100", lines)
+		self.assertIn("blockchaintools_node_masternode_status{coin=\"vivo\",node=\"1\",status=\"ENABLED \\\"ok\\\"\"} 1",\
+			lines)
+		self.assertIn("blockchaintools_node_rpc_latency_seconds_bucket{coin=\"vivo\",node=\"1\",le=\"0.025\"} 1", lines)
+		self.assertIn("blockchaintools_node_restarts_total{coin=\"vivo\",node=\"3\"} 1", lines)
+		self.assertIn("# TYPE blockchaintools_node_cpu_seconds_total counter", lines)
+		# Unknown values are left out.
+		self.assertFalse([line for line in lines if line.startswith("blockchaintools_node_peers{")\
+			and "node=\"3\"" in line])
+	
+	def test_textfile(self):
+		path = os.path.join(self.tempDir.name, "vivo.prom")
+		self.exporter.writeTextfile(path)
+		with open(path, "r") as textFile:
+			self.assertEqual(textFile.read(), self.exporter.text)
+		self.assertEqual(os.listdir(self.tempDir.name), ["vivo.prom"])
+	
+	def test_textfileFailure(self):
+		with self.assertRaises(PrometheusError):
+			self.exporter.writeTextfile(os.path.join(self.tempDir.name, "missing", "vivo.prom"))
+	
+	def test_serve(self):
+		host, port = self.exporter.serve("127.0.0.1", 0)
+		with urllib.request.urlopen("http://127.0.0.1:{0}/metrics".format(port), timeout=5) as response:
+			self.assertTrue(response.headers["Content-Type"].startswith("text/plain; version=0.0.4"))
+			self.assertEqual(response.read().decode(), self.exporter.text)
+		with self.assertRaises(urllib.error.HTTPError):
+			urllib.request.urlopen("http://127.0.0.1:{0}/other".format(port), timeout=5)
+		self.assertEqual(self.exporter.scrapes, 1)
+
+class StandInDaemonTestCase(unittest.TestCase):
+	
+	#=============================
+	"""Probes a stand-in daemon: A JSON-RPC server with the pid file naming this process."""
+	#=============================
+	
+	def setUp(self):
+		self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandInDaemonHandler)
+		threading.Thread(target=self.server.serve_forever, daemon=True).start()
+		self.tempDir = tempfile.TemporaryDirectory()
+		with open("/proc/self/comm", "r") as commFile:
+			processName = commFile.read().strip()
+		binDirPath = os.path.join(self.tempDir.name, "bin")
+		dataDirPath = os.path.join(self.tempDir.name, ".vivocore")
+		os.makedirs(binDirPath)
+		os.makedirs(dataDirPath)
+		for binName in (processName, "vivo-cli"):
+			with open(os.path.join(binDirPath, binName), "w"):
+				pass
+		with open(os.path.join(dataDirPath, "vivo.conf"), "w") as confFile:
+			confFile.write("rpcuser=user\nrpcpassword=secret\nrpcport={0}\n".format(self.server.server_address[1]))
+		with open(os.path.join(dataDirPath, "{0}.pid".format(processName)), "w") as pidFile:
+			pidFile.write(str(os.getpid()))
+		self.wallet = BitcoinWallet(BitcoinConfig(basePaths=[binDirPath], cliBinName="vivo-cli",\
+			daemonBinName=processName, dataDirPath=dataDirPath, configFileName="vivo.conf", host="127.0.0.1"))
+	
+	def tearDown(self):
+		self.wallet.rpcClient.close()
+		self.server.shutdown()
+		self.server.server_close()
+		self.tempDir.cleanup()
+	
+	def test_probe(self):
+		exporter = FleetExporter()
+		nodeHealth = self.wallet.probeHealth("1")
+		self.assertTrue(nodeHealth.alive, nodeHealth.error)
+		exporter.observe(MonitorEvent("probe", "1", nodeHealth))
+		lines = exporter.text.splitlines()
+		self.assertIn("blockchaintools_node_block_height{node=\"1\"} 4321", lines)
+		self.assertIn("blockchaintools_node_peers{node=\"1\"} 9", lines)
+		self.assertIn("blockchaintools_node_mempool_transactions{node=\"1\"} 17", lines)
+		self.assertIn("blockchaintools_node_masternode_status{node=\"1\",status=\"Masternode successfully started\"} 1",\
+			lines)
+		self.assertIn("blockchaintools_node_rpc_latency_seconds_count{node=\"1\"} 1", lines)
+		self.assertTrue([line for line in lines if line.startswith("blockchaintools_node_resident_memory_bytes")])
+
+if __name__ == "__main__":
+	unittest.main()
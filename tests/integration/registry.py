@@ -0,0 +1,99 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+# Local
+from lib.fleet import FleetLoader
+from plugins.currencies.vivo import Config
+
+# What's to be tested.
+from lib.registry import NodeRegistry, RegistryChange
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+class CountingFleetLoader(FleetLoader):
+	"""FleetLoader counting how often it had to list the masternodes directory."""
+	scanCount = 0
+	def scan(self):
+		self.scanCount += 1
+		return super().scan()
+
+class NodeRegistryTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.coinDirPath = Path(self.tempDir.name, "vivo")
+		for id in ["1", "2"]:
+			self.dataDirPath(id).mkdir(parents=True)
+		self.confPath("2").write_text("rpcport=9555\n")
+
+	def tearDown(self):
+		self.tempDir.cleanup()
+
+	def dataDirPath(self, id):
+		return Path(self.coinDirPath, "masternodes", id, ".vivocore")
+
+	def confPath(self, id):
+		return Path(self.dataDirPath(id), "vivo.conf")
+
+	def registry(self):
+		return NodeRegistry(CountingFleetLoader(Config, self.coinDirPath))
+
+	def test_persistence(self):
+		self.assertEqual(sorted(self.registry().ids), ["1", "2"])
+		registry = self.registry()
+		self.assertEqual(registry.resolve("2").rpcPort, 9555)
+		self.assertEqual(registry.loader.scanCount, 0)
+
+	def test_newNode(self):
+		self.registry().load()
+		self.dataDirPath("3").mkdir(parents=True)
+		registry = self.registry()
+		self.assertEqual(registry.fleet().byId(3).rpcPort, 9403)
+		self.assertEqual(registry.loader.scanCount, 1)
+
+	def test_confChange(self):
+		self.registry().load()
+		self.confPath("2").write_text("rpcport=9556\n")
+		self.assertEqual(self.registry().resolve("2").rpcPort, 9556)
+
+	def test_confTouched(self):
+		# Rewritten with the same contents: Nothing changes, but the new signature is saved.
+		self.registry().load()
+		self.confPath("2").write_text("rpcport=9555\n")
+		os.utime(self.confPath("2"), ns=(0, 0))
+		self.assertEqual(self.registry().resolve("2").rpcPort, 9555)
+		registry = self.registry().load()
+		self.assertTrue(registry._isCurrent(registry.records["2"]))
+
+	def test_watch(self):
+		registry = self.registry()
+		changes = []
+		thread = threading.Thread(target=lambda: changes.extend(registry.watch(timeout=1)))
+		thread.start()
+		time.sleep(0.2)
+		self.confPath("1").write_text("rpcport=9444\n")
+		Path(self.dataDirPath("2"), "vivod.pid").write_text("1234\n")
+		self.dataDirPath("3").mkdir(parents=True)
+		self.confPath("3").write_text("rpcport=9333\n")
+		thread.join()
+		self.assertIn(RegistryChange("changed", "1"), changes)
+		self.assertIn(RegistryChange("pid", "2"), changes)
+		self.assertIn(RegistryChange("added", "3"), changes)
+		registry = self.registry()
+		self.assertEqual(registry.resolve("3").rpcPort, 9333)
+		self.assertEqual(registry.pid("2"), 1234)
+		self.assertEqual(registry.loader.scanCount, 0)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,90 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import tempfile
+import threading
+import time
+import unittest
+from collections import namedtuple
+from pathlib import Path
+
+# What's to be tested.
+from lib.rollout import RollingOrchestrator, RolloutCheckpoint, RolloutError
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+Node = namedtuple("Node", "id")
+
+class RollingOrchestratorTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.checkpoint = RolloutCheckpoint(Path(self.tempDir.name, "rollout.json"))
+		self.nodes = [Node(str(id)) for id in range(1, 6)]
+		self.down = set()
+		self.peakDown = 0
+		self.lock = threading.Lock()
+		self.failFor = set()
+
+	def tearDown(self):
+		self.tempDir.cleanup()
+
+	def restart(self, node):
+		with self.lock:
+			self.down.add(node.id)
+			self.peakDown = max(self.peakDown, len(self.down))
+		time.sleep(0.05)
+		if node.id in self.failFor:
+			raise RuntimeError("Node {0} didn't come back.".format(node.id))
+		with self.lock:
+			self.down.discard(node.id)
+
+	def isAvailable(self, node):
+		return not node.id in self.down
+
+	def orchestrator(self, operationName="restart", maxUnavailable=2):
+		return RollingOrchestrator(operationName, self.restart, self.isAvailable,\
+			maxUnavailable=maxUnavailable, checkpoint=self.checkpoint, waitTimeout=0.2, pollInterval=0.01)
+
+	def test_rollout(self):
+		events = list(self.orchestrator().run(self.nodes))
+		self.assertEqual(len([event for event in events if event.kind == "done"]), 5)
+		self.assertEqual(events[-1].kind, "finished")
+		self.assertEqual(self.peakDown, 2)
+		self.assertFalse(self.checkpoint.exists)
+
+	def test_downElsewhere(self):
+		# With one node down already, only one more may go down at a time.
+		self.down.add("5")
+		events = list(self.orchestrator().run(self.nodes))
+		self.assertEqual(events[-1].kind, "finished")
+		self.assertEqual(self.peakDown, 2)
+
+	def test_budgetExhausted(self):
+		self.down.update(["4", "5"])
+		with self.assertRaises(RolloutError):
+			list(self.orchestrator().run(self.nodes))
+		self.assertEqual(self.peakDown, 0) # Nothing got taken down.
+
+	def test_resume(self):
+		self.failFor.add("3")
+		with self.assertRaises(RolloutError):
+			list(self.orchestrator(maxUnavailable=1).run(self.nodes))
+		self.assertEqual(self.checkpoint.done, ["1", "2"])
+		self.failFor.clear()
+		self.down.clear()
+		events = list(self.orchestrator(maxUnavailable=1).run(self.nodes))
+		self.assertEqual([event.id for event in events if event.kind == "skipped"], ["1", "2"])
+		self.assertEqual([event.id for event in events if event.kind == "done"], ["3", "4", "5"])
+
+	def test_otherOperation(self):
+		self.checkpoint.begin("reindex", [node.id for node in self.nodes])
+		with self.assertRaises(RolloutError):
+			list(self.orchestrator().run(self.nodes))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,135 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import base64
+import http.server
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+# What's to be tested.
+from lib.nodeconf import RpcEndpoint
+from lib.rpc import RpcClient, RpcError, RpcConnectionError, RPC_IN_WARMUP, RPC_METHOD_NOT_FOUND
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+class FakeDaemonHandler(http.server.BaseHTTPRequestHandler):
+	
+	protocol_version = "HTTP/1.1"
+	
+	def log_message(self, *args):
+		pass
+	
+	def answer(self, call):
+		if call["method"] == "getblockcount":
+			return {"id": call["id"], "result": self.server.height, "error": None}
+		if call["method"] == "echo":
+			return {"id": call["id"], "result": call["params"], "error": None}
+		if call["method"] == "warmup":
+			return {"id": call["id"], "result": None, "error": {"code": RPC_IN_WARMUP, "message": "Loading..."}}
+		return {"id": call["id"], "result": None, "error": {"code": RPC_METHOD_NOT_FOUND,\
+			"message": "Method not found"}}
+	
+	def do_POST(self):
+		self.server.connections.add(self.client_address)
+		body = self.rfile.read(int(self.headers["Content-Length"]))
+		if not self.headers.get("Authorization") == "Basic {0}".format(\
+			base64.b64encode(self.server.credentials.encode()).decode()):
+			self.send_response(401)
+			self.send_header("Content-Length", "0")
+			self.end_headers()
+			return
+		payload = json.loads(body.decode())
+		if isinstance(payload, list):
+			answer = [self.answer(call) for call in reversed(payload)]
+		else:
+			answer = self.answer(payload)
+		data = json.dumps(answer).encode()
+		self.send_response(200)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(data)))
+		self.end_headers()
+		self.wfile.write(data)
+
+class RpcClientTestCase(unittest.TestCase):
+	
+	def setUp(self):
+		self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FakeDaemonHandler)
+		self.server.credentials = "user:secret"
+		self.server.height = 1234
+		self.server.connections = set()
+		self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+		self.thread.start()
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.client = None
+	
+	def tearDown(self):
+		if not self.client is None:
+			self.client.close()
+		self.server.shutdown()
+		self.server.server_close()
+		self.tempDir.cleanup()
+	
+	def endpoint(self, user="user", password="secret", cookieFilePath=None):
+		return RpcEndpoint(host="127.0.0.1", port=self.server.server_address[1], user=user, password=password,\
+			cookieFilePath=cookieFilePath)
+	
+	def test_call(self):
+		self.client = RpcClient(self.endpoint())
+		self.assertEqual(self.client.call("getblockcount"), 1234)
+		self.assertEqual(self.client.call("echo", 1, "two"), [1, "two"])
+		# Both calls went over the same connection.
+		self.assertEqual(len(self.server.connections), 1)
+	
+	def test_error(self):
+		self.client = RpcClient(self.endpoint())
+		with self.assertRaises(RpcError) as context:
+			self.client.call("warmup")
+		self.assertEqual(context.exception.code, RPC_IN_WARMUP)
+		self.assertEqual(context.exception.rpcMessage, "Loading...")
+	
+	def test_batch(self):
+		self.client = RpcClient(self.endpoint())
+		results = self.client.batch([("getblockcount", []), ("nonsense", []), ("echo", [3])])
+		self.assertEqual(results[0].result, 1234)
+		self.assertEqual(results[1].error.code, RPC_METHOD_NOT_FOUND)
+		self.assertEqual(results[2].result, [3])
+	
+	def test_cookie(self):
+		cookieFilePath = os.path.join(self.tempDir.name, ".cookie")
+		self.server.credentials = "__cookie__:first"
+		with open(cookieFilePath, "w") as cookieFile:
+			cookieFile.write(self.server.credentials)
+		self.client = RpcClient(self.endpoint(user=None, password=None, cookieFilePath=cookieFilePath))
+		self.assertEqual(self.client.call("getblockcount"), 1234)
+		# The daemon restarted with a new cookie.
+		self.server.credentials = "__cookie__:second"
+		with open(cookieFilePath, "w") as cookieFile:
+			cookieFile.write(self.server.credentials)
+		self.assertEqual(self.client.call("getblockcount"), 1234)
+	
+	def test_wrongCredentials(self):
+		self.client = RpcClient(self.endpoint(password="wrong"))
+		with self.assertRaises(RpcConnectionError):
+			self.client.call("getblockcount")
+	
+	def test_unreachable(self):
+		# A port nobody listens on.
+		listener = socket.socket()
+		listener.bind(("127.0.0.1", 0))
+		port = listener.getsockname()[1]
+		listener.close()
+		self.client = RpcClient(RpcEndpoint(host="127.0.0.1", port=port, user="user", password="secret",\
+			cookieFilePath=None), timeout=1.0)
+		with self.assertRaises(RpcConnectionError):
+			self.client.call("getblockcount")
+
+if __name__ == "__main__":
+	unittest.main()
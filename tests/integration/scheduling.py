@@ -0,0 +1,98 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+# What's to be tested.
+from lib.scheduling import SpreadScheduler, PeriodicJob, runJob
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+def job(id, code):
+	return PeriodicJob(id=id, commandLine=[sys.executable, "-c", code], cwd=None)
+
+class RunJobTestCase(unittest.TestCase):
+	
+	def test_success(self):
+		run = runJob(job("1", "print('hello')"))
+		self.assertIsNone(run.error)
+		self.assertEqual(run.exitCode, 0)
+		self.assertEqual(run.output, "hello")
+	
+	def test_failure(self):
+		run = runJob(job("1", "import sys; print('oops'); sys.exit(2)"))
+		self.assertEqual(run.exitCode, 2)
+		self.assertIsNotNone(run.error)
+		self.assertEqual(run.output, "oops")
+	
+	def test_timeout(self):
+		startTime = time.monotonic()
+		run = runJob(job("1", "import time; time.sleep(30)"), timeout=0.5)
+		self.assertLess(time.monotonic()-startTime, 10)
+		self.assertIsNone(run.exitCode)
+		self.assertIn("Timed out", run.error)
+	
+	def test_missing(self):
+		run = runJob(PeriodicJob(id="1", commandLine=["/nonexistent/venv/bin/python"], cwd=None))
+		self.assertIsNone(run.exitCode)
+		self.assertIsNotNone(run.error)
+
+class SpreadSchedulerTestCase(unittest.TestCase):
+	
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+	
+	def tearDown(self):
+		self.tempDir.cleanup()
+	
+	def test_spread(self):
+		scheduler = SpreadScheduler([job(str(id), "") for id in range(4)], period=60)
+		self.assertEqual([scheduler.nextRunTime(index, 600.0) for index in range(4)], [600.0, 615.0, 630.0, 645.0])
+		self.assertEqual(scheduler.nextRunTime(1, 616.0), 675.0)
+	
+	def test_run(self):
+		statusPath = os.path.join(self.tempDir.name, "status.json")
+		jobs = [job("fast", "pass"), job("failing", "import sys; sys.exit(1)"),\
+			job("slow", "import time; time.sleep(1.2)")]
+		scheduler = SpreadScheduler(jobs, period=0.6, maxWorkers=2, statusPath=statusPath)
+		events = []
+		startTime = time.monotonic()
+		for event in scheduler.run():
+			events.append(event)
+			if time.monotonic()-startTime > 3:
+				scheduler.stop()
+		kinds = dict([(id, set([event.kind for event in events if event.id == id])) for id in scheduler.jobs])
+		self.assertEqual(kinds["fast"], set(["finished"]))
+		self.assertEqual(kinds["failing"], set(["failed"]))
+		self.assertIn("skipped", kinds["slow"])
+		self.assertGreaterEqual(scheduler.stats["fast"].runs, 3)
+		self.assertEqual(scheduler.stats["failing"].failuresInARow, scheduler.stats["failing"].runs)
+		with open(statusPath, "r") as statusFile:
+			status = json.load(statusFile)
+		self.assertEqual(status["jobs"]["failing"]["failures"], scheduler.stats["failing"].failures)
+
+	def test_statusWriteFailure(self):
+		# A status file that can't be written is reported, and the runs go on.
+		statusPath = os.path.join(self.tempDir.name, "missing", "status.json")
+		scheduler = SpreadScheduler([job("fast", "pass")], period=0.2, statusPath=statusPath)
+		events = []
+		for event in scheduler.run():
+			events.append(event)
+			if len([event for event in events if event.kind == "finished"]) >= 2:
+				scheduler.stop()
+		self.assertEqual([event.kind for event in events], ["finished", "statusFailed"]*2)
+		self.assertIn(statusPath, events[1].detail)
+		self.assertEqual(scheduler.stats["fast"].runs, 2)
+		self.assertEqual(os.listdir(self.tempDir.name), [])
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,70 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import threading
+import time
+import unittest
+
+# What's to be tested.
+from lib.staggering import StaggeredRunner, IoPressureProbe
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+class FakeIoPressureProbe(object):
+	"""Reports the pressures it's given, then none."""
+	def __init__(self, pressures):
+		self.pressures = list(pressures)
+		self.sampleCount = 0
+	def sample(self):
+		self.sampleCount += 1
+		return self.pressures.pop(0) if len(self.pressures) > 0 else 0.0
+
+class StaggeredRunnerTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.lock = threading.Lock()
+		self.active = 0
+		self.peak = 0
+
+	def operation(self, item):
+		with self.lock:
+			self.active += 1
+			self.peak = max(self.peak, self.active)
+		time.sleep(0.1)
+		with self.lock:
+			self.active -= 1
+		if item == 3:
+			raise ValueError("Node 3 broke.")
+		return item*2
+
+	def runner(self, pressures=[], maxConcurrency=3):
+		return StaggeredRunner(self.operation, maxConcurrency=maxConcurrency, maxIoPressure=50.0,\
+			minInterval=0.01, ioPressureProbe=FakeIoPressureProbe(pressures), pollInterval=0.01)
+
+	def test_results(self):
+		results = {result.item: result for result in self.runner().run(range(6))}
+		self.assertEqual(sorted(results.keys()), list(range(6)))
+		self.assertEqual(results[5].value, 10)
+		self.assertIsInstance(results[3].error, ValueError)
+
+	def test_maxConcurrency(self):
+		list(self.runner(maxConcurrency=2).run(range(6)))
+		self.assertEqual(self.peak, 2)
+
+	def test_pressure(self):
+		# While under pressure, nothing but the first operation runs.
+		runner = self.runner(pressures=[90.0]*20)
+		list(runner.run(range(3)))
+		self.assertEqual(self.peak, 1)
+		self.assertGreater(runner.ioPressureProbe.sampleCount, 1)
+
+	def test_probe(self):
+		pressure = IoPressureProbe(minWindow=0.01).sample()
+		self.assertTrue(0.0 <= pressure <= 100.0)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,210 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import errno
+import os
+import sys
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from types import SimpleNamespace
+
+# What's to be tested.
+from lib.supervisor import Supervisor, SupervisedChild, SupervisorClient, SupervisorConnectionError,\
+	CrashLoopBackoff
+from plugins.currencies.bitcoin import BitcoinConfig, BitcoinWallet, MonitorAction
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+# Exits with status 3 while the crash file exists, saying so on stderr, runs until SIGTERM otherwise.
+CHILD_SCRIPT = """
+import os, signal, sys, time
+if os.path.exists(sys.argv[1]):
+	time.sleep(0.05)
+	sys.stderr.write("Starting up\\nError: The crash file exists\\n")
+	sys.exit(3)
+signal.signal(signal.SIGTERM, lambda number, frame: sys.exit(0))
+while True:
+	time.sleep(1)
+"""
+
+# Like the daemons: Forks into the background and exits 0 if the conf file says daemon=1,
+# unless the command line says otherwise. Writes its pid file, then runs until SIGTERM.
+DAEMONIZING_SCRIPT = """#!{python}
+import os, signal, sys, time
+dataDirPath = [arg.partition("=")[2] for arg in sys.argv if arg.startswith("-datadir=")][0]
+with open(os.path.join(dataDirPath, "vivo.conf")) as confFile:
+	daemon = "daemon=1" in confFile.read().split()
+for arg in sys.argv[1:]:
+	if arg in ("-daemon", "-daemon=1"):
+		daemon = True
+	elif arg == "-daemon=0":
+		daemon = False
+if daemon and os.fork() > 0:
+	sys.exit(0)
+with open(os.path.join(dataDirPath, "vivod.pid"), "w") as pidFile:
+	pidFile.write(str(os.getpid()))
+signal.signal(signal.SIGTERM, lambda number, frame: sys.exit(0))
+while True:
+	time.sleep(1)
+"""
+
+class SupervisorTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.socketPath = os.path.join(self.tempDir.name, "supervisor.sock")
+		self.crashPath = os.path.join(self.tempDir.name, "crash")
+
+	def tearDown(self):
+		self.tempDir.cleanup()
+
+	def supervise(self, usePidfd=True, findRunning=None):
+		children = [SupervisedChild(id, [sys.executable, "-c", CHILD_SCRIPT, self.crashPath if id == "2" else "-"],\
+			findRunning=findRunning if id == "1" else None) for id in ["1", "2"]]
+		self.supervisor = Supervisor(children, socketPath=self.socketPath,\
+			backoff=CrashLoopBackoff(initialDelay=0.1, maxDelay=0.4), stopTimeout=2, usePidfd=usePidfd)
+		self.events = []
+		self.thread = threading.Thread(target=lambda: self.events.extend(self.supervisor.run()), daemon=True)
+		self.thread.start()
+		self.client = SupervisorClient(self.socketPath)
+		for attempt in range(100):
+			if self.client.available:
+				return
+			time.sleep(0.02)
+
+	def finish(self):
+		self.client.request("shutdown")
+		self.thread.join(5)
+		self.assertFalse(self.thread.is_alive())
+		self.assertEqual(self.events[-1].kind, "shutdown")
+
+	def waitFor(self, check):
+		for attempt in range(200):
+			if check():
+				return
+			time.sleep(0.02)
+		self.fail("Timed out.")
+
+	def checkLifecycle(self, usePidfd):
+		open(self.crashPath, "w").close()
+		self.supervise(usePidfd=usePidfd)
+		self.waitFor(lambda: self.client.status()["2"]["crashesInARow"] >= 3)
+		status = self.client.status()
+		self.assertEqual(status["1"]["state"], "running")
+		self.assertEqual(status["2"]["lastExit"], "exit status 3")
+		self.assertTrue(status["2"]["lastError"].endswith("Error: The crash file exists"))
+		os.unlink(self.crashPath)
+		self.waitFor(lambda: self.client.status()["2"]["state"] == "running")
+		pid = self.client.status()["1"]["pid"]
+		self.client.request("restart 1")
+		self.waitFor(lambda: self.client.status()["1"]["pid"] not in (None, pid))
+		self.client.request("stop 2")
+		self.waitFor(lambda: self.client.status()["2"]["state"] == "stopped")
+		self.assertFalse(self.client.status()["2"]["wanted"])
+		self.finish()
+		self.assertFalse(os.path.exists(self.socketPath))
+
+	def test_pidfd(self):
+		self.checkLifecycle(usePidfd=True)
+
+	def test_sigchld(self):
+		self.checkLifecycle(usePidfd=False)
+
+	def test_backoff(self):
+		backoff = CrashLoopBackoff(initialDelay=1, maxDelay=10)
+		self.assertEqual([backoff.delay(count) for count in range(1, 7)], [1, 2, 4, 8, 10, 10])
+
+	def test_noPidfdForChild(self):
+		# Children whose pidfd couldn't be opened are polled instead.
+		with mock.patch("os.pidfd_open", side_effect=OSError(errno.EMFILE, "Too many open files")):
+			self.checkLifecycle(usePidfd=True)
+
+	def checkAdoption(self, usePidfd):
+		# As after a restart of the supervisor: The daemon is running, but not as its child.
+		elsewhere = subprocess.Popen([sys.executable, "-c", CHILD_SCRIPT, "-"], start_new_session=True)
+		self.supervise(usePidfd=usePidfd, findRunning=lambda: elsewhere.pid if elsewhere.poll() is None else None)
+		status = self.client.status()["1"]
+		self.assertEqual((status["state"], status["pid"], status["adopted"]), ("running", elsewhere.pid, True))
+		elsewhere.kill()
+		self.waitFor(lambda: self.client.status()["1"]["pid"] not in (None, elsewhere.pid))
+		status = self.client.status()["1"]
+		self.assertEqual((status["state"], status["adopted"]), ("running", False))
+		self.assertEqual(status["lastExit"], "exited (adopted, status unknown)")
+		self.finish()
+
+	def test_adoptionPidfd(self):
+		self.checkAdoption(usePidfd=True)
+
+	def test_adoptionPolling(self):
+		self.checkAdoption(usePidfd=False)
+
+	def test_stopAdopted(self):
+		elsewhere = subprocess.Popen([sys.executable, "-c", CHILD_SCRIPT, "-"], start_new_session=True)
+		self.supervise(findRunning=lambda: elsewhere.pid if elsewhere.poll() is None else None)
+		self.client.request("stop 1")
+		elsewhere.wait(5) # Gets SIGTERM, like our own children.
+		self.waitFor(lambda: self.client.status()["1"]["state"] == "stopped")
+		self.finish()
+
+	def test_daemonizingChild(self):
+		# The conf file says daemon=1, as the ones we write do; supervised, it has to stay a child anyway.
+		binDirPath = os.path.join(self.tempDir.name, "bin")
+		dataDirPath = os.path.join(self.tempDir.name, ".vivocore")
+		os.makedirs(binDirPath)
+		os.makedirs(dataDirPath)
+		with open(os.path.join(dataDirPath, "vivo.conf"), "w") as confFile:
+			confFile.write("server=1\ndaemon=1\n")
+		for binName, script in (("vivod", DAEMONIZING_SCRIPT.format(python=sys.executable)), ("vivo-cli", "")):
+			with open(os.path.join(binDirPath, binName), "w") as binFile:
+				binFile.write(script)
+			os.chmod(os.path.join(binDirPath, binName), 0o755)
+		wallet = BitcoinWallet(BitcoinConfig(basePaths=[binDirPath], cliBinName="vivo-cli", daemonBinName="vivod",\
+			dataDirPath=dataDirPath, configFileName="vivo.conf"))
+		self.supervisor = Supervisor([SupervisedChild("1", wallet.daemonCommandLine(detach=False))],\
+			socketPath=self.socketPath, stopTimeout=2)
+		self.events = []
+		self.thread = threading.Thread(target=lambda: self.events.extend(self.supervisor.run()), daemon=True)
+		self.thread.start()
+		self.client = SupervisorClient(self.socketPath)
+		pidFilePath = os.path.join(dataDirPath, "vivod.pid")
+		self.waitFor(lambda: os.path.exists(pidFilePath) and os.path.getsize(pidFilePath) > 0)
+		time.sleep(0.3)
+		status = self.client.status()["1"]
+		self.assertEqual((status["state"], status["wanted"]), ("running", True))
+		with open(pidFilePath, "r") as pidFile:
+			self.assertEqual(int(pidFile.read()), status["pid"])
+		self.finish()
+	
+	def test_monitorRestart(self):
+		# The monitor restarts supervised nodes through the supervisor, but not those stopped through it.
+		self.supervise()
+		self.waitFor(lambda: self.client.status()["1"]["state"] == "running")
+		self.client.request("stop 1")
+		self.waitFor(lambda: self.client.status()["1"]["state"] == "stopped")
+		action = MonitorAction("monitor", None)
+		action._registry = SimpleNamespace(loader=SimpleNamespace(coinDirPath=self.tempDir.name))
+		self.assertIsNotNone(action._restart(None, SimpleNamespace(id="1"), "not alive"))
+		time.sleep(0.3)
+		status = self.client.status()["1"]
+		self.assertEqual((status["state"], status["wanted"]), ("stopped", False))
+		self.waitFor(lambda: self.client.status()["2"]["state"] == "running")
+		pid = self.client.status()["2"]["pid"]
+		self.assertIsNone(action._restart(None, SimpleNamespace(id="2"), "not alive"))
+		self.waitFor(lambda: self.client.status()["2"]["state"] == "running"\
+			and not self.client.status()["2"]["pid"] in (None, pid))
+		self.finish()
+	
+	def test_noSupervisor(self):
+		with self.assertRaises(SupervisorConnectionError):
+			SupervisorClient(self.socketPath).status()
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,75 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import os
+import tempfile
+import time
+import unittest
+
+# What's to be tested.
+from lib.syncprogress import SyncProgressTracker, parseUpdateTip, estimate
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+START_TIME = 1525132800 # 2018-05-01 00:00:00
+
+def updateTipLine(second, height, progress, cache="cache=41.2MiB(301020txo)"):
+	return ("{time} UpdateTip: new best=0000000000000000001c height={height} version=0x20000000 "
+		"log2_work=88.99 tx={tx} date='2018-05-01 11:59:50' progress={progress:f} {cache}\n")\
+		.format(time=time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(START_TIME+second)), height=height,\
+		tx=height*100, progress=progress, cache=cache)
+
+class SyncProgressTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.tempDir.name, "debug.log")
+
+	def tearDown(self):
+		self.tempDir.cleanup()
+
+	def write(self, seconds):
+		with open(self.path, "a") as logFile:
+			for second in seconds:
+				logFile.write(updateTipLine(second, 1000+second*2, second/1000))
+				logFile.write("{0} Other line\n".format(time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(START_TIME+second))))
+
+	def test_parse(self):
+		tipUpdate = parseUpdateTip(updateTipLine(1, 522000, 0.5))
+		self.assertEqual((tipUpdate.time, tipUpdate.height, tipUpdate.progress, tipUpdate.tx, tipUpdate.cache),\
+			(START_TIME+1, 522000, 0.5, 52200000, 41.2))
+		self.assertIsNone(parseUpdateTip(updateTipLine(1, 1, 0.5, cache="cache=3051")).cache)
+		self.assertIsNone(parseUpdateTip("2018-05-01 00:00:00 Other line"))
+
+	def test_estimate(self):
+		self.write(range(0, 500))
+		result = SyncProgressTracker(self.path, resolution=0).estimate(window=100)
+		self.assertAlmostEqual(result.blocksPerSecond, 2.0)
+		self.assertAlmostEqual(result.eta, 501.0)
+		self.assertFalse(result.synced)
+		self.assertIsNone(estimate([]))
+
+	def test_incremental(self):
+		self.write(range(0, 100))
+		tracker = SyncProgressTracker(self.path, resolution=10)
+		samples = tracker.update()
+		# One per 10 seconds, and the latest.
+		self.assertEqual([sample.time-START_TIME for sample in samples], list(range(0, 100, 10))+[99])
+		self.write(range(100, 200))
+		# A new tracker goes on where the last one left off.
+		samples = SyncProgressTracker(self.path, resolution=10).update()
+		self.assertEqual(samples[-1].height, 1000+199*2)
+		self.assertEqual(len([sample for sample in samples if sample.time == START_TIME+50]), 1)
+
+	def test_catchUp(self):
+		self.write(range(0, 1000))
+		samples = SyncProgressTracker(self.path, resolution=0, maxCatchUp=10000).update()
+		self.assertLess(len(samples), 100)
+		self.assertEqual(samples[-1].height, 1000+999*2)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,111 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+from concurrent.futures import ThreadPoolExecutor
+import os
+import tempfile
+import time
+import unittest
+
+# What's to be tested.
+from lib.trash import TrashCan, TrashPurger, TrashError, setIdleIoPriority
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+class TrashTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.trashDirPath = os.path.join(self.tempDir.name, ".trash")
+		self.blocksDirPath = os.path.join(self.tempDir.name, "blocks")
+		os.makedirs(os.path.join(self.blocksDirPath, "index"))
+		for name, size in [("blk00000.dat", 300000), ("rev00000.dat", 1000), ("index/000001.ldb", 10)]:
+			with open(os.path.join(self.blocksDirPath, name), "wb") as dataFile:
+				dataFile.write(b"\0"*size)
+		self.keptPath = os.path.join(self.tempDir.name, "kept.dat")
+		os.link(os.path.join(self.blocksDirPath, "blk00000.dat"), self.keptPath)
+		os.symlink(self.tempDir.name, os.path.join(self.blocksDirPath, "link"))
+		self.trashCan = TrashCan(self.trashDirPath)
+
+	def tearDown(self):
+		self.tempDir.cleanup()
+
+	def purger(self, **kwargs):
+		return TrashPurger(self.trashDirPath, truncateStep=100000, statusInterval=0, **kwargs)
+
+	def test_put(self):
+		trashedPath = self.trashCan.put(self.blocksDirPath)
+		self.assertFalse(os.path.exists(self.blocksDirPath))
+		self.assertTrue(os.path.isdir(trashedPath))
+		self.assertEqual(self.trashCan.pending, [os.path.basename(trashedPath)])
+		with self.assertRaises(TrashError):
+			self.trashCan.put(self.blocksDirPath)
+
+	def test_purge(self):
+		self.trashCan.put(self.blocksDirPath)
+		progress = list(self.purger().purge())[-1]
+		self.assertTrue(progress.done)
+		self.assertEqual(progress.errors, [])
+		self.assertEqual(progress.files, 4)
+		self.assertEqual(self.trashCan.pending, [])
+		self.assertEqual(self.trashCan.status["files"], 4)
+		# Other hardlinks and symlink targets are left alone.
+		self.assertEqual(os.path.getsize(self.keptPath), 300000)
+		self.assertTrue(os.path.isdir(self.tempDir.name))
+
+	def test_truncate(self):
+		os.unlink(self.keptPath)
+		self.trashCan.put(self.blocksDirPath)
+		progress = list(self.purger().purge())[-1]
+		self.assertEqual(progress.bytes, 301010)
+
+	def test_throttle(self):
+		self.trashCan.put(self.blocksDirPath)
+		startTime = time.monotonic()
+		list(self.purger(maxFilesPerSecond=20).purge())
+		self.assertGreater(time.monotonic()-startTime, 0.1)
+
+	def test_lock(self):
+		self.trashCan.put(self.blocksDirPath)
+		purge = self.purger().purge()
+		next(purge)
+		with self.assertRaises(TrashError):
+			list(self.purger().purge())
+		list(purge)
+
+	def test_trashedWhilePurging(self):
+		# The second tree's purger finds the first one working and leaves it to that.
+		self.trashCan.put(self.blocksDirPath)
+		purge = self.purger().purge()
+		next(purge)
+		os.makedirs(os.path.join(self.tempDir.name, "chainstate"))
+		self.trashCan.put(os.path.join(self.tempDir.name, "chainstate"))
+		with self.assertRaises(TrashError):
+			list(self.purger().purge())
+		self.assertTrue(list(purge)[-1].done)
+		self.assertEqual(self.trashCan.pending, [])
+
+	def test_detach(self):
+		# From a worker thread, as when the rollout resyncs nodes.
+		self.trashCan.put(self.blocksDirPath)
+		with ThreadPoolExecutor(max_workers=2) as executor:
+			process = executor.submit(self.purger().detach).result()
+		self.assertEqual(process.wait(30), 0)
+		self.assertEqual(self.trashCan.pending, [])
+		self.assertTrue(self.trashCan.status["done"])
+		self.assertNotEqual(self.trashCan.status["pid"], os.getpid())
+
+	def test_thread(self):
+		self.trashCan.put(self.blocksDirPath)
+		self.purger().start().join(10)
+		self.assertEqual(self.trashCan.pending, [])
+
+	def test_idle(self):
+		self.assertIn(setIdleIoPriority(), (True, False))
+
+if __name__ == "__main__":
+	unittest.main()
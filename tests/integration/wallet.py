@@ -0,0 +1,641 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import http.server
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+# What's to be tested.
+from lib.currencies import WalletError
+from lib.metrics import MetricsStore
+from lib.notifications import BlockNotifyListener
+from plugins.currencies.bitcoin import BitcoinConfig, BitcoinWallet, DaemonStartupMonitor, MetricsAction,\
+	MonitorAction, StopAllAction, parseTime
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+# Like the daemons: Goes into the background with -daemon, locks the datadir, writes its
+# pid file, logs that it's done loading, runs the -blocknotify command for block "00ab"
+# and, on SIGTERM, takes a while to flush before it exits (-flush=SECONDS). With -fail,
+# it logs an error and exits instead.
+FAKE_DAEMON_SCRIPT = """#!{python}
+import fcntl, os, signal, sys, time
+options = dict([arg.partition("=")[::2] for arg in sys.argv[1:]])
+dataDirPath = options["-datadir"]
+if "-daemon" in options:
+	if os.fork() > 0:
+		os._exit(0)
+	os.setsid()
+	devNull = os.open(os.devnull, os.O_RDWR)
+	for fd in (0, 1, 2):
+		os.dup2(devNull, fd)
+logFile = open(os.path.join(dataDirPath, "debug.log"), "a")
+if "-fail" in options:
+	logFile.write("Error: Unable to bind to 127.0.0.1:9999 on this computer.\\n")
+	sys.exit(1)
+lockFile = open(os.path.join(dataDirPath, ".lock"), "a")
+fcntl.lockf(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+with open(os.path.join(dataDirPath, "vivod.pid"), "w") as pidFile:
+	pidFile.write(str(os.getpid()))
+logFile.write("init message: Loading block index...\\ninit message: Done loading\\n")
+logFile.flush()
+if "-blocknotify" in options:
+	os.system(options["-blocknotify"].replace("%s", "00ab"))
+stopping = []
+signal.signal(signal.SIGTERM, lambda number, frame: stopping.append(True))
+while not stopping:
+	time.sleep(0.02)
+time.sleep(float(options.get("-flush", 0)))
+"""
+
+# Like the cli: Prints the JSON document (the first argument) in small pieces, as the
+# output of a large call arrives. Says the daemon is warming up if the file "warmingup"
+# is next to it, the first time, and fails for the method "fail".
+FAKE_CLI_SCRIPT = """#!{python}
+import os, sys, time
+warmupPath = os.path.join(os.path.dirname(sys.argv[0]), "warmingup")
+if os.path.exists(warmupPath):
+	os.remove(warmupPath)
+	sys.stderr.write("error code: -28\\nerror message:\\nLoading block index...\\n")
+	sys.exit(28)
+if sys.argv[-1] == "fail":
+	sys.stderr.write("error code: -32601\\nerror message:\\nMethod not found\\n")
+	sys.exit(1)
+document = sys.argv[-1]
+for index in range(0, len(document), 3):
+	sys.stdout.write(document[index:index+3])
+	sys.stdout.flush()
+"""
+
+# Like the cli of a daemon that's warming up: Answers with RPC error -28 and the messages
+# in the file "warmup" next to it, one per call, then with the block count. Can't connect
+# if the file "down" is next to it.
+WARMUP_CLI_SCRIPT = """#!{python}
+import os, sys
+binDirPath = os.path.dirname(sys.argv[0])
+if os.path.exists(os.path.join(binDirPath, "down")):
+	sys.stderr.write("error: couldn't connect to server: unknown (code -1)\\n")
+	sys.exit(1)
+warmupPath = os.path.join(binDirPath, "warmup")
+if os.path.exists(warmupPath):
+	with open(warmupPath) as warmupFile:
+		messages = warmupFile.read().splitlines()
+	if len(messages) > 0:
+		with open(warmupPath, "w") as warmupFile:
+			warmupFile.write("\\n".join(messages[1:]))
+		sys.stderr.write("error code: -28\\nerror message:\\n{{0}}\\n".format(messages[0]))
+		sys.exit(28)
+print(1234)
+"""
+
+class StandInRpcHandler(http.server.BaseHTTPRequestHandler):
+	
+	#=============================
+	"""Answers every RPC call with the next of .answers, a list of (result, error) pairs.
+	The last answer is repeated."""
+	#=============================
+	
+	protocol_version = "HTTP/1.1"
+	answers = []
+	
+	def log_message(self, *args):
+		pass
+	
+	def do_POST(self):
+		call = json.loads(self.rfile.read(int(self.headers["Content-Length"])).decode())
+		result, error = self.answers.pop(0) if len(self.answers) > 1 else self.answers[0]
+		data = json.dumps({"id": call["id"], "result": result, "error": error}).encode()
+		self.send_response(500 if error else 200)
+		self.send_header("Content-Length", str(len(data)))
+		self.end_headers()
+		self.wfile.write(data)
+
+class FindFileTestCase(unittest.TestCase):
+	
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.basePaths = [os.path.join(self.tempDir.name, name) for name in ("first", "second")]
+		for path in self.basePaths:
+			os.makedirs(path)
+		self.config = BitcoinConfig(basePaths=self.basePaths, cliBinName="vivo-cli", daemonBinName="vivod",\
+			dataDirPath=os.path.join(self.tempDir.name, ".vivocore"), configFileName="vivo.conf")
+	
+	def tearDown(self):
+		self.tempDir.cleanup()
+	
+	def createFile(self, path):
+		with open(path, "w"):
+			pass
+		return path
+	
+	def test_basePaths(self):
+		# Found in the base path, wherever we run from.
+		daemonBinPath = self.createFile(os.path.join(self.basePaths[1], "vivod"))
+		self.assertNotEqual(os.getcwd(), self.basePaths[1])
+		self.assertEqual(self.config.daemonBinPath, daemonBinPath)
+	
+	def test_order(self):
+		cliBinPath = self.createFile(os.path.join(self.basePaths[0], "vivo-cli"))
+		self.createFile(os.path.join(self.basePaths[1], "vivo-cli"))
+		self.assertEqual(self.config.cliBinPath, cliBinPath)
+	
+	def test_directorySkipped(self):
+		os.makedirs(os.path.join(self.basePaths[0], "vivo.conf"))
+		configFilePath = self.createFile(os.path.join(self.basePaths[1], "vivo.conf"))
+		self.assertEqual(self.config.configFilePath, configFilePath)
+	
+	def test_which(self):
+		self.assertEqual(self.config.findFile("sh"), shutil.which("sh"))
+		self.assertIsNone(self.config.findFile("vivod"))
+	
+	def test_cache(self):
+		daemonBinPath = self.createFile(os.path.join(self.basePaths[1], "vivod"))
+		self.assertEqual(self.config.daemonBinPath, daemonBinPath)
+		# A binary switch isn't noticed until the cache is invalidated.
+		switchedBinPath = self.createFile(os.path.join(self.basePaths[0], "vivod"))
+		self.assertEqual(self.config.daemonBinPath, daemonBinPath)
+		self.config.invalidatePathCache()
+		self.assertEqual(self.config.daemonBinPath, switchedBinPath)
+	
+	def test_basePathsChanged(self):
+		daemonBinPath = self.createFile(os.path.join(self.basePaths[1], "vivod"))
+		self.assertEqual(self.config.daemonBinPath, daemonBinPath)
+		self.config.basePaths = [self.basePaths[0]]
+		self.assertIsNone(self.config.daemonBinPath)
+	
+	def test_cacheNotShown(self):
+		self.config.daemonBinPath
+		self.assertNotIn("_resolvedPaths", [attribute.name for attribute in self.config._config_])
+
+class ParseTimeTestCase(unittest.TestCase):
+	
+	def test_dateAndTime(self):
+		self.assertEqual(parseTime("2024-01-02 03:04:05"), 1704164645)
+		self.assertEqual(parseTime("2024-01-02T03:04"), 1704164640)
+	
+	def test_timeOfDay(self):
+		today = time.gmtime()
+		self.assertEqual(time.gmtime(parseTime("03:04"))[:5], (today.tm_year, today.tm_mon, today.tm_mday, 3, 4))
+	
+	def test_none(self):
+		self.assertIsNone(parseTime(None))
+	
+	def test_garbage(self):
+		with self.assertRaises(WalletError) as context:
+			parseTime("yesterday")
+		self.assertEqual(context.exception.code, WalletError.codes.CLI_ERROR)
+
+class MetricsActionTestCase(unittest.TestCase):
+	
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.startTime = (int(time.time())//60-10)*60
+		self.action = MetricsAction("metrics", SimpleNamespace(args=SimpleNamespace(metric="height",\
+			since=time.strftime("%Y-%m-%d %H:%M", time.gmtime(self.startTime)),\
+			until=time.strftime("%Y-%m-%d %H:%M", time.gmtime(self.startTime+300)), resolution=None, nodeIds=None)))
+		self.action._registry = SimpleNamespace(loader=SimpleNamespace(coinDirPath=self.tempDir.name),\
+			fleet=lambda: [SimpleNamespace(id="1")])
+	
+	def tearDown(self):
+		self.tempDir.cleanup()
+	
+	def test_range(self):
+		with MetricsStore(self.action.metricsPath) as store:
+			store.add("1", "height", 10, self.startTime+60)
+			store.add("1", "height", 20, self.startTime+360)
+		(id, metric, metricRange), = list(self.action.iterRanges())
+		self.assertEqual((id, metric, list(metricRange.values)), ("1", "height", [10]))
+	
+	def test_nothingRecorded(self):
+		self.assertEqual(list(self.action.iterRanges()), ["No metrics recorded yet; see \"monitor\"."])
+
+class FakeDaemonTestCase(unittest.TestCase):
+
+	#=============================
+	"""Sets up a wallet in a temp dir whose daemon is FAKE_DAEMON_SCRIPT."""
+	#=============================
+	
+	rpcPort = 1
+	
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.binDirPath = os.path.join(self.tempDir.name, "bin")
+		self.dataDirPath = os.path.join(self.tempDir.name, ".vivocore")
+		os.makedirs(self.binDirPath)
+		os.makedirs(self.dataDirPath)
+		with open(os.path.join(self.dataDirPath, "vivo.conf"), "w") as confFile:
+			confFile.write("server=1\nrpcuser=user\nrpcpassword=secret\nrpcport={0}\n".format(self.rpcPort))
+		for binName, script in (("vivod", FAKE_DAEMON_SCRIPT.format(python=sys.executable)), ("vivo-cli", "")):
+			with open(os.path.join(self.binDirPath, binName), "w") as binFile:
+				binFile.write(script)
+			os.chmod(os.path.join(self.binDirPath, binName), 0o755)
+		self.wallet = BitcoinWallet(BitcoinConfig(basePaths=[self.binDirPath], cliBinName="vivo-cli",\
+			daemonBinName="vivod", dataDirPath=self.dataDirPath, configFileName="vivo.conf", host="127.0.0.1"))
+		self.daemons = []
+	
+	def tearDown(self):
+		for daemon in self.daemons:
+			if daemon.poll() is None:
+				daemon.kill()
+				daemon.wait()
+		if not self.wallet.daemonPid is None:
+			os.kill(self.wallet.daemonPid, signal.SIGKILL)
+		self.wallet.rpcClient.close()
+		self.tempDir.cleanup()
+	
+	def startFakeDaemon(self, flushSeconds=0):
+		daemon = subprocess.Popen([os.path.join(self.binDirPath, "vivod"), "-flush={0}".format(flushSeconds),\
+			"-datadir={0}".format(self.dataDirPath)])
+		self.daemons.append(daemon)
+		pidFilePath = self.wallet.config.pidFilePath
+		deadline = time.monotonic()+10
+		while not (os.path.exists(pidFilePath) and os.path.getsize(pidFilePath) > 0):
+			self.assertLess(time.monotonic(), deadline)
+			time.sleep(0.02)
+		return daemon
+	
+	def writeCli(self, script):
+		with open(os.path.join(self.binDirPath, "vivo-cli"), "w") as binFile:
+			binFile.write(script.format(python=sys.executable))
+	
+	def writeStalePidFile(self):
+		# A pid that's certainly free: one of an exited and reaped process.
+		process = subprocess.Popen(["true"])
+		process.wait()
+		with open(self.wallet.config.pidFilePath, "w") as pidFile:
+			pidFile.write(str(process.pid))
+
+class WaitForExitTestCase(FakeDaemonTestCase):
+
+	def test_notRunning(self):
+		self.assertIsNone(self.wallet.daemonPid)
+		self.assertFalse(self.wallet.dataDirLocked)
+		self.assertTrue(self.wallet.waitForExit(0))
+	
+	def test_stalePidFile(self):
+		self.writeStalePidFile()
+		self.assertIsNone(self.wallet.daemonPid)
+		self.assertTrue(self.wallet.waitForExit(0))
+	
+	def test_running(self):
+		daemon = self.startFakeDaemon()
+		self.assertEqual(self.wallet.daemonPid, daemon.pid)
+		self.assertTrue(self.wallet.dataDirLocked)
+		self.assertFalse(self.wallet.daemonRunning)
+		self.assertFalse(self.wallet.waitForExit(0.3))
+	
+	def test_flushing(self):
+		# Without RPC the daemon reads as not running, yet it holds the datadir until it has flushed.
+		daemon = self.startFakeDaemon(flushSeconds=0.5)
+		daemon.send_signal(signal.SIGTERM)
+		startTime = time.monotonic()
+		self.assertTrue(self.wallet.waitForExit(10))
+		self.assertGreaterEqual(time.monotonic()-startTime, 0.4)
+		self.assertIsNotNone(daemon.poll())
+		self.assertFalse(self.wallet.dataDirLocked)
+	
+	def test_lockedByOtherProcess(self):
+		# A daemon whose pid file is gone still counts for as long as it holds the lock.
+		daemon = self.startFakeDaemon()
+		os.remove(self.wallet.config.pidFilePath)
+		self.assertIsNone(self.wallet.daemonPid)
+		self.assertFalse(self.wallet.waitForExit(0.3))
+		daemon.send_signal(signal.SIGTERM)
+		self.assertTrue(self.wallet.waitForExit(10))
+
+class DeleteBlockchainDataTestCase(FakeDaemonTestCase):
+	
+	def setUp(self):
+		super().setUp()
+		os.makedirs(os.path.join(self.dataDirPath, "blocks"))
+		with open(os.path.join(self.dataDirPath, "blocks", "blk00000.dat"), "wb") as blockFile:
+			blockFile.write(b"\0"*1000)
+	
+	def test_daemonExiting(self):
+		# Stopped answering, but still flushing: Its block data mustn't be moved yet.
+		daemon = self.startFakeDaemon(flushSeconds=60)
+		daemon.send_signal(signal.SIGTERM)
+		with self.assertRaises(WalletError) as context:
+			self.wallet.deleteBlockchainData(purge=False)
+		self.assertEqual(context.exception.code, WalletError.codes.DATA_DELETION_FAILED)
+		self.assertTrue(os.path.isdir(os.path.join(self.dataDirPath, "blocks")))
+	
+	def test_purge(self):
+		self.writeStalePidFile()
+		trashedPaths = self.wallet.deleteBlockchainData()
+		self.assertEqual(len(trashedPaths), 1)
+		self.assertFalse(os.path.exists(os.path.join(self.dataDirPath, "blocks")))
+		deadline = time.monotonic()+30
+		while len(self.wallet.trashCan.pending) > 0:
+			self.assertLess(time.monotonic(), deadline)
+			time.sleep(0.05)
+
+class KillDaemonTestCase(FakeDaemonTestCase):
+	
+	def test_hung(self):
+		daemon = self.startFakeDaemon(flushSeconds=60)
+		startTime = time.monotonic()
+		self.wallet.killDaemon(0.3)
+		self.assertLess(time.monotonic()-startTime, 5)
+		self.assertEqual(daemon.wait(), -signal.SIGKILL)
+		self.assertTrue(self.wallet.waitForExit(0))
+	
+	def test_terminated(self):
+		daemon = self.startFakeDaemon(flushSeconds=0.1)
+		self.wallet.killDaemon(10)
+		self.assertEqual(daemon.wait(), 0)
+	
+	def test_notRunning(self):
+		self.writeStalePidFile()
+		self.wallet.killDaemon(0)
+	
+	def test_monitorRestartsHungDaemon(self):
+		# Not answering RPC calls, so not .daemonRunning, but its process is there: It has to go first.
+		daemon = self.startFakeDaemon(flushSeconds=60)
+		action = MonitorAction("monitor", None)
+		action._registry = SimpleNamespace(loader=SimpleNamespace(coinDirPath=self.tempDir.name))
+		action.stopTimeout = 0.3
+		self.assertIsNone(action._restart(self.wallet, SimpleNamespace(id="1"), "not alive"))
+		self.assertEqual(daemon.wait(), -signal.SIGKILL)
+		deadline = time.monotonic()+10
+		while self.wallet.daemonPid in (None, daemon.pid):
+			self.assertLess(time.monotonic(), deadline)
+			time.sleep(0.02)
+
+	def test_monitorRestartFailing(self):
+		# A launcher that fails right away: No "restarted" for a daemon that didn't come up.
+		with open(os.path.join(self.binDirPath, "vivod"), "w") as binFile:
+			binFile.write("#!{python}\nimport sys\nsys.stderr.write(\"Error: Cannot obtain a lock on data directory\\n\")\n"\
+				"sys.exit(1)\n".format(python=sys.executable))
+		action = MonitorAction("monitor", None)
+		action._registry = SimpleNamespace(loader=SimpleNamespace(coinDirPath=self.tempDir.name))
+		action.stopTimeout = 0.3
+		with self.assertRaises(WalletError) as context:
+			action._restart(self.wallet, SimpleNamespace(id="1"), "not alive")
+		self.assertEqual(context.exception.code, WalletError.codes.DAEMON_START_FAILED)
+		self.assertIn("Cannot obtain a lock", str(context.exception))
+
+class StopAllTestCase(FakeDaemonTestCase):
+	
+	def setUp(self):
+		super().setUp()
+		self.action = StopAllAction("stopall", SimpleNamespace(args=SimpleNamespace(stopDaemonTimeout="2")))
+		self.node = SimpleNamespace(id="1", config=self.wallet.config)
+	
+	def test_notRunning(self):
+		self.assertEqual(self.action.stopNode(self.node), "not running")
+	
+	def test_flushing(self):
+		# Not answering anymore, but only stopped once it has flushed and exited.
+		daemon = self.startFakeDaemon(flushSeconds=0.5)
+		daemon.send_signal(signal.SIGTERM)
+		self.assertEqual(self.action.stopNode(self.node), "stopped")
+		self.assertIsNotNone(daemon.poll())
+		self.assertFalse(self.wallet.dataDirLocked)
+	
+	def test_stuck(self):
+		self.startFakeDaemon()
+		with self.assertRaises(WalletError) as context:
+			self.action.stopNode(self.node)
+		self.assertEqual(context.exception.code, WalletError.codes.DAEMON_STUCK)
+
+class WarmupTestCase(FakeDaemonTestCase):
+	
+	def setUp(self):
+		super().setUp()
+		self.writeCli(WARMUP_CLI_SCRIPT)
+	
+	def warmUp(self, *messages):
+		with open(os.path.join(self.binDirPath, "warmup"), "w") as warmupFile:
+			warmupFile.write("\n".join(messages))
+	
+	def test_parseWarmupProgress(self):
+		self.assertEqual(self.wallet._parseWarmupProgress("Loading block index... 45%"), 45.0)
+		self.assertEqual(self.wallet._parseWarmupProgress("Verifying blocks... 12.5 %"), 12.5)
+		self.assertEqual(self.wallet._parseWarmupProgress("2024-01-01 00:00:00 Verification progress: 60"), 60.0)
+		self.assertIsNone(self.wallet._parseWarmupProgress("Loading wallet..."))
+	
+	def test_ready(self):
+		status = self.wallet.warmupStatus()
+		self.assertTrue(status.ready)
+	
+	def test_progressFromRpc(self):
+		self.warmUp("Loading block index... 45%")
+		status = self.wallet.warmupStatus()
+		self.assertEqual(tuple(status), (False, "Loading block index... 45%", 45.0, "rpc"))
+	
+	def test_progressFromDebugLog(self):
+		# The RPC error doesn't say how far it got, but the log does.
+		with open(self.wallet.config.debugLogPath, "w") as logFile:
+			logFile.write("2024-01-01 00:00:00 init message: Verifying blocks...\n"
+				"2024-01-01 00:00:01 Verification progress: 60\n")
+		self.warmUp("Verifying blocks...")
+		status = self.wallet.warmupStatus()
+		self.assertEqual(tuple(status), (False, "Verifying blocks...", 60.0, "debug.log"))
+	
+	def test_waitUntilReady(self):
+		self.warmUp("Loading block index... 10%", "Loading block index... 90%", "Verifying blocks...")
+		progress = []
+		status = self.wallet.waitUntilReady(timeout=30, initialInterval=0.01, progressCallback=progress.append)
+		self.assertTrue(status.ready)
+		self.assertEqual([status.progress for status in progress], [10.0, 90.0, None])
+	
+	def test_stuck(self):
+		self.warmUp(*["Loading block index..."]*100)
+		with self.assertRaises(WalletError) as context:
+			self.wallet.waitUntilReady(timeout=0.3, initialInterval=0.01)
+		self.assertEqual(context.exception.code, WalletError.codes.DAEMON_STUCK)
+	
+	def test_neverAnswered(self):
+		open(os.path.join(self.binDirPath, "down"), "w").close()
+		with self.assertRaises(WalletError) as context:
+			self.wallet.waitUntilReady(timeout=0.3, initialInterval=0.01)
+		self.assertEqual(context.exception.code, WalletError.codes.RPC_CONNECTION_FAILED)
+	
+	def test_runCliSafe(self):
+		# A call right after the daemon started is answered once it's ready.
+		self.warmUp("Loading block index...", "Loading wallet...")
+		self.assertEqual(self.wallet.getBlockCount(), 1234)
+
+class DaemonStartupMonitorTestCase(FakeDaemonTestCase):
+	
+	def setUp(self):
+		super().setUp()
+		self.writeCli(WARMUP_CLI_SCRIPT)
+		with open(self.wallet.config.debugLogPath, "w") as logFile:
+			logFile.write("init message: Done loading\nError: From a previous run\n")
+	
+	def test_ready(self):
+		monitor = self.wallet.monitorStartup(timeout=30)
+		self.wallet.startDaemon().waitAndGetOutput(timeout=30)
+		status = monitor.wait()
+		self.assertTrue(status.ready)
+		self.assertEqual((monitor.stage, monitor.pid), ("ready", self.wallet.daemonPid))
+	
+	def test_stalePidFile(self):
+		# Left behind by a daemon that crashed: Its process is gone, but that of the new one isn't.
+		self.writeStalePidFile()
+		monitor = self.wallet.monitorStartup(timeout=30)
+		time.sleep(0.2)
+		self.wallet.startDaemon().waitAndGetOutput(timeout=30)
+		self.assertTrue(monitor.wait().ready)
+	
+	def test_error(self):
+		monitor = self.wallet.monitorStartup(timeout=30)
+		self.wallet.startDaemon(["-fail"]).waitAndGetOutput(timeout=30)
+		with self.assertRaises(WalletError) as context:
+			monitor.wait()
+		self.assertEqual(context.exception.code, WalletError.codes.DAEMON_START_FAILED)
+		self.assertIn("Unable to bind", str(context.exception))
+	
+	def test_processGone(self):
+		monitor = DaemonStartupMonitor(self.wallet, timeout=30)
+		daemon = self.startFakeDaemon()
+		daemon.kill()
+		daemon.wait()
+		monitor.start()
+		with self.assertRaises(WalletError) as context:
+			monitor.wait()
+		self.assertIn("is gone", str(context.exception))
+	
+	def test_timeout(self):
+		monitor = self.wallet.monitorStartup(timeout=0.3)
+		with self.assertRaises(WalletError) as context:
+			monitor.wait()
+		self.assertEqual(context.exception.code, WalletError.codes.DAEMON_STUCK)
+		self.assertEqual(monitor.stage, "starting")
+
+class BlockNotifyTestCase(FakeDaemonTestCase):
+	
+	def test_startDaemon(self):
+		with BlockNotifyListener(os.path.join(self.tempDir.name, "blocknotify.sock")) as listener:
+			self.wallet.startDaemon(blockNotifySocketPath=listener.socketPath).waitAndGetOutput(timeout=30)
+			event = listener.receive(timeout=10)
+		self.assertEqual((event.node, event.blockHash), (self.dataDirPath, "00ab"))
+
+class RunCliStreamTestCase(FakeDaemonTestCase):
+	
+	mempool = {"{0:064x}".format(index): {"size": 200+index, "fee": 0.00001*index, "time": 1.5e9+index}\
+		for index in range(1, 30)}
+	
+	def setUp(self):
+		super().setUp()
+		self.writeCli(FAKE_CLI_SCRIPT)
+	
+	def test_stream(self):
+		self.assertEqual(dict(self.wallet.runCliStream([json.dumps(self.mempool)])), self.mempool)
+	
+	def test_path(self):
+		block = {"hash": "00ab", "tx": [{"txid": "1", "fee": 0.0001}, {"txid": "2", "fee": -0.5e-3}]}
+		self.assertEqual(list(self.wallet.runCliStream([json.dumps(block)], path=["tx"])), block["tx"])
+	
+	def test_warmup(self):
+		open(os.path.join(self.binDirPath, "warmingup"), "w").close()
+		self.assertEqual(list(self.wallet.runCliStream([json.dumps([0.0001, 2])])), [0.0001, 2])
+	
+	def test_error(self):
+		with self.assertRaises(WalletError) as context:
+			list(self.wallet.runCliStream(["fail"]))
+		self.assertEqual(context.exception.code, WalletError.codes.CLI_ERROR)
+		self.assertIn("Method not found", str(context.exception))
+
+class ProbeLivenessTestCase(FakeDaemonTestCase):
+	
+	def setUp(self):
+		self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.server.bind(("127.0.0.1", 0))
+		self.server.listen(5)
+		self.rpcPort = self.server.getsockname()[1]
+		super().setUp()
+		self.writeCli(WARMUP_CLI_SCRIPT)
+	
+	def tearDown(self):
+		super().tearDown()
+		self.server.close()
+	
+	def test_notRunning(self):
+		report = self.wallet.probeLiveness()
+		self.assertFalse(report.alive)
+		self.assertEqual(report.tier("pidfile").detail, "no pid file")
+		self.assertIsNone(report.tier("tcp"))
+		self.assertFalse(self.wallet.daemonRunning)
+	
+	def test_stalePidFile(self):
+		# The port is taken by someone else, yet the pid file names nobody: Not running.
+		self.writeStalePidFile()
+		report = self.wallet.probeLiveness()
+		self.assertFalse(report.alive)
+		self.assertIn("is gone", report.tier("pidfile").detail)
+		self.assertFalse(self.wallet.daemonRunning)
+	
+	def test_running(self):
+		daemon = self.startFakeDaemon()
+		report = self.wallet.probeLiveness()
+		self.assertTrue(report.alive)
+		self.assertEqual(report.tier("pidfile").detail, daemon.pid)
+		self.assertTrue(report.tier("tcp").alive)
+		self.assertIsNone(report.tier("rpc"))
+		self.assertTrue(self.wallet.daemonRunning)
+	
+	def test_deep(self):
+		self.startFakeDaemon()
+		with open(os.path.join(self.binDirPath, "warmup"), "w") as warmupFile:
+			warmupFile.write("Loading block index... 45%")
+		report = self.wallet.probeLiveness(deep=True)
+		self.assertFalse(report.alive)
+		self.assertEqual(report.tier("rpc").detail, "Loading block index... 45%")
+		self.assertTrue(self.wallet.probeLiveness(deep=True).alive)
+		with open(os.path.join(self.binDirPath, "down"), "w"):
+			pass
+		self.assertEqual(self.wallet.probeLiveness(deep=True).tier("rpc").detail, "RPC connection failed")
+
+class WaitUntilCaughtUpTestCase(FakeDaemonTestCase):
+	
+	def setUp(self):
+		self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandInRpcHandler)
+		threading.Thread(target=self.server.serve_forever, daemon=True).start()
+		self.rpcPort = self.server.server_address[1]
+		super().setUp()
+	
+	def tearDown(self):
+		super().tearDown()
+		self.server.shutdown()
+		self.server.server_close()
+	
+	def test_reindexing(self):
+		# Answering already, but still reindexing: Not caught up until initial block download is over.
+		StandInRpcHandler.answers = [
+			(None, {"code": -28, "message": "Loading block index..."}),
+			({"blocks": 1000, "initialblockdownload": True, "verificationprogress": 0.2}, None),
+			({"blocks": 5000, "initialblockdownload": False, "verificationprogress": 0.99999}, None)]
+		info = self.wallet.waitUntilCaughtUp(timeout=10, initialInterval=0.01)
+		self.assertEqual(info["blocks"], 5000)
+	
+	def test_olderDaemon(self):
+		# No initialblockdownload field: Verification progress has to catch up.
+		StandInRpcHandler.answers = [({"blocks": 10, "verificationprogress": 0.5}, None),\
+			({"blocks": 20, "verificationprogress": 1.0}, None)]
+		self.assertEqual(self.wallet.waitUntilCaughtUp(timeout=10, initialInterval=0.01)["blocks"], 20)
+	
+	def test_stuck(self):
+		StandInRpcHandler.answers = [({"blocks": 10, "initialblockdownload": True, "verificationprogress": 0.5}, None)]
+		with self.assertRaises(WalletError) as context:
+			self.wallet.waitUntilCaughtUp(timeout=0.2, initialInterval=0.01)
+		self.assertEqual(context.exception.code, WalletError.codes.DAEMON_STUCK)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,120 @@
+#=======================================================================================
+# Imports
+#=======================================================================================
+
+# Python
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+# What's to be tested.
+from lib.watching import Inotify, InotifyUnavailableError, PathWatcher, IN_CREATE, IN_IGNORED, IN_MODIFY
+
+#=======================================================================================
+# Tests
+#=======================================================================================
+
+def inotifyAvailable():
+	try:
+		Inotify().close()
+	except InotifyUnavailableError:
+		return False
+	return True
+
+@unittest.skipUnless(inotifyAvailable(), "inotify isn't available")
+class InotifyTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.inotify = Inotify()
+
+	def tearDown(self):
+		self.inotify.close()
+		self.tempDir.cleanup()
+
+	def test_events(self):
+		self.inotify.addWatch(self.tempDir.name)
+		with open(os.path.join(self.tempDir.name, "debug.log"), "w") as logFile:
+			logFile.write("line\n")
+		events = self.inotify.read(5)
+		self.assertTrue(any([event.mask & IN_CREATE and event.name == "debug.log"\
+			and event.path == self.tempDir.name for event in events]))
+		self.assertEqual(self.inotify.read(0), [])
+
+	def test_watchedPathDeleted(self):
+		dirPath = os.path.join(self.tempDir.name, "datadir")
+		os.makedirs(dirPath)
+		self.inotify.addWatch(dirPath)
+		shutil.rmtree(dirPath)
+		events = []
+		for attempt in range(10):
+			events += self.inotify.read(1)
+			if any([event.mask & IN_IGNORED for event in events]):
+				break
+		self.assertEqual(self.inotify.watches, {})
+
+	def test_missingPath(self):
+		with self.assertRaises(InotifyUnavailableError):
+			self.inotify.addWatch(os.path.join(self.tempDir.name, "missing"))
+
+class PathWatcherTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tempDir = tempfile.TemporaryDirectory()
+		self.dataDirPath = os.path.join(self.tempDir.name, ".vivocore")
+
+	def tearDown(self):
+		self.tempDir.cleanup()
+
+	def writeLater(self, path, delay=0.2):
+		def write():
+			time.sleep(delay)
+			with open(path, "a") as logFile:
+				logFile.write("line\n")
+		thread = threading.Thread(target=write, daemon=True)
+		thread.start()
+		return thread
+
+	@unittest.skipUnless(inotifyAvailable(), "inotify isn't available")
+	def test_wakesUp(self):
+		os.makedirs(self.dataDirPath)
+		with PathWatcher([self.dataDirPath], pollInterval=60) as watcher:
+			self.assertTrue(watcher.usingInotify)
+			self.writeLater(os.path.join(self.dataDirPath, "debug.log"))
+			startTime = time.monotonic()
+			events = watcher.wait(30)
+			self.assertLess(time.monotonic()-startTime, 10)
+			self.assertTrue(any([event.name == "debug.log" for event in events]))
+
+	@unittest.skipUnless(inotifyAvailable(), "inotify isn't available")
+	def test_pathAppearingLater(self):
+		# The datadir of a new node only appears once its daemon starts.
+		with PathWatcher([self.dataDirPath], pollInterval=0.1) as watcher:
+			self.assertEqual(watcher.inotify.watches, {})
+			os.makedirs(self.dataDirPath)
+			watcher.wait(0.3)
+			self.assertEqual(list(watcher.inotify.watches.values()), [self.dataDirPath])
+			self.writeLater(os.path.join(self.dataDirPath, "debug.log"), delay=0.1)
+			events = []
+			for attempt in range(20):
+				events += watcher.wait(1)
+				if any([event.mask & IN_MODIFY for event in events]):
+					break
+			self.assertTrue(any([event.name == "debug.log" for event in events]))
+
+	def test_polling(self):
+		os.makedirs(self.dataDirPath)
+		with PathWatcher([self.dataDirPath], pollInterval=0.1, useInotify=False) as watcher:
+			self.assertFalse(watcher.usingInotify)
+			startTime = time.monotonic()
+			self.assertEqual(watcher.wait(30), [])
+			self.assertLess(time.monotonic()-startTime, 5)
+			startTime = time.monotonic()
+			watcher.wait(0)
+			self.assertLess(time.monotonic()-startTime, 0.1)
+
+if __name__ == "__main__":
+	unittest.main()